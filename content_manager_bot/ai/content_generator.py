@@ -24,6 +24,7 @@ from content_manager_bot.ai.prompts import ContentPrompts
 from content_manager_bot.database.models import ImportedPost
 from content_manager_bot.utils.product_reference import ProductReferenceManager
 from shared.media import media_library  # НОВОЕ: индексированная медиа-библиотека
+from shared.utils.offload import path_exists, read_file_base64
 
 
 # Типы постов, где используется GPT-4 для лучшего качества
@@ -1081,7 +1082,6 @@ class ContentGenerator:
             # Ищем фото для ЛЮБОГО типа поста, если в тексте упоминается продукт
             if use_product_reference:
                 import time
-                import base64
 
                 start_time = time.time()
 
@@ -1092,11 +1092,12 @@ class ContentGenerator:
 
                     if asset and asset.file_path:
                         from pathlib import Path
-                        photo_path = Path(asset.file_path)
+                        # Вариант 1280px (если построен) — меньше байт в посте и при публикации
+                        photo_path = Path(asset.send_path())
 
-                        if photo_path.exists():
-                            with open(photo_path, 'rb') as f:
-                                image_base64 = base64.b64encode(f.read()).decode('utf-8')
+                        if await path_exists(photo_path):
+                            # Чтение и base64 многомегабайтного фото — вне event loop
+                            image_base64 = await read_file_base64(photo_path)
 
                             product_name = asset.nl_products[0] if asset.nl_products else "unknown"
                             logger.info(f"[ФОТО] ✅ MediaLibrary: найдено фото {product_name} за {search_time_ms:.1f}ms")
@@ -1114,9 +1115,9 @@ class ContentGenerator:
                 if product_result:
                     keyword, folder_path, photo_path = product_result
                     logger.info(f"[ФОТО] Fallback: найден продукт '{keyword}' → {folder_path}")
-                    if photo_path and photo_path.exists():
-                        with open(photo_path, 'rb') as f:
-                            image_base64 = base64.b64encode(f.read()).decode('utf-8')
+                    if photo_path and await path_exists(photo_path):
+                        photo_path = self.product_reference.telegram_photo_path(photo_path)
+                        image_base64 = await read_file_base64(photo_path)
                         logger.info(f"[ФОТО] ✅ Fallback: используем фото {photo_path}")
                         return image_base64, f"готовое фото: {keyword} ({photo_path.name})"
 
@@ -253,6 +253,10 @@ class MediaAsset(Base, TimestampMixin):
     # Локальный путь (для фото продуктов и testimonials)
     file_path: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
+    # Подготовленные для Telegram варианты {"tg": path, "webp": path, "tg_wm": path}
+    # (shared/media/image_variants.py, ключ — хеш исходного файла)
+    variants: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, nullable=True)
+
     # Промпт для генерации (для регенерации)
     generation_prompt: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
@@ -12,6 +12,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from shared.config.settings import settings
 from shared.database.base import AsyncSessionLocal
+from shared.ai_clients.usage import collect_usage, summarize_usage
+from shared.ai_clients.usage_recorder import get_usage_recorder, get_usage_report
+from shared.media.file_id_registry import get_file_id_registry
+from shared.utils.offload import decode_base64
 from shared.style_monitor import get_style_service
 from content_manager_bot.ai.content_generator import ContentGenerator
 from content_manager_bot.database.models import Post, PostStatus, AdminAction
@@ -219,7 +223,8 @@ async def cmd_help(message: Message):
         "/stats - базовая статистика\n"
         "/analytics [дней] - детальная аналитика\n"
         "/update_stats - обновить из Telegram\n"
-        "/top [views|reactions] [N] [дней] - топ постов\n\n"
+        "/top [views|reactions] [N] [дней] - топ постов\n"
+        "/llm_usage [дней] - токены и задержки AI\n\n"
 
         "<b>📺 КАНАЛЫ-ОБРАЗЦЫ (стиль)</b>\n"
         "/add_channel @username [категория] - добавить канал\n"
@@ -288,8 +293,6 @@ async def generate_and_show_post(
         post_type: Тип поста
         custom_topic: Дополнительная тема
     """
-    from aiogram.types import BufferedInputFile
-    import base64
 
     type_names = ContentGenerator.get_available_post_types()
     type_name = type_names.get(post_type, post_type)
@@ -299,10 +302,11 @@ async def generate_and_show_post(
 
     try:
         # Генерируем контент
-        content, prompt_used = await content_generator.generate_post(
-            post_type=post_type,
-            custom_topic=custom_topic
-        )
+        with collect_usage() as usages:
+            content, prompt_used = await content_generator.generate_post(
+                post_type=post_type,
+                custom_topic=custom_topic
+            )
 
         # Сохраняем в БД
         async with AsyncSessionLocal() as session:
@@ -311,13 +315,21 @@ async def generate_and_show_post(
                 post_type=post_type,
                 status="pending",
                 generated_at=datetime.utcnow(),
-                ai_model="GigaChat",
-                prompt_used=prompt_used
+                ai_model=usages[-1].model if usages else "GigaChat",
+                prompt_used=prompt_used,
+                generation_params={"usage": summarize_usage(usages)}
             )
             session.add(post)
             await session.commit()
             await session.refresh(post)
 
+            get_usage_recorder().record(
+                usages,
+                purpose="post_generation",
+                post_id=post.id,
+                post_type=post_type
+            )
+
             # Логируем действие
             action = AdminAction(
                 admin_id=message.from_user.id,
@@ -379,11 +391,14 @@ async def generate_and_show_post(
                     )
                     post = result.scalar_one()
 
-                    image_bytes = base64.b64decode(post.image_url)
-                    image_file = BufferedInputFile(image_bytes, filename=f"post_{post_id}.jpg")
+                    image_bytes = await decode_base64(post.image_url)
 
-                    await message.answer_photo(
-                        photo=image_file,
+                    # Первая загрузка картинки: file_id переиспользуется при публикации
+                    await get_file_id_registry().send_photo(
+                        message.bot,
+                        message.chat.id,
+                        data=image_bytes,
+                        filename=f"post_{post_id}.jpg",
                         caption=(
                             f"📝 <b>Новый пост ({type_name})</b>\n"
                             f"ID: #{post_id}\n\n"
@@ -660,6 +675,79 @@ async def cmd_top(message: Message):
         )
 
 
+@router.message(Command("llm_usage"))
+async def cmd_llm_usage(message: Message):
+    """Обработчик команды /llm_usage - токены и задержки AI по дням, типам постов и диалогам"""
+    if not is_admin(message.from_user.id):
+        return
+
+    # Парсим аргументы: /llm_usage [дней]
+    args = message.text.split()
+    days = int(args[1]) if len(args) > 1 and args[1].isdigit() else 7
+
+    status_msg = await message.answer("⏳ Собираю статистику AI...")
+
+    try:
+        # Сбрасываем буфер, чтобы отчёт включал последние вызовы
+        await get_usage_recorder().flush()
+        report = await get_usage_report(days=days)
+
+        response = f"🤖 <b>Использование AI</b>\n<i>За последние {days} дней</i>\n\n"
+
+        response += "<b>📅 По дням:</b>\n"
+        for row in report["by_day"]:
+            response += (
+                f"  {row['key'].strftime('%d.%m')}: {row['tokens']} ток. | "
+                f"{row['calls']} выз. | ⏱ {row['avg_wall_ms']} мс\n"
+            )
+        if not report["by_day"]:
+            response += "  нет данных\n"
+
+        response += "\n<b>📝 По типам постов:</b>\n"
+        for row in report["by_post_type"]:
+            response += (
+                f"  {row['key']}: {row['tokens']} ток. | "
+                f"{row['calls']} выз. | ⏱ {row['avg_wall_ms']} мс\n"
+            )
+        if not report["by_post_type"]:
+            response += "  нет данных\n"
+
+        response += "\n<b>💬 Самые дорогие диалоги:</b>\n"
+        for row in report["top_conversations"]:
+            response += (
+                f"  user #{row['key']}: {row['tokens']} ток. | "
+                f"{row['calls']} выз. | ⏱ {row['avg_wall_ms']} мс\n"
+            )
+        if not report["top_conversations"]:
+            response += "  нет данных\n"
+
+        await status_msg.edit_text(response)
+
+    except Exception as e:
+        logger.error(f"Error getting LLM usage: {e}")
+        await status_msg.edit_text(
+            f"❌ Ошибка при получении статистики AI:\n{str(e)}"
+        )
+
+
+@router.message(Command("file_ids"))
+async def cmd_file_ids(message: Message):
+    """Обработчик команды /file_ids - сколько загрузок картинок сэкономлено за счёт file_id"""
+    if not is_admin(message.from_user.id):
+        return
+
+    stats = get_file_id_registry().get_stats()
+    await message.answer(
+        "🖼 <b>Отправка картинок</b>\n<i>С момента запуска бота</i>\n\n"
+        f"По file_id: {stats['reuses']} ({stats['reuse_rate']}%)\n"
+        f"Загрузок: {stats['uploads']}\n"
+        f"Отклонённых file_id: {stats['rejected']}\n\n"
+        f"📤 Загружено: {stats['bytes_uploaded'] / 1024 / 1024:.1f} МБ\n"
+        f"💾 Сэкономлено: {stats['bytes_saved'] / 1024 / 1024:.1f} МБ\n"
+        f"Известных file_id: {stats['file_ids']}"
+    )
+
+
 # ============== КОМАНДЫ ДЛЯ КАНАЛОВ-ОБРАЗЦОВ ==============
 
 @router.message(Command("add_channel"))
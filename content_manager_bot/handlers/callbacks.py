@@ -13,6 +13,10 @@ from sqlalchemy import select, func
 
 from shared.config.settings import settings
 from shared.database.base import AsyncSessionLocal
+from shared.ai_clients.usage import collect_usage
+from shared.ai_clients.usage_recorder import get_usage_recorder
+from shared.media.file_id_registry import get_file_id_registry
+from shared.utils.offload import decode_base64
 from content_manager_bot.ai.content_generator import ContentGenerator
 from content_manager_bot.database.models import Post, AdminAction, ContentSchedule
 from content_manager_bot.utils.keyboards import Keyboards
@@ -105,8 +109,6 @@ async def callback_generate_by_type(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("publish:"))
 async def callback_publish(callback: CallbackQuery, bot: Bot):
     """Публикация поста в канал"""
-    import base64
-    from aiogram.types import BufferedInputFile
 
     # === ЛОГИРОВАНИЕ ===
     logger.info(f"[CALLBACK] publish: user={callback.from_user.id}, data={callback.data}")
@@ -158,9 +160,9 @@ async def callback_publish(callback: CallbackQuery, bot: Bot):
             # Если есть изображение - публикуем первую часть с изображением
             if post.image_url:
                 try:
-                    # Конвертируем base64 в файл
-                    image_bytes = base64.b64decode(post.image_url)
-                    image_file = BufferedInputFile(image_bytes, filename=f"post_{post_id}.jpg")
+                    # Картинка поста уже могла быть загружена (превью админу) — тогда по file_id
+                    image_bytes = await decode_base64(post.image_url)
+                    file_registry = get_file_id_registry()
 
                     # Первая часть с фото (caption до 1024 символов)
                     first_part = post_parts[0] if post_parts else ""
@@ -168,17 +170,21 @@ async def callback_publish(callback: CallbackQuery, bot: Bot):
                         first_part = first_part[:1020] + "..."
 
                     if settings.group_id and topic_id:
-                        channel_message = await bot.send_photo(
-                            chat_id=target_chat,
-                            photo=image_file,
+                        channel_message = await file_registry.send_photo(
+                            bot,
+                            target_chat,
+                            data=image_bytes,
+                            filename=f"post_{post_id}.jpg",
                             caption=first_part,
                             message_thread_id=topic_id,
                             parse_mode="HTML"
                         )
                     else:
-                        channel_message = await bot.send_photo(
-                            chat_id=target_chat,
-                            photo=image_file,
+                        channel_message = await file_registry.send_photo(
+                            bot,
+                            target_chat,
+                            data=image_bytes,
+                            filename=f"post_{post_id}.jpg",
                             caption=first_part,
                             parse_mode="HTML"
                         )
@@ -1145,12 +1151,19 @@ async def process_regenerate_feedback(message: Message, state: FSMContext):
 
         try:
             # Перегенерируем через AI
-            new_content = await content_generator.regenerate_post(
-                original_post=post.content,
-                feedback=message.text
-            )
+            with collect_usage() as usages:
+                new_content = await content_generator.regenerate_post(
+                    original_post=post.content,
+                    feedback=message.text
+                )
 
             post.content = new_content
+            get_usage_recorder().record(
+                usages,
+                purpose="post_regeneration",
+                post_id=post.id,
+                post_type=post.post_type
+            )
 
             action = AdminAction(
                 admin_id=message.from_user.id,
@@ -1493,17 +1506,14 @@ async def _show_post_with_image(message: Message, post: Post):
         message: Сообщение для редактирования
         post: Объект поста с изображением
     """
-    import base64
     import io
-    from aiogram.types import BufferedInputFile
 
     type_names = ContentGenerator.get_available_post_types()
     type_name = type_names.get(post.post_type, post.post_type)
 
     try:
-        # Конвертируем base64 в файл
-        image_bytes = base64.b64decode(post.image_url)
-        image_file = BufferedInputFile(image_bytes, filename=f"post_{post.id}.jpg")
+        # Конвертируем base64 в байты (загрузка в Telegram — один раз, дальше по file_id)
+        image_bytes = await decode_base64(post.image_url)
 
         # Удаляем старое сообщение (с текстом "генерирую...")
         try:
@@ -1512,8 +1522,11 @@ async def _show_post_with_image(message: Message, post: Post):
             pass
 
         # Отправляем новое сообщение с изображением
-        await message.answer_photo(
-            photo=image_file,
+        await get_file_id_registry().send_photo(
+            message.bot,
+            message.chat.id,
+            data=image_bytes,
+            filename=f"post_{post.id}.jpg",
             caption=(
                 f"📝 <b>Пост ({type_name})</b>\n"
                 f"ID: #{post.id}\n\n"
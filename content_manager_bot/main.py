@@ -10,7 +10,11 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from shared.config.settings import settings
 from shared.utils.logger import setup_logger
+from shared.webhook import run_dispatcher
 from shared.database.base import init_db
+from shared.media import media_library
+from shared.media.asset_usage import get_asset_usage_buffer
+from shared.utils.shutdown import close_shared_resources
 from content_manager_bot.handlers import admin_router, callbacks_router
 from content_manager_bot.scheduler.content_scheduler import ContentScheduler
 
@@ -19,8 +23,14 @@ from content_manager_bot.scheduler.content_scheduler import ContentScheduler
 logger = setup_logger("content_manager", settings.log_level)
 
 
-async def main():
-    """Главная функция запуска бота"""
+async def main(close_shared: bool = True):
+    """
+    Главная функция запуска бота
+
+    Args:
+        close_shared: Закрыть общие ресурсы процесса при остановке
+            (run_bots.py передаёт False и закрывает их сам после обоих ботов)
+    """
 
     logger.info("🚀 Starting AI-Content-Manager Bot...")
 
@@ -29,6 +39,15 @@ async def main():
     await init_db()
     logger.info("✅ Database initialized")
 
+    # Строим индекс упоминаний продуктов (маппинг + media_keyword_index)
+    # и подписываемся на NOTIFY от scripts/index_media_library.py
+    try:
+        await media_library.reload_product_index()
+        await media_library.start_index_listener()
+        logger.info("✅ Product index built")
+    except Exception as e:
+        logger.warning(f"Product index: media keywords not loaded ({e}), using mapping only")
+
     # Создаем бота
     bot = Bot(
         token=settings.content_manager_bot_token,
@@ -52,16 +71,21 @@ async def main():
     await scheduler.start()
     logger.info("✅ Content scheduler started")
 
-    # Запускаем polling
+    # Принимаем апдейты (polling или webhook — BOT_MODE)
     try:
         logger.info("🤖 AI-Content-Manager Bot is running!")
         logger.info(f"AI Model: {settings.content_manager_ai_model or 'GigaChat'}")
         logger.info(f"Channel: {settings.channel_username}")
         logger.info(f"Admins: {settings.admin_ids_list}")
 
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await run_dispatcher("content", bot, dp)
     finally:
         await scheduler.stop()
+        await media_library.stop_index_listener()
+        await get_asset_usage_buffer().close()
+        # Общие с куратором ресурсы (usage AI, токены, пулы потоков)
+        if close_shared:
+            await close_shared_resources()
         await bot.session.close()
         logger.info("👋 AI-Content-Manager Bot stopped")
 
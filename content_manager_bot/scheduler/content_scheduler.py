@@ -10,6 +10,10 @@ from sqlalchemy import select, and_
 
 from shared.config.settings import settings
 from shared.database.base import AsyncSessionLocal
+from shared.ai_clients.usage import collect_usage, summarize_usage
+from shared.ai_clients.usage_recorder import get_usage_recorder
+from shared.media.file_id_registry import get_file_id_registry
+from shared.utils.offload import decode_base64
 from content_manager_bot.database.models import Post, ContentSchedule
 from content_manager_bot.ai.content_generator import ContentGenerator
 from content_manager_bot.utils.keyboards import Keyboards
@@ -124,8 +128,6 @@ class ContentScheduler:
             post: Пост для публикации
             session: Сессия БД
         """
-        import base64
-        from aiogram.types import BufferedInputFile
 
         try:
             # Определяем куда публиковать (тема в группе)
@@ -145,24 +147,29 @@ class ContentScheduler:
             # === ПУБЛИКАЦИЯ С КАРТИНКОЙ ===
             if post.image_url:
                 try:
-                    image_bytes = base64.b64decode(post.image_url)
-                    image_file = BufferedInputFile(image_bytes, filename=f"post_{post.id}.jpg")
+                    # Картинка уже загружалась при превью — отправляем по file_id
+                    image_bytes = await decode_base64(post.image_url)
+                    file_registry = get_file_id_registry()
 
                     # Ограничение Telegram: caption max 1024 символа
                     caption = post_with_curator[:1024] if len(post_with_curator) > 1024 else post_with_curator
 
                     if settings.group_id and topic_id:
-                        message = await self.bot.send_photo(
-                            chat_id=target_chat,
-                            photo=image_file,
+                        message = await file_registry.send_photo(
+                            self.bot,
+                            target_chat,
+                            data=image_bytes,
+                            filename=f"post_{post.id}.jpg",
                             caption=caption,
                             message_thread_id=topic_id,
                             parse_mode="HTML"
                         )
                     else:
-                        message = await self.bot.send_photo(
-                            chat_id=target_chat,
-                            photo=image_file,
+                        message = await file_registry.send_photo(
+                            self.bot,
+                            target_chat,
+                            data=image_bytes,
+                            filename=f"post_{post.id}.jpg",
                             caption=caption,
                             parse_mode="HTML"
                         )
@@ -291,9 +298,10 @@ class ContentScheduler:
         logger.info(f"Running auto generation for schedule #{schedule.id} ({schedule.post_type})")
 
         # Генерируем пост
-        content, prompt_used = await self.content_generator.generate_post(
-            post_type=schedule.post_type
-        )
+        with collect_usage() as usages:
+            content, prompt_used = await self.content_generator.generate_post(
+                post_type=schedule.post_type
+            )
 
         # Сохраняем как pending (требует модерации)
         post = Post(
@@ -302,7 +310,8 @@ class ContentScheduler:
             status="pending",
             generated_at=datetime.utcnow(),
             ai_model=settings.content_manager_ai_model,
-            prompt_used=prompt_used
+            prompt_used=prompt_used,
+            generation_params={"usage": summarize_usage(usages)}
         )
         session.add(post)
 
@@ -317,6 +326,13 @@ class ContentScheduler:
         await session.commit()
         await session.refresh(post)
 
+        get_usage_recorder().record(
+            usages,
+            purpose="post_generation",
+            post_id=post.id,
+            post_type=schedule.post_type
+        )
+
         logger.info(
             f"✅ Auto-generated post #{post.id} ({schedule.post_type}). "
             f"Total generated: {schedule.total_generated}. "
@@ -8,8 +8,10 @@ from pathlib import Path
 from aiogram.types import BufferedInputFile
 from loguru import logger
 
+from shared.media.image_variants import draw_watermark, encode_image, fit_within, paste_logo
+
 try:
-    from PIL import Image, ImageDraw, ImageFont
+    from PIL import Image
     PILLOW_AVAILABLE = True
 except ImportError:
     PILLOW_AVAILABLE = False
@@ -114,49 +116,13 @@ def add_watermark(
     try:
         # Декодируем изображение
         image_bytes = base64.b64decode(base64_image)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-
-        # Создаем слой для водяного знака
-        watermark_layer = Image.new("RGBA", image.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(watermark_layer)
-
-        # Определяем размер шрифта (2% от высоты изображения)
-        font_size = max(int(image.height * 0.02), 12)
-        try:
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            font = ImageFont.load_default()
-
-        # Получаем размеры текста
-        bbox = draw.textbbox((0, 0), watermark_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-
-        # Вычисляем позицию
-        padding = 20
-        positions = {
-            "bottom_right": (image.width - text_width - padding, image.height - text_height - padding),
-            "bottom_left": (padding, image.height - text_height - padding),
-            "top_right": (image.width - text_width - padding, padding),
-            "top_left": (padding, padding),
-            "center": ((image.width - text_width) // 2, (image.height - text_height) // 2)
-        }
-
-        x, y = positions.get(position, positions["bottom_right"])
-
-        # Рисуем водяной знак
-        draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, opacity))
-
-        # Накладываем водяной знак на изображение
-        result = Image.alpha_composite(image, watermark_layer)
+        image = Image.open(io.BytesIO(image_bytes))
 
-        # Конвертируем обратно в RGB для JPEG
-        result_rgb = result.convert("RGB")
+        # Рисуем водяной знак (общая реализация с вариантами медиа-библиотеки)
+        result = draw_watermark(image, watermark_text, position=position, opacity=opacity)
 
-        # Сохраняем в base64
-        output_buffer = io.BytesIO()
-        result_rgb.save(output_buffer, format="JPEG", quality=95)
-        output_base64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+        # Сохраняем в base64 (JPEG, без альфа-канала)
+        output_base64 = base64.b64encode(encode_image(result, "JPEG", quality=95)).decode('utf-8')
 
         logger.info(f"Watermark '{watermark_text}' added at {position}")
         return output_base64
@@ -199,44 +165,16 @@ def add_logo_overlay(
 
         # Декодируем изображение
         image_bytes = base64.b64decode(base64_image)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-
-        # Загружаем логотип
-        logo = Image.open(logo_file).convert("RGBA")
-
-        # Изменяем размер логотипа
-        logo_width = int(image.width * (logo_size_percent / 100))
-        logo_aspect = logo.height / logo.width
-        logo_height = int(logo_width * logo_aspect)
-        logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-
-        # Применяем прозрачность
-        if opacity < 255:
-            alpha = logo.split()[3]
-            alpha = alpha.point(lambda p: int(p * (opacity / 255)))
-            logo.putalpha(alpha)
-
-        # Вычисляем позицию
-        padding = 20
-        positions = {
-            "bottom_right": (image.width - logo_width - padding, image.height - logo_height - padding),
-            "bottom_left": (padding, image.height - logo_height - padding),
-            "top_right": (image.width - logo_width - padding, padding),
-            "top_left": (padding, padding)
-        }
-
-        x, y = positions.get(position, positions["bottom_right"])
+        image = Image.open(io.BytesIO(image_bytes))
 
         # Накладываем логотип
-        image.paste(logo, (x, y), logo)
+        with Image.open(logo_file) as logo:
+            result = paste_logo(
+                image, logo, position=position, logo_size_percent=logo_size_percent, opacity=opacity
+            )
 
-        # Конвертируем обратно в RGB для JPEG
-        result_rgb = image.convert("RGB")
-
-        # Сохраняем в base64
-        output_buffer = io.BytesIO()
-        result_rgb.save(output_buffer, format="JPEG", quality=95)
-        output_base64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+        # Сохраняем в base64 (JPEG, без альфа-канала)
+        output_base64 = base64.b64encode(encode_image(result, "JPEG", quality=95)).decode('utf-8')
 
         logger.info(f"Logo overlay added at {position} (size: {logo_size_percent}%)")
         return output_base64
@@ -278,21 +216,12 @@ def resize_image(
             logger.info("Image already within size limits")
             return base64_image
 
-        # Вычисляем новые размеры с сохранением пропорций
-        ratio = min(max_width / image.width, max_height / image.height)
-        new_size = (int(image.width * ratio), int(image.height * ratio))
-
-        # Изменяем размер
-        resized = image.resize(new_size, Image.Resampling.LANCZOS)
-
-        # Конвертируем в RGB если нужно
-        if resized.mode in ("RGBA", "LA", "P"):
-            resized = resized.convert("RGB")
+        # Изменяем размер с сохранением пропорций
+        resized = fit_within(image, max_width, max_height)
+        new_size = resized.size
 
         # Сохраняем в base64
-        output_buffer = io.BytesIO()
-        resized.save(output_buffer, format="JPEG", quality=quality)
-        output_base64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+        output_base64 = base64.b64encode(encode_image(resized, "JPEG", quality=quality)).decode('utf-8')
 
         logger.info(f"Image resized from {image.size} to {new_size}")
         return output_base64
@@ -8,6 +8,10 @@ from typing import Optional, Dict, Any, Tuple
 from pathlib import Path
 from loguru import logger
 
+from shared.media.product_index import get_product_index
+from shared.media.photo_index import get_photo_index
+from shared.media.image_variants import get_variant_store
+
 
 class ProductReferenceManager:
     """Менеджер для работы с референсными изображениями продуктов"""
@@ -31,6 +35,10 @@ class ProductReferenceManager:
         self.mapping_file = project_root / "content" / "unified_products" / "full_products_mapping.json"
         self._mapping: Optional[Dict[str, Any]] = None
         self._photo_cache: Dict[str, str] = {}  # Кэш найденных фото
+        # Индекс фото (строится один раз, поиск без обращений к диску)
+        self.photo_index = get_photo_index(self.base_path)
+        # Подготовленные для Telegram копии фото (scripts/build_image_variants.py)
+        self.variant_store = get_variant_store(self.base_path)
 
     def load_mapping(self) -> Dict[str, Any]:
         """
@@ -98,11 +106,26 @@ class ProductReferenceManager:
         Returns:
             str: Base64-encoded изображение или None
         """
-        # Проверяем кэш
         cache_key = f"{category}_{product_key}"
         if cache_key in self._photo_cache:
             return self._photo_cache[cache_key]
 
+        image_path = self._locate_product_image(product_key, category)
+        if not image_path:
+            return None
+
+        try:
+            with open(image_path, 'rb') as f:
+                image_base64 = base64.b64encode(f.read()).decode('utf-8')
+            self._photo_cache[cache_key] = image_base64
+            logger.info(f"Loaded product image: {product_key} from {image_path}")
+            return image_base64
+        except Exception as e:
+            logger.error(f"Error loading product image: {e}")
+            return None
+
+    def _locate_product_image(self, product_key: str, category: Optional[str] = None) -> Optional[Path]:
+        """Проверяет продукт и находит файл фото (обход каталогов — блокирующий)"""
         product_info = self.get_product_info(product_key, category)
         if not product_info:
             logger.warning(f"Product not found: {product_key} in category {category}")
@@ -113,17 +136,7 @@ class ProductReferenceManager:
         if not image_path:
             logger.warning(f"Product image not found for: {product_key}")
             return None
-
-        try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-                image_base64 = base64.b64encode(image_data).decode('utf-8')
-                self._photo_cache[cache_key] = image_base64
-                logger.info(f"Loaded product image: {product_info['name']} from {image_path}")
-                return image_base64
-        except Exception as e:
-            logger.error(f"Error loading product image: {e}")
-            return None
+        return image_path
 
     def _find_product_photo(self, product_key: str, category: Optional[str] = None) -> Optional[Path]:
         """
@@ -138,45 +151,10 @@ class ProductReferenceManager:
         Returns:
             Path: Путь к фото или None
         """
-        search_paths = []
-
-        if category:
-            # Ищем в конкретной категории
-            search_paths.append(self.base_path / category / product_key / "photos")
-            # Альтернативные написания
-            search_paths.append(self.base_path / category.lower() / product_key.lower() / "photos")
-            search_paths.append(self.base_path / category / "*" / "photos")
-
-        # Ищем по всем категориям
-        for brand_dir in self.base_path.iterdir():
-            if brand_dir.is_dir():
-                product_dir = brand_dir / product_key / "photos"
-                if product_dir.exists():
-                    search_paths.insert(0, product_dir)
-
-                # Ищем похожие названия
-                for product_dir in brand_dir.iterdir():
-                    if product_dir.is_dir() and product_key.lower() in product_dir.name.lower():
-                        photos_dir = product_dir / "photos"
-                        if photos_dir.exists():
-                            search_paths.insert(0, photos_dir)
-
-        # Ищем первое доступное фото
-        for search_path in search_paths:
-            if not search_path.exists():
-                continue
-
-            jpg_files = list(search_path.glob("*.jpg"))
-            if jpg_files:
-                # Берём первое фото
-                return jpg_files[0]
-
-            # Пробуем PNG
-            png_files = list(search_path.glob("*.png"))
-            if png_files:
-                return png_files[0]
-
-        return None
+        folder = self.photo_index.find_product_folder(product_key, category)
+        if not folder:
+            return None
+        return self.photo_index.first_photo(folder)
 
     def get_random_product_photo(self, category: Optional[str] = None) -> Optional[Tuple[str, Path]]:
         """
@@ -188,21 +166,10 @@ class ProductReferenceManager:
         Returns:
             Tuple[str, Path]: (base64, путь к файлу) или None
         """
-        import random
-
-        all_photos = []
-
-        search_path = self.base_path / category if category else self.base_path
-
-        if search_path.exists():
-            for photo in search_path.rglob("*.jpg"):
-                all_photos.append(photo)
-
-        if not all_photos:
+        photo_path = self.photo_index.random_photo(category)
+        if not photo_path:
             return None
 
-        photo_path = random.choice(all_photos)
-
         try:
             with open(photo_path, 'rb') as f:
                 image_base64 = base64.b64encode(f.read()).decode('utf-8')
@@ -245,7 +212,7 @@ class ProductReferenceManager:
     def extract_product_from_content(self, content: str) -> Optional[tuple[str, str, Path]]:
         """
         Пытается извлечь упоминание продукта из текста контента
-        Использует keywords из full_products_mapping.json
+        Использует единый ProductIndex (keywords из full_products_mapping.json)
 
         Args:
             content: Текст поста
@@ -253,30 +220,27 @@ class ProductReferenceManager:
         Returns:
             tuple: (keyword, folder_path, photo_path) или None
         """
-        mapping = self.load_mapping()
-        keywords_map = mapping.get("keywords", {})
-
-        if not keywords_map:
-            logger.warning("No keywords found in mapping")
-            return None
-
-        content_lower = content.lower()
+        # Единый индекс продуктов: совпадения уже упорядочены (длиннее → приоритетнее)
+        for match in get_product_index().find_all(content):
+            if not match.folder:
+                continue
+            photo_path = self._find_photo_in_folder(match.folder)
+            if photo_path:
+                logger.info(f"Found product by keyword '{match.keyword}': {photo_path}")
+                return match.keyword, match.folder, photo_path
+            else:
+                logger.warning(f"Keyword '{match.keyword}' found but no photo in {match.folder}")
 
-        # Сортируем по длине ключа (сначала более специфичные)
-        sorted_keywords = sorted(keywords_map.keys(), key=len, reverse=True)
+        return None
 
-        for keyword in sorted_keywords:
-            if keyword in content_lower:
-                folder_path = keywords_map[keyword]
-                # Ищем фото в папке
-                photo_path = self._find_photo_in_folder(folder_path)
-                if photo_path:
-                    logger.info(f"Found product by keyword '{keyword}': {photo_path}")
-                    return keyword, folder_path, photo_path
-                else:
-                    logger.warning(f"Keyword '{keyword}' found but no photo in {folder_path}")
+    def telegram_photo_path(self, photo_path: Path, variant: str = "tg") -> Path:
+        """
+        Путь для отправки фото в Telegram
 
-        return None
+        Вариант 1280px, если он построен и актуален, иначе оригинал.
+        Изображение при отправке не обрабатывается.
+        """
+        return self.variant_store.resolve(photo_path, variant)
 
     def _find_photo_in_folder(self, folder_path: str) -> Optional[Path]:
         """
@@ -288,32 +252,7 @@ class ProductReferenceManager:
         Returns:
             Path к первому найденному фото или None
         """
-        # Пробуем разные варианты структуры
-        search_paths = [
-            self.base_path / folder_path / "photos",
-            self.base_path / folder_path,
-        ]
-
-        for search_path in search_paths:
-            if not search_path.exists():
-                continue
-
-            # Ищем jpg
-            jpg_files = list(search_path.glob("*.jpg"))
-            if jpg_files:
-                return jpg_files[0]
-
-            # Ищем png
-            png_files = list(search_path.glob("*.png"))
-            if png_files:
-                return png_files[0]
-
-            # Ищем jpeg
-            jpeg_files = list(search_path.glob("*.jpeg"))
-            if jpeg_files:
-                return jpeg_files[0]
-
-        return None
+        return self.photo_index.first_photo(folder_path)
 
     def generate_image_to_image_prompt(self, product_info: Dict[str, Any], original_prompt: str) -> str:
         """
@@ -7,8 +7,9 @@ from datetime import datetime
 from loguru import logger
 
 from shared.ai_clients.openai_client import OpenAIClient
-from shared.persona import PersonaManager, PERSONA_CHARACTERISTICS
 from curator_bot.ai.prompts import get_curator_system_prompt, get_rag_instruction
+from curator_bot.ai.message_features import MessageFeatures, classify_message, INTENT_CATEGORY_TAGS
+from curator_bot.ai.persona_selection import CuratorPersona, message_seed, select_persona
 from curator_bot.database.models import User, ConversationMessage
 from curator_bot.funnels.conversational_funnel import get_conversational_funnel, ConversationalFunnel
 
@@ -29,15 +30,14 @@ class CuratorChatEngine:
         """
         self.ai_client = ai_client
 
-        # Система персон для адаптации стиля
-        self.persona_manager = PersonaManager()
+        # Система персон для адаптации стиля (выбор — чистая функция, без общего состояния)
         self.use_persona_system = True  # ВКЛЮЧЕНО - адаптация стиля под настроение клиента
 
         # Диалоговая воронка для естественного ведения разговора
         self.conversational_funnel = get_conversational_funnel()
         self.use_conversational_mode = True  # Включить диалоговый режим
 
-        logger.info("Curator chat engine initialized with PersonaManager and ConversationalFunnel")
+        logger.info("Curator chat engine initialized with persona selection and ConversationalFunnel")
 
     async def generate_response(
         self,
@@ -46,7 +46,8 @@ class CuratorChatEngine:
         conversation_history: List[ConversationMessage],
         knowledge_fragments: Optional[List[str]] = None,
         max_history: int = 10,
-        use_persona: bool = True
+        use_persona: bool = True,
+        features: Optional[MessageFeatures] = None
     ) -> str:
         """
         Генерирует ответ куратора
@@ -58,11 +59,15 @@ class CuratorChatEngine:
             knowledge_fragments: Релевантные фрагменты из базы знаний
             max_history: Максимальное количество сообщений из истории
             use_persona: Использовать систему персон для адаптации стиля
+            features: Признаки сообщения (если уже посчитаны в хендлере)
 
         Returns:
             str: Ответ куратора
         """
         try:
+            if features is None:
+                features = classify_message(user_message)
+
             # Получаем системный промпт
             system_prompt = get_curator_system_prompt(
                 user_name=user.first_name or "Партнер",
@@ -76,9 +81,12 @@ class CuratorChatEngine:
 
             # Добавляем инструкции диалоговой воронки
             if self.use_conversational_mode:
+                # Контекст воронки загружается лениво (после рестарта — из хранилища)
+                await self.conversational_funnel.load_context(user.telegram_id)
                 funnel_instructions = self.conversational_funnel.get_ai_instructions(
                     user_id=user.telegram_id,
-                    message=user_message
+                    message=user_message,
+                    features=features
                 )
                 system_prompt = system_prompt + "\n\n" + funnel_instructions
                 logger.info(f"Added conversational funnel instructions for user {user.telegram_id}")
@@ -86,18 +94,18 @@ class CuratorChatEngine:
             # Добавляем контекст персоны если включена система
             if use_persona and self.use_persona_system:
                 # Анализируем настроение сообщения пользователя и адаптируем персону
-                persona_context = self._get_adaptive_persona(user_message)
+                persona_context = self._get_adaptive_persona(user_message, features)
 
                 if persona_context:
-                    # Добавляем информацию о персоне в промпт
-                    persona_enhancement = self.persona_manager.get_prompt_enhancement(persona_context)
-                    system_prompt = system_prompt + "\n\n" + persona_enhancement
+                    # Добавляем информацию о персоне в промпт (строка готова заранее)
+                    system_prompt = system_prompt + "\n\n" + persona_context.prompt_enhancement
 
                     # Используем температуру персоны
                     temperature = persona_context.temperature
 
                     logger.info(
-                        f"Using persona {persona_context.persona_name} for user {user.telegram_id}"
+                        f"Using persona {persona_context.persona_name} "
+                        f"({persona_context.mood_category}/{persona_context.intensity}) for user {user.telegram_id}"
                     )
 
             # Формируем контекст из истории диалога
@@ -169,57 +177,31 @@ class CuratorChatEngine:
 
         return response.strip()
 
-    def _get_adaptive_persona(self, user_message: str):
+    def _get_adaptive_persona(
+        self,
+        user_message: str,
+        features: Optional[MessageFeatures] = None
+    ) -> CuratorPersona:
         """
         Выбирает персону на основе контекста сообщения пользователя.
 
         Адаптирует стиль ответа под:
         - Эмоциональное состояние пользователя
         - Тип вопроса
-        - Контекст разговора
+
+        Не меняет состояние движка: результат зависит только от сообщения,
+        поэтому параллельные диалоги не влияют друг на друга.
 
         Args:
             user_message: Сообщение пользователя
+            features: Признаки сообщения (см. message_features.PERSONA_MOOD_KEYWORDS)
 
         Returns:
-            PersonaContext или None
+            CuratorPersona (неизменяемая, с готовым дополнением к промпту)
         """
-        message_lower = user_message.lower()
-
-        # Определяем контекст по ключевым словам
-        # Пользователь расстроен/устал -> tired или friend
-        sad_keywords = ["устал", "не получается", "сложно", "трудно", "бросить", "не могу", "тяжело", "плохо"]
-        if any(word in message_lower for word in sad_keywords):
-            self.persona_manager.generate_mood(force_category="sadness", force_intensity="medium")
-            return self.persona_manager.get_persona_context(post_type="personal")
-
-        # Пользователь задаёт вопросы о продуктах -> expert
-        product_keywords = ["продукт", "состав", "как принимать", "дозировка", "витамин", "коллаген", "energy diet"]
-        if any(word in message_lower for word in product_keywords):
-            self.persona_manager.generate_mood(force_category="interest", force_intensity="medium")
-            return self.persona_manager.get_persona_context(post_type="product")
-
-        # Пользователь скептик или сомневается -> expert или rebel
-        skeptic_keywords = ["развод", "пирамида", "не верю", "зачем", "смысл", "почему так дорого", "обман"]
-        if any(word in message_lower for word in skeptic_keywords):
-            self.persona_manager.generate_mood(force_category="anger", force_intensity="light")
-            return self.persona_manager.get_persona_context(post_type="myth_busting")
-
-        # Пользователь радуется/делится успехом -> friend или crazy
-        happy_keywords = ["получилось", "ура", "круто", "супер", "спасибо", "вау", "класс", "результат"]
-        if any(word in message_lower for word in happy_keywords):
-            self.persona_manager.generate_mood(force_category="joy", force_intensity="strong")
-            return self.persona_manager.get_persona_context(post_type="celebration")
-
-        # Пользователь спрашивает о бизнесе -> expert или friend
-        business_keywords = ["заработать", "бизнес", "команда", "партнёр", "квалификация", "бонус", "доход"]
-        if any(word in message_lower for word in business_keywords):
-            self.persona_manager.generate_mood(force_category="trust", force_intensity="medium")
-            return self.persona_manager.get_persona_context(post_type="business")
-
-        # По умолчанию - дружелюбный стиль
-        self.persona_manager.generate_mood(force_category="trust", force_intensity="light")
-        return self.persona_manager.get_persona_context(post_type="tips")
+        if features is None:
+            features = classify_message(user_message)
+        return select_persona(features, seed=message_seed(user_message))
 
     def _prepare_context(
         self,
@@ -256,98 +238,35 @@ class CuratorChatEngine:
 
 Спасибо за понимание!"""
 
-    async def analyze_user_intent(self, user_message: str) -> Dict[str, any]:
+    async def analyze_user_intent(
+        self,
+        user_message: str,
+        features: Optional[MessageFeatures] = None
+    ) -> Dict[str, any]:
         """
         Анализирует намерение пользователя
 
         Args:
             user_message: Сообщение пользователя
+            features: Признаки сообщения (если уже посчитаны в хендлере)
 
         Returns:
             Dict: Информация о намерении (type, category, urgency)
         """
-        # Простая категоризация на основе ключевых слов
-        message_lower = user_message.lower()
+        # Категоризация по ключевым словам (словари в message_features.INTENT_CATEGORY_KEYWORDS)
+        if features is None:
+            features = classify_message(user_message)
 
         intent = {
             "type": "general",
-            "category": "other",
-            "urgency": "normal",
+            "category": features.intent_category,
+            "urgency": features.urgency,
             "keywords": []
         }
 
-        # Определяем категорию вопроса
-        # PRODUCTS - продукты NL International
-        product_keywords = [
-            "продукт", "energy diet", "коктейль", "крем", "витамин",
-            "коллаген", "collagen", "бад", "адаптоген", "slim", "похуден",
-            "косметик", "уход за кож", "сыворотк", "маск", "шампун",
-            "гель", "лосьон", "тоник", "пилинг", "скраб", "капсул",
-            "спрей", "напиток", "батончик", "чай", "кофе",
-            # 3D Slim продукты:
-            "metaboost", "метабуст", "метабуст", "жиросжигат", "l-карнитин", "карнитин",
-            "draineffect", "дрейн", "дрейнэффект", "детокс", "дренаж", "отеки", "лишняя вода",
-            "white tea", "белый чай", "вайт ти", "аппетит", "тяга к сладком", "сладкое",
-            "антицеллюлит", "целлюлит", "гель hot", "гель cold", "хот", "колд",
-            "растяжки", "стрии", "shaping", "шейпинг", "моделирующ", "lifting", "лифтинг",
-            "3d slim", "3д слим", "slimdo"
-        ]
-        if any(word in message_lower for word in product_keywords):
-            intent["category"] = "products"
-            intent["keywords"].append("products")
-
-        # BUSINESS - маркетинг-план, заработок, партнёрство
-        elif any(word in message_lower for word in [
-            "заработ", "дохо", "товарообор", "проце", "бону", "квалифик",
-            "маркетинг", "план вознаг", "карьер", "менеджер", "директор",
-            "реферал", "пригласи", "ссылк", "промокод", "скидк", "регистр"
-        ]):
-            intent["category"] = "business"
-            intent["keywords"].append("marketing_plan")
-
-        # SALES - продажи и работа с возражениями
-        elif any(word in message_lower for word in [
-            "как продать", "клиент", "возражен", "продаж", "сетевой",
-            "пирамид", "развод", "дорого", "не работает", "отказ"
-        ]):
-            intent["category"] = "sales"
-            intent["keywords"].append("sales_scripts")
-
-        # TRAINING - обучение, советы, соцсети
-        elif any(word in message_lower for word in [
-            "обучен", "урок", "курс", "мастер", "совет", "новичок",
-            "начать", "первы шаг", "соцсет", "инстаграм", "telegram",
-            "контент", "пост", "сторис", "reels", "видео"
-        ]):
-            intent["category"] = "training"
-            intent["keywords"].append("training")
-
-        # FAQ - заказы, доставка, оплата
-        elif any(word in message_lower for word in [
-            "заказ", "оформи", "доставк", "оплат", "получи", "посылк",
-            "трек", "адрес", "пункт выдач", "почт", "курьер", "стоимость"
-        ]):
-            intent["category"] = "faq"
-            intent["keywords"].append("faq")
-
-        # COMPANY - о компании NL International
-        elif any(word in message_lower for word in [
-            "о компании", "nl international", "история", "основател",
-            "когда создан", "сколько лет", "головной офис", "страны"
-        ]):
-            intent["category"] = "company"
-            intent["keywords"].append("company")
-
-        # TEAM_BUILDING - команда и структура
-        elif any(word in message_lower for word in [
-            "команд", "партнер", "структур", "лидер", "наставник", "спонсор"
-        ]):
-            intent["category"] = "team_building"
-            intent["keywords"].append("team_building")
-
-        # Определяем срочность
-        if any(word in message_lower for word in ["срочно", "быстро", "важно", "помоги", "проблем"]):
-            intent["urgency"] = "high"
+        tag = INTENT_CATEGORY_TAGS.get(features.intent_category)
+        if tag:
+            intent["keywords"].append(tag)
 
         logger.debug(f"Intent analysis: {intent}")
         return intent
@@ -0,0 +1,248 @@
+"""
+Кэш последних реплик диалога куратора.
+
+Для каждого активного пользователя в памяти хранится кольцевой буфер
+последних N реплик (LRU по пользователям). Буфер пополняется при каждом
+сообщении пользователя и ответе бота (write-through), поэтому в тёплом
+диалоге история не читается из БД вообще. БД — источник только при
+холодном старте (первое сообщение после рестарта или вытеснения).
+
+Опционально второй уровень — Redis (settings.redis_url): список
+curator:history:{user_id} переживает рестарт процесса. Если пакет redis
+не установлен или Redis недоступен, работаем только с памятью и БД.
+
+Пример:
+    history_cache = get_history_cache()
+    history = await history_cache.get_history(session, user.id)
+    history.append(await history_cache.append(user.id, "user", text, timestamp))
+"""
+import json
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from curator_bot.database.conversation_writer import get_conversation_writer
+from curator_bot.database.models import ConversationMessage
+from shared.config.settings import settings
+from shared.utils.lru_cache import LRUCache
+
+REDIS_KEY_PREFIX = "curator:history:"
+
+
+@dataclass(frozen=True)
+class HistoryTurn:
+    """Реплика диалога (те же поля, что читает CuratorChatEngine у ConversationMessage)"""
+    sender: str
+    message_text: str
+    timestamp: datetime
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"sender": self.sender, "text": self.message_text, "ts": self.timestamp.isoformat()},
+            ensure_ascii=False
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> "HistoryTurn":
+        data = json.loads(raw)
+        return cls(sender=data["sender"], message_text=data["text"], timestamp=datetime.fromisoformat(data["ts"]))
+
+
+class ConversationHistoryCache:
+    """user_id → последние реплики (память → Redis → БД)"""
+
+    def __init__(
+        self,
+        max_users: int = 5000,
+        turns: int = 20,
+        ttl: Optional[float] = 6 * 3600,
+        redis_url: Optional[str] = None
+    ):
+        """
+        Args:
+            max_users: Сколько пользователей держать в памяти (LRU)
+            turns: Длина буфера на пользователя
+            ttl: Через сколько секунд без сообщений буфер устаревает
+            redis_url: Redis для второго уровня (None — только память)
+        """
+        self.turns = turns
+        self.ttl = ttl
+        self._memory: LRUCache[Deque[HistoryTurn]] = LRUCache(maxsize=max_users, ttl=ttl)
+        self._redis_url = redis_url
+        self._redis = None
+
+        self.db_loads = 0
+        self.redis_loads = 0
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    async def get_history(self, session: AsyncSession, user_id: int) -> List[HistoryTurn]:
+        """
+        Последние реплики пользователя в хронологическом порядке
+
+        Args:
+            session: Сессия БД (используется только при холодном старте)
+            user_id: ID пользователя (users.id)
+
+        Returns:
+            Копия буфера — её можно дополнять, не трогая кэш
+        """
+        buffer = self._memory.get(user_id)
+        if buffer is None:
+            turns = await self._load_redis(user_id)
+            if turns is None:
+                turns = await self._load_db(session, user_id)
+                await self._store_redis(user_id, turns)
+            buffer = deque(turns, maxlen=self.turns)
+            self._memory.set(user_id, buffer)
+        return list(buffer)
+
+    async def _load_db(self, session: AsyncSession, user_id: int) -> List[HistoryTurn]:
+        """Холодный старт: последние N сообщений из conversation_messages"""
+        # Сообщения пользователя могут ещё ждать пакетной записи
+        writer = get_conversation_writer()
+        if writer.has_pending(user_id):
+            await writer.flush()
+
+        result = await session.execute(
+            select(ConversationMessage.sender, ConversationMessage.message_text, ConversationMessage.timestamp)
+            .where(ConversationMessage.user_id == user_id)
+            .order_by(ConversationMessage.timestamp.desc())
+            .limit(self.turns)
+        )
+        self.db_loads += 1
+        return [HistoryTurn(sender, text, timestamp) for sender, text, timestamp in reversed(result.all())]
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    async def append(self, user_id: int, sender: str, message_text: str, timestamp: datetime) -> HistoryTurn:
+        """
+        Добавляет реплику (после постановки в ConversationWriter)
+
+        Если буфера пользователя нет, он не создаётся: следующее чтение
+        загрузит полную историю из Redis/БД (с предварительным сбросом
+        очереди записи), где реплика уже есть.
+        """
+        turn = HistoryTurn(sender=sender, message_text=message_text, timestamp=timestamp)
+        buffer = self._memory.get(user_id)
+        if buffer is not None:
+            buffer.append(turn)
+            # Повторная запись продлевает TTL активного диалога
+            self._memory.set(user_id, buffer)
+        await self._push_redis(user_id, turn)
+        return turn
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает буфер пользователя в памяти"""
+        self._memory.invalidate(user_id)
+
+    def clear(self):
+        """Сбрасывает все буферы в памяти (перебалансировка шардов)"""
+        self._memory.clear()
+
+    # ------------------------------------------------------------------
+    # Redis
+    # ------------------------------------------------------------------
+
+    def _redis_client(self):
+        """Клиент Redis или None (создаётся при первом обращении)"""
+        if self._redis is None and self._redis_url:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                logger.warning("redis not installed - conversation history cached in memory only")
+                self._redis_url = None
+                return None
+            self._redis = aioredis.from_url(self._redis_url, decode_responses=True)
+        return self._redis
+
+    def _redis_failed(self, action: str, error: Exception):
+        logger.warning(f"[HISTORY] Redis {action} failed: {error}")
+
+    async def _load_redis(self, user_id: int) -> Optional[List[HistoryTurn]]:
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.lrange(f"{REDIS_KEY_PREFIX}{user_id}", 0, -1)
+        except Exception as e:
+            self._redis_failed("read", e)
+            return None
+        if not raw:
+            return None
+        self.redis_loads += 1
+        return [HistoryTurn.from_json(item) for item in raw]
+
+    async def _store_redis(self, user_id: int, turns: Iterable[HistoryTurn]):
+        """Заменяет список пользователя в Redis (после загрузки из БД)"""
+        client = self._redis_client()
+        items = [turn.to_json() for turn in turns]
+        if client is None or not items:
+            return
+        key = f"{REDIS_KEY_PREFIX}{user_id}"
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *items)
+                pipe.ltrim(key, -self.turns, -1)
+                if self.ttl:
+                    pipe.expire(key, int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self._redis_failed("write", e)
+
+    async def _push_redis(self, user_id: int, turn: HistoryTurn):
+        """Дописывает реплику, только если список уже есть (иначе он был бы неполным)"""
+        client = self._redis_client()
+        if client is None:
+            return
+        key = f"{REDIS_KEY_PREFIX}{user_id}"
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.rpushx(key, turn.to_json())
+                pipe.ltrim(key, -self.turns, -1)
+                if self.ttl:
+                    pipe.expire(key, int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self._redis_failed("write", e)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для мониторинга"""
+        return {
+            "users": len(self._memory),
+            "db_loads": self.db_loads,
+            "redis_loads": self.redis_loads,
+            "memory": self._memory.stats.as_dict(),
+        }
+
+
+# Глобальный экземпляр
+_history_cache: Optional[ConversationHistoryCache] = None
+
+
+def get_history_cache() -> ConversationHistoryCache:
+    """Получить глобальный экземпляр ConversationHistoryCache"""
+    global _history_cache
+    if _history_cache is None:
+        _history_cache = ConversationHistoryCache(
+            max_users=settings.history_cache_users,
+            turns=settings.history_cache_turns,
+            ttl=settings.history_cache_ttl,
+            redis_url=settings.redis_url if settings.history_cache_redis else None
+        )
+    return _history_cache
@@ -0,0 +1,296 @@
+"""
+Единый классификатор сообщений куратора.
+
+Все словари ключевых слов (намерение для RAG, адаптивная персона, диалоговая
+воронка, мгновенные ссылки) собраны здесь и скомпилированы в один автомат
+Ахо-Корасик. Сообщение сканируется один раз, результат — MessageFeatures,
+который используют CuratorChatEngine, ConversationalFunnel и referral_links.
+
+Приоритеты совпадают с прежними цепочками if/elif в каждом компоненте.
+"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from shared.utils.aho_corasick import AhoCorasick
+
+
+# ============================================
+# СЛОВАРИ: категория вопроса (RAG) — CuratorChatEngine.analyze_user_intent
+# ============================================
+# Порядок важен: первая совпавшая категория побеждает
+INTENT_CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    # PRODUCTS - продукты NL International
+    "products": [
+        "продукт", "energy diet", "коктейль", "крем", "витамин",
+        "коллаген", "collagen", "бад", "адаптоген", "slim", "похуден",
+        "косметик", "уход за кож", "сыворотк", "маск", "шампун",
+        "гель", "лосьон", "тоник", "пилинг", "скраб", "капсул",
+        "спрей", "напиток", "батончик", "чай", "кофе",
+        # 3D Slim продукты:
+        "metaboost", "метабуст", "жиросжигат", "l-карнитин", "карнитин",
+        "draineffect", "дрейн", "дрейнэффект", "детокс", "дренаж", "отеки", "лишняя вода",
+        "white tea", "белый чай", "вайт ти", "аппетит", "тяга к сладком", "сладкое",
+        "антицеллюлит", "целлюлит", "гель hot", "гель cold", "хот", "колд",
+        "растяжки", "стрии", "shaping", "шейпинг", "моделирующ", "lifting", "лифтинг",
+        "3d slim", "3д слим", "slimdo"
+    ],
+    # BUSINESS - маркетинг-план, заработок, партнёрство
+    "business": [
+        "заработ", "дохо", "товарообор", "проце", "бону", "квалифик",
+        "маркетинг", "план вознаг", "карьер", "менеджер", "директор",
+        "реферал", "пригласи", "ссылк", "промокод", "скидк", "регистр"
+    ],
+    # SALES - продажи и работа с возражениями
+    "sales": [
+        "как продать", "клиент", "возражен", "продаж", "сетевой",
+        "пирамид", "развод", "дорого", "не работает", "отказ"
+    ],
+    # TRAINING - обучение, советы, соцсети
+    "training": [
+        "обучен", "урок", "курс", "мастер", "совет", "новичок",
+        "начать", "первы шаг", "соцсет", "инстаграм", "telegram",
+        "контент", "пост", "сторис", "reels", "видео"
+    ],
+    # FAQ - заказы, доставка, оплата
+    "faq": [
+        "заказ", "оформи", "доставк", "оплат", "получи", "посылк",
+        "трек", "адрес", "пункт выдач", "почт", "курьер", "стоимость"
+    ],
+    # COMPANY - о компании NL International
+    "company": [
+        "о компании", "nl international", "история", "основател",
+        "когда создан", "сколько лет", "головной офис", "страны"
+    ],
+    # TEAM_BUILDING - команда и структура
+    "team_building": [
+        "команд", "партнер", "структур", "лидер", "наставник", "спонсор"
+    ],
+}
+
+# Ключевое слово в intent["keywords"] для каждой категории
+INTENT_CATEGORY_TAGS: Dict[str, str] = {
+    "products": "products",
+    "business": "marketing_plan",
+    "sales": "sales_scripts",
+    "training": "training",
+    "faq": "faq",
+    "company": "company",
+    "team_building": "team_building",
+}
+
+URGENCY_KEYWORDS = ["срочно", "быстро", "важно", "помоги", "проблем"]
+
+# ============================================
+# СЛОВАРИ: адаптивная персона — CuratorChatEngine._get_adaptive_persona
+# ============================================
+PERSONA_MOOD_KEYWORDS: Dict[str, List[str]] = {
+    # Пользователь расстроен/устал -> tired или friend
+    "sad": ["устал", "не получается", "сложно", "трудно", "бросить", "не могу", "тяжело", "плохо"],
+    # Пользователь задаёт вопросы о продуктах -> expert
+    "product": ["продукт", "состав", "как принимать", "дозировка", "витамин", "коллаген", "energy diet"],
+    # Пользователь скептик или сомневается -> expert или rebel
+    "skeptic": ["развод", "пирамида", "не верю", "зачем", "смысл", "почему так дорого", "обман"],
+    # Пользователь радуется/делится успехом -> friend или crazy
+    "happy": ["получилось", "ура", "круто", "супер", "спасибо", "вау", "класс", "результат"],
+    # Пользователь спрашивает о бизнесе -> expert или friend
+    "business": ["заработать", "бизнес", "команда", "партнёр", "квалификация", "бонус", "доход"],
+}
+
+# ============================================
+# СЛОВАРИ: диалоговая воронка — ConversationalFunnel
+# ============================================
+FUNNEL_INTENT_MARKERS: Dict[str, List[str]] = {
+    "skeptic": [
+        "развод", "пирамида", "не верю", "обман", "дорого", "не работает",
+        "млм", "сетевой маркетинг", "зачем", "почему", "бесполезно",
+        "втюхивают", "навязывают", "секта"
+    ],
+    "business": [
+        "заработать", "дополнительный доход", "удалённо", "из дома",
+        "бизнес", "подработка", "пассивный доход", "команда", "сетевой",
+        "партнёр", "сколько можно заработать", "как начать"
+    ],
+    "product": [
+        "устал", "энергия", "похудеть", "здоровье", "витамины", "кожа",
+        "волосы", "сон", "иммунитет", "детокс", "спорт", "фитнес",
+        "болит", "проблема", "хочу", "нужно", "посоветуй", "что лучше"
+    ],
+}
+
+PAIN_MARKERS: Dict[str, List[str]] = {
+    "energy": ["устаю", "нет сил", "энергии", "разбитый", "вялый", "сонный"],
+    "weight": ["похудеть", "лишний вес", "жир", "живот", "фигура", "диета"],
+    "skin": ["кожа", "прыщи", "морщины", "сухая", "проблемная", "возраст"],
+    "immunity": ["болею", "простуда", "иммунитет", "слабый", "витамины"],
+    "sleep": ["сон", "бессонница", "не высыпаюсь", "ночью", "утром тяжело"],
+    "sport": ["спорт", "тренировки", "мышцы", "восстановление", "протеин"],
+    "kids": ["ребёнок", "дети", "детский", "для детей", "малыш"],
+    "money": ["заработок", "деньги", "доход", "финансы", "кредит", "ипотека",
+              "заработать", "удалённо", "подработка", "бизнес", "партнёр", "как начать"]
+}
+
+OBJECTION_MARKERS = [
+    "дорого", "не верю", "не работает", "развод", "пирамида",
+    "нет времени", "подумаю", "не знаю", "сомневаюсь", "не уверен"
+]
+
+OBJECTION_TYPE_MARKERS: Dict[str, List[str]] = {
+    "price": ["дорого", "цена", "стоит"],
+    "trust": ["не верю", "развод", "пирамида", "обман"],
+    "time": ["нет времени", "занят"],
+    "delay": ["подумаю", "потом"],
+}
+
+TRUST_POSITIVE_MARKERS = ["спасибо", "интересно", "расскажи", "хочу"]
+TRUST_NEGATIVE_MARKERS = ["не верю", "развод", "обман"]
+
+# ============================================
+# СЛОВАРИ: мгновенные ссылки — referral_links.get_instant_link_for_query
+# ============================================
+LINK_CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "cocktails": [
+        "похудение", "похудеть", "вес", "slim", "метабуст", "metaboost",
+        "draineffect", "дрейн", "white tea", "3d slim", "коктейль", "energy diet",
+        "ед", "энерджи диет", "сбросить вес", "жиросжигатель"
+    ],
+    "bad": [
+        "энергия", "витамин", "бад", "иммунитет", "здоровье", "адаптоген",
+        "детокс", "detox", "очищение", "усталость"
+    ],
+    "face_care": [
+        "красота", "кожа", "лицо", "уход", "крем", "морщины",
+        "антивозраст", "коллаген", "гиалур"
+    ],
+    "kids": [
+        "ребенок", "детям", "дети", "школа", "иммунитет детский",
+        "ребёнок", "для детей"
+    ],
+    "business": [
+        "заработ", "бизнес", "доход", "партнёр", "деньги",
+        "заработать", "млм", "сетевой маркетинг", "партнер",
+        "квалификация", "структура", "команда"
+    ],
+}
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    """Признаки сообщения, общие для всех компонентов куратора"""
+    text_lower: str
+    groups: FrozenSet[str]
+
+    # CuratorChatEngine.analyze_user_intent
+    intent_category: str          # products, business, sales, training, faq, company, team_building, other
+    urgency: str                  # high, normal
+
+    # CuratorChatEngine._get_adaptive_persona
+    persona_mood: str             # sad, product, skeptic, happy, business, default
+
+    # ConversationalFunnel
+    funnel_intent: str            # skeptic, business, product, curious
+    pains: Tuple[str, ...]
+    is_objection: bool
+    objection_type: Optional[str]  # price, trust, time, delay (только если is_objection)
+    trust_delta: int
+
+    # referral_links.get_instant_link_for_query
+    link_category: str            # cocktails, bad, face_care, kids, business, general
+
+    def has(self, group: str) -> bool:
+        """Совпало ли хотя бы одно слово из группы (например "pain:energy")"""
+        return group in self.groups
+
+
+def _first(groups: FrozenSet[str], prefix: str, order, default):
+    """Первая по приоритету группа с префиксом"""
+    for name in order:
+        if f"{prefix}:{name}" in groups:
+            return name
+    return default
+
+
+class MessageClassifier:
+    """Скомпилированный классификатор: один автомат на все словари"""
+
+    def __init__(self):
+        self.automaton = AhoCorasick()
+
+        vocabularies = [
+            ("intent", INTENT_CATEGORY_KEYWORDS),
+            ("persona", PERSONA_MOOD_KEYWORDS),
+            ("funnel", FUNNEL_INTENT_MARKERS),
+            ("pain", PAIN_MARKERS),
+            ("objection_type", OBJECTION_TYPE_MARKERS),
+            ("link", LINK_CATEGORY_KEYWORDS),
+        ]
+        for prefix, groups in vocabularies:
+            for name, words in groups.items():
+                for word in words:
+                    self.automaton.add(word, f"{prefix}:{name}")
+
+        flat = [
+            ("urgency", URGENCY_KEYWORDS),
+            ("objection", OBJECTION_MARKERS),
+            ("trust:positive", TRUST_POSITIVE_MARKERS),
+            ("trust:negative", TRUST_NEGATIVE_MARKERS),
+        ]
+        for group, words in flat:
+            for word in words:
+                self.automaton.add(word, group)
+
+        self.automaton.build()
+
+    def classify(self, message: str) -> MessageFeatures:
+        """
+        Классифицирует сообщение за один проход
+
+        Args:
+            message: Текст сообщения пользователя
+
+        Returns:
+            MessageFeatures
+        """
+        text_lower = message.lower()
+        groups = frozenset(self.automaton.values_in(text_lower))
+
+        is_objection = "objection" in groups
+        objection_type = None
+        if is_objection:
+            objection_type = _first(groups, "objection_type", OBJECTION_TYPE_MARKERS, None)
+
+        trust_delta = 0
+        if "trust:positive" in groups:
+            trust_delta += 1
+        if "trust:negative" in groups:
+            trust_delta -= 1
+
+        return MessageFeatures(
+            text_lower=text_lower,
+            groups=groups,
+            intent_category=_first(groups, "intent", INTENT_CATEGORY_KEYWORDS, "other"),
+            urgency="high" if "urgency" in groups else "normal",
+            persona_mood=_first(groups, "persona", PERSONA_MOOD_KEYWORDS, "default"),
+            funnel_intent=_first(groups, "funnel", FUNNEL_INTENT_MARKERS, "curious"),
+            pains=tuple(pain for pain in PAIN_MARKERS if f"pain:{pain}" in groups),
+            is_objection=is_objection,
+            objection_type=objection_type,
+            trust_delta=trust_delta,
+            link_category=_first(groups, "link", LINK_CATEGORY_KEYWORDS, "general"),
+        )
+
+
+# Глобальный экземпляр (автомат строится один раз)
+_classifier: Optional[MessageClassifier] = None
+
+
+def get_message_classifier() -> MessageClassifier:
+    """Получить глобальный экземпляр MessageClassifier"""
+    global _classifier
+    if _classifier is None:
+        _classifier = MessageClassifier()
+    return _classifier
+
+
+def classify_message(message: str) -> MessageFeatures:
+    """Классифицирует сообщение глобальным классификатором"""
+    return get_message_classifier().classify(message)
@@ -0,0 +1,110 @@
+"""
+Выбор персоны куратора по признакам сообщения — чистая функция.
+
+CuratorChatEngine держал один PersonaManager на всех пользователей:
+get_persona_context запоминал выбранную персону в менеджере, и при
+параллельной обработке сообщений состояние одного диалога могло попасть
+в промпт и температуру другого. Теперь:
+- правило «настроение сообщения → категория, интенсивность, тип поста» — таблица;
+- CuratorPersona неизменяема и содержит готовое дополнение к промпту;
+  варианты (персона, категория, интенсивность) строятся один раз и кэшируются;
+- select_persona только выбирает готовый объект: без общего состояния,
+  блокировок и сборки строк на горячем пути.
+
+Из нескольких подходящих персон (например, expert или friend для вопросов
+о продуктах) вариант выбирается по seed, а не random: одно и то же
+сообщение всегда получает одну и ту же персону.
+"""
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from shared.persona import PERSONA_CHARACTERISTICS, PersonaContext, PersonaManager
+from shared.persona.mood_config import get_personas_for_post_type
+from curator_bot.ai.message_features import MessageFeatures
+
+# Настроение сообщения (MessageFeatures.persona_mood) → (категория, интенсивность, тип поста)
+MOOD_RULES: Dict[str, Tuple[str, str, str]] = {
+    # Пользователь расстроен/устал
+    "sad": ("sadness", "medium", "personal"),
+    # Пользователь задаёт вопросы о продуктах
+    "product": ("interest", "medium", "product"),
+    # Пользователь скептик или сомневается
+    "skeptic": ("anger", "light", "myth_busting"),
+    # Пользователь радуется/делится успехом
+    "happy": ("joy", "strong", "celebration"),
+    # Пользователь спрашивает о бизнесе
+    "business": ("trust", "medium", "business"),
+    # По умолчанию — дружелюбный стиль
+    "default": ("trust", "light", "tips"),
+}
+
+
+@dataclass(frozen=True)
+class CuratorPersona:
+    """Персона для одного ответа (неизменяемая, общая для всех пользователей)"""
+
+    persona_version: str
+    persona_name: str
+    mood_category: str
+    intensity: str
+    temperature: float
+    prompt_enhancement: str
+
+
+@lru_cache(maxsize=None)
+def get_curator_persona(persona_version: str, mood_category: str, intensity: str) -> CuratorPersona:
+    """
+    Персона с готовым дополнением к промпту (строится один раз на сочетание)
+
+    Дополнение то же, что PersonaManager.get_prompt_enhancement даёт для
+    этой персоны: категория и интенсивность только выбирают персону и в
+    промпт не попадают.
+    """
+    data = PERSONA_CHARACTERISTICS.get(persona_version, PERSONA_CHARACTERISTICS["friend"])
+    context = PersonaContext(
+        persona_version=persona_version,
+        persona_name=data["name"],
+        tone=data["tone"],
+        emoji=data["emoji"],
+        speech_patterns=data["speech_patterns"],
+        temperature=data.get("temperature", 0.7),
+        hook=None,
+        mood=None
+    )
+    return CuratorPersona(
+        persona_version=persona_version,
+        persona_name=context.persona_name,
+        mood_category=mood_category,
+        intensity=intensity,
+        temperature=context.temperature,
+        prompt_enhancement=PersonaManager.get_prompt_enhancement(context)
+    )
+
+
+# Варианты персоны для каждого настроения — готовые объекты
+_VARIANTS: Dict[str, Tuple[CuratorPersona, ...]] = {
+    mood: tuple(
+        get_curator_persona(persona, category, intensity)
+        for persona in get_personas_for_post_type(post_type)
+    )
+    for mood, (category, intensity, post_type) in MOOD_RULES.items()
+}
+
+
+def message_seed(text: str) -> int:
+    """Стабильный seed выбора варианта по тексту сообщения"""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def select_persona(features: MessageFeatures, seed: int = 0) -> CuratorPersona:
+    """
+    Выбирает персону по признакам сообщения
+
+    Args:
+        features: Признаки сообщения (используется persona_mood)
+        seed: Выбор среди подходящих персон (см. message_seed)
+    """
+    variants = _VARIANTS.get(features.persona_mood) or _VARIANTS["default"]
+    return variants[seed % len(variants)]
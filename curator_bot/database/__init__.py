@@ -9,6 +9,7 @@ from .models import (
     UserReminder,
     UserFeedback,
     UserOnboardingProgress,
+    FunnelContextRecord,
 )
 
 __all__ = [
@@ -19,4 +20,5 @@ __all__ = [
     "UserReminder",
     "UserFeedback",
     "UserOnboardingProgress",
+    "FunnelContextRecord",
 ]
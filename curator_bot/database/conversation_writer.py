@@ -0,0 +1,247 @@
+"""
+Отложенная (write-behind) запись диалогов куратора.
+
+Раньше каждый ответ куратора делал несколько отдельных транзакций:
+сообщение пользователя, ответ бота, last_activity, прогресс онбординга.
+Теперь строки копятся в памяти и сбрасываются одной транзакцией:
+
+- сообщения — одним многострочным INSERT ... RETURNING id
+- users.last_activity — одним UPDATE ... FROM (VALUES ...)
+- user_onboarding_progress (активность, сброс напоминаний) — одним UPDATE
+
+Сброс — по таймеру (через flush_interval после первой записи) или когда
+накопилось batch_size сообщений. Для сценариев, где запись нужна сразу
+(пользователь оставил контакт), есть await flush(). Неудачный сброс
+повторяется с растущей паузой, при остановке бота close() сбрасывает
+остаток с повторными попытками (shared/utils/batch_buffer.py).
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import DateTime, Integer, column, insert, update, values
+
+from curator_bot.database.models import ConversationMessage, User, UserOnboardingProgress
+from shared.database.base import AsyncSessionLocal
+from shared.utils.batch_buffer import BatchBuffer
+
+
+@dataclass
+class PendingMessage:
+    """Сообщение, ожидающее записи в conversation_messages"""
+    user_id: int
+    sender: str
+    message_text: str
+    timestamp: datetime
+    ai_model: Optional[str] = None
+    tokens_used: Optional[int] = None
+    # Вызывается с ID строки после коммита (например, для учёта usage LLM)
+    on_saved: Optional[Callable[[int], None]] = field(default=None, repr=False)
+    # ID строки в conversation_messages (после записи)
+    id: Optional[int] = None
+
+    def as_row(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "sender": self.sender,
+            "message_text": self.message_text,
+            "timestamp": self.timestamp,
+            "ai_model": self.ai_model,
+            "tokens_used": self.tokens_used,
+        }
+
+
+# Пакет сброса: сообщения, users.last_activity, активность онбординга
+_Batch = Tuple[List[PendingMessage], Dict[int, datetime], Dict[int, datetime]]
+
+
+class ConversationWriter(BatchBuffer):
+    """Буфер сообщений и отметок активности с пакетным сбросом в БД"""
+
+    log_prefix = "CONVERSATION"
+    item_name = "messages"
+
+    def __init__(
+        self,
+        flush_interval: float = 0.3,
+        batch_size: int = 100,
+        max_pending: int = 20000,
+        close_retries: int = 3
+    ):
+        """
+        Args:
+            flush_interval: Задержка сброса после первой записи (сек)
+            batch_size: Сколько сообщений накопить до немедленного сброса
+            max_pending: Сколько сообщений держать при недоступной БД
+            close_retries: Попыток сброса при остановке бота
+        """
+        super().__init__(
+            flush_interval=flush_interval,
+            batch_size=batch_size,
+            max_pending=max_pending,
+            close_retries=close_retries
+        )
+        self._messages: List[PendingMessage] = []
+        self._user_activity: Dict[int, datetime] = {}
+        self._onboarding_activity: Dict[int, datetime] = {}
+
+    # ------------------------------------------------------------------
+    # Запись в буфер
+    # ------------------------------------------------------------------
+
+    def add_message(
+        self,
+        user_id: int,
+        sender: str,
+        message_text: str,
+        timestamp: Optional[datetime] = None,
+        ai_model: Optional[str] = None,
+        tokens_used: Optional[int] = None,
+        on_saved: Optional[Callable[[int], None]] = None
+    ) -> PendingMessage:
+        """
+        Ставит сообщение в очередь на запись
+
+        Args:
+            user_id: ID пользователя (users.id)
+            sender: 'user' или 'bot'
+            message_text: Текст
+            timestamp: Время сообщения (по умолчанию — сейчас)
+            ai_model: Модель, сгенерировавшая ответ
+            tokens_used: Токены на ответ
+            on_saved: Колбэк с ID строки после коммита
+
+        Returns:
+            PendingMessage (timestamp уже заполнен)
+        """
+        pending = PendingMessage(
+            user_id=user_id,
+            sender=sender,
+            message_text=message_text,
+            timestamp=timestamp or datetime.now(),
+            ai_model=ai_model,
+            tokens_used=tokens_used,
+            on_saved=on_saved
+        )
+        self._messages.append(pending)
+        self._schedule()
+        return pending
+
+    def touch_user(self, user_id: int, at: Optional[datetime] = None, onboarding: bool = True):
+        """
+        Отмечает активность пользователя
+
+        Args:
+            user_id: ID пользователя (users.id)
+            at: Время активности
+            onboarding: Обновить и прогресс онбординга (если он не завершён)
+        """
+        at = at or datetime.now()
+        self._user_activity[user_id] = at
+        if onboarding:
+            self._onboarding_activity[user_id] = at
+        self._schedule()
+
+    def has_pending(self, user_id: int) -> bool:
+        """Есть ли у пользователя несохранённые сообщения"""
+        return any(m.user_id == user_id for m in self._messages)
+
+    @property
+    def pending(self) -> int:
+        """Сколько сообщений ждут записи"""
+        return len(self._messages)
+
+    # ------------------------------------------------------------------
+    # Сброс (цикл, лок, повторы и close() — в BatchBuffer)
+    # ------------------------------------------------------------------
+
+    def _has_pending(self) -> bool:
+        return bool(self._messages or self._user_activity or self._onboarding_activity)
+
+    def _take(self) -> _Batch:
+        batch = (self._messages, self._user_activity, self._onboarding_activity)
+        self._messages, self._user_activity, self._onboarding_activity = [], {}, {}
+        return batch
+
+    def _count(self, batch: _Batch) -> int:
+        return len(batch[0])
+
+    async def _write(self, batch: _Batch) -> int:
+        """Записывает пакет одной транзакцией"""
+        messages, user_activity, onboarding_activity = batch
+
+        async with AsyncSessionLocal() as session:
+            ids: List[int] = []
+            if messages:
+                result = await session.execute(
+                    insert(ConversationMessage).returning(
+                        ConversationMessage.id, sort_by_parameter_order=True
+                    ),
+                    [m.as_row() for m in messages]
+                )
+                ids = list(result.scalars().all())
+
+            if user_activity:
+                activity = self._activity_values(user_activity)
+                await session.execute(
+                    update(User)
+                    .where(User.id == activity.c.id)
+                    .values(last_activity=activity.c.at)
+                    .execution_options(synchronize_session=False)
+                )
+
+            if onboarding_activity:
+                activity = self._activity_values(onboarding_activity)
+                await session.execute(
+                    update(UserOnboardingProgress)
+                    .where(
+                        UserOnboardingProgress.user_id == activity.c.id,
+                        UserOnboardingProgress.is_completed.is_(False)
+                    )
+                    .values(last_activity=activity.c.at, last_reminder_hours=0)
+                    .execution_options(synchronize_session=False)
+                )
+
+            await session.commit()
+
+        for message, message_id in zip(messages, ids):
+            message.id = message_id
+        return len(messages)
+
+    def _after_flush(self, batch: _Batch):
+        """Колбэки on_saved — после коммита и вне лока"""
+        for message in batch[0]:
+            if message.on_saved and message.id is not None:
+                try:
+                    message.on_saved(message.id)
+                except Exception as e:
+                    logger.warning(f"[CONVERSATION] on_saved callback failed: {e}")
+
+    @staticmethod
+    def _activity_values(activity: Dict[int, datetime]):
+        return values(
+            column("id", Integer),
+            column("at", DateTime),
+            name="activity"
+        ).data(list(activity.items()))
+
+    def _merge_back(self, batch: _Batch):
+        """Возвращает несохранённое в буфер (старые сообщения — вперёд, с ограничением)"""
+        messages, user_activity, onboarding_activity = batch
+        self._messages = (messages + self._messages)[-self.max_pending:]
+        for target, source in ((self._user_activity, user_activity), (self._onboarding_activity, onboarding_activity)):
+            for user_id, at in source.items():
+                target[user_id] = max(at, target.get(user_id, at))
+
+
+# Глобальный экземпляр
+_conversation_writer: Optional[ConversationWriter] = None
+
+
+def get_conversation_writer() -> ConversationWriter:
+    """Получить глобальный экземпляр ConversationWriter"""
+    global _conversation_writer
+    if _conversation_writer is None:
+        _conversation_writer = ConversationWriter()
+    return _conversation_writer
@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, BigInteger, Text, Integer, Boolean, ForeignKey, ARRAY
+from sqlalchemy import String, BigInteger, Text, Integer, Boolean, ForeignKey, ARRAY, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from pgvector.sqlalchemy import Vector
@@ -14,6 +14,9 @@ from shared.database.base import Base, TimestampMixin
 class User(Base, TimestampMixin):
     """Модель пользователя (партнера)"""
     __tablename__ = "users"
+    # updated_at возвращается из UPDATE ... RETURNING: объект остаётся
+    # загруженным после коммита и пригоден для кэша пользователей
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
@@ -62,6 +65,10 @@ class User(Base, TimestampMixin):
         uselist=False,
         cascade="all, delete-orphan"
     )
+    onboarding_progress: Mapped[Optional["UserOnboardingProgress"]] = relationship(
+        back_populates="user",
+        uselist=False
+    )
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, telegram_id={self.telegram_id}, name={self.first_name})>"
@@ -186,5 +193,27 @@ class UserOnboardingProgress(Base, TimestampMixin):
     # Завершён ли онбординг
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
 
+    # Relationships
+    user: Mapped["User"] = relationship(back_populates="onboarding_progress")
+
     def __repr__(self) -> str:
         return f"<UserOnboardingProgress(user_id={self.user_id}, day={self.current_day})>"
+
+
+class FunnelContextRecord(Base):
+    """
+    Состояние диалоговой воронки пользователя (этап, боли, счётчики).
+
+    Ключ — telegram_id (воронка работает с ним); пишется пачками
+    из FunnelContextStore, читается при первом сообщении после рестарта.
+    """
+    __tablename__ = "funnel_contexts"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    data: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<FunnelContextRecord(telegram_id={self.telegram_id})>"
@@ -0,0 +1,379 @@
+"""
+Хранилище контекстов диалоговой воронки.
+
+Контексты (этап, боли, счётчики доверия) живут в памяти в LRU с TTL,
+поэтому память ограничена активными пользователями. Постоянная копия
+хранится в бэкенде — Postgres (таблица funnel_contexts, JSONB) или Redis —
+и переживает деплой, а несколько экземпляров куратора видят одно состояние.
+
+- Загрузка ленивая: контекст читается из бэкенда при первом сообщении
+  пользователя после старта (одновременные загрузки объединяются).
+- Запись отложенная: изменённые контексты помечаются грязными и
+  сбрасываются пачкой (один upsert / один pipeline) раз в flush_interval;
+  несколько сообщений пользователя между сбросами дают одну запись.
+- close() при остановке бота сбрасывает остаток.
+
+Пример:
+    store = FunnelContextStore(ConversationContext.new, ConversationContext.from_dict,
+                               backend=PostgresContextBackend())
+    ctx = await store.load(telegram_id)
+    ctx.messages_count += 1
+    store.mark_dirty(telegram_id, ctx)
+"""
+import asyncio
+import json
+import sys
+from typing import Any, Callable, Dict, Generic, Iterable, Optional, Protocol, Set, TypeVar
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from curator_bot.database.models import FunnelContextRecord
+from shared.database.base import AsyncSessionLocal
+from shared.utils.lru_cache import LRUCache
+from shared.utils.single_flight import SingleFlight
+
+C = TypeVar("C")
+
+_load_flight = SingleFlight("funnel_contexts")
+
+
+# ----------------------------------------------------------------------
+# Бэкенды
+# ----------------------------------------------------------------------
+
+class ContextBackend(Protocol):
+    """Постоянное хранилище сериализованных контекстов"""
+
+    name: str
+
+    async def load(self, user_id: int) -> Optional[Dict[str, Any]]: ...
+
+    async def save_many(self, records: Dict[int, Dict[str, Any]]) -> None: ...
+
+    async def delete_many(self, user_ids: Iterable[int]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class PostgresContextBackend:
+    """Таблица funnel_contexts: telegram_id → data (JSONB)"""
+
+    name = "postgres"
+
+    async def load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(FunnelContextRecord.data).where(FunnelContextRecord.telegram_id == user_id)
+            )
+            return result.scalar_one_or_none()
+
+    async def save_many(self, records: Dict[int, Dict[str, Any]]):
+        stmt = insert(FunnelContextRecord).values([
+            {"telegram_id": user_id, "data": data} for user_id, data in records.items()
+        ])
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["telegram_id"],
+                    set_={"data": stmt.excluded.data, "updated_at": func.now()}
+                )
+            )
+            await session.commit()
+
+    async def delete_many(self, user_ids: Iterable[int]):
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(FunnelContextRecord).where(FunnelContextRecord.telegram_id.in_(list(user_ids)))
+            )
+            await session.commit()
+
+    async def close(self):
+        pass
+
+
+class RedisContextBackend:
+    """Ключи funnel:ctx:{telegram_id} (JSON) с истечением"""
+
+    name = "redis"
+    KEY_PREFIX = "funnel:ctx:"
+
+    def __init__(self, redis_url: str, ttl: Optional[int] = 30 * 24 * 3600):
+        """
+        Args:
+            redis_url: Адрес Redis
+            ttl: Сколько хранить контекст без сообщений (сек)
+        """
+        # redis — необязательная зависимость, нужна только этому бэкенду
+        import redis.asyncio as aioredis
+
+        self.ttl = ttl
+        self._redis = aioredis.from_url(redis_url, decode_responses=True)
+
+    async def load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(f"{self.KEY_PREFIX}{user_id}")
+        return json.loads(raw) if raw else None
+
+    async def save_many(self, records: Dict[int, Dict[str, Any]]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id, data in records.items():
+                pipe.set(f"{self.KEY_PREFIX}{user_id}", json.dumps(data, ensure_ascii=False), ex=self.ttl)
+            await pipe.execute()
+
+    async def delete_many(self, user_ids: Iterable[int]):
+        keys = [f"{self.KEY_PREFIX}{user_id}" for user_id in user_ids]
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+# ----------------------------------------------------------------------
+# Хранилище
+# ----------------------------------------------------------------------
+
+class FunnelContextStore(Generic[C]):
+    """LRU контекстов в памяти + отложенная запись в бэкенд"""
+
+    def __init__(
+        self,
+        factory: Callable[[int], C],
+        decode: Callable[[Dict[str, Any]], C],
+        backend: Optional[ContextBackend] = None,
+        maxsize: int = 10000,
+        ttl: Optional[float] = 24 * 3600,
+        flush_interval: float = 2.0,
+        max_pending: int = 50000
+    ):
+        """
+        Args:
+            factory: Новый контекст по user_id
+            decode: Контекст из словаря бэкенда (to_dict() — обратное преобразование)
+            backend: Постоянное хранилище (None — только память)
+            maxsize: Сколько контекстов держать в памяти
+            ttl: Через сколько секунд без обращений контекст выгружается из памяти
+            flush_interval: Интервал отложенной записи (сек)
+            max_pending: Сколько изменённых контекстов держать при недоступном бэкенде
+        """
+        self._factory = factory
+        self._decode = decode
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._memory: LRUCache[C] = LRUCache(maxsize=maxsize, ttl=ttl)
+        # Изменённые контексты храним ссылками: вытеснение из LRU до сброса их не теряет
+        self._dirty: Dict[int, C] = {}
+        self._deleted: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.backend_loads = 0
+        self.backend_errors = 0
+        self.flushes = 0
+        self.records_written = 0
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def peek(self, user_id: int) -> Optional[C]:
+        """Контекст из памяти (без обращения к бэкенду)"""
+        return self._dirty.get(user_id) or self._memory.get(user_id)
+
+    def get_or_create(self, user_id: int) -> C:
+        """Контекст из памяти или новый (синхронно; до этого стоит вызвать load())"""
+        ctx = self.peek(user_id)
+        if ctx is None:
+            ctx = self._factory(user_id)
+            self._memory.set(user_id, ctx)
+        return ctx
+
+    async def load(self, user_id: int) -> C:
+        """Контекст пользователя: память → бэкенд → новый"""
+        ctx = self.peek(user_id)
+        if ctx is not None:
+            return ctx
+        if self.backend is None:
+            return self.get_or_create(user_id)
+        return await _load_flight.do((id(self), user_id), lambda: self._load_backend(user_id))
+
+    async def _load_backend(self, user_id: int) -> C:
+        data = None
+        if user_id not in self._deleted:
+            try:
+                data = await self.backend.load(user_id)
+                self.backend_loads += 1
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"[FUNNEL] Failed to load context {user_id} from {self.backend.name}: {e}")
+
+        # Пока шла загрузка, контекст мог появиться в памяти
+        ctx = self.peek(user_id)
+        if ctx is None:
+            ctx = self._factory(user_id)
+            if data:
+                try:
+                    ctx = self._decode(data)
+                except Exception as e:
+                    logger.warning(f"[FUNNEL] Broken context {user_id}, starting over: {e}")
+            self._memory.set(user_id, ctx)
+        return ctx
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def mark_dirty(self, user_id: int, ctx: C):
+        """Отмечает изменение контекста (запись в бэкенд — при следующем сбросе)"""
+        self._memory.set(user_id, ctx)
+        if self.backend is None:
+            return
+        self._deleted.discard(user_id)
+        self._dirty[user_id] = ctx
+        self._ensure_started()
+
+    def delete(self, user_id: int):
+        """Удаляет контекст из памяти и (при сбросе) из бэкенда"""
+        self._memory.invalidate(user_id)
+        self._dirty.pop(user_id, None)
+        if self.backend is not None:
+            self._deleted.add(user_id)
+            self._ensure_started()
+
+    def evict(self, predicate: Callable[[int], bool]) -> int:
+        """
+        Выгружает из памяти контексты подходящих пользователей (без удаления из бэкенда).
+
+        Несохранённые контексты остаются до сброса — их перечитает новый владелец
+        только после записи. Возвращает число выгруженных.
+        """
+        return self._memory.discard_where(lambda user_id: predicate(user_id) and user_id not in self._dirty)
+
+    def _ensure_started(self):
+        """Запускает фоновый цикл сброса при первой записи"""
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+            except RuntimeError:
+                # Нет event loop (скрипты/тесты) — сбросим при close()
+                pass
+
+    async def _flush_loop(self):
+        """Периодический сброс изменённых контекстов"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Записывает изменённые контексты одной пачкой
+
+        Returns:
+            int: Количество записанных контекстов
+        """
+        if self.backend is None:
+            return 0
+        async with self._lock:
+            if not (self._dirty or self._deleted):
+                return 0
+            dirty, self._dirty = self._dirty, {}
+            deleted, self._deleted = self._deleted, set()
+
+            try:
+                if dirty:
+                    await self.backend.save_many({user_id: ctx.to_dict() for user_id, ctx in dirty.items()})
+                if deleted:
+                    await self.backend.delete_many(deleted)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"[FUNNEL] Failed to flush {len(dirty)} contexts to {self.backend.name}: {e}")
+                self._merge_back(dirty, deleted)
+                return 0
+
+            self.flushes += 1
+            self.records_written += len(dirty)
+            logger.debug(f"[FUNNEL] Flushed {len(dirty)} contexts, deleted {len(deleted)}")
+            return len(dirty)
+
+    def _merge_back(self, dirty: Dict[int, C], deleted: Set[int]):
+        """Возвращает несохранённое (более новые изменения не перезаписываем)"""
+        for user_id, ctx in dirty.items():
+            if len(self._dirty) >= self.max_pending:
+                break
+            if user_id not in self._deleted:
+                self._dirty.setdefault(user_id, ctx)
+        self._deleted |= {user_id for user_id in deleted if user_id not in self._dirty}
+
+    async def close(self):
+        """Останавливает фоновый цикл, сбрасывает остаток и закрывает бэкенд"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+        if self.backend is not None:
+            await self.backend.close()
+
+    # ------------------------------------------------------------------
+    # Метрики
+    # ------------------------------------------------------------------
+
+    def approx_memory_bytes(self, sample: int = 200) -> int:
+        """Оценка памяти под контексты (по выборке записей)"""
+        count = len(self._memory)
+        if not count:
+            return 0
+        contexts = [item[0] for _, item in zip(range(sample), self._memory._data.values())]
+        average = sum(_deep_sizeof(ctx) for ctx in contexts) / len(contexts)
+        return int(average * count)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для мониторинга"""
+        return {
+            "backend": self.backend.name if self.backend else "memory",
+            "contexts": len(self._memory),
+            "approx_memory_kb": round(self.approx_memory_bytes() / 1024, 1),
+            "dirty": len(self._dirty),
+            "backend_loads": self.backend_loads,
+            "backend_errors": self.backend_errors,
+            "flushes": self.flushes,
+            "records_written": self.records_written,
+            "cache": self._memory.stats.as_dict(),
+        }
+
+
+def _deep_sizeof(obj: Any) -> int:
+    """Размер объекта со слотами, списками и строками внутри"""
+    size = sys.getsizeof(obj)
+    for slot in getattr(type(obj), "__slots__", ()):
+        value = getattr(obj, slot, None)
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+def create_backend(kind: str, redis_url: Optional[str] = None) -> Optional[ContextBackend]:
+    """
+    Бэкенд по настройке FUNNEL_CONTEXT_BACKEND
+
+    Args:
+        kind: memory, postgres или redis
+        redis_url: Адрес Redis (для redis)
+    """
+    kind = (kind or "memory").lower()
+    if kind == "postgres":
+        return PostgresContextBackend()
+    if kind == "redis":
+        try:
+            return RedisContextBackend(redis_url)
+        except ImportError:
+            logger.warning("redis not installed - funnel contexts kept in memory only")
+            return None
+    return None
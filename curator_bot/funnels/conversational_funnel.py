@@ -7,7 +7,7 @@
 
 ВАЖНО: При SOLUTION и CLOSING этапах — автоматически вставляет реферальные ссылки!
 """
-from typing import Optional, Dict, Any, List
+from typing import Callable, Optional, Dict, Any, List
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
@@ -21,6 +21,14 @@ from curator_bot.funnels.referral_links import (
     get_link_for_pain,
     PRODUCT_RECOMMENDATIONS,
 )
+from curator_bot.ai.message_features import (
+    MessageFeatures,
+    classify_message,
+    FUNNEL_INTENT_MARKERS,
+    PAIN_MARKERS as FUNNEL_PAIN_MARKERS,
+)
+from curator_bot.funnels.context_store import FunnelContextStore, create_backend
+from shared.config.settings import settings
 
 
 class ConversationStage(Enum):
@@ -45,9 +53,9 @@ class UserIntent(Enum):
     UNKNOWN = "unknown"       # Не определено
 
 
-@dataclass
+@dataclass(slots=True)
 class ConversationContext:
-    """Контекст диалога с пользователем"""
+    """Контекст диалога с пользователем (слоты — компактно при тысячах пользователей)"""
     user_id: int
     stage: ConversationStage = ConversationStage.GREETING
     intent: UserIntent = UserIntent.UNKNOWN
@@ -74,6 +82,57 @@ class ConversationContext:
     last_message_at: Optional[datetime] = None
     conversation_started_at: Optional[datetime] = None
 
+    @classmethod
+    def new(cls, user_id: int) -> "ConversationContext":
+        """Контекст нового диалога"""
+        return cls(user_id=user_id, conversation_started_at=datetime.now())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-совместимый словарь для хранилища контекстов"""
+        return {
+            "user_id": self.user_id,
+            "stage": self.stage.value,
+            "intent": self.intent.value,
+            "pains": list(self.pains),
+            "needs": list(self.needs),
+            "objections": list(self.objections),
+            "engagement_score": self.engagement_score,
+            "trust_score": self.trust_score,
+            "objection_count": self.objection_count,
+            "messages_count": self.messages_count,
+            "suggested_products": list(self.suggested_products),
+            "suggested_business": self.suggested_business,
+            "link_provided": self.link_provided,
+            "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
+            "conversation_started_at": (
+                self.conversation_started_at.isoformat() if self.conversation_started_at else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationContext":
+        """Обратное преобразование to_dict() (неизвестные ключи игнорируются)"""
+        def parse_dt(value: Optional[str]) -> Optional[datetime]:
+            return datetime.fromisoformat(value) if value else None
+
+        return cls(
+            user_id=data["user_id"],
+            stage=ConversationStage(data.get("stage", ConversationStage.GREETING.value)),
+            intent=UserIntent(data.get("intent", UserIntent.UNKNOWN.value)),
+            pains=list(data.get("pains") or []),
+            needs=list(data.get("needs") or []),
+            objections=list(data.get("objections") or []),
+            engagement_score=data.get("engagement_score", 0),
+            trust_score=data.get("trust_score", 0),
+            objection_count=data.get("objection_count", 0),
+            messages_count=data.get("messages_count", 0),
+            suggested_products=list(data.get("suggested_products") or []),
+            suggested_business=data.get("suggested_business", False),
+            link_provided=data.get("link_provided", False),
+            last_message_at=parse_dt(data.get("last_message_at")),
+            conversation_started_at=parse_dt(data.get("conversation_started_at")),
+        )
+
 
 class ConversationalFunnel:
     """
@@ -93,35 +152,11 @@ class ConversationalFunnel:
     TRUST_THRESHOLD = 2
 
     # Маркеры для определения intent
-    PRODUCT_MARKERS = [
-        "устал", "энергия", "похудеть", "здоровье", "витамины", "кожа",
-        "волосы", "сон", "иммунитет", "детокс", "спорт", "фитнес",
-        "болит", "проблема", "хочу", "нужно", "посоветуй", "что лучше"
-    ]
-
-    BUSINESS_MARKERS = [
-        "заработать", "дополнительный доход", "удалённо", "из дома",
-        "бизнес", "подработка", "пассивный доход", "команда", "сетевой",
-        "партнёр", "сколько можно заработать", "как начать"
-    ]
-
-    SKEPTIC_MARKERS = [
-        "развод", "пирамида", "не верю", "обман", "дорого", "не работает",
-        "млм", "сетевой маркетинг", "зачем", "почему", "бесполезно",
-        "втюхивают", "навязывают", "секта"
-    ]
-
-    PAIN_MARKERS = {
-        "energy": ["устаю", "нет сил", "энергии", "разбитый", "вялый", "сонный"],
-        "weight": ["похудеть", "лишний вес", "жир", "живот", "фигура", "диета"],
-        "skin": ["кожа", "прыщи", "морщины", "сухая", "проблемная", "возраст"],
-        "immunity": ["болею", "простуда", "иммунитет", "слабый", "витамины"],
-        "sleep": ["сон", "бессонница", "не высыпаюсь", "ночью", "утром тяжело"],
-        "sport": ["спорт", "тренировки", "мышцы", "восстановление", "протеин"],
-        "kids": ["ребёнок", "дети", "детский", "для детей", "малыш"],
-        "money": ["заработок", "деньги", "доход", "финансы", "кредит", "ипотека",
-                  "заработать", "удалённо", "подработка", "бизнес", "партнёр", "как начать"]
-    }
+    # (словари в curator_bot.ai.message_features — все сканируются одним проходом)
+    PRODUCT_MARKERS = FUNNEL_INTENT_MARKERS["product"]
+    BUSINESS_MARKERS = FUNNEL_INTENT_MARKERS["business"]
+    SKEPTIC_MARKERS = FUNNEL_INTENT_MARKERS["skeptic"]
+    PAIN_MARKERS = FUNNEL_PAIN_MARKERS
 
     # Паттерны вопросов для углубления
     DEEPENING_QUESTIONS = {
@@ -151,25 +186,54 @@ class ConversationalFunnel:
         "business": "Слушай, я понимаю. Сам искал удалённую работу. Нашёл систему где платят за результат, не за время. Расскажу?"
     }
 
-    def __init__(self):
-        """Инициализация"""
-        # Хранилище контекстов (в продакшене — Redis/DB)
-        self._contexts: Dict[int, ConversationContext] = {}
-        logger.info("ConversationalFunnel initialized")
+    def __init__(self, store: Optional[FunnelContextStore] = None):
+        """
+        Инициализация
 
-    def get_context(self, user_id: int) -> ConversationContext:
-        """Получает или создаёт контекст для пользователя"""
-        if user_id not in self._contexts:
-            self._contexts[user_id] = ConversationContext(
-                user_id=user_id,
-                conversation_started_at=datetime.now()
+        Args:
+            store: Хранилище контекстов (по умолчанию — из настроек FUNNEL_CONTEXT_*)
+        """
+        if store is None:
+            store = FunnelContextStore(
+                ConversationContext.new,
+                ConversationContext.from_dict,
+                backend=create_backend(settings.funnel_context_backend, settings.redis_url),
+                maxsize=settings.funnel_context_cache_size,
+                ttl=settings.funnel_context_ttl,
+                flush_interval=settings.funnel_context_flush_interval
             )
-        return self._contexts[user_id]
+        self._store = store
+        logger.info(f"ConversationalFunnel initialized (contexts: {store.get_stats()['backend']})")
 
-    def analyze_message(self, user_id: int, message: str) -> Dict[str, Any]:
+    def get_context(self, user_id: int) -> ConversationContext:
+        """Получает или создаёт контекст для пользователя (из памяти; см. load_context)"""
+        return self._store.get_or_create(user_id)
+
+    async def load_context(self, user_id: int) -> ConversationContext:
+        """Загружает контекст из хранилища (вызывается до анализа сообщения)"""
+        return await self._store.load(user_id)
+
+    def _get_context(self, user_id: int) -> Optional[ConversationContext]:
+        """Контекст, если он уже загружен"""
+        return self._store.peek(user_id)
+
+    def _get_or_create_context(self, user_id: int) -> ConversationContext:
+        return self.get_context(user_id)
+
+    def analyze_message(
+        self,
+        user_id: int,
+        message: str,
+        features: Optional[MessageFeatures] = None
+    ) -> Dict[str, Any]:
         """
         Анализирует сообщение и обновляет контекст.
 
+        Args:
+            user_id: Telegram ID пользователя
+            message: Текст сообщения
+            features: Признаки сообщения (если уже посчитаны)
+
         Returns:
             Dict с рекомендациями для AI:
             - stage: текущий этап
@@ -180,7 +244,8 @@ class ConversationalFunnel:
             - solution_hint: подводка к решению
         """
         ctx = self.get_context(user_id)
-        message_lower = message.lower()
+        if features is None:
+            features = classify_message(message)
 
         # Обновляем счётчики
         ctx.messages_count += 1
@@ -188,24 +253,24 @@ class ConversationalFunnel:
 
         # Определяем intent если ещё не определён
         if ctx.intent == UserIntent.UNKNOWN:
-            ctx.intent = self._detect_intent(message_lower)
+            ctx.intent = self._detect_intent(features)
 
         # Выявляем боли
-        detected_pains = self._detect_pains(message_lower)
+        detected_pains = self._detect_pains(features)
         for pain in detected_pains:
             if pain not in ctx.pains:
                 ctx.pains.append(pain)
 
         # Определяем возражения
-        if self._is_objection(message_lower):
+        if self._is_objection(features):
             ctx.objection_count += 1
-            objection = self._extract_objection(message_lower)
+            objection = self._extract_objection(features)
             if objection:
                 ctx.objections.append(objection)
 
         # Обновляем engagement/trust
         ctx.engagement_score += self._calc_engagement_delta(message)
-        ctx.trust_score += self._calc_trust_delta(message)
+        ctx.trust_score += self._calc_trust_delta(features)
 
         # Определяем этап воронки
         ctx.stage = self._determine_stage(ctx)
@@ -243,46 +308,26 @@ class ConversationalFunnel:
             # Нужно отработать возражение
             result["objection_response"] = self._get_objection_script(ctx.objections[-1])
 
+        self._store.mark_dirty(user_id, ctx)
+
         logger.info(f"Conversation analysis for {user_id}: stage={ctx.stage.value}, intent={ctx.intent.value}")
         return result
 
-    def _detect_intent(self, message: str) -> UserIntent:
-        """Определяет намерение по сообщению"""
-        if any(word in message for word in self.SKEPTIC_MARKERS):
-            return UserIntent.SKEPTIC
-        if any(word in message for word in self.BUSINESS_MARKERS):
-            return UserIntent.BUSINESS
-        if any(word in message for word in self.PRODUCT_MARKERS):
-            return UserIntent.PRODUCT
-        return UserIntent.CURIOUS
-
-    def _detect_pains(self, message: str) -> List[str]:
+    def _detect_intent(self, features: MessageFeatures) -> UserIntent:
+        """Определяет намерение по сообщению (скептик > бизнес > продукт)"""
+        return UserIntent(features.funnel_intent)
+
+    def _detect_pains(self, features: MessageFeatures) -> List[str]:
         """Определяет боли из сообщения"""
-        pains = []
-        for pain_type, markers in self.PAIN_MARKERS.items():
-            if any(word in message for word in markers):
-                pains.append(pain_type)
-        return pains
+        return list(features.pains)
 
-    def _is_objection(self, message: str) -> bool:
+    def _is_objection(self, features: MessageFeatures) -> bool:
         """Проверяет, содержит ли сообщение возражение"""
-        objection_markers = [
-            "дорого", "не верю", "не работает", "развод", "пирамида",
-            "нет времени", "подумаю", "не знаю", "сомневаюсь", "не уверен"
-        ]
-        return any(word in message for word in objection_markers)
-
-    def _extract_objection(self, message: str) -> Optional[str]:
-        """Извлекает тип возражения"""
-        if any(word in message for word in ["дорого", "цена", "стоит"]):
-            return "price"
-        if any(word in message for word in ["не верю", "развод", "пирамида", "обман"]):
-            return "trust"
-        if any(word in message for word in ["нет времени", "занят"]):
-            return "time"
-        if any(word in message for word in ["подумаю", "потом"]):
-            return "delay"
-        return None
+        return features.is_objection
+
+    def _extract_objection(self, features: MessageFeatures) -> Optional[str]:
+        """Извлекает тип возражения (price, trust, time, delay)"""
+        return features.objection_type
 
     def _calc_engagement_delta(self, message: str) -> int:
         """Считает изменение вовлечённости"""
@@ -300,18 +345,9 @@ class ConversationalFunnel:
             score += 1
         return score
 
-    def _calc_trust_delta(self, message: str) -> int:
-        """Считает изменение доверия"""
-        score = 0
-        message_lower = message.lower()
-
-        # Позитивные маркеры
-        if any(word in message_lower for word in ["спасибо", "интересно", "расскажи", "хочу"]):
-            score += 1
-        # Негативные маркеры
-        if any(word in message_lower for word in ["не верю", "развод", "обман"]):
-            score -= 1
-        return score
+    def _calc_trust_delta(self, features: MessageFeatures) -> int:
+        """Считает изменение доверия (+1 позитивные маркеры, -1 негативные)"""
+        return features.trust_delta
 
     def _determine_stage(self, ctx: ConversationContext) -> ConversationStage:
         """Определяет текущий этап воронки"""
@@ -374,6 +410,7 @@ class ConversationalFunnel:
         """
         ctx = self._get_or_create_context(user_id)
         ctx.link_provided = True
+        self._store.mark_dirty(user_id, ctx)
 
     def has_link_been_provided(self, user_id: int) -> bool:
         """
@@ -410,13 +447,18 @@ class ConversationalFunnel:
         }
         return scripts.get(objection_type, "")
 
-    def get_ai_instructions(self, user_id: int, message: str) -> str:
+    def get_ai_instructions(
+        self,
+        user_id: int,
+        message: str,
+        features: Optional[MessageFeatures] = None
+    ) -> str:
         """
         Генерирует инструкции для AI на основе контекста.
 
         Вставляется в промпт перед генерацией ответа.
         """
-        analysis = self.analyze_message(user_id, message)
+        analysis = self.analyze_message(user_id, message, features)
         ctx = self.get_context(user_id)
 
         instructions = f"""
@@ -579,9 +621,26 @@ class ConversationalFunnel:
 
     def reset_context(self, user_id: int):
         """Сбрасывает контекст пользователя"""
-        if user_id in self._contexts:
-            del self._contexts[user_id]
-            logger.info(f"Reset conversation context for user {user_id}")
+        self._store.delete(user_id)
+        logger.info(f"Reset conversation context for user {user_id}")
+
+    async def release_contexts(self, keep: Callable[[int], bool]) -> int:
+        """
+        Сохраняет изменения и выгружает из памяти контексты чужих пользователей
+
+        Вызывается при перебалансировке шардов: пользователи, для которых
+        keep(telegram_id) ложно, переехали на другой воркер.
+        """
+        await self._store.flush()
+        return self._store.evict(lambda user_id: not keep(user_id))
+
+    async def close(self):
+        """Сбрасывает изменённые контексты (при остановке бота)"""
+        await self._store.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Память, попадания и записи хранилища контекстов"""
+        return self._store.get_stats()
 
 
 # Глобальный экземпляр воронки
@@ -5,7 +5,10 @@
 - Регистрация, магазин, категории продуктов, акции
 """
 
+from typing import Optional
+
 from shared.config.settings import settings
+from curator_bot.ai.message_features import MessageFeatures, classify_message
 
 
 # =============================================================================
@@ -188,18 +191,21 @@ def get_client_registration_link() -> str:
     return CLIENT_REGISTRATION_LINK
 
 
-def get_instant_link_for_query(query: str) -> tuple[str, str]:
+def get_instant_link_for_query(query: str, features: Optional[MessageFeatures] = None) -> tuple[str, str]:
     """
     Определяет подходящую ссылку для немедленной выдачи на основе запроса.
 
     Используется для быстрой выдачи ссылок при первом упоминании продуктов/бизнеса.
+    Ключевые слова — message_features.LINK_CATEGORY_KEYWORDS (продуктовые
+    категории проверяются раньше бизнеса).
 
     Args:
         query: Текст вопроса пользователя
+        features: Признаки сообщения (если уже посчитаны)
 
     Returns:
         tuple: (category_name, link_url)
-        Если не найдено — возвращает ("general", NLSTORE_MAIN_LINK)
+        Если не найдено — возвращает ("general", SHOP_MAIN_LINK)
 
     Examples:
         >>> get_instant_link_for_query("Что такое MetaBoost?")
@@ -208,45 +214,18 @@ def get_instant_link_for_query(query: str) -> tuple[str, str]:
         >>> get_instant_link_for_query("Как заработать в NL?")
         ('business', 'https://nlstar.com/ref/eiPusg/')
     """
-    query_lower = query.lower()
-
-    # Продуктовые ключевые слова
-    product_keywords = {
-        "cocktails": [
-            "похудение", "похудеть", "вес", "slim", "метабуст", "metaboost",
-            "draineffect", "дрейн", "white tea", "3d slim", "коктейль", "energy diet",
-            "ед", "энерджи диет", "сбросить вес", "жиросжигатель"
-        ],
-        "bad": [
-            "энергия", "витамин", "бад", "иммунитет", "здоровье", "адаптоген",
-            "детокс", "detox", "очищение", "усталость"
-        ],
-        "face_care": [
-            "красота", "кожа", "лицо", "уход", "крем", "морщины",
-            "антивозраст", "коллаген", "гиалур"
-        ],
-        "kids": [
-            "ребенок", "детям", "дети", "школа", "иммунитет детский",
-            "ребёнок", "для детей"
-        ],
-    }
-
-    # Ищем совпадения с продуктовыми категориями
-    for category, keywords in product_keywords.items():
-        if any(keyword in query_lower for keyword in keywords):
-            return (category, CATEGORY_LINKS[category])
-
-    # Бизнес ключевые слова
-    business_keywords = [
-        "заработ", "бизнес", "доход", "партнёр", "деньги",
-        "заработать", "млм", "сетевой маркетинг", "партнер",
-        "квалификация", "структура", "команда", "доход"
-    ]
-    if any(keyword in query_lower for keyword in business_keywords):
+    if features is None:
+        features = classify_message(query)
+
+    category = features.link_category
+    if category in CATEGORY_LINKS:
+        return (category, CATEGORY_LINKS[category])
+
+    if category == "business":
         return ("business", PARTNER_REGISTRATION_LINK)
 
     # По умолчанию — общий магазин
-    return ("general", NLSTORE_MAIN_LINK)
+    return ("general", SHOP_MAIN_LINK)
 
 
 def get_business_link() -> str:
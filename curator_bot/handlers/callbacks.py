@@ -2,12 +2,12 @@
 Обработчики callback-кнопок для воронки продаж
 """
 from datetime import datetime
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.database.base import AsyncSessionLocal
 from curator_bot.database.models import User
 from curator_bot.funnels.keyboards import (
     get_pain_keyboard,
@@ -93,38 +93,37 @@ router = Router(name="callbacks")
 # ============================================
 
 async def update_user_funnel(
-    telegram_id: int,
+    session: AsyncSession,
+    user: Optional[User],
     user_intent: str = None,
     pain_point: str = None,
     income_goal: str = None,
     funnel_step: int = None,
     lead_status: str = None,
-) -> User:
-    """Обновляет данные воронки пользователя"""
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = result.scalar_one_or_none()
+) -> Optional[User]:
+    """
+    Обновляет данные воронки пользователя
 
-        if user:
-            if user_intent is not None:
-                user.user_intent = user_intent
-            if pain_point is not None:
-                user.pain_point = pain_point
-            if income_goal is not None:
-                user.income_goal = income_goal
-            if funnel_step is not None:
-                user.funnel_step = funnel_step
-            if lead_status is not None:
-                user.lead_status = lead_status
+    user и session — из DbSessionMiddleware: пользователь уже загружен,
+    повторного SELECT нет, только UPDATE при коммите.
+    """
+    if user:
+        if user_intent is not None:
+            user.user_intent = user_intent
+        if pain_point is not None:
+            user.pain_point = pain_point
+        if income_goal is not None:
+            user.income_goal = income_goal
+        if funnel_step is not None:
+            user.funnel_step = funnel_step
+        if lead_status is not None:
+            user.lead_status = lead_status
 
-            user.last_activity = datetime.utcnow()
+        user.last_activity = datetime.utcnow()
 
-            await session.commit()
-            await session.refresh(user)
+        await session.commit()
 
-        return user
+    return user
 
 
 async def log_funnel_event(
@@ -142,12 +141,13 @@ async def log_funnel_event(
 # ============================================
 
 @router.callback_query(F.data == "intent_client")
-async def handle_client_intent(callback: CallbackQuery):
+async def handle_client_intent(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Пользователь выбрал 'Хочу улучшить здоровье'"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         user_intent="client",
         funnel_step=1,
         lead_status="qualified"
@@ -166,12 +166,13 @@ async def handle_client_intent(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "intent_business")
-async def handle_business_intent(callback: CallbackQuery):
+async def handle_business_intent(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Пользователь выбрал 'Интересует заработок'"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         user_intent="business",
         funnel_step=1,
         lead_status="qualified"
@@ -190,12 +191,13 @@ async def handle_business_intent(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "intent_curious")
-async def handle_curious_intent(callback: CallbackQuery):
+async def handle_curious_intent(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Пользователь выбрал 'Просто хочу узнать больше'"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         user_intent="curious",
         funnel_step=1,
         lead_status="cold"
@@ -247,12 +249,13 @@ async def handle_back_to_pain(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "pain_weight")
-async def handle_pain_weight(callback: CallbackQuery):
+async def handle_pain_weight(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Похудение"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="weight",
         funnel_step=2
     )
@@ -270,12 +273,13 @@ async def handle_pain_weight(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "pain_energy")
-async def handle_pain_energy(callback: CallbackQuery):
+async def handle_pain_energy(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Энергия"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="energy",
         funnel_step=2
     )
@@ -287,12 +291,13 @@ async def handle_pain_energy(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "pain_immunity")
-async def handle_pain_immunity(callback: CallbackQuery):
+async def handle_pain_immunity(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Иммунитет"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="immunity",
         funnel_step=2
     )
@@ -304,12 +309,13 @@ async def handle_pain_immunity(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "pain_beauty")
-async def handle_pain_beauty(callback: CallbackQuery):
+async def handle_pain_beauty(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Красота"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="beauty",
         funnel_step=2
     )
@@ -321,12 +327,13 @@ async def handle_pain_beauty(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "pain_kids")
-async def handle_pain_kids(callback: CallbackQuery):
+async def handle_pain_kids(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Дети"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="kids",
         funnel_step=2
     )
@@ -338,12 +345,13 @@ async def handle_pain_kids(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "pain_sport")
-async def handle_pain_sport(callback: CallbackQuery):
+async def handle_pain_sport(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана боль: Спорт"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         pain_point="sport",
         funnel_step=2
     )
@@ -359,17 +367,10 @@ async def handle_pain_sport(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "funnel_continue")
-async def handle_funnel_continue(callback: CallbackQuery):
+async def handle_funnel_continue(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Кнопка 'Продолжить' — переход к следующему шагу прогрева"""
     await callback.answer()
 
-    # Получаем данные пользователя
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
     if not user:
         await callback.message.answer("Пожалуйста, начни с /start")
         return
@@ -382,7 +383,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         if current_step == 2:
             # Переход к шагу 3 (описание продукта)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -392,7 +394,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         elif current_step == 3:
             # Переход к шагу 4 (выбор цели по весу)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -403,7 +406,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         if current_step == 2:
             # Переход к шагу 3 (объяснение)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -413,7 +417,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         elif current_step == 3:
             # Переход к шагу 4 (персонализация)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -424,7 +429,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         if current_step == 2:
             # Переход к шагу 3 (объяснение)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -434,7 +440,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
         elif current_step == 3:
             # Переход к шагу 4 (персонализация)
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -444,7 +451,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
     elif pain_point == "beauty":
         if current_step == 2:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -453,7 +461,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
             )
         elif current_step == 3:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -463,7 +472,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
     elif pain_point == "kids":
         if current_step == 2:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -472,7 +482,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
             )
         elif current_step == 3:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -482,7 +493,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
     elif pain_point == "sport":
         if current_step == 2:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=3
             )
             await callback.message.edit_text(
@@ -491,7 +503,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
             )
         elif current_step == 3:
             await update_user_funnel(
-                telegram_id=callback.from_user.id,
+                session,
+                user,
                 funnel_step=4
             )
             await callback.message.edit_text(
@@ -501,7 +514,8 @@ async def handle_funnel_continue(callback: CallbackQuery):
     else:
         # Для других болей — сразу показываем рекомендацию продукта
         await update_user_funnel(
-            telegram_id=callback.from_user.id,
+            session,
+            user,
             funnel_step=4
         )
         product_message = format_product_message(pain_point)
@@ -513,17 +527,10 @@ async def handle_funnel_continue(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "product_select")
-async def handle_product_select(callback: CallbackQuery):
+async def handle_product_select(callback: CallbackQuery, user: Optional[User]):
     """Клиент нажал 'Да, подбери для меня'"""
     await callback.answer()
 
-    # Получаем пользователя
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
     if user and user.pain_point == "weight":
         # Для похудения — спрашиваем цель по весу
         await callback.message.edit_text(
@@ -572,16 +579,10 @@ async def handle_product_select(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "product_price")
-async def handle_product_price(callback: CallbackQuery):
+async def handle_product_price(callback: CallbackQuery, user: Optional[User]):
     """Клиент нажал 'Сколько это стоит?'"""
     await callback.answer()
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
     pain_point = user.pain_point if user else "weight"
     product_message = format_product_message(pain_point)
 
@@ -608,14 +609,15 @@ async def handle_product_questions(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("weight_"))
-async def handle_weight_goal(callback: CallbackQuery):
+async def handle_weight_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора цели по весу"""
     await callback.answer()
 
     weight_goal = callback.data  # weight_5_10, weight_10_20, etc.
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -640,14 +642,15 @@ async def handle_weight_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("energy_"))
-async def handle_energy_goal(callback: CallbackQuery):
+async def handle_energy_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора проблемы с энергией"""
     await callback.answer()
 
     energy_goal = callback.data  # energy_morning, energy_afternoon, etc.
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -672,14 +675,15 @@ async def handle_energy_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("immunity_"))
-async def handle_immunity_goal(callback: CallbackQuery):
+async def handle_immunity_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора проблемы с иммунитетом"""
     await callback.answer()
 
     immunity_goal = callback.data
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -704,14 +708,15 @@ async def handle_immunity_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("beauty_"))
-async def handle_beauty_goal(callback: CallbackQuery):
+async def handle_beauty_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора проблемы с красотой"""
     await callback.answer()
 
     beauty_goal = callback.data
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -736,14 +741,15 @@ async def handle_beauty_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("kids_"))
-async def handle_kids_goal(callback: CallbackQuery):
+async def handle_kids_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора проблемы для детей"""
     await callback.answer()
 
     kids_goal = callback.data
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -768,14 +774,15 @@ async def handle_kids_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data.startswith("sport_"))
-async def handle_sport_goal(callback: CallbackQuery):
+async def handle_sport_goal(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Обработка выбора цели для спортсменов"""
     await callback.answer()
 
     sport_goal = callback.data
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=5,
         lead_status="hot"
     )
@@ -800,12 +807,13 @@ async def handle_sport_goal(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "income_10_30k")
-async def handle_income_10_30k(callback: CallbackQuery):
+async def handle_income_10_30k(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана цель: 10-30к/мес"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         income_goal="10_30k",
         funnel_step=2
     )
@@ -823,12 +831,13 @@ async def handle_income_10_30k(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "income_50_100k")
-async def handle_income_50_100k(callback: CallbackQuery):
+async def handle_income_50_100k(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана цель: 50-100к/мес"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         income_goal="50_100k",
         funnel_step=2
     )
@@ -840,12 +849,13 @@ async def handle_income_50_100k(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "income_200k_plus")
-async def handle_income_200k_plus(callback: CallbackQuery):
+async def handle_income_200k_plus(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана цель: 200к+/мес"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         income_goal="200k_plus",
         funnel_step=2
     )
@@ -857,12 +867,13 @@ async def handle_income_200k_plus(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "income_unsure")
-async def handle_income_unsure(callback: CallbackQuery):
+async def handle_income_unsure(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Выбрана цель: Пока не уверен"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         income_goal="unsure",
         funnel_step=2
     )
@@ -878,12 +889,13 @@ async def handle_income_unsure(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "business_calc")
-async def handle_business_calc(callback: CallbackQuery):
+async def handle_business_calc(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Показать расчёт дохода"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=3
     )
 
@@ -894,12 +906,13 @@ async def handle_business_calc(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "business_next")
-async def handle_business_next(callback: CallbackQuery):
+async def handle_business_next(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Следующий шаг бизнес-прогрева"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         funnel_step=4,
         lead_status="hot"
     )
@@ -926,12 +939,13 @@ async def handle_business_questions(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "contact_phone")
-async def handle_contact_phone(callback: CallbackQuery):
+async def handle_contact_phone(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Запрос телефона"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         lead_status="contact_requested"
     )
 
@@ -939,12 +953,13 @@ async def handle_contact_phone(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "contact_email")
-async def handle_contact_email(callback: CallbackQuery):
+async def handle_contact_email(callback: CallbackQuery, session: AsyncSession, user: Optional[User]):
     """Запрос email"""
     await callback.answer()
 
     await update_user_funnel(
-        telegram_id=callback.from_user.id,
+        session,
+        user,
         lead_status="contact_requested"
     )
 
@@ -964,16 +979,10 @@ async def handle_contact_skip(callback: CallbackQuery):
 # ============================================
 
 @router.callback_query(F.data == "reminder_continue")
-async def handle_reminder_continue(callback: CallbackQuery):
+async def handle_reminder_continue(callback: CallbackQuery, user: Optional[User]):
     """Пользователь хочет продолжить после напоминания"""
     await callback.answer()
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
     if user and user.user_intent == "client":
         # Показываем рекомендацию продукта
         pain_point = user.pain_point or "weight"
@@ -1044,16 +1053,10 @@ async def handle_back_to_income(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "back_to_calc")
-async def handle_back_to_calc(callback: CallbackQuery):
+async def handle_back_to_calc(callback: CallbackQuery, user: Optional[User]):
     """Возврат к расчёту дохода"""
     await callback.answer()
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
     income_goal = user.income_goal if user else "50_100k"
 
     # Выбираем сообщение в зависимости от цели
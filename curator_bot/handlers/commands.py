@@ -2,13 +2,13 @@
 Обработчики команд для AI-Куратора
 """
 from datetime import datetime
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.filters import Command, CommandStart
 from aiogram.types import Message
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.database.base import AsyncSessionLocal
 from shared.config.settings import settings
 from curator_bot.database.models import User
 from curator_bot.ai.prompts import get_welcome_message
@@ -23,57 +23,44 @@ router = Router(name="commands")
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, session: AsyncSession, user: Optional[User]):
     """
     Обработчик команды /start
     Регистрирует нового пользователя и начинает ДИАЛОГОВЫЙ режим (без кнопок)
     """
     try:
-        async with AsyncSessionLocal() as session:
-            # Проверяем, есть ли пользователь в БД
-            result = await session.execute(
-                select(User).where(User.telegram_id == message.from_user.id)
-            )
-            user = result.scalar_one_or_none()
-
-            first_name = message.from_user.first_name or "Друг"
-
-            if not user:
-                # Создаем нового пользователя
-                user = User(
-                    telegram_id=message.from_user.id,
-                    username=message.from_user.username,
-                    first_name=message.from_user.first_name,
-                    last_name=message.from_user.last_name,
-                    user_type="lead",
-                    qualification="consultant",
-                    funnel_started_at=datetime.utcnow(),
-                    lead_status="new"
-                )
-                session.add(user)
-                await session.commit()
-                logger.info(f"New user registered: {message.from_user.id}")
-
-                # Создаём запись онбординга
-                from curator_bot.database.models import UserOnboardingProgress
-
-                onboarding_progress = UserOnboardingProgress(
-                    user_id=user.id,
+        first_name = message.from_user.first_name or "Друг"
+
+        if not user:
+            # Создаем нового пользователя вместе с записью онбординга (один коммит)
+            from curator_bot.database.models import UserOnboardingProgress
+
+            user = User(
+                telegram_id=message.from_user.id,
+                username=message.from_user.username,
+                first_name=message.from_user.first_name,
+                last_name=message.from_user.last_name,
+                user_type="lead",
+                qualification="consultant",
+                funnel_started_at=datetime.utcnow(),
+                lead_status="new",
+                onboarding_progress=UserOnboardingProgress(
                     current_day=1,
                     completed_tasks=[],
                     started_at=datetime.utcnow(),
                     last_activity=datetime.utcnow()
                 )
-                session.add(onboarding_progress)
-                await session.commit()
-                logger.info(f"Onboarding progress created for user {message.from_user.id}")
+            )
+            session.add(user)
+            await session.commit()
+            logger.info(f"New user registered: {message.from_user.id} (onboarding progress created)")
 
-                # Получаем чеклист для дня 1
-                from curator_bot.onboarding.proactive_tasks import OnboardingTasks
-                tasks_message = OnboardingTasks.format_tasks_message(day=1, completed_tasks=[])
+            # Получаем чеклист для дня 1
+            from curator_bot.onboarding.proactive_tasks import OnboardingTasks
+            tasks_message = OnboardingTasks.format_tasks_message(day=1, completed_tasks=[])
 
-                # ДИАЛОГОВЫЙ РЕЖИМ с чеклистом
-                welcome_text = f"""Йо, {first_name}! 👋
+            # ДИАЛОГОВЫЙ РЕЖИМ с чеклистом
+            welcome_text = f"""Йо, {first_name}! 👋
 
 Я Данил — твой гайд по NL.
 
@@ -84,14 +71,14 @@ async def cmd_start(message: Message):
 
 💬 Можешь задавать любые вопросы — я отвечу!"""
 
-                await message.answer(welcome_text)
+            await message.answer(welcome_text)
 
-            else:
-                # Существующий пользователь — диалоговый режим
-                user.last_activity = datetime.utcnow()
-                await session.commit()
+        else:
+            # Существующий пользователь — диалоговый режим
+            user.last_activity = datetime.utcnow()
+            await session.commit()
 
-                welcome_text = f"""Йо, {first_name}! 👋
+            welcome_text = f"""Йо, {first_name}! 👋
 
 Рад что вернулся. Чё новенького?
 
@@ -101,8 +88,8 @@ async def cmd_start(message: Message):
 
 Или просто напиши что на уме 💬"""
 
-                await message.answer(welcome_text)
-                logger.info(f"Existing user returned: {message.from_user.id}")
+            await message.answer(welcome_text)
+            logger.info(f"Existing user returned: {message.from_user.id}")
 
     except Exception as e:
         logger.error(f"Error in /start command: {e}")
@@ -138,48 +125,42 @@ async def cmd_help(message: Message):
 
 
 @router.message(Command("progress"))
-async def cmd_progress(message: Message):
+async def cmd_progress(message: Message, user: Optional[User]):
     """Показывает прогресс пользователя"""
     try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == message.from_user.id)
-            )
-            user = result.scalar_one_or_none()
-
-            if not user:
-                await message.answer("Сначала нажми /start для регистрации")
-                return
-
-            # Словарь квалификаций по системе NL International
-            qual_names = {
-                "consultant": "🌱 Консультант (3%)",
-                "consultant_6": "📈 Консультант 6%",
-                "manager_9": "⭐ Менеджер 9%",
-                "senior_manager": "💼 Старший менеджер (12%)",
-                "manager_15": "📊 Менеджер 15%",
-                "director_21": "🎯 Директор 21%",
-                "M1": "🔥 Middle 1",
-                "M2": "🔥 Middle 2",
-                "M3": "🔥 Middle 3",
-                "B1": "💼 Business Partner 1",
-                "B2": "💼 Business Partner 2",
-                "B3": "💼 Business Partner 3",
-                "TOP": "⭐ TOP",
-                "TOP1": "⭐ TOP 1",
-                "TOP2": "⭐ TOP 2",
-                "TOP3": "⭐ TOP 3",
-                "TOP4": "⭐ TOP 4",
-                "TOP5": "⭐ TOP 5",
-                "AC1": "👑 Ambassador Club 1",
-                "AC2": "👑 Ambassador Club 2",
-                "AC3": "👑 Ambassador Club 3",
-                "AC4": "👑 Ambassador Club 4",
-                "AC5": "👑 Ambassador Club 5",
-                "AC6": "👑 Ambassador Club 6",
-            }
-
-            progress_text = f"""<b>📊 Твой прогресс</b>
+        if not user:
+            await message.answer("Сначала нажми /start для регистрации")
+            return
+
+        # Словарь квалификаций по системе NL International
+        qual_names = {
+            "consultant": "🌱 Консультант (3%)",
+            "consultant_6": "📈 Консультант 6%",
+            "manager_9": "⭐ Менеджер 9%",
+            "senior_manager": "💼 Старший менеджер (12%)",
+            "manager_15": "📊 Менеджер 15%",
+            "director_21": "🎯 Директор 21%",
+            "M1": "🔥 Middle 1",
+            "M2": "🔥 Middle 2",
+            "M3": "🔥 Middle 3",
+            "B1": "💼 Business Partner 1",
+            "B2": "💼 Business Partner 2",
+            "B3": "💼 Business Partner 3",
+            "TOP": "⭐ TOP",
+            "TOP1": "⭐ TOP 1",
+            "TOP2": "⭐ TOP 2",
+            "TOP3": "⭐ TOP 3",
+            "TOP4": "⭐ TOP 4",
+            "TOP5": "⭐ TOP 5",
+            "AC1": "👑 Ambassador Club 1",
+            "AC2": "👑 Ambassador Club 2",
+            "AC3": "👑 Ambassador Club 3",
+            "AC4": "👑 Ambassador Club 4",
+            "AC5": "👑 Ambassador Club 5",
+            "AC6": "👑 Ambassador Club 6",
+        }
+
+        progress_text = f"""<b>📊 Твой прогресс</b>
 
 <b>Текущая квалификация:</b> {qual_names.get(user.qualification, "🌱 Консультант")}
 <b>Пройдено уроков:</b> 0 из 25
@@ -189,12 +170,12 @@ async def cmd_progress(message: Message):
 🏆 Зарегистрирован в системе
 """
 
-            if user.current_goal:
-                progress_text += f"\n<b>Твоя цель:</b> {user.current_goal}"
+        if user.current_goal:
+            progress_text += f"\n<b>Твоя цель:</b> {user.current_goal}"
 
-            progress_text += "\n\n💪 Продолжай в том же духе!"
+        progress_text += "\n\n💪 Продолжай в том же духе!"
 
-            await message.answer(progress_text)
+        await message.answer(progress_text)
 
     except Exception as e:
         logger.error(f"Error in /progress command: {e}")
@@ -302,3 +283,62 @@ async def cmd_hot_leads(message: Message):
     except Exception as e:
         logger.error(f"Error in /hot_leads command: {e}", exc_info=True)
         await message.answer("❌ Ошибка при получении списка лидов")
+
+
+@router.message(Command("queue_stats"))
+async def cmd_queue_stats(message: Message):
+    """
+    Очередь обработки сообщений: глубина, ожидание, отказы (только для админов)
+    """
+    if message.from_user.id not in settings.admin_ids_list:
+        await message.answer("❌ Эта команда доступна только администраторам")
+        return
+
+    from curator_bot.middlewares import get_user_ordering_middleware
+    stats = get_user_ordering_middleware().get_stats()
+
+    await message.answer(
+        "⏳ <b>ОЧЕРЕДЬ СООБЩЕНИЙ</b>\n\n"
+        f"В обработке: {stats['active']}\n"
+        f"Ждут воркера: {stats['queue_depth']} (максимум {stats['max_queue_depth']})\n"
+        f"Пользователей в очереди: {stats['users_pending']}\n"
+        f"Обработано: {stats['processed']}\n\n"
+        f"Ожидание p50/p95/max: {stats['wait_p50_ms']} / {stats['wait_p95_ms']} / {stats['wait_max_ms']} мс\n"
+        f"Отказов (пользователь спешит): {stats['rejected_user']}\n"
+        f"Отказов (перегрузка): {stats['rejected_overload']}\n"
+        f"Отказов по таймауту: {stats['timed_out']}\n"
+        f"Уведомлений о месте в очереди: {stats['queue_notices']}"
+    )
+
+
+@router.message(Command("leaders"))
+async def cmd_leaders(message: Message):
+    """
+    Какой экземпляр выполняет какой планировщик (только для админов)
+    """
+    if message.from_user.id not in settings.admin_ids_list:
+        await message.answer("❌ Эта команда доступна только администраторам")
+        return
+
+    try:
+        from shared.database.leader_election import get_leader_election, get_lease_status
+        leases = await get_lease_status(stale_after=settings.leader_heartbeat_interval * 3)
+        local = get_leader_election().get_stats()
+
+        response = "👑 <b>ПЛАНИРОВЩИКИ</b>\n\n"
+        for lease in leases:
+            status = "🟢" if lease["active"] else "🔴 нет heartbeat"
+            response += (
+                f"{status} <b>{lease['job']}</b>\n"
+                f"   {lease['holder']} · heartbeat {lease['heartbeat_age_sec']} с назад\n"
+            )
+        if not leases:
+            response += "Задачи ещё никто не захватил\n"
+
+        response += f"\nЭтот экземпляр: {local['instance']}\n"
+        response += f"Выполняет: {', '.join(local['leading']) or '—'}"
+        await message.answer(response)
+
+    except Exception as e:
+        logger.error(f"Error in /leaders command: {e}", exc_info=True)
+        await message.answer("❌ Ошибка при получении статуса планировщиков")
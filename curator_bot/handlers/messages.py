@@ -1,21 +1,29 @@
 """
 Обработчик текстовых сообщений для AI-Куратора
 """
+import asyncio
 import re
-from datetime import datetime
+import time
 from pathlib import Path
+from typing import Any, Awaitable, Dict, List, Optional, TypeVar
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile
-from sqlalchemy import select
+from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.database.base import AsyncSessionLocal
 from shared.ai_clients.yandexgpt_client import YandexGPTClient
 from shared.ai_clients.anthropic_client import AnthropicClient
+from shared.ai_clients.gigachat_client import GigaChatClient
+from shared.ai_clients.router_client import RoutingAIClient
+from shared.ai_clients.usage import collect_usage
+from shared.ai_clients.usage_recorder import get_usage_recorder
 from shared.config.settings import settings
+from shared.media.file_id_registry import get_file_id_registry
 from shared.rag import get_rag_engine
-from curator_bot.database.models import User, ConversationMessage
+from curator_bot.database.models import User
+from curator_bot.database.conversation_writer import get_conversation_writer
 from curator_bot.ai.chat_engine import CuratorChatEngine
+from curator_bot.ai.history_cache import get_history_cache
+from curator_bot.ai.message_features import classify_message
 from curator_bot.funnels.messages import CONTACT_THANKS
 # Кнопки убраны - диалоговый режим
 # from curator_bot.funnels.keyboards import (
@@ -31,23 +39,64 @@ from loguru import logger
 
 router = Router(name="messages")
 
+T = TypeVar("T")
+
 # Регулярные выражения для контактов
 PHONE_PATTERN = re.compile(r'^\+?[78]?\d{10}$|^\+7\s?\(?\d{3}\)?\s?\d{3}[-\s]?\d{2}[-\s]?\d{2}$')
 EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 # Инициализируем AI клиент глобально
+def _build_provider(name: str):
+    """Создаёт клиент провайдера по имени, если для него есть ключи"""
+    if name == "claude" and settings.anthropic_api_key:
+        return AnthropicClient()
+    if name == "yandexgpt" and settings.yandex_folder_id and settings.yandex_private_key:
+        return YandexGPTClient()
+    if name == "gigachat" and settings.gigachat_auth_token:
+        return GigaChatClient()
+    return None
+
+
 def get_ai_client():
-    """Выбирает AI клиент: Claude если настроен, иначе YandexGPT"""
+    """
+    Выбирает AI клиент: Claude если настроен, иначе YandexGPT.
+    Если доступно несколько провайдеров — оборачивает их в RoutingAIClient
+    (hedged-запросы, failover, circuit breaker).
+    """
     model = settings.curator_ai_model.lower()
-    if settings.anthropic_api_key and "claude" in model:
+    primary = "claude" if settings.anthropic_api_key and "claude" in model else "yandexgpt"
+
+    order = [primary] + [
+        name.strip().lower() for name in settings.ai_fallback_providers.split(",")
+        if name.strip() and name.strip().lower() != primary
+    ]
+
+    providers = []
+    for name in order:
         try:
-            client = AnthropicClient()
-            logger.info(f"Curator using Claude: {settings.curator_ai_model}")
-            return client
+            client = _build_provider(name)
         except Exception as e:
-            logger.warning(f"Claude init failed: {e}, falling back to YandexGPT")
-    logger.info("Curator using YandexGPT")
-    return YandexGPTClient()
+            logger.warning(f"{name} init failed: {e}")
+            continue
+        if client is not None:
+            providers.append((name, client))
+
+    if not providers:
+        logger.info("Curator using YandexGPT")
+        return YandexGPTClient()
+
+    if len(providers) == 1:
+        logger.info(f"Curator using {providers[0][0]}: {settings.curator_ai_model}")
+        return providers[0][1]
+
+    logger.info(f"Curator using router: {', '.join(name for name, _ in providers)}")
+    return RoutingAIClient(
+        providers,
+        hedge_percentile=settings.ai_hedge_percentile,
+        default_hedge_delay=settings.ai_hedge_default_delay,
+        hedging_enabled=settings.ai_hedging_enabled,
+        circuit_cooldown=settings.ai_circuit_cooldown
+    )
 
 ai_client = get_ai_client()
 
@@ -72,203 +121,251 @@ business_presenter = get_business_presenter()
 # ОБЩИЙ ОБРАБОТЧИК ТЕКСТОВЫХ СООБЩЕНИЙ
 # ============================================
 
+async def retrieve_knowledge(text: str, intent: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Ищет фрагменты базы знаний (эмбеддинг запроса + векторный поиск)
+
+    Зависит только от текста сообщения, поэтому выполняется параллельно
+    с работой с БД пользователя.
+
+    Returns:
+        Фрагменты для chat_engine или None
+    """
+    try:
+        # Получаем RAG движок и ищем релевантные документы
+        rag_engine = await get_rag_engine()
+
+        # Определяем категорию для поиска
+        category = intent.get("category")
+        if category == "sales":
+            category = "training"  # Скрипты продаж в категории training
+
+        # Выполняем поиск по базе знаний
+        search_results = await rag_engine.retrieve(
+            query=text,
+            category=category,
+            top_k=5,
+            min_similarity=0.3
+        )
+
+        if search_results:
+            logger.info(f"RAG: найдено {len(search_results)} документов для категории '{category}'")
+            # Преобразуем результаты в список строк для chat_engine
+            return [f"[{r.source}]: {r.content}" for r in search_results]
+
+        logger.info(f"RAG: документы не найдены для запроса в категории '{category}'")
+        return None
+
+    except Exception as rag_error:
+        # Продолжаем без RAG если произошла ошибка
+        logger.warning(f"RAG search failed, continuing without knowledge base: {rag_error}")
+        return None
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable[T]) -> T:
+    """Выполняет этап и записывает его длительность (мс)"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = (time.perf_counter() - start) * 1000
+
+
+async def _send_typing(message: Message):
+    """Индикатор «печатает» (не критичен для ответа)"""
+    try:
+        await message.bot.send_chat_action(message.chat.id, "typing")
+    except Exception as e:
+        logger.debug(f"send_chat_action failed: {e}")
+
+
+async def _no_knowledge() -> None:
+    return None
+
+
+def _format_timings(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage}={ms:.0f}ms" for stage, ms in timings.items())
+
+
 @router.message(F.text)
-async def handle_message(message: Message):
+async def handle_message(message: Message, session: AsyncSession, user: Optional[User]):
     """
     Обработчик всех текстовых сообщений
     Генерирует ответ с помощью AI
+
+    Пользователь и сессия — из DbSessionMiddleware (горячие пользователи без запроса).
+    Этапы до вызова LLM выполняются параллельно:
+    - RAG (эмбеддинг + поиск) зависит только от текста — стартует сразу после
+      проверок регистрации и ввода контакта
+    - индикатор «печатает»
+    - история диалога (кэш, при холодном старте — БД)
+    Активность и онбординг пишутся отложенно (ConversationWriter).
     """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    rag_task: Optional[asyncio.Task] = None
+
     try:
-        # Показываем, что бот печатает
-        await message.bot.send_chat_action(message.chat.id, "typing")
+        # Признаки сообщения считаем один раз для всех компонентов куратора
+        features = classify_message(message.text)
+
+        # Анализируем намерение пользователя (по ключевым словам, без I/O)
+        intent = await chat_engine.analyze_user_intent(message.text, features=features)
 
-        async with AsyncSessionLocal() as session:
-            # Получаем пользователя
-            result = await session.execute(
-                select(User).where(User.telegram_id == message.from_user.id)
+        if not user:
+            # Если пользователь не зарегистрирован
+            await message.answer(
+                "Привет! Сначала нажми /start чтобы начать работу со мной 😊"
             )
-            user = result.scalar_one_or_none()
+            return
+
+        # Проверяем, ожидает ли пользователь ввод контакта
+        if user.lead_status == "contact_requested":
+            text = message.text.strip()
+
+            # Проверяем телефон
+            phone_clean = re.sub(r'[\s\-\(\)]', '', text)
+            if PHONE_PATTERN.match(phone_clean) or (phone_clean.isdigit() and len(phone_clean) >= 10):
+                # Нормализуем телефон
+                if not phone_clean.startswith('+'):
+                    if phone_clean.startswith('8'):
+                        phone_clean = '+7' + phone_clean[1:]
+                    elif phone_clean.startswith('7'):
+                        phone_clean = '+' + phone_clean
+                    else:
+                        phone_clean = '+7' + phone_clean
 
-            if not user:
-                # Если пользователь не зарегистрирован
-                await message.answer(
-                    "Привет! Сначала нажми /start чтобы начать работу со мной 😊"
-                )
+                user.phone = phone_clean
+                user.lead_status = "hot"
+                await session.commit()
+                # Лид горячий — диалог должен быть в БД до уведомлений менеджеру
+                await get_conversation_writer().flush()
+
+                logger.info(f"User {user.telegram_id} provided phone: {phone_clean}")
+                await message.answer(CONTACT_THANKS)
                 return
 
-            # Проверяем, ожидает ли пользователь ввод контакта
-            if user.lead_status == "contact_requested":
-                text = message.text.strip()
-
-                # Проверяем телефон
-                phone_clean = re.sub(r'[\s\-\(\)]', '', text)
-                if PHONE_PATTERN.match(phone_clean) or (phone_clean.isdigit() and len(phone_clean) >= 10):
-                    # Нормализуем телефон
-                    if not phone_clean.startswith('+'):
-                        if phone_clean.startswith('8'):
-                            phone_clean = '+7' + phone_clean[1:]
-                        elif phone_clean.startswith('7'):
-                            phone_clean = '+' + phone_clean
-                        else:
-                            phone_clean = '+7' + phone_clean
-
-                    user.phone = phone_clean
-                    user.lead_status = "hot"
-                    await session.commit()
-
-                    logger.info(f"User {user.telegram_id} provided phone: {phone_clean}")
-                    await message.answer(CONTACT_THANKS)
-                    return
-
-                # Проверяем email
-                if EMAIL_PATTERN.match(text):
-                    user.email = text.lower()
-                    user.lead_status = "hot"
-                    await session.commit()
-
-                    logger.info(f"User {user.telegram_id} provided email: {text}")
-                    await message.answer(CONTACT_THANKS)
-                    return
-
-            # Обновляем последнюю активность
-            user.last_activity = datetime.now()
-
-            # Обновляем активность в онбординге
-            from curator_bot.database.models import UserOnboardingProgress
-            result_onboarding = await session.execute(
-                select(UserOnboardingProgress).where(UserOnboardingProgress.user_id == user.id)
-            )
-            onboarding_progress = result_onboarding.scalar_one_or_none()
-
-            if onboarding_progress and not onboarding_progress.is_completed:
-                onboarding_progress.last_activity = datetime.now()
-                # Сбрасываем счётчик напоминаний (пользователь активен)
-                onboarding_progress.last_reminder_hours = 0
-
-            # Сохраняем сообщение пользователя в БД
-            user_msg = ConversationMessage(
-                user_id=user.id,
-                message_text=message.text,
-                sender="user",
-                timestamp=datetime.now()
-            )
-            session.add(user_msg)
-            await session.commit()
+            # Проверяем email
+            if EMAIL_PATTERN.match(text):
+                user.email = text.lower()
+                user.lead_status = "hot"
+                await session.commit()
+                await get_conversation_writer().flush()
 
-            logger.info(f"Processing message from user {user.telegram_id}: {message.text[:50]}...")
+                logger.info(f"User {user.telegram_id} provided email: {text}")
+                await message.answer(CONTACT_THANKS)
+                return
 
-            # Получаем историю диалога
-            history_result = await session.execute(
-                select(ConversationMessage)
-                .where(ConversationMessage.user_id == user.id)
-                .order_by(ConversationMessage.timestamp.desc())
-                .limit(20)
+        # Определяем, нужна ли база знаний, и запускаем поиск — после ранних
+        # выходов (нет регистрации, ввод контакта), чтобы не искать впустую
+        if chat_engine.should_use_rag(intent):
+            rag_task = asyncio.create_task(
+                _timed(timings, "rag", retrieve_knowledge(message.text, intent))
             )
-            conversation_history = list(history_result.scalars().all())
-
-            # Анализируем намерение пользователя
-            intent = await chat_engine.analyze_user_intent(message.text)
-
-            # Определяем, нужна ли база знаний
-            knowledge_fragments = None
-            if chat_engine.should_use_rag(intent):
-                try:
-                    # Получаем RAG движок и ищем релевантные документы
-                    rag_engine = await get_rag_engine()
-
-                    # Определяем категорию для поиска
-                    category = intent.get("category")
-                    if category == "sales":
-                        category = "training"  # Скрипты продаж в категории training
-
-                    # Выполняем поиск по базе знаний
-                    search_results = await rag_engine.retrieve(
-                        query=message.text,
-                        category=category,
-                        top_k=5,
-                        min_similarity=0.3
-                    )
 
-                    if search_results:
-                        # Преобразуем результаты в список строк для chat_engine
-                        knowledge_fragments = [
-                            f"[{r.source}]: {r.content}"
-                            for r in search_results
-                        ]
-                        logger.info(f"RAG: найдено {len(search_results)} документов для категории '{category}'")
-                    else:
-                        logger.info(f"RAG: документы не найдены для запроса в категории '{category}'")
+        # Сообщения и активность пишутся в БД пакетами (write-behind)
+        conversation_writer = get_conversation_writer()
+
+        # Последняя активность и онбординг (сброс счётчика напоминаний,
+        # если онбординг не завершён)
+        conversation_writer.touch_user(user.id)
+
+        # История диалога из кэша (БД — только при холодном старте,
+        # поэтому читаем до записи нового сообщения) — параллельно с RAG
+        history_cache = get_history_cache()
+        # Индикатор «печатает» — параллельно с ними
+        conversation_history, knowledge_fragments, _ = await asyncio.gather(
+            _timed(timings, "history", history_cache.get_history(session, user.id)),
+            rag_task if rag_task else _no_knowledge(),
+            _send_typing(message)
+        )
+
+        # Сохраняем сообщение пользователя
+        user_msg = conversation_writer.add_message(user.id, "user", message.text)
+        conversation_history.append(
+            await history_cache.append(user.id, "user", user_msg.message_text, user_msg.timestamp)
+        )
 
-                except Exception as rag_error:
-                    logger.warning(f"RAG search failed, continuing without knowledge base: {rag_error}")
-                    # Продолжаем без RAG если произошла ошибка
+        logger.info(f"Processing message from user {user.telegram_id}: {message.text[:50]}...")
+        timings["to_llm"] = (time.perf_counter() - started) * 1000
+        logger.info(f"[TIMING] user {user.telegram_id}: {_format_timings(timings)}")
 
-            # Генерируем ответ от AI
-            ai_response = await chat_engine.generate_response(
+        # Генерируем ответ от AI (собираем usage всех вызовов LLM)
+        with collect_usage() as usages:
+            ai_response = await _timed(timings, "llm", chat_engine.generate_response(
                 user=user,
                 user_message=message.text,
                 conversation_history=conversation_history,
-                knowledge_fragments=knowledge_fragments
+                knowledge_fragments=knowledge_fragments,
+                features=features
+            ))
+
+        # Сохраняем ответ бота; usage LLM привязываем к ID строки после записи
+        user_id = user.id
+        bot_msg = conversation_writer.add_message(
+            user_id,
+            "bot",
+            ai_response,
+            ai_model=usages[-1].model if usages else settings.curator_ai_model,
+            tokens_used=sum(u.total_tokens for u in usages) if usages else None,
+            on_saved=lambda message_id: get_usage_recorder().record(
+                usages,
+                purpose="curator_reply",
+                user_id=user_id,
+                conversation_message_id=message_id
             )
+        )
+        await history_cache.append(user.id, "bot", bot_msg.message_text, bot_msg.timestamp)
 
-            # Сохраняем ответ бота в БД
-            bot_msg = ConversationMessage(
-                user_id=user.id,
-                message_text=ai_response,
-                sender="bot",
-                timestamp=datetime.now(),
-                ai_model=settings.curator_ai_model,
-                tokens_used=None  # OpenAI возвращает usage в ответе, можно добавить позже
-            )
-            session.add(bot_msg)
-            await session.commit()
-
-            # Отправляем ответ пользователю
-            await message.answer(ai_response)
-
-            # Проверяем упоминание продукта и отправляем фото если найден
-            # Ищем в ОБОИХ текстах: сообщении пользователя И ответе AI
-            try:
-                combined_text = f"{message.text} {ai_response}"
-                product_tuple = product_manager.extract_product_from_content(combined_text)
-                if product_tuple:
-                    category, product_key, product_info = product_tuple
-                    logger.info(f"[PRODUCT] Found: {category}/{product_key} - {product_info['name']}")
-                    photo_path = product_manager._find_product_photo(product_key, category)
-                    logger.info(f"[PRODUCT] Photo path: {photo_path}, exists={photo_path.exists() if photo_path else False}")
-                    if photo_path and photo_path.exists():
-                        await message.answer_photo(
-                            photo=FSInputFile(photo_path),
-                            caption=f"📦 {product_info['name']}"
-                        )
-                        logger.info(f"[PRODUCT] ✅ Sent photo: {product_info['name']}")
-                else:
-                    logger.debug(f"[PRODUCT] No product found in: {combined_text[:100]}")
-            except Exception as photo_error:
-                logger.error(f"[PRODUCT] ❌ Error sending photo: {photo_error}", exc_info=True)
-
-            # Проверяем, нужно ли отправить бизнес-контент (истории успеха, примеры)
-            # Отправляем только если ответ AI был коротким (меньше 300 символов)
-            try:
-                if len(ai_response) < 300:
-                    media_type = business_presenter.should_send_business_media(message.text, ai_response)
-                    if media_type:
-                        extra_text = None
-                        if media_type == "success_story":
-                            extra_text = business_presenter.get_success_story()
-                        elif media_type == "income_proof":
-                            extra_text = business_presenter.get_income_proof()
-                        elif media_type == "business_proof":
-                            extra_text = business_presenter.get_business_presentation()
-
-                        if extra_text:
-                            # Отправляем как дополнительное сообщение
-                            await message.answer(f"Вот пример:\n\n{extra_text[:1500]}")
-                            logger.info(f"[BUSINESS] ✅ Sent {media_type} example text")
-            except Exception as business_error:
-                logger.error(f"[BUSINESS] ❌ Error sending business content: {business_error}", exc_info=True)
-
-            logger.info(f"Response sent to user {user.telegram_id}")
+        # Отправляем ответ пользователю
+        await message.answer(ai_response)
+
+        # Проверяем упоминание продукта и отправляем фото если найден
+        # Ищем в ОБОИХ текстах: сообщении пользователя И ответе AI
+        try:
+            combined_text = f"{message.text} {ai_response}"
+            product_tuple = product_manager.extract_product_from_content(combined_text)
+            if product_tuple:
+                keyword, folder_path, photo_path = product_tuple
+                logger.info(f"[PRODUCT] Found: '{keyword}' -> {folder_path}, photo={photo_path}")
+                # Путь взят из индекса фото — без лишней проверки на диске
+                if photo_path:
+                    # Повторные отправки того же фото — по file_id, без загрузки
+                    await get_file_id_registry().send_photo(
+                        message.bot,
+                        message.chat.id,
+                        path=product_manager.telegram_photo_path(photo_path),
+                        caption=f"📦 {keyword.title()}"
+                    )
+                    logger.info(f"[PRODUCT] ✅ Sent photo: {folder_path}")
+            else:
+                logger.debug(f"[PRODUCT] No product found in: {combined_text[:100]}")
+        except Exception as photo_error:
+            logger.error(f"[PRODUCT] ❌ Error sending photo: {photo_error}", exc_info=True)
+
+        # Проверяем, нужно ли отправить бизнес-контент (истории успеха, примеры)
+        # Отправляем только если ответ AI был коротким (меньше 300 символов)
+        try:
+            if len(ai_response) < 300:
+                media_type = business_presenter.should_send_business_media(message.text, ai_response)
+                if media_type:
+                    extra_text = None
+                    if media_type == "success_story":
+                        extra_text = business_presenter.get_success_story()
+                    elif media_type == "income_proof":
+                        extra_text = business_presenter.get_income_proof()
+                    elif media_type == "business_proof":
+                        extra_text = business_presenter.get_business_presentation()
+
+                    if extra_text:
+                        # Отправляем как дополнительное сообщение
+                        await message.answer(f"Вот пример:\n\n{extra_text[:1500]}")
+                        logger.info(f"[BUSINESS] ✅ Sent {media_type} example text")
+        except Exception as business_error:
+            logger.error(f"[BUSINESS] ❌ Error sending business content: {business_error}", exc_info=True)
+
+        timings["total"] = (time.perf_counter() - started) * 1000
+        logger.info(f"Response sent to user {user.telegram_id} ({_format_timings(timings)})")
 
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
@@ -276,3 +373,7 @@ async def handle_message(message: Message):
             "Извини, произошла ошибка при обработке твоего сообщения 😔\n"
             "Попробуй написать еще раз или используй /help"
         )
+    finally:
+        # Незарегистрированный пользователь, контакт или ошибка — поиск больше не нужен
+        if rag_task and not rag_task.done():
+            rag_task.cancel()
@@ -8,17 +8,28 @@ from aiogram.client.default import DefaultBotProperties
 
 from shared.config.settings import settings
 from shared.utils.logger import setup_logger
+from shared.webhook import run_dispatcher
 from shared.database.base import init_db
+from shared.media.product_index import get_product_index
+from shared.media.photo_index import get_photo_index
 from curator_bot.handlers import messages, commands, callbacks
+from curator_bot.middlewares import get_db_session_middleware, get_user_ordering_middleware
 from curator_bot.scheduler.reminder_scheduler import setup_reminder_scheduler, shutdown_scheduler
+from shared.database.leader_election import get_leader_election
 
 
 # Настраиваем логгер
 logger = setup_logger("curator", settings.log_level)
 
 
-async def main():
-    """Главная функция запуска бота"""
+async def main(close_shared: bool = True):
+    """
+    Главная функция запуска бота
+
+    Args:
+        close_shared: Закрыть общие ресурсы процесса при остановке
+            (run_bots.py передаёт False и закрывает их сам после обоих ботов)
+    """
 
     logger.info("🚀 Starting AI-Curator Bot...")
 
@@ -27,6 +38,11 @@ async def main():
     await init_db()
     logger.info("✅ Database initialized")
 
+    # Индексы упоминаний продуктов и фото (для фото в ответах)
+    get_product_index()
+    get_photo_index()
+    logger.info("✅ Product and photo indexes built")
+
     # Создаем бота
     bot = Bot(
         token=settings.curator_bot_token,
@@ -36,6 +52,16 @@ async def main():
     # Создаем диспетчер
     dp = Dispatcher()
 
+    # Сообщения одного пользователя — по очереди, общая конкуренция ограничена
+    ordering = get_user_ordering_middleware()
+    dp.message.outer_middleware(ordering)
+    dp.callback_query.outer_middleware(ordering)
+
+    # Одна сессия БД и один запрос пользователя на апдейт (только если нашёлся обработчик)
+    db_session = get_db_session_middleware()
+    dp.message.middleware(db_session)
+    dp.callback_query.middleware(db_session)
+
     # Регистрируем роутеры
     dp.include_router(commands.router)
     dp.include_router(callbacks.router)  # Воронка продаж (callback-кнопки)
@@ -43,31 +69,72 @@ async def main():
 
     logger.info("✅ Handlers registered")
 
-    # Запускаем планировщик напоминаний
-    setup_reminder_scheduler(bot)
-    logger.info("✅ Reminder scheduler started")
-
-    # Запускаем онбординг-планировщик
-    from curator_bot.onboarding.onboarding_scheduler import OnboardingScheduler
-    onboarding_scheduler = OnboardingScheduler(bot)
-    await onboarding_scheduler.start()
-    logger.info("✅ Onboarding scheduler started")
-
-    # Сохраняем ссылку для graceful shutdown
-    dp.onboarding_scheduler = onboarding_scheduler
-
-    # Запускаем polling
+    # Планировщики выполняет один экземпляр — лидер (advisory-блокировка Postgres),
+    # чат обслуживают все. При падении лидера задачи подхватывает другой.
+    leader_election = get_leader_election()
+    if settings.curator_run_schedulers:
+        from curator_bot.onboarding.onboarding_scheduler import OnboardingScheduler
+        onboarding_scheduler = OnboardingScheduler(bot)
+
+        async def start_reminders():
+            setup_reminder_scheduler(bot)
+
+        async def stop_reminders():
+            shutdown_scheduler()
+
+        # Напоминания 24ч/48ч/7д и горячие лиды (APScheduler)
+        leader_election.add_job("curator_reminders", start_reminders, stop_reminders)
+        # Онбординг и уведомления о новых постах (system_events)
+        leader_election.add_job("curator_onboarding", onboarding_scheduler.start, onboarding_scheduler.stop)
+        await leader_election.start()
+        logger.info(f"✅ Scheduler leader election started: {leader_election.get_stats()}")
+    else:
+        logger.info("Schedulers disabled on this instance (CURATOR_RUN_SCHEDULERS=false)")
+
+    # Воркер шарда: апдейты своих пользователей приходят от шард-роутера
+    shard_worker = None
+    if settings.bot_mode == "shard_worker":
+        from curator_bot.sharding import start_shard_worker
+        shard_worker = await start_shard_worker(bot, dp)
+
+    # Принимаем апдейты (polling или webhook — BOT_MODE)
     try:
         logger.info("🤖 AI-Curator Bot is running!")
         logger.info(f"Model: {settings.curator_ai_model}")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await run_dispatcher("curator", bot, dp)
     finally:
-        shutdown_scheduler()
-
-        # Останавливаем онбординг-планировщик
-        if hasattr(dp, 'onboarding_scheduler'):
-            await dp.onboarding_scheduler.stop()
-            logger.info("✅ Onboarding scheduler stopped")
+        # Сначала уходим из кольца: новые апдейты пойдут другим воркерам
+        if shard_worker is not None:
+            logger.info(f"Shard: {shard_worker.get_stats()}")
+            await shard_worker.stop()
+
+        # Останавливаем свои планировщики и отдаём лидерство другим экземплярам
+        await leader_election.stop()
+
+        logger.info(f"Update queue: {get_user_ordering_middleware().get_stats()}")
+        logger.info(f"User cache: {get_db_session_middleware().get_stats()}")
+
+        # Дописываем отложенные сообщения диалогов (до статистики AI:
+        # после записи ответов в неё добавляются их usage)
+        from curator_bot.database.conversation_writer import get_conversation_writer
+        await get_conversation_writer().close()
+
+        # Сохраняем изменённые контексты воронки
+        from curator_bot.funnels.conversational_funnel import get_conversational_funnel
+        logger.info(f"Funnel contexts: {get_conversational_funnel().get_stats()}")
+        await get_conversational_funnel().close()
+
+        from shared.media.file_id_registry import get_file_id_registry
+        logger.info(f"Photo sends: {get_file_id_registry().get_stats()}")
+
+        from curator_bot.ai.history_cache import get_history_cache
+        logger.info(f"History cache: {get_history_cache().get_stats()}")
+        await get_history_cache().close()
+
+        # Общие с контент-менеджером ресурсы (usage AI, токены, пулы потоков)
+        if close_shared:
+            from shared.utils.shutdown import close_shared_resources
+            await close_shared_resources()
 
         await bot.session.close()
         logger.info("👋 AI-Curator Bot stopped")
@@ -0,0 +1,12 @@
+"""
+Middleware AI-Куратора
+"""
+from curator_bot.middlewares.db_session import DbSessionMiddleware, get_db_session_middleware
+from curator_bot.middlewares.user_ordering import UserOrderingMiddleware, get_user_ordering_middleware
+
+__all__ = [
+    "DbSessionMiddleware",
+    "get_db_session_middleware",
+    "UserOrderingMiddleware",
+    "get_user_ordering_middleware",
+]
@@ -0,0 +1,133 @@
+"""
+Сессия БД и пользователь на один апдейт.
+
+Обработчики куратора открывали сессию сами и заново выбирали User по
+telegram_id — на нажатие кнопки уходило по два-три одинаковых SELECT
+(прочитать шаг воронки, потом update_user_funnel). Middleware:
+- открывает одну сессию на апдейт и передаёт её обработчику (session);
+- загружает User вместе с прогрессом онбординга одним запросом и
+  передаёт его обработчику (user, None — если пользователь не зарегистрирован);
+- держит недавно активных пользователей в коротком TTL-кэше: повторный
+  апдейт того же пользователя присоединяет копию к новой сессии
+  (merge без загрузки) и не делает ни одного запроса.
+
+Обработчики меняют полученного user и коммитят сессию сами. В кэш
+возвращается только чистый объект: при ошибке, незакоммиченных изменениях
+или откате запись сбрасывается и следующий апдейт перечитает пользователя.
+Апдейты одного пользователя в процессе идут по очереди (UserOrderingMiddleware),
+а изменения из других процессов видны не позже чем через TTL.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from curator_bot.database.models import User
+from shared.database.base import AsyncSessionLocal
+from shared.utils.lru_cache import LRUCache
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия и один запрос пользователя на апдейт, горячие пользователи — из кэша"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        cache_size: int = 10000,
+        cache_ttl: float = 30.0
+    ):
+        """
+        Args:
+            session_factory: Фабрика сессий (для тестов)
+            cache_size: Сколько пользователей держать в кэше
+            cache_ttl: Время жизни записи (сек) — предел устаревания
+                       при изменениях из других процессов
+        """
+        super().__init__()
+        self._session_factory = session_factory
+        self._cache: LRUCache[User] = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.queries = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        async with self._session_factory() as session:
+            user = await self.load_user(session, from_user.id) if from_user else None
+            data["session"] = session
+            data["user"] = user
+            try:
+                result = await handler(event, data)
+            except Exception:
+                if from_user:
+                    self._cache.invalidate(from_user.id)
+                raise
+            if user is not None:
+                self._remember(session, user)
+            return result
+
+    async def load_user(self, session: AsyncSession, telegram_id: int) -> Optional[User]:
+        """User из кэша (без запроса) или из БД вместе с прогрессом онбординга"""
+        cached = self._cache.get(telegram_id)
+        if cached is not None:
+            return await session.merge(cached, load=False)
+
+        self.queries += 1
+        result = await session.execute(
+            select(User)
+            .options(joinedload(User.onboarding_progress))
+            .where(User.telegram_id == telegram_id)
+        )
+        return result.scalar_one_or_none()
+
+    def _remember(self, session: AsyncSession, user: User):
+        """Кэширует пользователя, если его состояние совпадает с БД"""
+        objects = [user]
+        if "onboarding_progress" in inspect(user).dict and user.onboarding_progress is not None:
+            objects.append(user.onboarding_progress)
+
+        clean = not session.new and all(
+            obj not in session.dirty and not inspect(obj).expired_attributes
+            for obj in objects
+        )
+        if clean:
+            self._cache.set(user.telegram_id, user)
+        else:
+            self._cache.invalidate(user.telegram_id)
+
+    def invalidate(self, telegram_id: int):
+        """Сбрасывает пользователя (изменён в обход middleware)"""
+        self._cache.invalidate(telegram_id)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Сбрасывает пользователей по условию на telegram_id"""
+        return self._cache.discard_where(predicate)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cached_users": len(self._cache),
+            "user_queries": self.queries,
+            **self._cache.stats.as_dict(),
+        }
+
+
+# Глобальный экземпляр
+_db_session_middleware: Optional[DbSessionMiddleware] = None
+
+
+def get_db_session_middleware() -> DbSessionMiddleware:
+    """Получить глобальный экземпляр DbSessionMiddleware"""
+    global _db_session_middleware
+    if _db_session_middleware is None:
+        from shared.config.settings import settings
+        _db_session_middleware = DbSessionMiddleware(
+            cache_size=settings.curator_user_cache_size,
+            cache_ttl=settings.curator_user_cache_ttl
+        )
+    return _db_session_middleware
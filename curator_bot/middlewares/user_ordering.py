@@ -0,0 +1,234 @@
+"""
+Очередь обработки апдейтов куратора: порядок по пользователю и общий лимит.
+
+aiogram обрабатывает апдейты параллельно, поэтому два быстрых сообщения
+одного пользователя шли через handle_message одновременно и гонялись за
+историей, контекстом воронки и персоной, а всплеск пользователей запускал
+неограниченное число вызовов LLM.
+
+Middleware:
+- выстраивает апдейты одного telegram_id в очередь (FIFO-лок на пользователя);
+- ограничивает число одновременно обрабатываемых апдейтов (пул воркеров);
+- при перегрузке отвечает сразу, а не по таймауту:
+    * у пользователя уже слишком много сообщений в очереди — просим подождать;
+    * общая очередь переполнена — короткий ответ «много вопросов»;
+    * ожидание затянулось — одно уведомление с местом в очереди;
+    * ожидание превысило предел — извиняемся и снимаем апдейт;
+- считает глубину очереди и время ожидания (get_stats, /queue_stats).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+from loguru import logger
+
+BUSY_USER_TEXT = "Секунду, я ещё отвечаю на твоё предыдущее сообщение 🙏"
+OVERLOAD_TEXT = (
+    "Сейчас очень много вопросов, не успеваю отвечать всем сразу 😅\n"
+    "Напиши, пожалуйста, ещё раз через пару минут!"
+)
+QUEUE_NOTICE_TEXT = "Сейчас много вопросов — ты {position}-й в очереди, скоро отвечу 🙌"
+TIMEOUT_TEXT = "Извини, не успел ответить — слишком много вопросов. Напиши ещё раз, пожалуйста 🙏"
+
+
+class _UserQueue:
+    """FIFO-лок одного пользователя и число его апдейтов в обработке/ожидании"""
+
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UserOrderingMiddleware(BaseMiddleware):
+    """Последовательная обработка апдейтов пользователя + ограниченный пул воркеров"""
+
+    def __init__(
+        self,
+        max_workers: int = 20,
+        max_queue: int = 200,
+        max_per_user: int = 3,
+        notice_after: float = 5.0,
+        max_wait: float = 90.0,
+        wait_samples: int = 1000
+    ):
+        """
+        Args:
+            max_workers: Сколько апдейтов обрабатывать одновременно
+            max_queue: Сколько апдейтов может ждать свободного воркера
+            max_per_user: Сколько апдейтов одного пользователя держать (включая текущий)
+            notice_after: Через сколько секунд ожидания сообщить место в очереди
+            max_wait: Максимальное ожидание воркера (сек), дальше — отказ
+            wait_samples: Сколько последних ожиданий хранить для перцентилей
+        """
+        super().__init__()
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.notice_after = notice_after
+        self.max_wait = max_wait
+
+        self._workers = asyncio.Semaphore(max_workers)
+        self._users: Dict[int, _UserQueue] = {}
+        self._waiting = 0           # ждут воркера (глубина общей очереди)
+        self._active = 0            # обрабатываются сейчас
+        self._tickets_issued = 0    # для номера в очереди
+        self._tickets_served = 0
+        self._waits: Deque[float] = deque(maxlen=wait_samples)
+
+        self.processed = 0
+        self.rejected_user = 0
+        self.rejected_overload = 0
+        self.timed_out = 0
+        self.notices = 0
+        self.max_queue_seen = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+
+        queue = self._users.get(user.id)
+        if queue is None:
+            queue = self._users[user.id] = _UserQueue()
+
+        if queue.pending >= self.max_per_user:
+            self.rejected_user += 1
+            await self._reply(event, BUSY_USER_TEXT)
+            return None
+
+        queue.pending += 1
+        try:
+            # Сначала очередь пользователя: один пользователь не занимает несколько воркеров
+            async with queue.lock:
+                return await self._run_with_worker(handler, event, data)
+        finally:
+            queue.pending -= 1
+            if queue.pending == 0:
+                self._users.pop(user.id, None)
+
+    async def _run_with_worker(self, handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if self._waiting >= self.max_queue:
+            self.rejected_overload += 1
+            await self._reply(event, OVERLOAD_TEXT)
+            return None
+
+        started = time.monotonic()
+        ticket = self._tickets_issued
+        self._tickets_issued += 1
+        self._waiting += 1
+        self.max_queue_seen = max(self.max_queue_seen, self._waiting)
+        try:
+            if not await self._acquire(event, ticket, started):
+                self.timed_out += 1
+                await self._reply(event, TIMEOUT_TEXT)
+                return None
+        finally:
+            self._waiting -= 1
+            self._tickets_served += 1
+
+        self._waits.append(time.monotonic() - started)
+        self._active += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self._active -= 1
+            self.processed += 1
+            self._workers.release()
+
+    async def _acquire(self, event: TelegramObject, ticket: int, started: float) -> bool:
+        """Ждёт воркера; при долгом ожидании один раз сообщает место в очереди"""
+        if not self._workers.locked():
+            # Свободный воркер: занимаем без переключения на другие задачи
+            await self._workers.acquire()
+            return True
+        try:
+            await asyncio.wait_for(self._workers.acquire(), timeout=self.notice_after)
+            return True
+        except asyncio.TimeoutError:
+            pass
+
+        position = max(1, ticket - self._tickets_served + 1)
+        self.notices += 1
+        await self._reply(event, QUEUE_NOTICE_TEXT.format(position=position), final=False)
+
+        remaining = self.max_wait - (time.monotonic() - started)
+        if remaining <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._workers.acquire(), timeout=remaining)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    @staticmethod
+    async def _reply(event: TelegramObject, text: str, final: bool = True):
+        """
+        Быстрый ответ без обработчика: сообщение или всплывашка у callback
+
+        Args:
+            final: Апдейт снимается (отказ) — обработчик не запустится.
+                Иначе у callback пишем в чат: на сам запрос потом ответит
+                обработчик, а повторный answerCallbackQuery Telegram отклоняет.
+        """
+        answer = getattr(event, "answer", None)
+        if isinstance(event, CallbackQuery) and not final:
+            answer = getattr(event.message, "answer", None)
+        if answer is None:
+            return
+        try:
+            await answer(text)
+        except Exception as e:
+            logger.debug(f"[QUEUE] Failed to send overload reply: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди, время ожидания, отказы"""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1)
+
+        return {
+            "active": self._active,
+            "queue_depth": self._waiting,
+            "max_queue_depth": self.max_queue_seen,
+            "users_pending": len(self._users),
+            "processed": self.processed,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "rejected_user": self.rejected_user,
+            "rejected_overload": self.rejected_overload,
+            "timed_out": self.timed_out,
+            "queue_notices": self.notices,
+        }
+
+
+# Глобальный экземпляр
+_user_ordering: Optional[UserOrderingMiddleware] = None
+
+
+def get_user_ordering_middleware() -> UserOrderingMiddleware:
+    """Получить глобальный экземпляр UserOrderingMiddleware"""
+    global _user_ordering
+    if _user_ordering is None:
+        from shared.config.settings import settings
+        _user_ordering = UserOrderingMiddleware(
+            max_workers=settings.curator_max_concurrency,
+            max_queue=settings.curator_max_queue,
+            max_per_user=settings.curator_max_per_user,
+            notice_after=settings.curator_queue_notice_after,
+            max_wait=settings.curator_queue_max_wait
+        )
+    return _user_ordering
@@ -319,4 +319,5 @@ def shutdown_scheduler():
 
     if scheduler:
         scheduler.shutdown(wait=False)
+        scheduler = None
         logger.info("Reminder scheduler stopped")
@@ -0,0 +1,184 @@
+"""
+Воркер шардированного куратора (BOT_MODE=shard_worker).
+
+Апдейты приходят не от Telegram, а от шард-роутера (shared/webhook/shard_router.py),
+который по консистентному хешу telegram_id отправляет пользователя всегда
+в один воркер. Воркер:
+- регистрируется у роутера heartbeat'ами и уходит по /shards/leave при остановке;
+- получает новый состав (POST /shards/ring) и перебалансирует горячее
+  состояние: дописывает отложенные сообщения, сохраняет контексты воронки,
+  выгружает контексты и кэш пользователей, переехавших на другие воркеры, и
+  сбрасывает кэш истории (при возврате пользователя он перечитается из БД).
+
+Планировщики напоминаний выполняет только один воркер — лидер, выбранный
+через advisory-блокировку Postgres (shared/database/leader_election.py).
+"""
+import asyncio
+import hmac
+from typing import Any, Dict, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+from loguru import logger
+
+from shared.webhook.hash_ring import HashRing
+from shared.webhook.server import SECRET_HEADER, WebhookServer, derive_secret
+from shared.webhook.shard_router import SHARDS_CHANNEL
+
+
+class ShardWorker:
+    """Членство воркера в кольце и перебалансировка его состояния"""
+
+    def __init__(
+        self,
+        worker_id: str,
+        worker_url: str,
+        router_url: str,
+        secret: str,
+        heartbeat_interval: float = 2.0
+    ):
+        """
+        Args:
+            worker_id: Имя воркера в кольце (стабильное между перезапусками)
+            worker_url: Адрес, по которому роутер достучится до воркера
+            router_url: Адрес роутера для heartbeat
+            secret: Общий WEBHOOK_SECRET
+            heartbeat_interval: Интервал heartbeat (сек)
+        """
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET is required for sharding")
+        self.worker_id = worker_id
+        self.worker_url = worker_url.rstrip("/")
+        self.router_url = router_url.rstrip("/")
+        self.heartbeat_interval = heartbeat_interval
+        self._shards_secret = derive_secret(secret, SHARDS_CHANNEL)
+
+        self.ring: Optional[HashRing] = None
+        self._ring_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._http: Optional[ClientSession] = None
+
+        self.rebalances = 0
+        self.contexts_released = 0
+        self.heartbeat_errors = 0
+
+    def install(self, server: WebhookServer):
+        """Добавляет маршрут /shards/ring в webhook-сервер воркера"""
+        server.add_route("POST", "/shards/ring", self.handle_ring)
+
+    def owns(self, telegram_id: int) -> bool:
+        """Принадлежит ли пользователь этому воркеру (до первого кольца — да)"""
+        return self.ring is None or self.ring.node_for(telegram_id) == self.worker_id
+
+    # === Членство ===
+
+    async def start(self):
+        self._http = ClientSession(timeout=ClientTimeout(total=5))
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"[SHARDS] Worker {self.worker_id} at {self.worker_url}, router {self.router_url}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self._post("/shards/heartbeat", {"worker": self.worker_id, "url": self.worker_url})
+            except Exception as e:
+                self.heartbeat_errors += 1
+                logger.debug(f"[SHARDS] Heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _post(self, path: str, payload: Dict[str, Any]):
+        async with self._http.post(
+            f"{self.router_url}{path}", json=payload, headers={SECRET_HEADER: self._shards_secret}
+        ) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+
+    async def stop(self):
+        """Уходит из кольца (пользователи сразу переезжают) и останавливает heartbeat"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._http:
+            try:
+                await self._post("/shards/leave", {"worker": self.worker_id})
+            except Exception as e:
+                logger.warning(f"[SHARDS] Failed to leave the ring: {e}")
+            await self._http.close()
+            self._http = None
+
+    # === Перебалансировка ===
+
+    async def handle_ring(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self._shards_secret):
+            return web.Response(status=401)
+        data = await request.json()
+        await self.rebalance(HashRing(data["workers"], replicas=data.get("replicas", 128)))
+        return web.json_response({"worker": self.worker_id, "ok": True})
+
+    async def rebalance(self, ring: HashRing):
+        """Сохраняет состояние и выгружает пользователей, которые теперь принадлежат другим"""
+        from curator_bot.ai.history_cache import get_history_cache
+        from curator_bot.database.conversation_writer import get_conversation_writer
+        from curator_bot.funnels.conversational_funnel import get_conversational_funnel
+        from curator_bot.middlewares import get_db_session_middleware
+
+        async with self._ring_lock:
+            self.ring = ring
+            await get_conversation_writer().flush()
+            released = await get_conversational_funnel().release_contexts(keep=self.owns)
+            get_db_session_middleware().discard_where(lambda telegram_id: not self.owns(telegram_id))
+            # Ключи кэша истории — users.id, а не telegram_id: сбрасываем целиком
+            get_history_cache().clear()
+
+            self.rebalances += 1
+            self.contexts_released += released
+            logger.info(f"[SHARDS] {self.worker_id}: ring {ring.nodes}, released {released} contexts")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker_id,
+            "ring": self.ring.nodes if self.ring else [],
+            "rebalances": self.rebalances,
+            "contexts_released": self.contexts_released,
+            "heartbeat_errors": self.heartbeat_errors,
+        }
+
+
+async def start_shard_worker(bot, dispatcher) -> ShardWorker:
+    """
+    Поднимает webhook-сервер воркера и начинает heartbeat.
+
+    Бот регистрируется в сервере до первого heartbeat: роутер начинает
+    пересылать апдейты сразу после включения воркера в кольцо.
+    """
+    from shared.webhook import get_webhook_server
+
+    server = get_webhook_server()
+    worker = get_shard_worker()
+    worker.install(server)
+    server.register("curator", bot, dispatcher)
+    await server.start()
+    await worker.start()
+    return worker
+
+
+# Глобальный экземпляр
+_shard_worker: Optional[ShardWorker] = None
+
+
+def get_shard_worker() -> ShardWorker:
+    """Получить глобальный экземпляр ShardWorker (BOT_MODE=shard_worker)"""
+    global _shard_worker
+    if _shard_worker is None:
+        from shared.config.settings import settings
+        _shard_worker = ShardWorker(
+            worker_id=settings.shard_id or f"curator-{settings.webhook_port}",
+            worker_url=settings.shard_worker_url or f"http://127.0.0.1:{settings.webhook_port}",
+            router_url=settings.shard_router_url,
+            secret=settings.webhook_secret,
+            heartbeat_interval=settings.shard_heartbeat_interval
+        )
+    return _shard_worker
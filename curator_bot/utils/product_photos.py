@@ -3,43 +3,19 @@
 Находит и отправляет фото продуктов клиентам.
 
 Использует полный маппинг из full_products_mapping.json (~200 продуктов)
+через единый индекс продуктов (shared.media.product_index)
 """
-import os
-import json
 import random
 from pathlib import Path
 from typing import Optional, List
 from loguru import logger
 
+from shared.media.product_index import get_product_index
+from shared.media.photo_index import get_photo_index
+
 # Базовый путь к фото продуктов
 UNIFIED_PRODUCTS_PATH = Path(__file__).parent.parent.parent / "content" / "unified_products"
 
-# Загружаем полный маппинг из JSON
-MAPPING_FILE = UNIFIED_PRODUCTS_PATH / "full_products_mapping.json"
-
-# Кэш маппинга
-_keywords_cache: Optional[dict] = None
-_categories_cache: Optional[dict] = None
-
-
-def _load_mapping():
-    """Загружает маппинг из JSON файла"""
-    global _keywords_cache, _categories_cache
-
-    if _keywords_cache is not None:
-        return
-
-    try:
-        with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            _keywords_cache = data.get("keywords", {})
-            _categories_cache = data.get("categories", {})
-            logger.info(f"Loaded product mapping: {len(_keywords_cache)} keywords, {len(_categories_cache)} categories")
-    except Exception as e:
-        logger.error(f"Failed to load product mapping: {e}")
-        _keywords_cache = {}
-        _categories_cache = {}
-
 
 def find_product_photos(product_name: str, limit: int = 5) -> List[str]:
     """
@@ -52,49 +28,29 @@ def find_product_photos(product_name: str, limit: int = 5) -> List[str]:
     Returns:
         Список путей к фото
     """
-    _load_mapping()
-
     photos = []
-    product_lower = product_name.lower().strip()
-
-    # Сначала ищем точное совпадение в маппинге
-    folder_path = None
-
-    # Пробуем найти точное ключевое слово
-    if product_lower in _keywords_cache:
-        folder_path = _keywords_cache[product_lower]
-        logger.info(f"Exact match for '{product_lower}' -> {folder_path}")
-    else:
-        # Ищем частичное совпадение
-        for keyword, path in _keywords_cache.items():
-            if keyword in product_lower or product_lower in keyword:
-                folder_path = path
-                logger.info(f"Partial match '{keyword}' in '{product_lower}' -> {folder_path}")
-                break
-
-    # Если нашли папку - ищем в ней фото
+
+    # Точное ключевое слово или самое длинное ключевое слово в названии (единый индекс)
+    folder_path = get_product_index().resolve_folder(product_name)
     if folder_path:
-        full_path = UNIFIED_PRODUCTS_PATH / folder_path / "photos"
-        if full_path.exists():
-            for photo_path in full_path.glob("*.jpg"):
-                photos.append(str(photo_path))
-            for photo_path in full_path.glob("*.png"):
-                photos.append(str(photo_path))
+        logger.info(f"Product index match for '{product_name}' -> {folder_path}")
 
-            logger.info(f"Found {len(photos)} photos in {full_path}")
+    photo_index = get_photo_index(UNIFIED_PRODUCTS_PATH)
+
+    # Если нашли папку - берём её фото из индекса
+    if folder_path:
+        photos = photo_index.photos_in_folder(folder_path)
+        logger.info(f"Found {len(photos)} photos in {folder_path}")
 
     # Если ничего не нашли - пробуем fallback на general
     if not photos:
-        general_path = UNIFIED_PRODUCTS_PATH / "general" / "photos"
-        if general_path.exists():
-            for photo_path in list(general_path.glob("*.jpg"))[:limit * 3]:
-                photos.append(str(photo_path))
+        photos = photo_index.photos_in_folder("general")[:limit * 3]
+        if photos:
             logger.warning(f"No specific photos for '{product_name}', using general")
 
-    # Перемешиваем и возвращаем
+    # Случайная выборка
     if photos:
-        random.shuffle(photos)
-        return photos[:limit]
+        return [str(p) for p in random.sample(photos, min(limit, len(photos)))]
 
     logger.warning(f"No photos found for product: {product_name}")
     return []
@@ -168,25 +124,18 @@ def get_photo_by_category(category: str) -> Optional[str]:
     Returns:
         Путь к фото или None
     """
-    _load_mapping()
-
     # Проверяем в старом маппинге
     folder = CATEGORY_PHOTO_MAP.get(category)
     if folder:
         return get_random_product_photo(folder)
 
     # Проверяем в новом маппинге категорий
-    category_lower = category.lower()
-    if category_lower in _categories_cache:
-        paths = _categories_cache[category_lower]
-        if paths:
-            # Берём первый путь из категории
-            folder_path = paths[0]
-            full_path = UNIFIED_PRODUCTS_PATH / folder_path / "photos"
-            if full_path.exists():
-                photos = list(full_path.glob("*.jpg")) + list(full_path.glob("*.png"))
-                if photos:
-                    return str(random.choice(photos))
+    paths = get_product_index().category_folders(category)
+    if paths:
+        # Берём первый путь из категории
+        photo = get_photo_index(UNIFIED_PRODUCTS_PATH).random_photo_in_folder(paths[0])
+        if photo:
+            return str(photo)
 
     return None
 
@@ -202,32 +151,22 @@ def get_all_photos_for_category(category: str, limit: int = 20) -> List[str]:
     Returns:
         Список путей к фото
     """
-    _load_mapping()
-
     photos = []
-    category_lower = category.lower()
-
-    if category_lower in _categories_cache:
-        for folder_path in _categories_cache[category_lower]:
-            full_path = UNIFIED_PRODUCTS_PATH / folder_path / "photos"
-            if full_path.exists():
-                for photo in full_path.glob("*.jpg"):
-                    photos.append(str(photo))
-                    if len(photos) >= limit:
-                        break
-                for photo in full_path.glob("*.png"):
-                    photos.append(str(photo))
-                    if len(photos) >= limit:
-                        break
 
+    photo_index = get_photo_index(UNIFIED_PRODUCTS_PATH)
+    for folder_path in get_product_index().category_folders(category):
+        photos.extend(str(p) for p in photo_index.photos_in_folder(folder_path))
+        if len(photos) >= limit:
+            break
+
+    photos = photos[:limit]
     random.shuffle(photos)
-    return photos[:limit]
+    return photos
 
 
 # Проверка наличия фото при импорте
 if UNIFIED_PRODUCTS_PATH.exists():
-    _load_mapping()
-    total_photos = sum(1 for _ in UNIFIED_PRODUCTS_PATH.rglob("*.jpg"))
+    total_photos = get_photo_index(UNIFIED_PRODUCTS_PATH).count(".jpg")
     logger.info(f"Product photos loaded: {total_photos} photos in {UNIFIED_PRODUCTS_PATH}")
 else:
     logger.warning(f"Product photos path not found: {UNIFIED_PRODUCTS_PATH}")
@@ -1,5 +1,11 @@
 """
 Запуск обоих ботов в одном процессе для Railway
+
+BOT_MODE=webhook: оба бота принимают апдейты через один aiohttp-сервер
+на WEBHOOK_PORT (пути {WEBHOOK_PATH}/curator и {WEBHOOK_PATH}/content).
+
+Общие ресурсы процесса (usage AI, токены, пулы потоков) закрываются здесь,
+после остановки обоих ботов, а не в main первого остановившегося.
 """
 import asyncio
 import sys
@@ -18,14 +24,14 @@ async def run_curator_bot():
     """Запуск AI-Куратора"""
     from curator_bot.main import main as curator_main
     logger.info("Starting AI-Curator Bot...")
-    await curator_main()
+    await curator_main(close_shared=False)
 
 
 async def run_content_manager_bot():
     """Запуск AI-Контент-Менеджера"""
     from content_manager_bot.main import main as content_main
     logger.info("Starting AI-Content-Manager Bot...")
-    await content_main()
+    await content_main(close_shared=False)
 
 
 async def main():
@@ -35,11 +41,15 @@ async def main():
     logger.info("=" * 50)
 
     # Запускаем оба бота параллельно
-    await asyncio.gather(
-        run_curator_bot(),
-        run_content_manager_bot(),
-        return_exceptions=True
-    )
+    try:
+        await asyncio.gather(
+            run_curator_bot(),
+            run_content_manager_bot(),
+            return_exceptions=True
+        )
+    finally:
+        from shared.utils.shutdown import close_shared_resources
+        await close_shared_resources()
 
 
 if __name__ == "__main__":
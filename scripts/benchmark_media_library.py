@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк MediaLibrary.find_in_text на большом словаре
+
+Сравнивает поиск продукта в тексте поста:
+- "до":    перебор всех строк media_keyword_index с `keyword in content`
+           (только Python-часть; загрузка всех строк из БД на каждый вызов не учтена)
+- "после": один проход автомата ProductIndex + снимок asset из памяти
+
+Обещание в docstring find_in_text — < 20ms; проверяется на --keywords (по умолчанию 10000).
+
+Использование:
+    python scripts/benchmark_media_library.py --keywords 10000 --posts 200
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+
+from shared.media.product_index import ProductIndex, DEFAULT_MAPPING_FILE, normalize_text
+
+
+SYLLABLES = [
+    "ко", "ла", "ген", "ме", "та", "буст", "дрейн", "эф", "фект", "оме", "га", "био",
+    "дрон", "слим", "энер", "вуд", "гри", "флеш", "лимф", "гьян", "ок", "ку", "ба",
+    "smart", "pro", "max", "vita", "derm", "lux", "nl", "care", "fit", "plus",
+]
+
+FILLER = (
+    "Сегодня расскажу, как я начала утро с правильного завтрака и почему это важно. "
+    "Многие спрашивают про энергию и сон, про то, как не сорваться вечером на сладкое. "
+    "Делюсь личным опытом и результатами за месяц, без волшебных таблеток и магии. "
+)
+
+
+def make_keywords(count: int, rng: random.Random):
+    """Синтетические ключевые слова (1-3 слова из слогов)"""
+    keywords = set()
+    while len(keywords) < count:
+        words = [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(rng.randint(1, 3))
+        ]
+        keywords.add(" ".join(words))
+    return sorted(keywords)
+
+
+def make_posts(keywords, count: int, rng: random.Random):
+    """Посты ~1000-1500 символов, в половине — 1-3 упоминания продуктов"""
+    posts = []
+    for _ in range(count):
+        parts = [FILLER * rng.randint(3, 5)]
+        if rng.random() < 0.5:
+            parts.extend(f"Попробуй {rng.choice(keywords)}!" for _ in range(rng.randint(1, 3)))
+        rng.shuffle(parts)
+        posts.append(" ".join(parts))
+    return posts
+
+
+def find_naive(rows, content: str):
+    """Прежний алгоритм find_in_text (без запроса к БД)"""
+    content_lower = content.lower()
+    matches = []
+    for normalized_keyword, priority, asset_id in rows:
+        if normalized_keyword in content_lower:
+            matches.append((len(normalized_keyword), priority, asset_id))
+    if not matches:
+        return None
+    matches.sort(reverse=True)
+    return matches[0][2]
+
+
+def measure(fn, posts):
+    """Времена вызовов, мс"""
+    timings = []
+    for post in posts:
+        start = time.perf_counter()
+        fn(post)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{name:<28} p50={statistics.median(timings):7.3f}ms  "
+        f"p95={p95:7.3f}ms  max={timings[-1]:7.3f}ms"
+    )
+    return p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска продуктов в тексте поста")
+    parser.add_argument("--keywords", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.remove()
+    rng = random.Random(args.seed)
+
+    keywords = make_keywords(args.keywords, rng)
+    # Строки media_keyword_index: (normalized_keyword, priority, asset_id)
+    rows = [(normalize_text(kw), len(kw), asset_id) for asset_id, kw in enumerate(keywords, start=1)]
+    assets = {asset_id: {"id": asset_id, "file_path": f"/photos/{asset_id}.jpg"} for _, _, asset_id in rows}
+    posts = make_posts(keywords, args.posts, rng)
+
+    start = time.perf_counter()
+    index = ProductIndex(mapping_file=DEFAULT_MAPPING_FILE)
+    index.load_mapping()
+    index.set_media_keywords((kw, priority, asset_id, "product") for kw, priority, asset_id in rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def find_indexed(content: str):
+        match = index.find(content, asset_type="product")
+        if match:
+            return assets.get(match.entry.asset_ids("product")[0])
+        return None
+
+    # Проверка эквивалентности выбора
+    mismatches = 0
+    for post in posts:
+        expected = find_naive(rows, post)
+        found = find_indexed(post)
+        if (found or {}).get("id") != expected:
+            mismatches += 1
+
+    print(f"Keywords: {len(rows)}, посты: {len(posts)}, средняя длина: "
+          f"{sum(map(len, posts)) // len(posts)} символов")
+    print(f"Построение индекса: {build_ms:.0f}ms (один раз при старте / после NOTIFY)")
+    if mismatches:
+        print(f"Расхождений в выборе asset: {mismatches} (разная нормализация спецсимволов)")
+
+    report("До (перебор строк)", measure(lambda p: find_naive(rows, p), posts))
+    p95 = report("После (автомат + снимок)", measure(find_indexed, posts))
+
+    verdict = "OK" if p95 < 20 else "ПРЕВЫШЕНО"
+    print(f"Цель < 20ms (p95): {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк классификации сообщений куратора
+
+Сравнивает стоимость обработки одного сообщения:
+- "до":    каждый компонент сам делает lower() и any(word in text ...)
+           по своим словарям (намерение, персона, воронка, ссылки)
+- "после": один проход автомата Ахо-Корасик (classify_message)
+
+Использование:
+    python scripts/benchmark_message_classifier.py --iterations 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from curator_bot.ai.message_features import (
+    INTENT_CATEGORY_KEYWORDS,
+    URGENCY_KEYWORDS,
+    PERSONA_MOOD_KEYWORDS,
+    FUNNEL_INTENT_MARKERS,
+    PAIN_MARKERS,
+    OBJECTION_MARKERS,
+    OBJECTION_TYPE_MARKERS,
+    TRUST_POSITIVE_MARKERS,
+    TRUST_NEGATIVE_MARKERS,
+    LINK_CATEGORY_KEYWORDS,
+    get_message_classifier,
+)
+
+
+SAMPLE_MESSAGES = [
+    "Привет!",
+    "Что такое MetaBoost и как его принимать?",
+    "Устала постоянно, нет сил к вечеру, что посоветуешь?",
+    "Это же пирамида, не верю я в ваш сетевой маркетинг",
+    "Сколько можно заработать если работать удалённо из дома?",
+    "Дорого, подумаю потом",
+    "Спасибо, очень интересно, расскажи подробнее про Energy Diet",
+    "Как оформить заказ и сколько стоит доставка в пункт выдачи?",
+    "Ребёнок часто болеет, есть что-то для детей для иммунитета?",
+    "Ура, получилось! Минус 5 кг за месяц, результат супер",
+    "Хочу узнать про маркетинг план и квалификации, как стать директором",
+    "Кожа сухая, появились морщины, какой крем с коллагеном лучше?",
+]
+
+
+def _first(groups, text):
+    for name, words in groups.items():
+        if any(word in text for word in words):
+            return name
+    return None
+
+
+def classify_naive(message: str):
+    """Прежняя схема: каждый компонент сканирует сообщение своими словарями"""
+    # CuratorChatEngine.analyze_user_intent
+    text = message.lower()
+    category = _first(INTENT_CATEGORY_KEYWORDS, text) or "other"
+    urgency = "high" if any(word in text for word in URGENCY_KEYWORDS) else "normal"
+
+    # CuratorChatEngine._get_adaptive_persona
+    text = message.lower()
+    mood = _first(PERSONA_MOOD_KEYWORDS, text) or "default"
+
+    # ConversationalFunnel.analyze_message
+    text = message.lower()
+    funnel_intent = _first(FUNNEL_INTENT_MARKERS, text) or "curious"
+    pains = tuple(pain for pain, words in PAIN_MARKERS.items() if any(word in text for word in words))
+    objection_type = None
+    is_objection = any(word in text for word in OBJECTION_MARKERS)
+    if is_objection:
+        objection_type = _first(OBJECTION_TYPE_MARKERS, text)
+    trust = message.lower()
+    trust_delta = 0
+    if any(word in trust for word in TRUST_POSITIVE_MARKERS):
+        trust_delta += 1
+    if any(word in trust for word in TRUST_NEGATIVE_MARKERS):
+        trust_delta -= 1
+
+    # referral_links.get_instant_link_for_query
+    text = message.lower()
+    link = _first(LINK_CATEGORY_KEYWORDS, text) or "general"
+
+    return category, urgency, mood, funnel_intent, pains, is_objection, objection_type, trust_delta, link
+
+
+def classify_single_pass(message: str):
+    """Новая схема: один проход автомата"""
+    f = get_message_classifier().classify(message)
+    return (
+        f.intent_category, f.urgency, f.persona_mood, f.funnel_intent, f.pains,
+        f.is_objection, f.objection_type, f.trust_delta, f.link_category
+    )
+
+
+def bench(fn, messages, iterations: int) -> float:
+    """Среднее время на сообщение, мкс"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(messages[i % len(messages)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк классификации сообщений куратора")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--long", action="store_true", help="Длинные сообщения (x5 текста)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    messages = list(SAMPLE_MESSAGES)
+    if args.long:
+        messages = [" ".join(random.sample(SAMPLE_MESSAGES, 5)) for _ in range(len(SAMPLE_MESSAGES))]
+
+    # Проверка эквивалентности
+    mismatches = [m for m in messages if classify_naive(m) != classify_single_pass(m)]
+    if mismatches:
+        print(f"ВНИМАНИЕ: расхождения на {len(mismatches)} сообщениях: {mismatches[:3]}")
+
+    classifier = get_message_classifier()
+    print(f"Шаблонов в автомате: {len(classifier.automaton)}")
+    print(f"Сообщений: {len(messages)}, итераций: {args.iterations}")
+
+    naive = bench(classify_naive, messages, args.iterations)
+    single = bench(classify_single_pass, messages, args.iterations)
+
+    print(f"До (any() по каждому словарю):  {naive:8.1f} мкс/сообщение")
+    print(f"После (один проход автомата):   {single:8.1f} мкс/сообщение")
+    print(f"Ускорение: x{naive / single:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное сравнение приёма апдейтов: long polling и webhook
+
+Поднимает локальную заглушку Bot API (getMe, getUpdates, sendMessage с
+настраиваемой сетевой задержкой) и прогоняет одинаковый поток апдейтов
+через aiogram Dispatcher в двух режимах:
+- polling: dp.start_polling забирает апдейты из заглушки пачками getUpdates;
+- webhook: WebhookServer, апдейты присылаются POST-запросами, как это делает
+           Telegram (до --connections соединений параллельно).
+
+Обработчик имитирует работу бота: await asyncio.sleep(--work) и ответ
+sendMessage в заглушку. Для каждого режима печатается пропускная способность
+(обработанных апдейтов/сек) и задержка от появления апдейта до начала
+обработчика.
+
+Использование:
+    python scripts/benchmark_webhook.py --updates 5000 --rtt 40 --rate 1000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import ClientSession, TCPConnector, web
+
+from shared.webhook.server import SECRET_HEADER, WebhookServer
+
+
+TOKEN = "42:BENCHMARK"
+
+
+def make_update(update_id: int, users: int) -> dict:
+    user_id = 1000 + update_id % users
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": f"msg {update_id}",
+        },
+    }
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: очередь для getUpdates, задержка сети на каждый вызов"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.queue: List[dict] = []
+        self.arrived = asyncio.Event()
+        self.sent_messages = 0
+        self.get_updates_calls = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    def push(self, update: dict):
+        self.queue.append(update)
+        self.arrived.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        await asyncio.sleep(self.rtt / 2)  # запрос идёт до Bot API
+
+        if method == "getme":
+            result = {"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getupdates":
+            result = await self._get_updates(int(form.get("offset", 0)), float(form.get("timeout", 0)))
+        elif method == "sendmessage":
+            self.sent_messages += 1
+            chat_id = int(form["chat_id"])
+            result = {
+                "message_id": self.sent_messages,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": form.get("text", ""),
+            }
+        else:
+            result = True
+        await asyncio.sleep(self.rtt / 2)  # ответ идёт обратно
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, offset: int, timeout: float) -> List[dict]:
+        self.get_updates_calls += 1
+        self.queue = [u for u in self.queue if u["update_id"] >= offset]
+        if not self.queue and timeout:
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.queue[:100]
+
+
+class Measurement:
+    """Время появления апдейта и начала его обработки"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.created: Dict[int, float] = {}
+        self.started: Dict[int, float] = {}
+        self.finished = 0
+        self.done = asyncio.Event()
+
+    def summary(self, mode: str, elapsed: float) -> dict:
+        latencies = sorted((self.started[i] - self.created[i]) * 1000 for i in self.started)
+        return {
+            "mode": mode,
+            "handled": self.finished,
+            "throughput": round(self.finished / elapsed, 1),
+            "latency_p50_ms": round(statistics.median(latencies), 1),
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        }
+
+
+def make_dispatcher(measurement: Measurement, work: float) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        measurement.started[message.message_id] = time.perf_counter()
+        await asyncio.sleep(work)
+        await message.answer("ok")
+        measurement.finished += 1
+        if measurement.finished >= measurement.total:
+            measurement.done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def produce(measurement: Measurement, rate: float, users: int, deliver):
+    """Выдаёт апдейты с частотой rate/сек (0 — все сразу)"""
+    for update_id in range(1, measurement.total + 1):
+        measurement.created[update_id] = time.perf_counter()
+        await deliver(make_update(update_id, users))
+        if rate:
+            await asyncio.sleep(1 / rate)
+
+
+async def bench_polling(args, api_url: str, api: FakeBotAPI) -> dict:
+    measurement = Measurement(args.updates)
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = make_dispatcher(measurement, args.work)
+
+    async def deliver(update):
+        api.push(update)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    started = time.perf_counter()
+    await produce(measurement, args.rate, args.users, deliver)
+    await asyncio.wait_for(measurement.done.wait(), args.timeout)
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    result = measurement.summary("polling", elapsed)
+    result["api_calls"] = api.get_updates_calls
+    return result
+
+
+async def bench_webhook(args, api_url: str) -> dict:
+    measurement = Measurement(args.updates)
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = make_dispatcher(measurement, args.work)
+
+    server = WebhookServer(host="127.0.0.1", port=args.port + 1, base_url="http://127.0.0.1", secret="bench")
+    server.register("bench", bot, dp)
+    await server.start()
+
+    url = f"http://127.0.0.1:{server.port}{server.path}/bench"
+    headers = {SECRET_HEADER: server.bot_secret("bench"), "Content-Type": "application/json"}
+    # Telegram держит до max_connections соединений и шлёт апдейты каждого чата по порядку
+    connections = asyncio.Semaphore(args.connections)
+    inflight = set()
+
+    async with ClientSession(connector=TCPConnector(limit=args.connections)) as http:
+        async def send(update):
+            async with connections:
+                await asyncio.sleep(args.rtt / 2000)  # путь от Telegram до сервера (половина RTT)
+                async with http.post(url, data=json.dumps(update), headers=headers) as response:
+                    assert response.status == 200
+                await asyncio.sleep(args.rtt / 2000)  # ответ 200 идёт обратно, соединение занято
+
+        async def deliver(update):
+            task = asyncio.create_task(send(update))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+        started = time.perf_counter()
+        await produce(measurement, args.rate, args.users, deliver)
+        await asyncio.wait_for(measurement.done.wait(), args.timeout)
+        elapsed = time.perf_counter() - started
+
+    await server.stop()
+    await bot.session.close()
+    result = measurement.summary("webhook", elapsed)
+    result["api_calls"] = server.get_stats()["received"]
+    return result
+
+
+async def run(args):
+    api = FakeBotAPI(rtt=args.rtt / 1000)
+    api_runner = await start_site(api.create_app(), args.port)
+    api_url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = [await bench_polling(args, api_url, api), await bench_webhook(args, api_url)]
+    finally:
+        await api_runner.cleanup()
+
+    print(f"\nUpdates: {args.updates}, rate: {args.rate or 'burst'}/s, RTT: {args.rtt} ms, "
+          f"handler: {args.work * 1000:.0f} ms, users: {args.users}")
+    print(f"{'mode':<10}{'handled':>9}{'upd/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'requests':>10}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['handled']:>9}{r['throughput']:>10}{r['latency_p50_ms']:>10}"
+              f"{r['latency_p95_ms']:>10}{r['api_calls']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение polling и webhook на заглушке Bot API")
+    parser.add_argument("--updates", type=int, default=3000, help="Сколько апдейтов прогнать")
+    parser.add_argument("--rate", type=float, default=0, help="Апдейтов в секунду (0 — все сразу)")
+    parser.add_argument("--rtt", type=float, default=40.0, help="Задержка сети до Bot API, мс")
+    parser.add_argument("--work", type=float, default=0.02, help="Время работы обработчика, сек")
+    parser.add_argument("--users", type=int, default=500, help="Сколько разных пользователей")
+    parser.add_argument("--connections", type=int, default=40, help="Параллельных соединений webhook")
+    parser.add_argument("--port", type=int, default=8091, help="Порт заглушки (webhook — порт + 1)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Предел ожидания прогона, сек")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
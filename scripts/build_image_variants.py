@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Построение вариантов изображений для Telegram
+
+Для каждого фото в content/unified_products и content/testimonials
+строит (только для новых/изменённых файлов):
+- tg       JPEG, до 1280px
+- webp     WebP, до 1280px
+- tg_wm    JPEG, до 1280px, с водяным знаком
+- tg_logo  JPEG, до 1280px, с логотипом (если есть content/resources/logo.png)
+
+Варианты лежат рядом с оригиналом в .variants/ и привязаны к хешу файла.
+С --update-db ссылки записываются в content_media_assets.variants.
+
+Использование:
+    python scripts/build_image_variants.py
+    python scripts/build_image_variants.py --force --update-db
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+
+from shared.media.image_variants import ImageVariantStore
+
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_ROOTS = [
+    PROJECT_ROOT / "content" / "unified_products",
+    PROJECT_ROOT / "content" / "testimonials",
+]
+
+
+def print_report(root: Path, report, elapsed: float):
+    mb = 1024 * 1024
+    print(f"\n{root}")
+    print(f"  Файлов: {report.sources}, построено: {report.built}, актуальны: {report.skipped}, "
+          f"ошибок: {report.errors} ({elapsed:.1f}s)")
+    if not report.sources:
+        return
+    print(f"  Оригиналы: {report.source_bytes / mb:.1f} МБ")
+    for name, size in sorted(report.variant_bytes.items()):
+        print(f"  {name:<8} {size / mb:.1f} МБ ({report.saved_percent(name):.0f}% меньше)")
+
+
+async def update_db(stores):
+    """Записывает пути вариантов в content_media_assets.variants"""
+    from sqlalchemy import select
+    from content_manager_bot.database.models import MediaAsset
+    from shared.database.base import AsyncSessionLocal
+
+    updated = 0
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(MediaAsset).where(MediaAsset.file_path.isnot(None)))
+        for asset in result.scalars():
+            for store in stores:
+                variants = store.variants_for(asset.file_path)
+                if variants:
+                    if (asset.variants or {}) != variants:
+                        asset.variants = variants
+                        updated += 1
+                    break
+        await session.commit()
+    print(f"\nMediaAsset.variants обновлено: {updated}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Варианты изображений для Telegram")
+    parser.add_argument("--root", action="append", type=Path, help="Каталог с изображениями (можно несколько)")
+    parser.add_argument("--force", action="store_true", help="Перестроить все варианты")
+    parser.add_argument("--update-db", action="store_true", help="Записать пути в content_media_assets")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    stores = []
+    for root in args.root or DEFAULT_ROOTS:
+        if not root.exists():
+            print(f"Пропуск: {root} не найден")
+            continue
+        store = ImageVariantStore(root)
+        store.load()
+        start = time.perf_counter()
+        report = store.build(force=args.force)
+        print_report(root, report, time.perf_counter() - start)
+        stores.append(store)
+
+    if args.update_db:
+        asyncio.run(update_db(stores))
+
+
+if __name__ == "__main__":
+    main()
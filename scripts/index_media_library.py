@@ -8,6 +8,8 @@
 3. Создаёт записи MediaAsset в БД
 4. Парсит full_products_mapping.json
 5. Создаёт индекс keywords в media_keyword_index
+   (перед этим строит варианты фото для Telegram — shared/media/image_variants.py)
+6. Отправляет NOTIFY media_index_changed — боты перезагружают индекс без рестарта
 
 Использование:
     python scripts/index_media_library.py
@@ -33,6 +35,8 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from content_manager_bot.database.models import MediaAsset, MediaKeywordIndex
+from shared.media.media_library import notify_media_index_changed
+from shared.media.image_variants import VARIANTS_DIR, get_variant_store
 from shared.database.base import AsyncSessionLocal, engine, Base
 
 logging.basicConfig(
@@ -113,6 +117,10 @@ class MediaIndexer:
             if file_path.suffix.lower() not in extensions:
                 continue
 
+            # Подготовленные варианты (.variants) — не отдельные ресурсы
+            if VARIANTS_DIR in file_path.relative_to(self.base_path).parts:
+                continue
+
             if file_path.is_file():
                 self.stats["files_scanned"] += 1
 
@@ -168,7 +176,8 @@ class MediaIndexer:
         file_hash: str,
         category: str,
         product: str,
-        keywords: List[str]
+        keywords: List[str],
+        variants: Optional[Dict[str, str]] = None
     ) -> Optional[int]:
         """
         Создаёт или обновляет MediaAsset
@@ -198,6 +207,10 @@ class MediaIndexer:
                 self.stats["assets_updated"] += 1
                 logger.debug(f"Обновлён asset {existing.id}: добавлено {len(new_kw - existing_kw)} keywords")
 
+            if variants is not None and (existing.variants or {}) != variants:
+                existing.variants = variants
+                self.stats["assets_updated"] += 1
+
             self.hash_to_asset[file_hash] = existing.id
             return existing.id
 
@@ -215,7 +228,8 @@ class MediaIndexer:
             keywords=keywords,
             nl_products=[product] if product != "unknown" else [],
             description=f"Фото продукта {product}",
-            usage_count=0
+            usage_count=0,
+            variants=variants or {}
         )
 
         session.add(asset)
@@ -287,6 +301,16 @@ class MediaIndexer:
         # 2. Загрузка маппинга keywords
         folder_to_keywords = self.load_keywords_mapping()
 
+        # 2.1 Варианты для Telegram (только новые/изменённые файлы)
+        variant_store = None
+        if not self.dry_run:
+            variant_store = get_variant_store(self.base_path)
+            report = variant_store.build(force=force)
+            logger.info(
+                f"✓ Варианты изображений: построено {report.built}, актуальны {report.skipped}, "
+                f"экономия tg {report.saved_percent('tg'):.0f}%"
+            )
+
         # 3. Создание/обновление БД
         async with AsyncSessionLocal() as session:
             # Удаление старых записей (если force)
@@ -312,8 +336,9 @@ class MediaIndexer:
                     keywords = [product.replace("_", " ")]
 
                 # Создаём/обновляем asset
+                variants = variant_store.variants_for(file_path) if variant_store else None
                 asset_id = await self.create_or_update_asset(
-                    session, file_path, file_hash, category, product, keywords
+                    session, file_path, file_hash, category, product, keywords, variants
                 )
 
                 # Создаём индекс keywords
@@ -325,9 +350,16 @@ class MediaIndexer:
                     await session.commit()
                     logger.info(f"  Checkpoint: {self.stats['assets_created']} assets созданы...")
 
-            # Финальный commit
+            # Финальный commit (+ NOTIFY ботам, чтобы перезагрузили индекс без рестарта)
             if not self.dry_run:
+                changed = force or any(
+                    self.stats[key] for key in ("assets_created", "assets_updated", "keywords_created")
+                )
+                if changed:
+                    await notify_media_index_changed(session, payload="force" if force else "update")
                 await session.commit()
+                if changed:
+                    logger.info("✓ Боты уведомлены об изменении индекса (NOTIFY)")
 
         # 4. Вывод статистики
         logger.info("=" * 70)
@@ -0,0 +1,31 @@
+-- =====================================================
+-- Миграция 004: Учёт использования LLM
+-- Дата: 2026-10-18
+-- Описание: Таблица llm_usage — токены, задержки, провайдер и модель
+--          по каждому вызову AI, со связью с сообщением или постом
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id SERIAL PRIMARY KEY,
+    provider VARCHAR(30) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    purpose VARCHAR(50) NOT NULL,
+    post_type VARCHAR(50),
+    user_id INTEGER,
+    conversation_message_id INTEGER,
+    post_id INTEGER,
+    input_tokens INTEGER DEFAULT 0,
+    output_tokens INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    wall_ms INTEGER DEFAULT 0,
+    ttft_ms INTEGER,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created ON llm_usage(created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_purpose_created ON llm_usage(purpose, created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_message ON llm_usage(conversation_message_id);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_post ON llm_usage(post_id);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_user ON llm_usage(user_id);
+
+COMMENT ON TABLE llm_usage IS 'Использование LLM по каждому вызову (токены, задержки)';
@@ -0,0 +1,19 @@
+-- =====================================================
+-- Миграция 005: Индексы для выбора testimonials
+-- Дата: 2026-10-19
+-- Описание: Случайный выбор чеков идёт в памяти (TestimonialSampler),
+--          в SQL остаются загрузка testimonials и фильтры по тегам.
+--          Частичный GIN (jsonb_path_ops) по tags только для testimonials
+--          меньше общего idx_media_tags и быстрее для оператора @>
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_media_testimonial_tags
+ON content_media_assets USING GIN (tags jsonb_path_ops)
+WHERE asset_type = 'testimonial';
+
+-- Загрузка сэмплера и фильтр по категории
+CREATE INDEX IF NOT EXISTS idx_media_testimonial_category
+ON content_media_assets(category, usage_count)
+WHERE asset_type = 'testimonial';
+
+COMMENT ON INDEX idx_media_testimonial_tags IS 'tags @> [...] для testimonials (jsonb_path_ops)';
@@ -0,0 +1,20 @@
+-- =====================================================
+-- Миграция 006: Реестр Telegram file_id
+-- Дата: 2026-10-19
+-- Описание: file_id, полученный при первой загрузке файла ботом,
+--          переиспользуется при следующих отправках того же файла
+--          (фото продуктов куратора, картинки постов контент-менеджера)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS telegram_file_ids (
+    id SERIAL PRIMARY KEY,
+    bot_id BIGINT NOT NULL,
+    file_hash VARCHAR(64) NOT NULL,
+    file_id VARCHAR(200) NOT NULL,
+    file_size INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_telegram_file_ids_bot_hash ON telegram_file_ids(bot_id, file_hash);
+
+COMMENT ON TABLE telegram_file_ids IS 'file_id загруженных в Telegram файлов по (бот, SHA256 файла)';
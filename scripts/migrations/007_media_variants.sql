@@ -0,0 +1,11 @@
+-- =====================================================
+-- Миграция 007: Варианты изображений для Telegram
+-- Дата: 2026-10-19
+-- Описание: Ссылки на подготовленные копии фото (1280px, JPEG/WebP,
+--          с водяным знаком/логотипом) — shared/media/image_variants.py
+-- =====================================================
+
+ALTER TABLE content_media_assets
+ADD COLUMN IF NOT EXISTS variants JSONB DEFAULT '{}';
+
+COMMENT ON COLUMN content_media_assets.variants IS 'Варианты для Telegram {"tg": path, "webp": path, "tg_wm": path}';
@@ -0,0 +1,17 @@
+-- =====================================================
+-- Миграция 008: Контексты диалоговой воронки
+-- Дата: 2026-10-19
+-- Описание: состояние ConversationalFunnel (этап, боли, доверие)
+--          переживает деплой и общее для нескольких экземпляров куратора
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS funnel_contexts (
+    telegram_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Для очистки давно неактивных контекстов
+CREATE INDEX IF NOT EXISTS idx_funnel_contexts_updated_at ON funnel_contexts(updated_at);
+
+COMMENT ON TABLE funnel_contexts IS 'Контексты диалоговой воронки куратора по telegram_id (JSON из FunnelContextStore)';
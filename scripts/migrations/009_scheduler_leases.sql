@@ -0,0 +1,17 @@
+-- =====================================================
+-- Миграция 009: Держатели периодических задач
+-- Дата: 2026-10-19
+-- Описание: планировщики куратора выполняются одним экземпляром
+--          (advisory-блокировка Postgres); таблица показывает, кто
+--          держит какую задачу и когда был последний heartbeat
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    job VARCHAR(100) PRIMARY KEY,
+    holder VARCHAR(200) NOT NULL,
+    lock_key BIGINT NOT NULL,
+    acquired_at TIMESTAMPTZ NOT NULL,
+    heartbeat_at TIMESTAMPTZ NOT NULL
+);
+
+COMMENT ON TABLE scheduler_leases IS 'Какой экземпляр выполняет периодическую задачу (витрина LeaderElection)';
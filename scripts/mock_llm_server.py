@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка AI провайдеров (YandexGPT, Claude, GigaChat)
+
+Позволяет нагрузочно тестировать куратора без расхода квот:
+задержки, скорость токенов, ошибки и 429 настраиваются флагами.
+
+Использование:
+    python scripts/mock_llm_server.py --port 8089 --latency lognormal:6.0,0.5 --tps 60
+
+    # Переменные окружения для ботов (включая тестовый ключ сервисного аккаунта):
+    python scripts/mock_llm_server.py --print-env >> .env.mock
+
+Флаги:
+    --latency      Распределение задержки до первого токена, мс
+                   (fixed:300 | uniform:100,800 | normal:500,100 | lognormal:6.0,0.5)
+    --tps          Скорость генерации, токенов/сек (0 — мгновенно)
+    --error-rate   Доля ответов 500
+    --429-rate     Доля ответов 429
+    --responses    JSON-файл со списком готовых ответов
+    --print-env    Вывести настройки для .env и выйти
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from shared.ai_clients.mock_server import MockLLMServer, MockLLMConfig, parse_latency
+
+
+def print_env(host: str, port: int):
+    """Печатает переменные окружения, направляющие клиентов на заглушку"""
+    # Заглушка не проверяет подпись JWT, но клиенту нужен настоящий RSA ключ для PS256
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode().replace("\n", "\\n")
+
+    base = f"http://{host}:{port}"
+    print(f"ANTHROPIC_BASE_URL={base}")
+    print("ANTHROPIC_API_KEY=mock-key")
+    print(f"YANDEX_LLM_BASE_URL={base}/foundationModels/v1")
+    print(f"YANDEX_IAM_URL={base}/iam/v1/tokens")
+    print("YANDEX_SERVICE_ACCOUNT_ID=mock-sa")
+    print("YANDEX_KEY_ID=mock-key-id")
+    print("YANDEX_FOLDER_ID=mock-folder")
+    print(f'YANDEX_PRIVATE_KEY="{pem}"')
+    print(f"GIGACHAT_BASE_URL={base}/api/v1")
+    print(f"GIGACHAT_OAUTH_URL={base}/api/v2/oauth")
+    print("GIGACHAT_AUTH_TOKEN=bW9jazptb2Nr")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка AI провайдеров")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:6.0,0.5", help="Задержка до первого токена, мс")
+    parser.add_argument("--tps", type=float, default=60.0, help="Токенов в секунду")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--429-rate", dest="rate_limit_rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--responses", type=Path, help="JSON-файл со списком ответов")
+    parser.add_argument("--seed", type=int, help="Seed генератора случайных чисел")
+    parser.add_argument("--print-env", action="store_true", help="Вывести настройки для .env")
+    args = parser.parse_args()
+
+    if args.print_env:
+        print_env(args.host, args.port)
+        return
+
+    parse_latency(args.latency)  # Проверяем формат до запуска
+
+    config = MockLLMConfig(
+        latency=args.latency,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+    if args.responses:
+        config.responses = json.loads(args.responses.read_text(encoding="utf-8"))
+
+    server = MockLLMServer(config)
+    print(f"Mock LLM server on http://{args.host}:{args.port} (latency={args.latency}, tps={args.tps})")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
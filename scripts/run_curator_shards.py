@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Запуск шардированного куратора на одной машине
+
+Поднимает шард-роутер (webhook Telegram на --port) и N воркеров куратора
+отдельными процессами (BOT_MODE=shard_worker, порты --port+1 … --port+N).
+Роутер раскладывает апдейты по воркерам консистентным хешем telegram_id,
+воркеры регистрируются у него heartbeat'ами. Упавший воркер перезапускается,
+его пользователи на это время переезжают к остальным.
+
+Планировщики напоминаний и онбординга выполняет один воркер — лидер
+(advisory-блокировка Postgres); при его падении задачи подхватывает другой.
+
+Использование:
+    # WEBHOOK_BASE_URL — публичный https-адрес, который смотрит на --port
+    python scripts/run_curator_shards.py --workers 4 --port 8080
+
+    # Без регистрации webhook в Telegram (локальная отладка)
+    python scripts/run_curator_shards.py --workers 2 --no-set-webhook
+
+Статус кольца: GET http://127.0.0.1:<port>/shards
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import signal
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiogram import Bot
+from aiohttp import web
+from loguru import logger
+
+from shared.config.settings import settings
+from shared.webhook.shard_router import ShardRouter
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Типы апдейтов, на которые подписаны обработчики куратора
+CURATOR_UPDATE_TYPES = ["message", "callback_query"]
+
+
+class WorkerProcess:
+    """Процесс воркера с перезапуском при падении"""
+
+    def __init__(self, index: int, port: int, env: Dict[str, str], restart_delay: float = 2.0):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.restart_delay = restart_delay
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+        self._stopping = False
+
+    @property
+    def name(self) -> str:
+        return f"curator-{self.index}"
+
+    async def run(self):
+        while not self._stopping:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "curator_bot.main", cwd=str(PROJECT_ROOT), env=self.env
+            )
+            logger.info(f"{self.name} started (pid {self.process.pid}, port {self.port})")
+            code = await self.process.wait()
+            if self._stopping:
+                break
+            self.restarts += 1
+            logger.warning(f"{self.name} exited with code {code}, restarting in {self.restart_delay}s")
+            await asyncio.sleep(self.restart_delay)
+
+    async def stop(self, timeout: float = 30.0):
+        """SIGTERM (воркер уходит из кольца и сохраняет состояние), затем SIGKILL"""
+        self._stopping = True
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name} did not stop in {timeout}s, killing")
+            self.process.kill()
+            await self.process.wait()
+
+
+def worker_env(index: int, port: int, router_port: int, secret: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "BOT_MODE": "shard_worker",
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(port),
+        "WEBHOOK_SECRET": secret,
+        "SHARD_ID": f"curator-{index}",
+        "SHARD_WORKER_URL": f"http://127.0.0.1:{port}",
+        "SHARD_ROUTER_URL": f"http://127.0.0.1:{router_port}",
+        "PYTHONPATH": str(PROJECT_ROOT),
+    })
+    return env
+
+
+async def set_webhook(router: ShardRouter):
+    if not settings.webhook_base_url:
+        logger.warning("WEBHOOK_BASE_URL is not set, Telegram webhook is not registered")
+        return
+    url = f"{settings.webhook_base_url.rstrip('/')}{router.path}/{router.bot_name}"
+    bot = Bot(settings.curator_bot_token)
+    try:
+        await bot.set_webhook(url=url, secret_token=router.bot_secret, allowed_updates=CURATOR_UPDATE_TYPES)
+        logger.info(f"Webhook set to {url}")
+    finally:
+        await bot.session.close()
+
+
+async def run(args):
+    # Общий секрет: им подписаны апдейты Telegram, пересылка воркерам и heartbeat
+    secret = settings.webhook_secret or secrets.token_hex(32)
+    router = ShardRouter(secret=secret, path=settings.webhook_path, heartbeat_ttl=settings.shard_heartbeat_ttl)
+
+    runner = web.AppRunner(router.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logger.info(f"Shard router on {args.host}:{args.port}, {args.workers} workers")
+
+    workers = [
+        WorkerProcess(i, args.port + 1 + i, worker_env(i, args.port + 1 + i, args.port, secret))
+        for i in range(args.workers)
+    ]
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        if args.set_webhook:
+            await set_webhook(router)
+        await stop.wait()
+    finally:
+        logger.info("Stopping workers...")
+        await asyncio.gather(*(worker.stop() for worker in workers))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Router: {router.get_stats()}")
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Шард-роутер и воркеры куратора на одной машине")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Сколько воркеров запустить")
+    parser.add_argument("--host", default=settings.webhook_host, help="Адрес роутера")
+    parser.add_argument("--port", type=int, default=settings.webhook_port, help="Порт роутера (воркеры — следующие)")
+    parser.add_argument("--no-set-webhook", dest="set_webhook", action="store_false",
+                        help="Не регистрировать webhook в Telegram")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
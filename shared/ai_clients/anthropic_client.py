@@ -6,6 +6,12 @@ from anthropic import AsyncAnthropic
 from loguru import logger
 
 from shared.config.settings import settings
+from shared.ai_clients.usage import LLMUsage, UsageTimer, record_usage
+from shared.utils.single_flight import SingleFlight, make_key
+
+
+# Одинаковые одновременные запросы к claude выполняются один раз
+_flight = SingleFlight("claude")
 
 
 class AnthropicClient:
@@ -52,6 +58,21 @@ class AnthropicClient:
         Returns:
             str: Ответ от AI
         """
+        key = make_key(self.model, system_prompt, user_message, context, temperature, max_tokens)
+        return await _flight.do(
+            key,
+            lambda: self._generate_response(system_prompt, user_message, context, temperature, max_tokens)
+        )
+
+    async def _generate_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        """Выполняет запрос к API (одинаковые одновременные вызовы объединяет generate_response)"""
         try:
             messages = []
 
@@ -64,16 +85,29 @@ class AnthropicClient:
 
             logger.debug(f"Sending request to Claude with {len(messages)} messages")
 
-            # Отправляем запрос
-            response = await self.client.messages.create(
+            # Отправляем запрос стримингом, чтобы замерить время до первого токена
+            timer = UsageTimer()
+            async with self.client.messages.stream(
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 system=system_prompt,
                 messages=messages
-            )
+            ) as stream:
+                async for _ in stream.text_stream:
+                    timer.mark_first_token()
+                response = await stream.get_final_message()
 
             answer = response.content[0].text
+            record_usage(LLMUsage(
+                provider="claude",
+                model=self.model,
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens,
+                cached_tokens=getattr(response.usage, "cache_read_input_tokens", None) or 0,
+                wall_ms=timer.wall_ms,
+                ttft_ms=timer.ttft_ms
+            ))
             logger.info(f"Response generated successfully (tokens: input={response.usage.input_tokens}, output={response.usage.output_tokens})")
 
             return answer
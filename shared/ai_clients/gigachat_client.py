@@ -1,11 +1,20 @@
 """
 Клиент для работы с GigaChat API (Сбер)
 """
+import hashlib
+import time
 from typing import List, Dict, Optional
 import httpx
 from loguru import logger
 
 from shared.config.settings import settings
+from shared.ai_clients.usage import LLMUsage, UsageTimer, record_usage
+from shared.utils.single_flight import SingleFlight, make_key
+from shared.ai_clients.token_manager import AuthToken, get_token_manager
+
+
+# Одинаковые одновременные запросы к gigachat выполняются один раз
+_flight = SingleFlight("gigachat")
 
 
 class GigaChatClient:
@@ -21,23 +30,23 @@ class GigaChatClient:
         """
         self.auth_token = auth_token or settings.gigachat_auth_token
         self.model = model or "GigaChat"
-        self.base_url = "https://gigachat.devices.sberbank.ru/api/v1"
-        self.access_token = None
+        self.base_url = settings.gigachat_base_url
+        self.oauth_url = settings.gigachat_oauth_url
+        # Ключ кэша — хэш учётных данных, а не сами данные
+        credentials_hash = hashlib.sha256((self.auth_token or "").encode()).hexdigest()[:12]
+        self.token_manager = get_token_manager(f"gigachat:{credentials_hash}", self._fetch_access_token)
         logger.info(f"GigaChat client initialized with model: {self.model}")
 
-    async def _get_access_token(self, force_refresh: bool = False) -> str:
+    async def _fetch_access_token(self) -> AuthToken:
         """
-        Получение access токена через OAuth
+        Получение access токена через OAuth (вызывается TokenManager'ом)
 
-        Args:
-            force_refresh: Принудительно обновить токен (при 401 ошибке)
+        Returns:
+            AuthToken: Токен и время его истечения
         """
-        if self.access_token and not force_refresh:
-            return self.access_token
-
         async with httpx.AsyncClient(verify=False) as client:
             response = await client.post(
-                "https://ngw.devices.sberbank.ru:9443/api/v2/oauth",
+                self.oauth_url,
                 headers={
                     "Authorization": f"Basic {self.auth_token}",
                     "RqUID": "6f0b1291-c7f3-43c6-bb2e-9f3efb2dc98e",
@@ -46,9 +55,25 @@ class GigaChatClient:
                 data={"scope": "GIGACHAT_API_PERS"}
             )
             response.raise_for_status()
-            self.access_token = response.json()["access_token"]
-            logger.info("GigaChat access token obtained" + (" (refreshed)" if force_refresh else ""))
-            return self.access_token
+            result = response.json()
+
+        # expires_at в миллисекундах; токен живёт 30 минут
+        expires_at = result.get("expires_at")
+        expires_at = expires_at / 1000 if expires_at else time.time() + 30 * 60
+        return AuthToken(value=result["access_token"], expires_at=expires_at)
+
+    async def _get_access_token(self, force_refresh: bool = False) -> str:
+        """
+        Получение access токена
+
+        Токен обновляется в фоне заранее, поэтому обычно возвращается сразу.
+
+        Args:
+            force_refresh: Принудительно обновить токен (при 401 ошибке)
+        """
+        if force_refresh:
+            return (await self.token_manager.refresh()).value
+        return await self.token_manager.get_token()
 
     async def generate_response(
         self,
@@ -71,10 +96,26 @@ class GigaChatClient:
         Returns:
             str: Ответ от AI
         """
+        key = make_key(self.model, system_prompt, user_message, context, temperature, max_tokens)
+        return await _flight.do(
+            key,
+            lambda: self._generate_response(system_prompt, user_message, context, temperature, max_tokens)
+        )
+
+    async def _generate_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        """Выполняет запрос к API (одинаковые одновременные вызовы объединяет generate_response)"""
         # Retry при истечении токена
         for attempt in range(2):
+            access_token = None
             try:
-                access_token = await self._get_access_token(force_refresh=(attempt > 0))
+                access_token = await self._get_access_token()
 
                 messages = []
 
@@ -90,6 +131,7 @@ class GigaChatClient:
 
                 logger.debug(f"Sending request to GigaChat with {len(messages)} messages")
 
+                timer = UsageTimer()
                 async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
                     response = await client.post(
                         f"{self.base_url}/chat/completions",
@@ -108,13 +150,23 @@ class GigaChatClient:
                     # Если 401 - токен истёк, пробуем обновить
                     if response.status_code == 401 and attempt == 0:
                         logger.warning("GigaChat token expired, refreshing...")
-                        self.access_token = None  # Сбрасываем токен
+                        self.token_manager.invalidate(access_token)
                         continue
 
                     response.raise_for_status()
                     result = response.json()
 
                 answer = result["choices"][0]["message"]["content"]
+
+                usage = result.get("usage", {})
+                record_usage(LLMUsage(
+                    provider="gigachat",
+                    model=self.model,
+                    input_tokens=usage.get("prompt_tokens", 0),
+                    output_tokens=usage.get("completion_tokens", 0),
+                    cached_tokens=usage.get("precached_prompt_tokens", 0),
+                    wall_ms=timer.wall_ms
+                ))
                 logger.info(f"Response generated successfully from GigaChat")
 
                 return answer
@@ -122,7 +174,7 @@ class GigaChatClient:
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 401 and attempt == 0:
                     logger.warning("GigaChat token expired (HTTPStatusError), refreshing...")
-                    self.access_token = None
+                    self.token_manager.invalidate(access_token)
                     continue
                 logger.error(f"Error calling GigaChat API: {e}")
                 raise
@@ -14,6 +14,52 @@ from pathlib import Path
 from typing import Optional
 from loguru import logger
 
+from shared.media.product_index import get_product_index
+
+
+# Папка продукта в unified_products (самый длинный подходящий префикс) → ID продукта в базе референсов
+FOLDER_TO_REFERENCE_ID = {
+    "energy_diet/ed_smart": "energy_diet_smart",
+    "energy_diet": "energy_diet",
+    "greenflash/draineffect": "draineffect",
+    "greenflash": "greenflash",
+    "collagen": "collagen",
+    "3d_slim": "3d_slim",
+    "omega": "omega",
+    "biodrone": "biodrone",
+    "enerwood": "enerwood",
+    "occuba": "occuba",
+    "beloved": "beloved",
+    "nlka": "baby_food",
+    "sport": "sport",
+}
+
+# Ключевые слова → ID референса, если единый индекс продуктов ничего не нашёл
+# (разговорные названия, категории и продукты без папки в unified_products)
+REFERENCE_KEYWORDS = {
+    'energy_diet': ['energy diet', 'энерджи дайет', 'энерджи диет', 'ed '],
+    'energy_diet_smart': ['ed smart', 'smart', 'смарт'],
+    'energy_diet_hd': ['ed hd', 'hd', 'хд'],
+    'greenflash': ['greenflash', 'green flash', 'грин флеш', 'гринфлеш'],
+    'collagen': ['collagen', 'коллаген'],
+    'draineffect': ['draineffect', 'drain effect', 'драйн', 'дрейн'],
+    '3d_slim': ['3d slim', '3д слим', 'слим'],
+    'omega': ['omega', 'омега'],
+    'biodrone': ['biodrone', 'биодрон'],
+    'enerwood': ['enerwood', 'энервуд', 'чай'],
+    'occuba': ['occuba', 'оккуба', 'косметика'],
+    'beloved': ['be loved', 'белавед', 'би лавед'],
+    'baby_food': ['детское', 'baby', 'малыш', 'ребёнок', 'для детей'],
+    'sport': ['протеин', 'protein', 'спорт', 'sport', 'гейнер', 'bcaa'],
+}
+
+# Сначала более специфичные ("ed hd" раньше "ed ")
+_REFERENCE_KEYWORDS_BY_LENGTH = sorted(
+    ((keyword, product_id) for product_id, keywords in REFERENCE_KEYWORDS.items() for keyword in keywords),
+    key=lambda item: len(item[0]),
+    reverse=True
+)
+
 
 class ImageReferenceService:
     """Сервис для работы с референсными изображениями"""
@@ -162,30 +208,21 @@ class ImageReferenceService:
         Returns:
             ID продукта или None
         """
+        # Упоминание ищем в едином индексе продуктов, затем переводим папку в ID референса
+        for match in get_product_index().find_all(text):
+            if not match.folder:
+                continue
+            folder = match.folder
+            while folder:
+                if folder in FOLDER_TO_REFERENCE_ID:
+                    return FOLDER_TO_REFERENCE_ID[folder]
+                folder = folder.rpartition("/")[0]
+
+        # Разговорные названия и категории, которых нет в индексе
         text_lower = text.lower()
-
-        # Маппинг ключевых слов к product_id
-        keyword_map = {
-            'energy_diet': ['energy diet', 'энерджи дайет', 'энерджи диет', 'ed '],
-            'energy_diet_smart': ['ed smart', 'smart', 'смарт'],
-            'energy_diet_hd': ['ed hd', 'hd', 'хд'],
-            'greenflash': ['greenflash', 'green flash', 'грин флеш', 'гринфлеш'],
-            'collagen': ['collagen', 'коллаген'],
-            'draineffect': ['draineffect', 'drain effect', 'драйн', 'дрейн'],
-            '3d_slim': ['3d slim', '3д слим', 'слим'],
-            'omega': ['omega', 'омега'],
-            'biodrone': ['biodrone', 'биодрон'],
-            'enerwood': ['enerwood', 'энервуд', 'чай'],
-            'occuba': ['occuba', 'оккуба', 'косметика'],
-            'beloved': ['be loved', 'белавед', 'би лавед'],
-            'baby_food': ['детское', 'baby', 'малыш', 'ребёнок', 'для детей'],
-            'sport': ['протеин', 'protein', 'спорт', 'sport', 'гейнер', 'bcaa'],
-        }
-
-        for product_id, keywords in keyword_map.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return product_id
+        for keyword, product_id in _REFERENCE_KEYWORDS_BY_LENGTH:
+            if keyword in text_lower:
+                return product_id
 
         return None
 
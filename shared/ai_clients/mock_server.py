@@ -0,0 +1,309 @@
+"""
+Локальная заглушка AI провайдеров для нагрузочного и latency-тестирования.
+
+Говорит на протоколах, которые используют наши клиенты:
+- YandexGPT:  POST /iam/v1/tokens, POST /foundationModels/v1/completion
+- Anthropic:  POST /v1/messages (обычный ответ и SSE-стриминг)
+- GigaChat:   POST /api/v2/oauth, POST /api/v1/chat/completions
+
+Поведение настраивается через MockLLMConfig: распределение задержки до первого
+токена, скорость генерации токенов, доля ошибок 500 и 429, готовые ответы.
+
+Клиенты переключаются на заглушку через настройки:
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8089
+    YANDEX_LLM_BASE_URL=http://127.0.0.1:8089/foundationModels/v1
+    YANDEX_IAM_URL=http://127.0.0.1:8089/iam/v1/tokens
+    GIGACHAT_BASE_URL=http://127.0.0.1:8089/api/v1
+    GIGACHAT_OAUTH_URL=http://127.0.0.1:8089/api/v2/oauth
+
+Запуск: python scripts/mock_llm_server.py --help
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
+
+from aiohttp import web
+
+
+DEFAULT_RESPONSES = [
+    "Привет! Расскажи, что именно тебя интересует — продукты или бизнес с NL?",
+    "Energy Diet — это сбалансированное функциональное питание. Хочешь подберу вкус?",
+    "Отличный вопрос! Давай разберём по шагам, с чего начать.",
+]
+
+
+@dataclass
+class MockLLMConfig:
+    """Настройки поведения заглушки"""
+
+    # Задержка до первого токена: "fixed:300", "uniform:100,800", "lognormal:6.0,0.5" (мс)
+    latency: str = "lognormal:6.0,0.5"
+    # Скорость генерации (токенов в секунду); 0 — мгновенно
+    tokens_per_second: float = 60.0
+    # Доли ответов с ошибками
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # Готовые ответы (выбираются случайно)
+    responses: List[str] = field(default_factory=lambda: list(DEFAULT_RESPONSES))
+    # Время жизни выдаваемых токенов авторизации (сек)
+    token_lifetime: int = 12 * 3600
+    seed: Optional[int] = None
+
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """
+    Разбирает описание распределения задержки
+
+    Args:
+        spec: "fixed:300" | "uniform:100,800" | "lognormal:mu,sigma" | "normal:mean,stddev"
+
+    Returns:
+        (тип, параметры)
+    """
+    kind, _, raw = spec.partition(":")
+    params = [float(x) for x in raw.split(",") if x.strip()]
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "normal": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    return kind, params
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка количества токенов (~4 символа на токен)"""
+    return max(1, len(text) // 4)
+
+
+class MockLLMServer:
+    """aiohttp-приложение заглушки со статистикой запросов"""
+
+    def __init__(self, config: Optional[MockLLMConfig] = None):
+        self.config = config or MockLLMConfig()
+        self._latency_kind, self._latency_params = parse_latency(self.config.latency)
+        self._random = random.Random(self.config.seed)
+        self.stats: Dict[str, int] = {"requests": 0, "errors": 0, "rate_limited": 0, "tokens_issued": 0}
+
+    def create_app(self) -> web.Application:
+        """Создаёт aiohttp-приложение со всеми маршрутами"""
+        app = web.Application()
+        app.router.add_post("/iam/v1/tokens", self.handle_yandex_iam)
+        app.router.add_post("/foundationModels/v1/completion", self.handle_yandex_completion)
+        app.router.add_post("/v1/messages", self.handle_anthropic_messages)
+        app.router.add_post("/api/v2/oauth", self.handle_gigachat_oauth)
+        app.router.add_post("/api/v1/chat/completions", self.handle_gigachat_completion)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    # ------------------------------------------------------------------
+    # Моделирование задержки и ошибок
+    # ------------------------------------------------------------------
+
+    def sample_ttft(self) -> float:
+        """Задержка до первого токена (сек) по настроенному распределению"""
+        kind, p = self._latency_kind, self._latency_params
+        if kind == "fixed":
+            ms = p[0]
+        elif kind == "uniform":
+            ms = self._random.uniform(p[0], p[1])
+        elif kind == "normal":
+            ms = self._random.gauss(p[0], p[1])
+        else:
+            ms = self._random.lognormvariate(p[0], p[1])
+        return max(0.0, ms) / 1000
+
+    def _token_delay(self) -> float:
+        """Пауза между токенами (сек)"""
+        if self.config.tokens_per_second <= 0:
+            return 0.0
+        return 1.0 / self.config.tokens_per_second
+
+    def _injected_error(self) -> Optional[web.Response]:
+        """Случайная ошибка 429/500 по настроенным долям"""
+        roll = self._random.random()
+        if roll < self.config.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"type": "rate_limit_error", "message": "Too many requests (mock)"}},
+                status=429,
+                headers={"Retry-After": "1"}
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"error": {"type": "api_error", "message": "Internal error (mock)"}},
+                status=500
+            )
+        return None
+
+    def _pick_response(self) -> str:
+        return self._random.choice(self.config.responses)
+
+    async def _simulate_generation(self, text: str):
+        """Ждёт ttft + время генерации всех токенов (для не-стриминговых ответов)"""
+        await asyncio.sleep(self.sample_ttft() + estimate_tokens(text) * self._token_delay())
+
+    def _issue_token(self) -> Tuple[str, float]:
+        self.stats["tokens_issued"] += 1
+        return f"mock-token-{uuid.uuid4().hex[:12]}", time.time() + self.config.token_lifetime
+
+    # ------------------------------------------------------------------
+    # YandexGPT
+    # ------------------------------------------------------------------
+
+    async def handle_yandex_iam(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if not body.get("jwt"):
+            return web.json_response({"message": "jwt is required"}, status=400)
+        token, expires_at = self._issue_token()
+        expires = datetime.fromtimestamp(expires_at, tz=timezone.utc)
+        return web.json_response({
+            "iamToken": token,
+            "expiresAt": expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        })
+
+    async def handle_yandex_completion(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        body = await request.json()
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        text = self._pick_response()
+        await self._simulate_generation(text)
+
+        prompt = " ".join(m.get("text", "") for m in body.get("messages", []))
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        model_uri = body.get("modelUri", "")
+        return web.json_response({
+            "result": {
+                "alternatives": [{
+                    "message": {"role": "assistant", "text": text},
+                    "status": "ALTERNATIVE_STATUS_FINAL",
+                }],
+                # YandexGPT отдаёт счётчики строками
+                "usage": {
+                    "inputTextTokens": str(input_tokens),
+                    "completionTokens": str(output_tokens),
+                    "totalTokens": str(input_tokens + output_tokens),
+                },
+                "modelVersion": model_uri.rsplit("/", 1)[-1] or "mock",
+            }
+        })
+
+    # ------------------------------------------------------------------
+    # Anthropic Messages
+    # ------------------------------------------------------------------
+
+    async def handle_anthropic_messages(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        body = await request.json()
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        text = self._pick_response()
+        prompt = str(body.get("system", "")) + " ".join(
+            m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+            for m in body.get("messages", [])
+        )
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        message_id = f"msg_mock_{uuid.uuid4().hex[:16]}"
+        model = body.get("model", "mock")
+
+        if not body.get("stream"):
+            await self._simulate_generation(text)
+            return web.json_response({
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(event: str, data: dict):
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        await send("message_start", {
+            "type": "message_start",
+            "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model,
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+            },
+        })
+        await send("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+        })
+
+        await asyncio.sleep(self.sample_ttft())
+        token_delay = self._token_delay()
+        # Отдаём текст кусками по ~4 символа (≈ 1 токен)
+        for i in range(0, len(text), 4):
+            await send("content_block_delta", {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": text[i:i + 4]},
+            })
+            if token_delay:
+                await asyncio.sleep(token_delay)
+
+        await send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await send("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": output_tokens},
+        })
+        await send("message_stop", {"type": "message_stop"})
+        await response.write_eof()
+        return response
+
+    # ------------------------------------------------------------------
+    # GigaChat
+    # ------------------------------------------------------------------
+
+    async def handle_gigachat_oauth(self, request: web.Request) -> web.Response:
+        if not request.headers.get("Authorization", "").startswith("Basic "):
+            return web.json_response({"message": "Basic auth required"}, status=401)
+        token, expires_at = self._issue_token()
+        return web.json_response({"access_token": token, "expires_at": int(expires_at * 1000)})
+
+    async def handle_gigachat_completion(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        body = await request.json()
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        text = self._pick_response()
+        await self._simulate_generation(text)
+
+        prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        return web.json_response({
+            "choices": [{
+                "message": {"role": "assistant", "content": text},
+                "index": 0,
+                "finish_reason": "stop",
+            }],
+            "created": int(time.time()),
+            "model": body.get("model", "GigaChat"),
+            "object": "chat.completion",
+            "usage": {
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "precached_prompt_tokens": 0,
+            },
+        })
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
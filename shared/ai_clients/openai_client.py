@@ -6,6 +6,12 @@ from openai import AsyncOpenAI
 from loguru import logger
 
 from shared.config.settings import settings
+from shared.ai_clients.usage import LLMUsage, UsageTimer, record_usage
+from shared.utils.single_flight import SingleFlight, make_key
+
+
+# Одинаковые одновременные запросы к openai выполняются один раз
+_flight = SingleFlight("openai")
 
 
 class OpenAIClient:
@@ -45,6 +51,21 @@ class OpenAIClient:
         Returns:
             str: Ответ от AI
         """
+        key = make_key(self.model, system_prompt, user_message, context, temperature, max_tokens)
+        return await _flight.do(
+            key,
+            lambda: self._generate_response(system_prompt, user_message, context, temperature, max_tokens)
+        )
+
+    async def _generate_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        """Выполняет запрос к API (одинаковые одновременные вызовы объединяет generate_response)"""
         try:
             messages = [{"role": "system", "content": system_prompt}]
 
@@ -58,6 +79,7 @@ class OpenAIClient:
             logger.debug(f"Sending request to OpenAI with {len(messages)} messages")
 
             # Отправляем запрос
+            timer = UsageTimer()
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
@@ -66,6 +88,14 @@ class OpenAIClient:
             )
 
             answer = response.choices[0].message.content
+            if response.usage:
+                record_usage(LLMUsage(
+                    provider="openai",
+                    model=self.model,
+                    input_tokens=response.usage.prompt_tokens,
+                    output_tokens=response.usage.completion_tokens,
+                    wall_ms=timer.wall_ms
+                ))
             logger.info(f"Response generated successfully (tokens: {response.usage.total_tokens})")
 
             return answer
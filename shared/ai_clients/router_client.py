@@ -0,0 +1,415 @@
+"""
+Маршрутизатор запросов между несколькими AI провайдерами.
+
+Возможности:
+- Скользящая статистика задержек (p50/p95) и ошибок по каждому провайдеру
+- Hedged-запросы: если основной провайдер не ответил за перцентильный дедлайн,
+  параллельно отправляется запрос альтернативному, побеждает первый хороший ответ
+- Failover: при ошибке основного сразу пробуем следующий
+- Circuit breaker: падающий провайдер временно исключается из маршрутизации
+
+Интерфейс совпадает с остальными клиентами (generate_response / generate_with_rag),
+поэтому RoutingAIClient можно передать в CuratorChatEngine вместо одиночного клиента.
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Any
+from loguru import logger
+
+
+class ProviderStats:
+    """Скользящая статистика одного провайдера"""
+
+    def __init__(self, window_size: int = 100):
+        """
+        Args:
+            window_size: Сколько последних вызовов учитывать
+        """
+        self.latencies: deque = deque(maxlen=window_size)  # Только успешные вызовы (сек)
+        self.outcomes: deque = deque(maxlen=window_size)   # True = успех, False = ошибка
+        self.total_calls = 0
+        self.total_errors = 0
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    def record_success(self, latency: float):
+        """Записывает успешный вызов"""
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.total_calls += 1
+
+    def record_failure(self):
+        """Записывает неудачный вызов"""
+        self.outcomes.append(False)
+        self.total_calls += 1
+        self.total_errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Возвращает перцентиль задержки
+
+        Args:
+            p: Перцентиль (0.0 - 1.0)
+
+        Returns:
+            Задержка в секундах или None если нет данных
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(int(p * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    @property
+    def error_rate(self) -> float:
+        """Доля ошибок в окне"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Статистика для мониторинга"""
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для провайдера.
+
+    closed    — запросы идут как обычно
+    open      — провайдер исключён до истечения cooldown
+    half_open — после cooldown пропускаем один пробный запрос
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 10,
+        cooldown: float = 30.0
+    ):
+        """
+        Args:
+            failure_threshold: Ошибок подряд для размыкания
+            error_rate_threshold: Доля ошибок в окне для размыкания
+            min_samples: Минимум вызовов в окне для оценки доли ошибок
+            cooldown: Сколько секунд провайдер исключён после размыкания
+        """
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос провайдеру"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            else:
+                return False
+
+        # HALF_OPEN: пропускаем только один пробный запрос
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        """Успешный вызов замыкает цепь"""
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.state = self.CLOSED
+
+    def record_failure(self, stats: ProviderStats):
+        """Неудачный вызов, при превышении порогов размыкает цепь"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+
+        too_many_in_row = self.consecutive_failures >= self.failure_threshold
+        too_many_in_window = (
+            len(stats.outcomes) >= self.min_samples
+            and stats.error_rate >= self.error_rate_threshold
+        )
+
+        if self.state == self.HALF_OPEN or too_many_in_row or too_many_in_window:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Пробный запрос отменён (проиграл hedge) — разрешаем следующий"""
+        self._probe_in_flight = False
+
+
+@dataclass
+class _Provider:
+    """Провайдер в маршрутизаторе"""
+    name: str
+    client: Any
+    stats: ProviderStats = field(default_factory=ProviderStats)
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+
+class AllProvidersFailedError(Exception):
+    """Ни один провайдер не вернул ответ"""
+    pass
+
+
+class RoutingAIClient:
+    """
+    Клиент-маршрутизатор поверх нескольких AI клиентов.
+
+    Провайдеры передаются в порядке приоритета: первый доступный
+    (с замкнутым circuit breaker) становится основным.
+    """
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, Any]],
+        hedge_percentile: float = 0.95,
+        default_hedge_delay: float = 8.0,
+        min_hedge_delay: float = 1.5,
+        max_hedge_delay: float = 20.0,
+        min_samples_for_percentile: int = 5,
+        hedging_enabled: bool = True,
+        circuit_cooldown: float = 30.0
+    ):
+        """
+        Args:
+            providers: Список (имя, клиент) в порядке приоритета
+            hedge_percentile: Перцентиль задержки основного провайдера для дедлайна hedge
+            default_hedge_delay: Дедлайн пока статистики недостаточно (сек)
+            min_hedge_delay: Нижняя граница дедлайна (сек)
+            max_hedge_delay: Верхняя граница дедлайна (сек)
+            min_samples_for_percentile: Сколько успешных вызовов нужно для перцентиля
+            hedging_enabled: Отправлять hedged-запросы (иначе только failover)
+            circuit_cooldown: Сколько секунд упавший провайдер исключён из маршрутизации
+        """
+        if not providers:
+            raise ValueError("RoutingAIClient requires at least one provider")
+
+        self.providers = [
+            _Provider(name=name, client=client, breaker=CircuitBreaker(cooldown=circuit_cooldown))
+            for name, client in providers
+        ]
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_samples_for_percentile = min_samples_for_percentile
+        self.hedging_enabled = hedging_enabled
+
+        names = ", ".join(p.name for p in self.providers)
+        logger.info(f"RoutingAIClient initialized with providers: {names}")
+
+    def _available_providers(self) -> List[_Provider]:
+        """Провайдеры в порядке приоритета, у которых цепь не разомкнута"""
+        return [p for p in self.providers if p.breaker.state != CircuitBreaker.OPEN
+                or time.monotonic() - p.breaker.opened_at >= p.breaker.cooldown]
+
+    def _hedge_delay(self, provider: _Provider) -> float:
+        """Дедлайн, после которого отправляется hedged-запрос"""
+        if len(provider.stats.latencies) < self.min_samples_for_percentile:
+            delay = self.default_hedge_delay
+        else:
+            delay = provider.stats.percentile(self.hedge_percentile)
+        return max(self.min_hedge_delay, min(delay, self.max_hedge_delay))
+
+    async def _call(self, provider: _Provider, method: str, kwargs: Dict[str, Any]) -> str:
+        """Вызывает провайдера и записывает статистику"""
+        start = time.monotonic()
+        try:
+            result = await getattr(provider.client, method)(**kwargs)
+        except asyncio.CancelledError:
+            provider.breaker.release_probe()
+            raise
+        except Exception:
+            provider.stats.record_failure()
+            provider.breaker.record_failure(provider.stats)
+            raise
+
+        if not result:
+            provider.stats.record_failure()
+            provider.breaker.record_failure(provider.stats)
+            raise ValueError(f"Empty response from {provider.name}")
+
+        provider.stats.record_success(time.monotonic() - start)
+        provider.breaker.record_success()
+        return result
+
+    async def _route(self, method: str, kwargs: Dict[str, Any]) -> str:
+        """
+        Основной алгоритм маршрутизации.
+
+        1. Запускаем запрос к первому доступному провайдеру
+        2. Ждём до перцентильного дедлайна
+        3. Не успел — запускаем hedged-запрос к следующему провайдеру
+        4. Ошибка — сразу запускаем следующий (failover)
+        5. Первый успешный ответ побеждает, остальные запросы отменяются
+        """
+        candidates = self._available_providers()
+        if not candidates:
+            # Все цепи разомкнуты — пробуем основной провайдер, чтобы не молчать
+            candidates = [self.providers[0]]
+
+        pending: Dict[asyncio.Task, _Provider] = {}
+        hedged: set = set()
+        next_index = 0
+        last_error: Optional[BaseException] = None
+
+        def launch_next() -> Optional[_Provider]:
+            nonlocal next_index
+            while next_index < len(candidates):
+                provider = candidates[next_index]
+                next_index += 1
+                # Half-open провайдер пропускает только один пробный запрос
+                if not provider.breaker.allow_request() and len(candidates) > 1:
+                    continue
+                task = asyncio.create_task(self._call(provider, method, kwargs))
+                pending[task] = provider
+                return provider
+            return None
+
+        launch_next()
+
+        try:
+            while pending:
+                primary = next(iter(pending.values()))
+                timeout = None
+                if self.hedging_enabled and next_index < len(candidates):
+                    timeout = self._hedge_delay(primary)
+
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Дедлайн истёк — hedge к следующему провайдеру
+                    hedge_provider = launch_next()
+                    if hedge_provider:
+                        hedged.add(hedge_provider.name)
+                        hedge_provider.stats.hedges_started += 1
+                        logger.info(
+                            f"[ROUTER] {primary.name} slower than {timeout:.1f}s, "
+                            f"hedging to {hedge_provider.name}"
+                        )
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if provider.name in hedged:
+                            provider.stats.hedges_won += 1
+                        logger.info(f"[ROUTER] Response from {provider.name}")
+                        return task.result()
+
+                    last_error = error
+                    logger.warning(f"[ROUTER] {provider.name} failed: {error}")
+
+                # Failover: если ничего не ждём, запускаем следующего
+                if not pending:
+                    launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AllProvidersFailedError(f"All AI providers failed, last error: {last_error}") from last_error
+
+    async def generate_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Генерирует ответ через самый быстрый доступный провайдер
+
+        Args:
+            system_prompt: Системный промпт
+            user_message: Сообщение от пользователя
+            context: История диалога
+            temperature: Креативность ответа
+            max_tokens: Максимальная длина ответа (None = дефолт провайдера)
+
+        Returns:
+            str: Ответ от AI
+        """
+        kwargs = {
+            "system_prompt": system_prompt,
+            "user_message": user_message,
+            "context": context,
+            "temperature": temperature,
+        }
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        return await self._route("generate_response", kwargs)
+
+    async def generate_with_rag(
+        self,
+        system_prompt: str,
+        user_message: str,
+        knowledge_fragments: List[str],
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Генерирует ответ с базой знаний через самый быстрый доступный провайдер
+
+        Args:
+            system_prompt: Системный промпт
+            user_message: Сообщение от пользователя
+            knowledge_fragments: Релевантные фрагменты из базы знаний
+            context: История диалога
+            temperature: Креативность ответа
+            max_tokens: Максимальная длина ответа (None = дефолт провайдера)
+
+        Returns:
+            str: Ответ от AI с учетом базы знаний
+        """
+        kwargs = {
+            "system_prompt": system_prompt,
+            "user_message": user_message,
+            "knowledge_fragments": knowledge_fragments,
+            "context": context,
+            "temperature": temperature,
+        }
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        return await self._route("generate_with_rag", kwargs)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика по всем провайдерам (для мониторинга)"""
+        return {
+            p.name: {**p.stats.to_dict(), "circuit": p.breaker.state}
+            for p in self.providers
+        }
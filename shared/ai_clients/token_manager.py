@@ -0,0 +1,227 @@
+"""
+Менеджер токенов авторизации AI провайдеров.
+
+- Обновляет токен в фоне заранее (по умолчанию на 80% времени жизни),
+  поэтому запросы пользователей не ждут получения токена
+- Single-flight: одновременные запросы при отсутствии токена делают
+  один вызов к эндпоинту авторизации, а не по одному на запрос
+- Опциональный кэш на диске: после рестарта используем ещё живой токен
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from shared.config.settings import settings
+
+
+@dataclass
+class AuthToken:
+    """Токен и момент его истечения (unix time)"""
+    value: str
+    expires_at: float
+
+    def is_valid(self, margin: float = 0.0) -> bool:
+        return time.time() < self.expires_at - margin
+
+
+class TokenManager:
+    """Фоновое обновление одного токена"""
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[AuthToken]],
+        refresh_ratio: float = 0.8,
+        min_validity: float = 30.0,
+        retry_delay: float = 30.0,
+        cache_path: Optional[str] = None
+    ):
+        """
+        Args:
+            name: Ключ токена (провайдер + идентификатор учётных данных)
+            fetch: Корутина, получающая новый токен у провайдера
+            refresh_ratio: Доля времени жизни, после которой обновляем в фоне
+            min_validity: Токен, которому осталось меньше (сек), считаем истёкшим
+            retry_delay: Пауза перед повтором неудачного фонового обновления (сек)
+            cache_path: Путь к JSON-кэшу токенов (None/"" — без кэша)
+        """
+        self.name = name
+        self._fetch = fetch
+        self.refresh_ratio = refresh_ratio
+        self.min_validity = min_validity
+        self.retry_delay = retry_delay
+        self.cache_path = Path(cache_path) if cache_path else None
+
+        self._token: Optional[AuthToken] = None
+        self._obtained_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        self.refresh_count = 0
+        self.coalesced_waits = 0
+
+        self._load_from_cache()
+
+    async def get_token(self) -> str:
+        """
+        Возвращает действующий токен
+
+        В штатном режиме токен уже обновлён фоновой задачей и возвращается сразу.
+        """
+        self._ensure_background_refresh()
+
+        if self._token and self._token.is_valid(self.min_validity):
+            return self._token.value
+
+        token = await self.refresh()
+        return token.value
+
+    def invalidate(self, stale_value: Optional[str] = None):
+        """
+        Помечает токен недействительным (после 401/403)
+
+        Args:
+            stale_value: Токен, который отверг провайдер. Если текущий токен
+                уже другой (его обновил параллельный запрос) — ничего не делаем.
+        """
+        if self._token and (stale_value is None or self._token.value == stale_value):
+            self._token = None
+
+    async def refresh(self) -> AuthToken:
+        """
+        Получает новый токен (одновременные вызовы делят один запрос)
+
+        Запрос к эндпоинту идёт в отдельной задаче: отмена вызвавшего
+        (например, отменённого запроса к LLM) не отменяет получение токена
+        для остальных ожидающих.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch_token())
+            self._inflight.add_done_callback(self._forget_inflight)
+        else:
+            self.coalesced_waits += 1
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch_token(self) -> AuthToken:
+        """Один запрос к эндпоинту авторизации"""
+        token = await self._fetch()
+        self._token = token
+        self._obtained_at = time.time()
+        self.refresh_count += 1
+        self._save_to_cache()
+        logger.info(f"[TOKENS] {self.name} token refreshed, valid for {int(token.expires_at - time.time())}s")
+        return token
+
+    def _forget_inflight(self, task: asyncio.Future):
+        """Запрос завершён — следующий refresh() начнёт новый"""
+        if self._inflight is task:
+            self._inflight = None
+        # Ошибка уже передана ждущим (или их не осталось); помечаем как прочитанную
+        if not task.cancelled():
+            task.exception()
+
+    def _next_refresh_delay(self) -> float:
+        """Через сколько секунд обновить токен в фоне"""
+        if not self._token:
+            return 0.0
+        lifetime = self._token.expires_at - self._obtained_at
+        refresh_at = self._obtained_at + lifetime * self.refresh_ratio
+        return max(0.0, refresh_at - time.time())
+
+    def _ensure_background_refresh(self):
+        """Запускает фоновую задачу обновления (один раз на event loop)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        """Обновляет токен заранее, до истечения"""
+        while True:
+            await asyncio.sleep(self._next_refresh_delay())
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[TOKENS] Background refresh of {self.name} failed: {e}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def close(self):
+        """Останавливает фоновое обновление"""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+        if self._inflight and not self._inflight.done():
+            self._inflight.cancel()
+
+    def _load_from_cache(self):
+        """Загружает ещё живой токен из кэша на диске"""
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            entry = data.get(self.name)
+            if not entry:
+                return
+            token = AuthToken(value=entry["value"], expires_at=float(entry["expires_at"]))
+            if token.is_valid(self.min_validity):
+                self._token = token
+                self._obtained_at = float(entry.get("obtained_at", time.time()))
+                logger.info(f"[TOKENS] {self.name} token loaded from cache")
+        except Exception as e:
+            logger.warning(f"[TOKENS] Failed to read token cache {self.cache_path}: {e}")
+
+    def _save_to_cache(self):
+        """Атомарно сохраняет токен в кэш (остальные ключи не трогаем)"""
+        if not self.cache_path or not self._token:
+            return
+        try:
+            data: Dict[str, dict] = {}
+            if self.cache_path.exists():
+                data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            data[self.name] = {
+                "value": self._token.value,
+                "expires_at": self._token.expires_at,
+                "obtained_at": self._obtained_at,
+            }
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"[TOKENS] Failed to write token cache {self.cache_path}: {e}")
+
+
+# Менеджеры по ключу, чтобы несколько клиентов одного провайдера делили токен
+_managers: Dict[str, TokenManager] = {}
+
+
+def get_token_manager(name: str, fetch: Callable[[], Awaitable[AuthToken]]) -> TokenManager:
+    """
+    Получить общий TokenManager для ключа
+
+    Args:
+        name: Ключ токена (провайдер + идентификатор учётных данных)
+        fetch: Корутина получения токена (используется при первом создании)
+    """
+    manager = _managers.get(name)
+    if manager is None:
+        manager = TokenManager(name, fetch, cache_path=settings.ai_token_cache_path or None)
+        _managers[name] = manager
+    return manager
+
+
+async def close_token_managers():
+    """Останавливает фоновое обновление всех токенов (при остановке бота)"""
+    for manager in _managers.values():
+        await manager.close()
@@ -0,0 +1,107 @@
+"""
+Учёт использования LLM: токены, задержки, провайдер и модель.
+
+Каждый AI клиент после успешного вызова создаёт LLMUsage и передаёт его
+в record_usage(). Вызывающий код собирает записи через collect_usage():
+
+    with collect_usage() as usages:
+        answer = await ai_client.generate_response(...)
+    tokens = sum(u.total_tokens for u in usages)
+
+Сборщик хранится в contextvar, поэтому работает сквозь RoutingAIClient,
+CuratorChatEngine и ContentGenerator без изменения их сигнатур.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterator
+
+
+@dataclass
+class LLMUsage:
+    """Использование одного вызова LLM"""
+    provider: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    wall_ms: int = 0
+    ttft_ms: Optional[int] = None  # Время до первого токена (только для стриминга)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat()
+        return data
+
+
+class UsageTimer:
+    """Замер wall time и времени до первого токена"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+
+    def mark_first_token(self):
+        """Отмечает получение первого токена (вызывать один раз)"""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    @property
+    def wall_ms(self) -> int:
+        return int((time.monotonic() - self.started) * 1000)
+
+    @property
+    def ttft_ms(self) -> Optional[int]:
+        if self.first_token_at is None:
+            return None
+        return int((self.first_token_at - self.started) * 1000)
+
+
+_usage_sink: ContextVar[Optional[List[LLMUsage]]] = ContextVar("llm_usage_sink", default=None)
+
+
+def record_usage(usage: LLMUsage) -> None:
+    """Добавляет запись в текущий сборщик (если он открыт)"""
+    sink = _usage_sink.get()
+    if sink is not None:
+        sink.append(usage)
+
+
+@contextmanager
+def collect_usage() -> Iterator[List[LLMUsage]]:
+    """
+    Собирает все вызовы LLM внутри блока.
+
+    Список общий для задач, созданных внутри блока (asyncio копирует контекст,
+    но ссылается на тот же список), поэтому hedged-запросы роутера тоже попадают сюда.
+    """
+    sink: List[LLMUsage] = []
+    token = _usage_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _usage_sink.reset(token)
+
+
+def summarize_usage(usages: List[LLMUsage]) -> Dict[str, Any]:
+    """
+    Сводка по списку вызовов (для Post.generation_params)
+
+    Returns:
+        dict: calls, input/output/cached tokens, wall_ms, providers
+    """
+    return {
+        "calls": len(usages),
+        "input_tokens": sum(u.input_tokens for u in usages),
+        "output_tokens": sum(u.output_tokens for u in usages),
+        "cached_tokens": sum(u.cached_tokens for u in usages),
+        "wall_ms": sum(u.wall_ms for u in usages),
+        "providers": sorted({f"{u.provider}/{u.model}" for u in usages}),
+    }
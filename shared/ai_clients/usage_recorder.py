@@ -0,0 +1,153 @@
+"""
+Пакетная запись использования LLM в таблицу llm_usage.
+
+Записи копятся в памяти и сбрасываются одним INSERT'ом по размеру пакета
+или по таймеру, чтобы учёт не добавлял лишний round-trip к каждому ответу
+(shared/utils/batch_buffer.py). При остановке бота нужно вызвать close() —
+он сбросит остаток.
+"""
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any
+
+from sqlalchemy import insert, select, func, desc
+
+from shared.database.base import AsyncSessionLocal
+from shared.database.models import LLMUsageRecord
+from shared.ai_clients.usage import LLMUsage
+from shared.utils.batch_buffer import BatchBuffer
+
+
+class UsageRecorder(BatchBuffer):
+    """Буфер записей использования LLM с пакетным сбросом в БД"""
+
+    log_prefix = "USAGE"
+    item_name = "LLM usage records"
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 10.0):
+        """
+        Args:
+            batch_size: Сколько записей накопить до немедленного сброса
+            flush_interval: Максимальный интервал между сбросами (сек)
+        """
+        super().__init__(flush_interval=flush_interval, batch_size=batch_size, max_pending=batch_size * 20)
+
+    def record(
+        self,
+        usages: List[LLMUsage],
+        purpose: str,
+        user_id: Optional[int] = None,
+        conversation_message_id: Optional[int] = None,
+        post_id: Optional[int] = None,
+        post_type: Optional[str] = None
+    ):
+        """
+        Добавляет записи в буфер
+
+        Args:
+            usages: Собранные через collect_usage() вызовы
+            purpose: Назначение (curator_reply, post_generation, post_regeneration)
+            user_id: ID пользователя куратора (users.id)
+            conversation_message_id: ID ответа бота в conversation_messages
+            post_id: ID поста контент-менеджера
+            post_type: Тип поста
+        """
+        for usage in usages:
+            self._buffer.append({
+                "provider": usage.provider,
+                "model": usage.model,
+                "purpose": purpose,
+                "post_type": post_type,
+                "user_id": user_id,
+                "conversation_message_id": conversation_message_id,
+                "post_id": post_id,
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "wall_ms": usage.wall_ms,
+                "ttft_ms": usage.ttft_ms,
+                "created_at": usage.created_at,
+            })
+
+        self._schedule()
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> int:
+        """Один INSERT на пакет"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(LLMUsageRecord), rows)
+            await session.commit()
+        return len(rows)
+
+
+async def get_usage_report(days: int = 7, top: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Отчёт по использованию LLM для админ-команды
+
+    Args:
+        days: За сколько дней
+        top: Сколько самых дорогих диалогов показать
+
+    Returns:
+        dict: by_day, by_post_type, top_conversations
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    tokens = func.sum(LLMUsageRecord.input_tokens + LLMUsageRecord.output_tokens)
+    avg_wall = func.avg(LLMUsageRecord.wall_ms)
+
+    async with AsyncSessionLocal() as session:
+        day = func.date_trunc("day", LLMUsageRecord.created_at)
+        by_day = await session.execute(
+            select(day.label("day"), func.count().label("calls"), tokens.label("tokens"), avg_wall.label("avg_wall"))
+            .where(LLMUsageRecord.created_at >= since)
+            .group_by(day)
+            .order_by(day)
+        )
+
+        by_post_type = await session.execute(
+            select(LLMUsageRecord.post_type, func.count().label("calls"), tokens.label("tokens"), avg_wall.label("avg_wall"))
+            .where(
+                LLMUsageRecord.created_at >= since,
+                LLMUsageRecord.post_type.isnot(None)
+            )
+            .group_by(LLMUsageRecord.post_type)
+            .order_by(desc("tokens"))
+        )
+
+        top_conversations = await session.execute(
+            select(LLMUsageRecord.user_id, func.count().label("calls"), tokens.label("tokens"), avg_wall.label("avg_wall"))
+            .where(
+                LLMUsageRecord.created_at >= since,
+                LLMUsageRecord.user_id.isnot(None)
+            )
+            .group_by(LLMUsageRecord.user_id)
+            .order_by(desc("tokens"))
+            .limit(top)
+        )
+
+        def rows(result, key: str) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "key": getattr(row, key),
+                    "calls": row.calls,
+                    "tokens": int(row.tokens or 0),
+                    "avg_wall_ms": int(row.avg_wall or 0),
+                }
+                for row in result
+            ]
+
+        return {
+            "by_day": rows(by_day, "day"),
+            "by_post_type": rows(by_post_type, "post_type"),
+            "top_conversations": rows(top_conversations, "user_id"),
+        }
+
+
+# Глобальный экземпляр
+_usage_recorder: Optional[UsageRecorder] = None
+
+
+def get_usage_recorder() -> UsageRecorder:
+    """Получить глобальный экземпляр UsageRecorder"""
+    global _usage_recorder
+    if _usage_recorder is None:
+        _usage_recorder = UsageRecorder()
+    return _usage_recorder
@@ -1,6 +1,7 @@
 """
 Клиент для работы с YandexGPT API
 """
+from datetime import datetime, timezone
 from typing import List, Dict, Optional
 import httpx
 import jwt
@@ -8,6 +9,13 @@ import time
 from loguru import logger
 
 from shared.config.settings import settings
+from shared.ai_clients.usage import LLMUsage, UsageTimer, record_usage
+from shared.utils.single_flight import SingleFlight, make_key
+from shared.ai_clients.token_manager import AuthToken, get_token_manager
+
+
+# Одинаковые одновременные запросы к yandexgpt выполняются один раз
+_flight = SingleFlight("yandexgpt")
 
 
 class YandexGPTClient:
@@ -40,9 +48,12 @@ class YandexGPTClient:
 
         self.folder_id = folder_id or settings.yandex_folder_id
         self.model = model or settings.yandex_model or "yandexgpt-lite"
-        self.base_url = "https://llm.api.cloud.yandex.net/foundationModels/v1"
-        self.iam_token = None
-        self.token_expires_at = 0
+        self.base_url = settings.yandex_llm_base_url
+        self.iam_url = settings.yandex_iam_url
+        self.token_manager = get_token_manager(
+            f"yandex:{self.service_account_id}:{self.key_id}",
+            self._fetch_iam_token
+        )
         logger.info(f"YandexGPT client initialized with model: {self.model}")
 
     def _create_jwt_token(self) -> str:
@@ -70,20 +81,13 @@ class YandexGPTClient:
 
         return encoded_token
 
-    async def _get_iam_token(self, force_refresh: bool = False) -> str:
+    async def _fetch_iam_token(self) -> AuthToken:
         """
-        Получение IAM токена через JWT
-
-        Args:
-            force_refresh: Принудительно обновить токен
+        Обмен JWT на IAM токен (вызывается TokenManager'ом)
 
         Returns:
-            str: IAM токен
+            AuthToken: IAM токен и время его истечения
         """
-        # Проверяем, не истёк ли текущий токен
-        if self.iam_token and not force_refresh and time.time() < self.token_expires_at:
-            return self.iam_token
-
         try:
             # Создаём JWT токен
             jwt_token = self._create_jwt_token()
@@ -91,23 +95,42 @@ class YandexGPTClient:
             # Обмениваем JWT на IAM токен
             async with httpx.AsyncClient() as client:
                 response = await client.post(
-                    'https://iam.api.cloud.yandex.net/iam/v1/tokens',
+                    self.iam_url,
                     json={'jwt': jwt_token}
                 )
                 response.raise_for_status()
                 result = response.json()
 
-                self.iam_token = result['iamToken']
-                # Токен действует ~12 часов, но обновим за час до истечения
-                self.token_expires_at = time.time() + (11 * 3600)
+            # expiresAt приходит в RFC3339 с наносекундами — секунд достаточно
+            try:
+                expires_at = datetime.strptime(result['expiresAt'][:19], "%Y-%m-%dT%H:%M:%S")
+                expires_at = expires_at.replace(tzinfo=timezone.utc).timestamp()
+            except (KeyError, ValueError):
+                # Токен действует ~12 часов
+                expires_at = time.time() + 12 * 3600
 
-                logger.info("YandexGPT IAM token obtained" + (" (refreshed)" if force_refresh else ""))
-                return self.iam_token
+            return AuthToken(value=result['iamToken'], expires_at=expires_at)
 
         except Exception as e:
             logger.error(f"Error obtaining IAM token: {e}")
             raise
 
+    async def _get_iam_token(self, force_refresh: bool = False) -> str:
+        """
+        Получение IAM токена
+
+        Токен обновляется в фоне заранее, поэтому обычно возвращается сразу.
+
+        Args:
+            force_refresh: Принудительно обновить токен
+
+        Returns:
+            str: IAM токен
+        """
+        if force_refresh:
+            return (await self.token_manager.refresh()).value
+        return await self.token_manager.get_token()
+
     async def generate_response(
         self,
         system_prompt: str,
@@ -129,10 +152,26 @@ class YandexGPTClient:
         Returns:
             str: Ответ от AI
         """
+        key = make_key(self.model, system_prompt, user_message, context, temperature, max_tokens)
+        return await _flight.do(
+            key,
+            lambda: self._generate_response(system_prompt, user_message, context, temperature, max_tokens)
+        )
+
+    async def _generate_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.6,
+        max_tokens: int = 2000
+    ) -> str:
+        """Выполняет запрос к API (одинаковые одновременные вызовы объединяет generate_response)"""
         # Retry при истечении токена
         for attempt in range(2):
+            iam_token = None
             try:
-                iam_token = await self._get_iam_token(force_refresh=(attempt > 0))
+                iam_token = await self._get_iam_token()
 
                 messages = []
 
@@ -152,6 +191,7 @@ class YandexGPTClient:
 
                 logger.debug(f"Sending request to YandexGPT with {len(messages)} messages")
 
+                timer = UsageTimer()
                 async with httpx.AsyncClient(timeout=60.0) as client:
                     response = await client.post(
                         f"{self.base_url}/completion",
@@ -174,14 +214,23 @@ class YandexGPTClient:
                     # Если 401/403 - токен истёк, пробуем обновить
                     if response.status_code in [401, 403] and attempt == 0:
                         logger.warning("YandexGPT token expired, refreshing...")
-                        self.iam_token = None
-                        self.token_expires_at = 0
+                        self.token_manager.invalidate(iam_token)
                         continue
 
                     response.raise_for_status()
                     result = response.json()
 
                 answer = result["result"]["alternatives"][0]["message"]["text"]
+
+                # YandexGPT возвращает количество токенов строками
+                usage = result["result"].get("usage", {})
+                record_usage(LLMUsage(
+                    provider="yandexgpt",
+                    model=self.model,
+                    input_tokens=int(usage.get("inputTextTokens", 0)),
+                    output_tokens=int(usage.get("completionTokens", 0)),
+                    wall_ms=timer.wall_ms
+                ))
                 logger.info(f"Response generated successfully from YandexGPT")
 
                 return answer
@@ -189,8 +238,7 @@ class YandexGPTClient:
             except httpx.HTTPStatusError as e:
                 if e.response.status_code in [401, 403] and attempt == 0:
                     logger.warning("YandexGPT token expired (HTTPStatusError), refreshing...")
-                    self.iam_token = None
-                    self.token_expires_at = 0
+                    self.token_manager.invalidate(iam_token)
                     continue
                 logger.error(f"Error calling YandexGPT API: {e}")
                 logger.error(f"Response body: {e.response.text if hasattr(e, 'response') else 'N/A'}")
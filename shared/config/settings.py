@@ -16,6 +16,23 @@ class Settings(BaseSettings):
     content_manager_bot_token: str = Field(..., env="CONTENT_MANAGER_BOT_TOKEN")
     channel_username: str = Field(..., env="CHANNEL_USERNAME")
 
+    # Приём апдейтов: long polling или webhook (один aiohttp-сервер на оба бота)
+    bot_mode: str = Field(default="polling", env="BOT_MODE")  # polling, webhook или shard_worker
+    webhook_base_url: str = Field(default="", env="WEBHOOK_BASE_URL")  # Публичный https-адрес, например https://bots.example.com
+    webhook_path: str = Field(default="/webhook", env="WEBHOOK_PATH")  # Префикс пути: /webhook/curator, /webhook/content
+    webhook_host: str = Field(default="0.0.0.0", env="WEBHOOK_HOST")
+    webhook_port: int = Field(default=8080, env="WEBHOOK_PORT")
+    webhook_secret: str = Field(default="", env="WEBHOOK_SECRET")  # Пусто — случайный секрет при каждом запуске
+
+    # Шардирование куратора по telegram_id (BOT_MODE=shard_worker, scripts/run_curator_shards.py)
+    shard_id: str = Field(default="", env="SHARD_ID")  # Имя воркера в кольце (пусто — curator-<порт>)
+    shard_router_url: str = Field(default="", env="SHARD_ROUTER_URL")  # Внутренний адрес роутера для heartbeat
+    shard_worker_url: str = Field(default="", env="SHARD_WORKER_URL")  # Адрес воркера для роутера (пусто — http://127.0.0.1:<порт>)
+    shard_heartbeat_interval: float = Field(default=2.0, env="SHARD_HEARTBEAT_INTERVAL")  # Интервал heartbeat (сек)
+    shard_heartbeat_ttl: float = Field(default=6.0, env="SHARD_HEARTBEAT_TTL")  # Воркер без heartbeat исключается (сек)
+    curator_run_schedulers: bool = Field(default=True, env="CURATOR_RUN_SCHEDULERS")  # Участвовать в выборах лидера планировщиков
+    leader_heartbeat_interval: float = Field(default=5.0, env="LEADER_HEARTBEAT_INTERVAL")  # Heartbeat лидера и попытки захвата задач (сек)
+
     # Group with Topics (for content publishing)
     group_id: str = Field(default="", env="GROUP_ID")
     curator_bot_username: str = Field(default="@nl_mentor1_bot", env="CURATOR_BOT_USERNAME")
@@ -66,6 +83,8 @@ class Settings(BaseSettings):
     anthropic_base_url: str = Field(default="", env="ANTHROPIC_BASE_URL")  # Прокси для обхода блокировки
     gigachat_auth_token: str = Field(default="", env="GIGACHAT_AUTH_TOKEN")
     gigachat_client_id: str = Field(default="", env="GIGACHAT_CLIENT_ID")
+    gigachat_base_url: str = Field(default="https://gigachat.devices.sberbank.ru/api/v1", env="GIGACHAT_BASE_URL")
+    gigachat_oauth_url: str = Field(default="https://ngw.devices.sberbank.ru:9443/api/v2/oauth", env="GIGACHAT_OAUTH_URL")
 
     # YandexGPT (Yandex Cloud)
     yandex_service_account_id: str = Field(default="", env="YANDEX_SERVICE_ACCOUNT_ID")
@@ -74,6 +93,8 @@ class Settings(BaseSettings):
     yandex_private_key_file: str = Field(default="", env="YANDEX_PRIVATE_KEY_FILE")
     yandex_folder_id: str = Field(default="", env="YANDEX_FOLDER_ID")
     yandex_model: str = Field(default="yandexgpt-32k", env="YANDEX_MODEL")
+    yandex_llm_base_url: str = Field(default="https://llm.api.cloud.yandex.net/foundationModels/v1", env="YANDEX_LLM_BASE_URL")
+    yandex_iam_url: str = Field(default="https://iam.api.cloud.yandex.net/iam/v1/tokens", env="YANDEX_IAM_URL")  # Для локальной заглушки: scripts/mock_llm_server.py
 
     @model_validator(mode='after')
     def load_private_key_from_file(self) -> 'Settings':
@@ -101,9 +122,44 @@ class Settings(BaseSettings):
     curator_ai_model: str = Field(default="gemini-1.5-flash", env="CURATOR_AI_MODEL")
     content_manager_ai_model: str = Field(default="gpt-3.5-turbo", env="CONTENT_MANAGER_AI_MODEL")
 
+    # AI Routing (маршрутизация между провайдерами)
+    ai_fallback_providers: str = Field(default="yandexgpt,gigachat", env="AI_FALLBACK_PROVIDERS")  # Порядок резервных провайдеров
+    ai_hedging_enabled: bool = Field(default=True, env="AI_HEDGING_ENABLED")  # Hedged-запросы к резервному провайдеру
+    ai_hedge_percentile: float = Field(default=0.95, env="AI_HEDGE_PERCENTILE")  # Перцентиль задержки для дедлайна hedge
+    ai_hedge_default_delay: float = Field(default=8.0, env="AI_HEDGE_DEFAULT_DELAY")  # Дедлайн до накопления статистики (сек)
+    ai_circuit_cooldown: float = Field(default=30.0, env="AI_CIRCUIT_COOLDOWN")  # Исключение упавшего провайдера (сек)
+    ai_token_cache_path: str = Field(default="", env="AI_TOKEN_CACHE_PATH")  # JSON-кэш токенов YandexGPT/GigaChat между рестартами
+
+    # Медиа-библиотека
+    media_cache_size: int = Field(default=2048, env="MEDIA_CACHE_SIZE")  # Максимум записей L1 кэша keyword → asset
+    media_cache_ttl: float = Field(default=3600.0, env="MEDIA_CACHE_TTL")  # Время жизни записи L1 кэша (сек)
+
     # Redis (optional)
     redis_url: str = Field(default="redis://localhost:6379", env="REDIS_URL")
 
+    # Кэш истории диалогов куратора
+    history_cache_users: int = Field(default=5000, env="HISTORY_CACHE_USERS")  # Сколько активных пользователей держать в памяти
+    history_cache_turns: int = Field(default=20, env="HISTORY_CACHE_TURNS")  # Реплик в буфере на пользователя
+    history_cache_ttl: float = Field(default=21600.0, env="HISTORY_CACHE_TTL")  # Буфер устаревает без сообщений (сек)
+    history_cache_redis: bool = Field(default=False, env="HISTORY_CACHE_REDIS")  # Второй уровень кэша в Redis (REDIS_URL)
+
+    # Контексты диалоговой воронки куратора
+    funnel_context_backend: str = Field(default="postgres", env="FUNNEL_CONTEXT_BACKEND")  # memory, postgres или redis
+    funnel_context_cache_size: int = Field(default=10000, env="FUNNEL_CONTEXT_CACHE_SIZE")  # Контекстов в памяти (LRU)
+    funnel_context_ttl: float = Field(default=86400.0, env="FUNNEL_CONTEXT_TTL")  # Выгрузка из памяти без сообщений (сек)
+    funnel_context_flush_interval: float = Field(default=2.0, env="FUNNEL_CONTEXT_FLUSH_INTERVAL")  # Отложенная запись в бэкенд (сек)
+
+    # Очередь обработки апдейтов куратора
+    curator_max_concurrency: int = Field(default=20, env="CURATOR_MAX_CONCURRENCY")  # Апдейтов в обработке одновременно
+    curator_max_queue: int = Field(default=200, env="CURATOR_MAX_QUEUE")  # Апдейтов в ожидании воркера, дальше — быстрый отказ
+    curator_max_per_user: int = Field(default=3, env="CURATOR_MAX_PER_USER")  # Сообщений одного пользователя в очереди (включая текущее)
+    curator_queue_notice_after: float = Field(default=5.0, env="CURATOR_QUEUE_NOTICE_AFTER")  # Сообщить место в очереди после (сек)
+    curator_queue_max_wait: float = Field(default=90.0, env="CURATOR_QUEUE_MAX_WAIT")  # Максимальное ожидание воркера (сек)
+
+    # Кэш пользователей куратора (DbSessionMiddleware)
+    curator_user_cache_size: int = Field(default=10000, env="CURATOR_USER_CACHE_SIZE")  # Пользователей в памяти
+    curator_user_cache_ttl: float = Field(default=30.0, env="CURATOR_USER_CACHE_TTL")  # Предел устаревания при изменениях извне (сек)
+
     # Telethon (для мониторинга каналов-образцов)
     # Получить на https://my.telegram.org/apps
     telethon_api_id: int = Field(default=0, env="TELETHON_API_ID")
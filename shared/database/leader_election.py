@@ -0,0 +1,283 @@
+"""
+Выбор лидера для периодических задач через advisory-блокировки Postgres.
+
+Планировщики куратора (напоминания 24ч/48ч/7д, онбординг и уведомления о
+постах) запускались в каждом процессе, и две реплики дублировали рассылки.
+LeaderElection держит одно выделенное соединение с БД и для каждой задачи
+пытается взять pg_try_advisory_lock(key):
+- взял — экземпляр становится лидером задачи и запускает её (start);
+- не взял — повторяет попытку каждые heartbeat_interval секунд;
+- heartbeat (SELECT 1 по тому же соединению) не прошёл — соединение считается
+  потерянным, все задачи останавливаются (stop), блокировки Postgres снимает сам.
+
+Advisory-блокировка живёт, пока живо соединение: при падении лидера она
+освобождается сразу (или через tcp keepalive, если пропала сеть), и другой
+экземпляр подхватывает задачу на следующей попытке. Чат при этом обслуживают
+все экземпляры.
+
+Кто держит какую задачу — таблица scheduler_leases (get_lease_status,
+команда /leaders в кураторе).
+"""
+import asyncio
+import hashlib
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from shared.database.base import AsyncSessionLocal, engine
+from shared.database.models import SchedulerLease
+
+TRY_LOCK_SQL = text("SELECT pg_try_advisory_lock(:key)")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(:key)")
+HEARTBEAT_SQL = text("SELECT 1")
+# Сервер быстрее замечает пропавшего клиента и освобождает его блокировки (~25 сек)
+KEEPALIVE_SQL = [
+    text("SET tcp_keepalives_idle = 10"),
+    text("SET tcp_keepalives_interval = 5"),
+    text("SET tcp_keepalives_count = 3"),
+]
+
+
+def lock_key(job: str) -> int:
+    """Ключ advisory-блокировки для имени задачи (signed bigint)"""
+    return int.from_bytes(hashlib.blake2b(job.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class LeaderJob:
+    """Периодическая задача, которую выполняет только лидер"""
+
+    name: str
+    start: Callable[[], Awaitable[None]]
+    stop: Callable[[], Awaitable[None]]
+    key: int
+    is_leader: bool = False
+    acquired_at: Optional[datetime] = None
+    elections_won: int = 0
+
+
+async def _connect():
+    """Выделенное соединение в autocommit: блокировки сессии без открытой транзакции"""
+    conn = await engine.connect()
+    await conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        for statement in KEEPALIVE_SQL:
+            await conn.execute(statement)
+    except Exception as e:
+        logger.debug(f"[LEADER] tcp keepalive settings not applied: {e}")
+    return conn
+
+
+class LeaderElection:
+    """Лидерство экземпляра по периодическим задачам"""
+
+    def __init__(
+        self,
+        instance_id: Optional[str] = None,
+        heartbeat_interval: float = 5.0,
+        connect: Callable[[], Awaitable[Any]] = _connect
+    ):
+        """
+        Args:
+            instance_id: Имя экземпляра в scheduler_leases (по умолчанию host:pid)
+            heartbeat_interval: Интервал heartbeat и повторных попыток захвата (сек)
+            connect: Фабрика выделенного соединения (для тестов)
+        """
+        self.instance_id = instance_id or default_instance_id()
+        self.heartbeat_interval = heartbeat_interval
+        self._connect = connect
+        self._conn = None
+        self._jobs: Dict[str, LeaderJob] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.connection_losses = 0
+
+    def add_job(self, name: str, start: Callable[[], Awaitable[None]], stop: Callable[[], Awaitable[None]]):
+        """Регистрирует задачу (до start())"""
+        self._jobs[name] = LeaderJob(name=name, start=start, stop=stop, key=lock_key(name))
+
+    def is_leader(self, name: str) -> bool:
+        job = self._jobs.get(name)
+        return job is not None and job.is_leader
+
+    # ------------------------------------------------------------------
+    # Цикл выборов
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Первая попытка захвата сразу, дальше — фоновый цикл"""
+        await self.tick()
+        self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.tick()
+
+    async def tick(self):
+        """Heartbeat лидерства и попытка захватить свободные задачи"""
+        try:
+            if self._conn is None:
+                self._conn = await self._connect()
+            await self._conn.execute(HEARTBEAT_SQL)
+
+            for job in self._jobs.values():
+                if not job.is_leader:
+                    result = await self._conn.execute(TRY_LOCK_SQL, {"key": job.key})
+                    if not result.scalar():
+                        continue
+                    await self._become_leader(job)
+                if job.is_leader:
+                    await self._write_lease(job)
+        except Exception as e:
+            logger.error(f"[LEADER] Lost database connection, stepping down: {e}")
+            self.connection_losses += 1
+            await self._step_down_all()
+            await self._drop_connection()
+
+    async def _become_leader(self, job: LeaderJob):
+        job.is_leader = True
+        job.acquired_at = datetime.now(timezone.utc)
+        job.elections_won += 1
+        logger.info(f"[LEADER] {self.instance_id} is now running {job.name}")
+        try:
+            await job.start()
+        except Exception as e:
+            logger.error(f"[LEADER] Failed to start {job.name}: {e}")
+            await self._release(job)
+
+    async def _write_lease(self, job: LeaderJob):
+        """Витрина держателя; её ошибка (нет таблицы) не лишает лидерства"""
+        try:
+            await self._upsert_lease(job)
+        except Exception as e:
+            logger.warning(f"[LEADER] Failed to update lease of {job.name}: {e}")
+
+    async def _upsert_lease(self, job: LeaderJob):
+        statement = insert(SchedulerLease).values(
+            job=job.name,
+            holder=self.instance_id,
+            lock_key=job.key,
+            acquired_at=job.acquired_at,
+            heartbeat_at=datetime.now(timezone.utc)
+        )
+        await self._conn.execute(statement.on_conflict_do_update(
+            index_elements=[SchedulerLease.job],
+            set_={
+                "holder": statement.excluded.holder,
+                "lock_key": statement.excluded.lock_key,
+                "acquired_at": statement.excluded.acquired_at,
+                "heartbeat_at": statement.excluded.heartbeat_at,
+            }
+        ))
+
+    # ------------------------------------------------------------------
+    # Остановка
+    # ------------------------------------------------------------------
+
+    async def _stop_job(self, job: LeaderJob):
+        job.is_leader = False
+        try:
+            await job.stop()
+        except Exception as e:
+            logger.error(f"[LEADER] Failed to stop {job.name}: {e}")
+        logger.info(f"[LEADER] {self.instance_id} stopped running {job.name}")
+
+    async def _release(self, job: LeaderJob):
+        """Останавливает задачу и отдаёт блокировку другим экземплярам"""
+        await self._stop_job(job)
+        try:
+            await self._conn.execute(UNLOCK_SQL, {"key": job.key})
+        except Exception as e:
+            logger.warning(f"[LEADER] Failed to unlock {job.name}: {e}")
+
+    async def _step_down_all(self):
+        for job in self._jobs.values():
+            if job.is_leader:
+                await self._stop_job(job)
+
+    async def _drop_connection(self):
+        """
+        Закрывает соединение по-настоящему: возврат в пул оставил бы
+        сессию Postgres — а с ней и блокировки — живой
+        """
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            await conn.invalidate()
+            await conn.close()
+        except Exception:
+            pass
+
+    async def stop(self):
+        """Останавливает выборы, свои задачи и отпускает блокировки"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for job in self._jobs.values():
+            if job.is_leader:
+                await self._release(job)
+        await self._drop_connection()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "instance": self.instance_id,
+            "leading": sorted(name for name, job in self._jobs.items() if job.is_leader),
+            "following": sorted(name for name, job in self._jobs.items() if not job.is_leader),
+            "connection_losses": self.connection_losses,
+        }
+
+
+async def get_lease_status(stale_after: float = 15.0) -> List[Dict[str, Any]]:
+    """
+    Кто держит какую задачу (по всем экземплярам)
+
+    Args:
+        stale_after: Heartbeat старше этого (сек) — держатель, вероятно, пропал
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(SchedulerLease).order_by(SchedulerLease.job))
+        leases = result.scalars().all()
+
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "job": lease.job,
+            "holder": lease.holder,
+            "acquired_at": lease.acquired_at,
+            "heartbeat_age_sec": round((now - lease.heartbeat_at).total_seconds(), 1),
+            "active": now - lease.heartbeat_at < timedelta(seconds=stale_after),
+        }
+        for lease in leases
+    ]
+
+
+# Глобальный экземпляр
+_leader_election: Optional[LeaderElection] = None
+
+
+def get_leader_election() -> LeaderElection:
+    """Получить глобальный экземпляр LeaderElection"""
+    global _leader_election
+    if _leader_election is None:
+        from shared.config.settings import settings
+        _leader_election = LeaderElection(
+            instance_id=settings.shard_id or None,
+            heartbeat_interval=settings.leader_heartbeat_interval
+        )
+    return _leader_election
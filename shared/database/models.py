@@ -208,3 +208,93 @@ class SystemEvent(Base, TimestampMixin):
         Index("idx_system_events_type_processed", "event_type", "processed"),
         Index("idx_system_events_target_processed", "target_module", "processed"),
     )
+
+
+class LLMUsageRecord(Base):
+    """
+    Использование LLM по каждому вызову.
+
+    Пишется пакетами через UsageRecorder. Связывается с сообщением куратора
+    (conversation_message_id) или постом контент-менеджера (post_id),
+    чтобы находить самые дорогие по токенам и задержке промпты.
+    """
+    __tablename__ = "llm_usage"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    # Провайдер и модель (claude, yandexgpt, gigachat, openai)
+    provider: Mapped[str] = mapped_column(String(30), nullable=False)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+
+    # Назначение вызова (curator_reply, post_generation, post_regeneration)
+    purpose: Mapped[str] = mapped_column(String(50), nullable=False)
+    post_type: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+
+    # Связи (без FK — таблицы принадлежат разным ботам)
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    conversation_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    post_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    # Токены
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cached_tokens: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Задержки (мс)
+    wall_ms: Mapped[int] = mapped_column(Integer, default=0)
+    ttft_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_llm_usage_created", "created_at"),
+        Index("idx_llm_usage_purpose_created", "purpose", "created_at"),
+        Index("idx_llm_usage_message", "conversation_message_id"),
+        Index("idx_llm_usage_post", "post_id"),
+        Index("idx_llm_usage_user", "user_id"),
+    )
+
+
+class TelegramFileId(Base):
+    """
+    file_id Telegram для ранее загруженного файла.
+
+    file_id действителен только для бота, который загрузил файл, поэтому
+    ключ — (bot_id, file_hash). Заполняется FileIdRegistry после первой
+    отправки, дальше тот же файл отправляется по file_id без загрузки.
+    """
+    __tablename__ = "telegram_file_ids"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    # ID бота (первая часть токена) и SHA256 содержимого файла
+    bot_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    file_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    file_id: Mapped[str] = mapped_column(String(200), nullable=False)
+    file_size: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_telegram_file_ids_bot_hash", "bot_id", "file_hash", unique=True),
+    )
+
+
+class SchedulerLease(Base):
+    """
+    Кто из экземпляров сейчас выполняет периодическую задачу.
+
+    Само право на задачу даёт advisory-блокировка Postgres (LeaderElection),
+    эта таблица — витрина для мониторинга: держатель, время захвата и
+    последний heartbeat. Строка с устаревшим heartbeat означает, что
+    держатель пропал и задачу вот-вот подхватит другой экземпляр.
+    """
+    __tablename__ = "scheduler_leases"
+
+    job: Mapped[str] = mapped_column(String(100), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(200), nullable=False)
+    lock_key: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    acquired_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
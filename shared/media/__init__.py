@@ -4,8 +4,13 @@
 Экспорт:
 - MediaLibrary: Основной класс для работы с медиа
 - media_library: Singleton инстанс
+- ProductIndex / get_product_index: Единый индекс упоминаний продуктов
+- PhotoIndex / get_photo_index: Индекс фото продуктов (без обхода диска на запрос)
 """
 
+from .product_index import ProductIndex, ProductMatch, get_product_index
+from .photo_index import PhotoIndex, get_photo_index
 from .media_library import MediaLibrary, media_library
 
-__all__ = ["MediaLibrary", "media_library"]
+__all__ = ["MediaLibrary", "media_library", "ProductIndex", "ProductMatch", "get_product_index",
+           "PhotoIndex", "get_photo_index"]
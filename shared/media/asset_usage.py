@@ -0,0 +1,94 @@
+"""
+Отложенная запись статистики использования медиа-ресурсов.
+
+Поиск в MediaLibrary — операция чтения: счётчики usage_count/last_used_at
+копятся в памяти и сбрасываются одним UPDATE ... FROM (VALUES ...) по таймеру
+(shared/utils/batch_buffer.py). При остановке бота нужно вызвать close() —
+он сбросит остаток.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, column, update, values
+
+from content_manager_bot.database.models import MediaAsset
+from shared.database.base import AsyncSessionLocal
+from shared.utils.batch_buffer import BatchBuffer
+
+
+class AssetUsageBuffer(BatchBuffer):
+    """Буфер счётчиков использования медиа-ресурсов с пакетным сбросом в БД"""
+
+    log_prefix = "MEDIA"
+    item_name = "asset usage counters"
+
+    def __init__(self, flush_interval: float = 30.0, max_pending: int = 10000):
+        """
+        Args:
+            flush_interval: Интервал между сбросами (сек)
+            max_pending: Сколько разных ресурсов держать при недоступной БД
+        """
+        super().__init__(flush_interval=flush_interval, max_pending=max_pending)
+        # asset_id → (число использований, время последнего)
+        self._pending: Dict[int, Tuple[int, datetime]] = {}
+
+    def record(self, asset_id: int, used_at: Optional[datetime] = None):
+        """Учитывает одно использование ресурса (без обращения к БД)"""
+        hits, _ = self._pending.get(asset_id, (0, None))
+        self._pending[asset_id] = (hits + 1, used_at or datetime.utcnow())
+        self._schedule()
+
+    def _has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def _take(self) -> Dict[int, Tuple[int, datetime]]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def _write(self, pending: Dict[int, Tuple[int, datetime]]) -> int:
+        """Один UPDATE ... FROM (VALUES ...) на все ресурсы"""
+        usage = values(
+            column("id", Integer),
+            column("hits", Integer),
+            column("used_at", DateTime),
+            name="usage"
+        ).data([(asset_id, hits, used_at) for asset_id, (hits, used_at) in pending.items()])
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(MediaAsset)
+                .where(MediaAsset.id == usage.c.id)
+                .values(
+                    usage_count=MediaAsset.usage_count + usage.c.hits,
+                    last_used_at=usage.c.used_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return len(pending)
+
+    def _merge_back(self, pending: Dict[int, Tuple[int, datetime]]):
+        """Возвращает несброшенные счётчики в буфер, не давая ему расти бесконечно"""
+        for asset_id, (hits, used_at) in pending.items():
+            if asset_id in self._pending:
+                new_hits, new_used_at = self._pending[asset_id]
+                self._pending[asset_id] = (hits + new_hits, max(used_at, new_used_at))
+            elif len(self._pending) < self.max_pending:
+                self._pending[asset_id] = (hits, used_at)
+
+    @property
+    def pending(self) -> int:
+        """Сколько ресурсов ждут сброса"""
+        return len(self._pending)
+
+
+# Глобальный экземпляр
+_asset_usage_buffer: Optional[AssetUsageBuffer] = None
+
+
+def get_asset_usage_buffer() -> AssetUsageBuffer:
+    """Получить глобальный экземпляр AssetUsageBuffer"""
+    global _asset_usage_buffer
+    if _asset_usage_buffer is None:
+        _asset_usage_buffer = AssetUsageBuffer()
+    return _asset_usage_buffer
@@ -0,0 +1,226 @@
+"""
+Реестр Telegram file_id: каждый файл загружается ботом один раз.
+
+После первой отправки Telegram возвращает file_id — дальше тот же файл
+(по SHA256 содержимого) отправляется по file_id без повторной загрузки.
+file_id действителен только для загрузившего его бота, поэтому ключ —
+(bot_id, file_hash); таблица telegram_file_ids общая для обоих ботов.
+
+Если Telegram отклонил file_id (файл удалён с серверов, сменился токен),
+запись забывается и файл загружается заново.
+
+Пример:
+    registry = get_file_id_registry()
+    await registry.send_photo(bot, chat_id, path=photo_path, caption="📦 Omega")
+    await registry.send_photo(bot, channel, data=image_bytes, filename="post.jpg")
+"""
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile, Message
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from shared.database.base import AsyncSessionLocal
+from shared.database.models import TelegramFileId
+from shared.utils.offload import run_cpu, run_io
+
+# Ответы Telegram, означающие что сам file_id больше не действителен
+# (остальные ошибки — caption, chat not found и т.п. — повторная загрузка не исправит)
+REJECTED_FILE_ID_ERRORS = ("wrong file identifier", "file reference expired", "file_reference_expired")
+
+
+def is_rejected_file_id(error: TelegramBadRequest) -> bool:
+    """Отклонён ли именно file_id"""
+    message = (error.message or "").lower()
+    return any(marker in message for marker in REJECTED_FILE_ID_ERRORS)
+
+
+class FileIdRegistry:
+    """(bot_id, SHA256 файла) → file_id со статистикой сэкономленных загрузок"""
+
+    def __init__(self):
+        self._file_ids: Dict[Tuple[int, str], str] = {}
+        self._loaded_bots: Set[int] = set()
+        self._load_lock = asyncio.Lock()
+        # path → (mtime, size, sha256): не перечитываем неизменившийся файл
+        self._path_hashes: Dict[str, Tuple[float, int, str]] = {}
+
+        self.uploads = 0
+        self.reuses = 0
+        self.rejected = 0
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+
+    # ------------------------------------------------------------------
+    # Хеши файлов
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """SHA256 байтов изображения"""
+        return hashlib.sha256(data).hexdigest()
+
+    def hash_path(self, path: Union[str, Path]) -> Tuple[str, int]:
+        """SHA256 и размер файла (кэшируется по mtime и размеру)"""
+        key = str(path)
+        stat = os.stat(key)
+        cached = self._path_hashes.get(key)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2], stat.st_size
+
+        sha256 = hashlib.sha256()
+        with open(key, "rb") as f:
+            while chunk := f.read(65536):
+                sha256.update(chunk)
+        file_hash = sha256.hexdigest()
+        self._path_hashes[key] = (stat.st_mtime, stat.st_size, file_hash)
+        return file_hash, stat.st_size
+
+    # ------------------------------------------------------------------
+    # Хранилище
+    # ------------------------------------------------------------------
+
+    async def _ensure_loaded(self, bot_id: int):
+        """Загружает file_id бота из БД при первом обращении"""
+        if bot_id in self._loaded_bots:
+            return
+        async with self._load_lock:
+            if bot_id in self._loaded_bots:
+                return
+            try:
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        select(TelegramFileId.file_hash, TelegramFileId.file_id)
+                        .where(TelegramFileId.bot_id == bot_id)
+                    )
+                    for file_hash, file_id in result:
+                        self._file_ids[(bot_id, file_hash)] = file_id
+                logger.info(f"[FILE_ID] Loaded {len(self._file_ids)} file_ids for bot {bot_id}")
+            except Exception as e:
+                logger.warning(f"[FILE_ID] Failed to load file_ids for bot {bot_id}: {e}")
+            self._loaded_bots.add(bot_id)
+
+    async def _save(self, bot_id: int, file_hash: str, file_id: str, file_size: int):
+        """Сохраняет (или заменяет) file_id в БД"""
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = insert(TelegramFileId).values(
+                    bot_id=bot_id, file_hash=file_hash, file_id=file_id, file_size=file_size
+                )
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["bot_id", "file_hash"],
+                        set_={"file_id": stmt.excluded.file_id, "file_size": stmt.excluded.file_size}
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            # Не критично: в памяти file_id уже есть, в худшем случае загрузим ещё раз после рестарта
+            logger.warning(f"[FILE_ID] Failed to save file_id: {e}")
+
+    def get(self, bot_id: int, file_hash: str) -> Optional[str]:
+        return self._file_ids.get((bot_id, file_hash))
+
+    def remember(self, bot_id: int, file_hash: str, file_id: str):
+        self._file_ids[(bot_id, file_hash)] = file_id
+
+    def forget(self, bot_id: int, file_hash: str):
+        self._file_ids.pop((bot_id, file_hash), None)
+
+    # ------------------------------------------------------------------
+    # Отправка
+    # ------------------------------------------------------------------
+
+    async def send_photo(
+        self,
+        bot: Bot,
+        chat_id: Union[int, str],
+        path: Optional[Union[str, Path]] = None,
+        data: Optional[bytes] = None,
+        filename: str = "image.jpg",
+        **kwargs: Any
+    ) -> Message:
+        """
+        Отправляет фото по file_id, а если его нет — загружает и запоминает
+
+        Args:
+            bot: Бот-отправитель
+            chat_id: Чат
+            path: Локальный файл (фото продуктов)
+            data: Байты изображения (картинки постов)
+            filename: Имя файла для загрузки из байтов
+            **kwargs: caption, parse_mode, message_thread_id и т.д.
+
+        Returns:
+            Отправленное сообщение
+        """
+        # Хеш многомегабайтного фото считаем вне event loop
+        if path is not None:
+            file_hash, file_size = await run_io(self.hash_path, path)
+        elif data is not None:
+            file_hash, file_size = await run_cpu(self.hash_bytes, data), len(data)
+        else:
+            raise ValueError("send_photo: нужен path или data")
+
+        bot_id = bot.id
+        await self._ensure_loaded(bot_id)
+
+        file_id = self.get(bot_id, file_hash)
+        if file_id:
+            try:
+                message = await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+                self.reuses += 1
+                self.bytes_saved += file_size
+                return message
+            except TelegramBadRequest as e:
+                if not is_rejected_file_id(e):
+                    raise
+                # file_id больше не принимается — забываем и загружаем заново
+                self.rejected += 1
+                self.forget(bot_id, file_hash)
+                logger.warning(f"[FILE_ID] file_id rejected ({e.message}), re-uploading {file_hash[:12]}")
+
+        photo = FSInputFile(path) if path is not None else BufferedInputFile(data, filename=filename)
+        message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+        self.uploads += 1
+        self.bytes_uploaded += file_size
+
+        if message.photo:
+            # Самый большой размер — исходное изображение
+            new_file_id = message.photo[-1].file_id
+            self.remember(bot_id, file_hash, new_file_id)
+            await self._save(bot_id, file_hash, new_file_id, file_size)
+
+        return message
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для мониторинга"""
+        sends = self.uploads + self.reuses
+        return {
+            "file_ids": len(self._file_ids),
+            "uploads": self.uploads,
+            "reuses": self.reuses,
+            "rejected": self.rejected,
+            "reuse_rate": round(self.reuses / sends * 100, 1) if sends else 0.0,
+            "bytes_uploaded": self.bytes_uploaded,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+# Глобальный экземпляр
+_file_id_registry: Optional[FileIdRegistry] = None
+
+
+def get_file_id_registry() -> FileIdRegistry:
+    """Получить глобальный экземпляр FileIdRegistry"""
+    global _file_id_registry
+    if _file_id_registry is None:
+        _file_id_registry = FileIdRegistry()
+    return _file_id_registry
@@ -0,0 +1,460 @@
+"""
+Подготовленные для Telegram варианты изображений
+
+Фото продуктов и чеков хранятся в исходном размере (несколько МБ), а
+Telegram всё равно пережимает их до 1280px. Варианты строятся заранее
+(scripts/build_image_variants.py, индексатор медиа-библиотеки, загрузка
+testimonial) и лежат рядом с оригиналом:
+
+    {папка}/.variants/{имя}.{sha256[:16]}.{вариант}.{ext}
+
+Манифест {root}/.variants/manifest.json связывает исходный файл с его
+хешем, mtime/size и вариантами. При отправке resolve() — это поиск в dict
+и один os.stat без обработки изображения; если оригинал изменился, а
+варианты ещё не перестроены, возвращается оригинал. Манифест, обновлённый
+другим процессом (scripts/build_image_variants.py), перечитывается по
+смене mtime — проверка не чаще reload_check_interval.
+
+Построение идёт в пуле потоков (run_cpu), поэтому build_file/build/save/load
+одного хранилища выполняются под его блокировкой: параллельные загрузки
+не пишут манифест одновременно, а перечитывание с event loop не подменяет
+манифест посреди построения.
+
+Тяжёлые операции PIL (fit_within, draw_watermark) используются и в
+content_manager_bot/utils/image_helpers.py.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+
+VARIANTS_DIR = ".variants"
+MANIFEST_NAME = "manifest.json"
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Максимальная сторона фото, которую хранит Telegram
+TELEGRAM_MAX_SIDE = 1280
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """Параметры варианта изображения"""
+    name: str
+    format: str = "JPEG"               # JPEG или WEBP
+    quality: int = 82
+    max_side: int = TELEGRAM_MAX_SIDE
+    watermark: Optional[str] = None    # текст водяного знака
+    logo_path: Optional[str] = None    # PNG-логотип (вариант пропускается, если файла нет)
+
+    @property
+    def extension(self) -> str:
+        return ".webp" if self.format == "WEBP" else ".jpg"
+
+
+DEFAULT_LOGO_PATH = Path(__file__).parent.parent.parent / "content" / "resources" / "logo.png"
+
+DEFAULT_VARIANTS: Tuple[VariantSpec, ...] = (
+    VariantSpec("tg"),
+    VariantSpec("webp", format="WEBP", quality=80),
+    VariantSpec("tg_wm", watermark="NL International"),
+    VariantSpec("tg_logo", logo_path=str(DEFAULT_LOGO_PATH)),
+)
+
+
+# ----------------------------------------------------------------------
+# Операции над изображениями
+# ----------------------------------------------------------------------
+
+def fit_within(image: "Image.Image", max_width: int, max_height: int) -> "Image.Image":
+    """Уменьшает изображение с сохранением пропорций (не увеличивает)"""
+    if image.width <= max_width and image.height <= max_height:
+        return image
+    ratio = min(max_width / image.width, max_height / image.height)
+    new_size = (max(int(image.width * ratio), 1), max(int(image.height * ratio), 1))
+    return image.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def _position(image_size, item_size, position: str, padding: int = 20) -> Tuple[int, int]:
+    width, height = image_size
+    item_width, item_height = item_size
+    positions = {
+        "bottom_right": (width - item_width - padding, height - item_height - padding),
+        "bottom_left": (padding, height - item_height - padding),
+        "top_right": (width - item_width - padding, padding),
+        "top_left": (padding, padding),
+        "center": ((width - item_width) // 2, (height - item_height) // 2),
+    }
+    return positions.get(position, positions["bottom_right"])
+
+
+def draw_watermark(
+    image: "Image.Image",
+    text: str,
+    position: str = "bottom_right",
+    opacity: int = 128
+) -> "Image.Image":
+    """Текстовый водяной знак (шрифт — 2% высоты изображения), результат RGBA"""
+    base = image.convert("RGBA")
+    layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+
+    font_size = max(int(base.height * 0.02), 12)
+    try:
+        font = ImageFont.truetype("arial.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x, y = _position(base.size, (bbox[2] - bbox[0], bbox[3] - bbox[1]), position)
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, opacity))
+    return Image.alpha_composite(base, layer)
+
+
+def paste_logo(
+    image: "Image.Image",
+    logo: "Image.Image",
+    position: str = "bottom_right",
+    logo_size_percent: int = 10,
+    opacity: int = 230
+) -> "Image.Image":
+    """Накладывает логотип (ширина — logo_size_percent% от ширины изображения), результат RGBA"""
+    base = image.convert("RGBA")
+    logo = logo.convert("RGBA")
+
+    logo_width = max(int(base.width * (logo_size_percent / 100)), 1)
+    logo_height = max(int(logo_width * logo.height / logo.width), 1)
+    logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
+
+    if opacity < 255:
+        alpha = logo.split()[3].point(lambda p: int(p * (opacity / 255)))
+        logo.putalpha(alpha)
+
+    base.paste(logo, _position(base.size, (logo_width, logo_height), position), logo)
+    return base
+
+
+def encode_image(image: "Image.Image", format: str = "JPEG", quality: int = 82) -> bytes:
+    """Сохраняет изображение в байты (JPEG — progressive, без альфа-канала)"""
+    if format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    if format == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format=format, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_variant(image: "Image.Image", spec: VariantSpec) -> Optional[bytes]:
+    """Строит вариант из открытого изображения (None — вариант неприменим)"""
+    result = fit_within(image, spec.max_side, spec.max_side)
+    if spec.logo_path:
+        if not Path(spec.logo_path).exists():
+            return None
+        with Image.open(spec.logo_path) as logo:
+            result = paste_logo(result, logo)
+    if spec.watermark:
+        result = draw_watermark(result, spec.watermark)
+    return encode_image(result, spec.format, spec.quality)
+
+
+# ----------------------------------------------------------------------
+# Хранилище вариантов
+# ----------------------------------------------------------------------
+
+@dataclass
+class BuildReport:
+    """Итог построения вариантов"""
+    sources: int = 0
+    built: int = 0
+    skipped: int = 0
+    errors: int = 0
+    source_bytes: int = 0
+    variant_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def saved_percent(self, variant: str = "tg") -> float:
+        if not self.source_bytes or variant not in self.variant_bytes:
+            return 0.0
+        return 100 - self.variant_bytes[variant] / self.source_bytes * 100
+
+
+class ImageVariantStore:
+    """Варианты изображений одного каталога (content/unified_products, content/testimonials)"""
+
+    def __init__(
+        self,
+        root: Path,
+        specs: Iterable[VariantSpec] = DEFAULT_VARIANTS,
+        reload_check_interval: float = 30.0
+    ):
+        self.root = Path(root)
+        self.specs = tuple(specs)
+        self.manifest_path = self.root / VARIANTS_DIR / MANIFEST_NAME
+        self.reload_check_interval = reload_check_interval
+        # относительный путь оригинала → {"hash", "mtime", "size", "variants": {имя: {"path", "bytes"}}}
+        self._manifest: Dict[str, dict] = {}
+        self._manifest_mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._loaded = False
+        self._dirty = False  # есть несохранённые изменения (build_file без save)
+        self._lock = threading.RLock()  # построение из нескольких потоков run_cpu
+
+    # --- манифест ---
+
+    def load(self):
+        """Читает манифест (отсутствие файла — пустое хранилище)"""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        self._manifest_mtime = self._stat_manifest()
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        except FileNotFoundError:
+            self._manifest = {}
+        except Exception as e:
+            logger.warning(f"Image variants manifest unreadable ({self.manifest_path}): {e}")
+            self._manifest = {}
+        self._loaded = True
+
+    def save(self):
+        """Атомарно записывает манифест"""
+        with self._lock:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+            # Собственная запись — не повод перечитывать
+            self._manifest_mtime = self._stat_manifest()
+            self._dirty = False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Перечитывает манифест, если файл изменился (не чаще reload_check_interval)
+
+        Returns:
+            True если манифест перечитан
+        """
+        now = time.monotonic()
+        if self._loaded and (self._dirty or now - self._last_check < self.reload_check_interval):
+            return False
+        self._last_check = now
+
+        if self._loaded and self._stat_manifest() == self._manifest_mtime:
+            return False
+        # Идёт построение — не ждём его на event loop; оно само сохранит манифест
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._loaded:
+                logger.info(f"Image variants manifest changed, reloading: {self.manifest_path}")
+            self._load()
+        finally:
+            self._lock.release()
+        return True
+
+    def _stat_manifest(self) -> Optional[float]:
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return None
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _key(self, source: Path) -> Optional[str]:
+        try:
+            return Path(source).resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    # --- поиск (горячий путь) ---
+
+    def resolve(self, source, variant: str = "tg") -> Path:
+        """
+        Путь к варианту или к оригиналу, если варианта нет/он устарел
+
+        Без обработки изображения: поиск в манифесте и os.stat оригинала
+        (и манифеста — не чаще reload_check_interval).
+        """
+        self.reload_if_changed()
+        path = self.variant_path(source, variant)
+        return path if path is not None else Path(source)
+
+    def variant_path(self, source, variant: str = "tg") -> Optional[Path]:
+        """Путь к актуальному варианту или None"""
+        self._ensure_loaded()
+        key = self._key(Path(source))
+        entry = self._manifest.get(key) if key else None
+        if not entry or variant not in entry["variants"]:
+            return None
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        if stat.st_mtime != entry["mtime"] or stat.st_size != entry["size"]:
+            return None
+        return self.root / entry["variants"][variant]["path"]
+
+    def variants_for(self, source) -> Dict[str, str]:
+        """Все актуальные варианты файла: {имя: путь} (для MediaAsset.variants)"""
+        self._ensure_loaded()
+        key = self._key(Path(source))
+        entry = self._manifest.get(key) if key else None
+        if not entry:
+            return {}
+        return {name: str(self.root / item["path"]) for name, item in entry["variants"].items()}
+
+    # --- построение (офлайн / при изменении) ---
+
+    def iter_sources(self) -> List[Path]:
+        """Исходные изображения каталога (без служебных .variants)"""
+        sources = []
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS:
+                    sources.append(Path(root) / name)
+        return sources
+
+    def build_file(self, source: Path, force: bool = False, report: Optional[BuildReport] = None) -> Dict[str, str]:
+        """
+        Строит варианты одного файла, если он новый или изменился
+
+        Returns:
+            {имя варианта: путь}
+        """
+        if not PILLOW_AVAILABLE:
+            raise RuntimeError("Pillow не установлен — варианты изображений не строятся")
+
+        with self._lock:
+            return self._build_file(Path(source), force, report or BuildReport())
+
+    def _build_file(self, source: Path, force: bool, report: BuildReport) -> Dict[str, str]:
+        self._ensure_loaded()
+        key = self._key(source)
+        if key is None:
+            raise ValueError(f"{source} вне каталога {self.root}")
+
+        stat = os.stat(source)
+        report.sources += 1
+        report.source_bytes += stat.st_size
+        entry = self._manifest.get(key)
+
+        if not force and entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            self._count_existing(entry, report)
+            report.skipped += 1
+            return self.variants_for(source)
+
+        data = source.read_bytes()
+        file_hash = hashlib.sha256(data).hexdigest()
+
+        # Тот же контент (например, файл скопирован заново) — только обновляем mtime
+        if not force and entry and entry["hash"] == file_hash and self._files_exist(entry):
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            self._dirty = True
+            self._count_existing(entry, report)
+            report.skipped += 1
+            return self.variants_for(source)
+
+        if entry:
+            self._remove_files(entry)
+        self._dirty = True
+
+        variants_dir = source.parent / VARIANTS_DIR
+        variants_dir.mkdir(exist_ok=True)
+        variants: Dict[str, dict] = {}
+
+        with Image.open(io.BytesIO(data)) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+
+        for spec in self.specs:
+            payload = render_variant(image, spec)
+            if payload is None:
+                continue
+            target = variants_dir / f"{source.stem}.{file_hash[:16]}.{spec.name}{spec.extension}"
+            target.write_bytes(payload)
+            variants[spec.name] = {"path": target.relative_to(self.root).as_posix(), "bytes": len(payload)}
+            report.variant_bytes[spec.name] = report.variant_bytes.get(spec.name, 0) + len(payload)
+
+        self._manifest[key] = {"hash": file_hash, "mtime": stat.st_mtime, "size": stat.st_size, "variants": variants}
+        report.built += 1
+        return self.variants_for(source)
+
+    def build(self, force: bool = False) -> BuildReport:
+        """Строит варианты для всех новых/изменённых файлов и удаляет варианты удалённых"""
+        with self._lock:
+            return self._build(force)
+
+    def _build(self, force: bool) -> BuildReport:
+        self._ensure_loaded()
+        report = BuildReport()
+        seen = set()
+
+        for source in self.iter_sources():
+            seen.add(self._key(source))
+            try:
+                self.build_file(source, force=force, report=report)
+            except Exception as e:
+                report.errors += 1
+                logger.error(f"Image variants failed for {source}: {e}")
+
+        for key in [k for k in self._manifest if k not in seen]:
+            self._remove_files(self._manifest.pop(key))
+            self._dirty = True
+
+        self.save()
+        logger.info(
+            f"Image variants: {report.built} built, {report.skipped} up to date, "
+            f"{report.errors} errors in {self.root}"
+        )
+        return report
+
+    def _files_exist(self, entry: dict) -> bool:
+        return all((self.root / item["path"]).exists() for item in entry["variants"].values())
+
+    def _remove_files(self, entry: dict):
+        for item in entry["variants"].values():
+            try:
+                (self.root / item["path"]).unlink()
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _count_existing(entry: dict, report: BuildReport):
+        for name, item in entry["variants"].items():
+            report.variant_bytes[name] = report.variant_bytes.get(name, 0) + item["bytes"]
+
+
+# Хранилища по каталогу
+_variant_stores: Dict[str, ImageVariantStore] = {}
+
+
+def get_variant_store(root: Path) -> ImageVariantStore:
+    """Получить хранилище вариантов для каталога"""
+    path = Path(root).resolve()
+    key = str(path)
+    if key not in _variant_stores:
+        store = ImageVariantStore(path)
+        store.load()
+        _variant_stores[key] = store
+    return _variant_stores[key]
@@ -6,24 +6,85 @@
 - Извлечение продуктов из текста постов
 - Управление чеками и историями партнёров
 - Кэширование результатов в памяти (L1 cache)
+- Отложенная пакетная запись usage_count (shared/media/asset_usage.py)
 - Автоматическая дедупликация по file_hash
 """
 
 import re
+import time
+import asyncio
 import hashlib
 import logging
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List, Dict
-from datetime import datetime
+from typing import Optional, List, Dict, Tuple
 
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from content_manager_bot.database.models import MediaAsset, MediaKeywordIndex
+from shared.config.settings import settings
 from shared.database.base import AsyncSessionLocal
+from shared.media.asset_usage import get_asset_usage_buffer
+from shared.media.image_variants import get_variant_store
+from shared.media.product_index import get_product_index
+from shared.media.testimonial_sampler import TestimonialSampler
+from shared.utils.lru_cache import LRUCache
+from shared.utils.offload import path_exists, run_cpu, sha256_file
 
 logger = logging.getLogger(__name__)
 
+# Канал PostgreSQL LISTEN/NOTIFY: scripts/index_media_library.py сообщает об изменении индекса
+MEDIA_INDEX_CHANNEL = "media_index_changed"
+
+
+@dataclass(frozen=True)
+class AssetSnapshot:
+    """Отвязанная от сессии копия MediaAsset (безопасно хранить в памяти процесса)"""
+    id: int
+    asset_type: str
+    file_path: Optional[str]
+    file_id: Optional[str]
+    file_type: Optional[str]
+    category: Optional[str]
+    description: Optional[str]
+    nl_products: Tuple[str, ...]
+    tags: Tuple[str, ...]
+    # (имя варианта, путь) — см. shared/media/image_variants.py
+    variants: Tuple[Tuple[str, str], ...] = ()
+
+    def send_path(self, variant: str = "tg") -> Optional[str]:
+        """Путь для отправки: подготовленный вариант, иначе оригинал"""
+        return dict(self.variants).get(variant) or self.file_path
+
+    @classmethod
+    def from_model(cls, asset: MediaAsset) -> "AssetSnapshot":
+        return cls(
+            id=asset.id,
+            asset_type=asset.asset_type,
+            file_path=asset.file_path,
+            file_id=asset.file_id,
+            file_type=asset.file_type,
+            category=asset.category,
+            description=asset.description,
+            nl_products=tuple(asset.nl_products or ()),
+            tags=tuple(asset.tags or ()),
+            variants=tuple(sorted((asset.variants or {}).items())),
+        )
+
+
+async def notify_media_index_changed(session: AsyncSession, payload: str = ""):
+    """
+    Сообщает ботам об изменении media_keyword_index
+
+    NOTIFY транзакционный: уведомление уйдёт только после commit() этой сессии.
+    """
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": MEDIA_INDEX_CHANNEL, "payload": payload}
+    )
+
 
 class MediaLibrary:
     """
@@ -41,22 +102,33 @@ class MediaLibrary:
     testimonial = await media.get_testimonial(category="checks")
     """
 
-    # L1 кэш: normalized_keyword -> asset_id
-    _keyword_cache: Dict[str, int] = {}
-
-    # Статистика для мониторинга производительности
-    _stats = {
-        "cache_hits": 0,
-        "cache_misses": 0,
-        "total_searches": 0,
-        "avg_search_time_ms": 0.0
-    }
+    # Как часто перечитывать testimonials из БД (обновляются веса по usage_count), сек
+    TESTIMONIALS_REFRESH_INTERVAL = 600.0
 
     def __init__(self):
         """Инициализация библиотеки"""
         self.base_path = Path(__file__).parent.parent.parent / "content" / "unified_products"
         self.testimonials_path = Path(__file__).parent.parent.parent / "content" / "testimonials"
 
+        # L1 кэш: (normalized_keyword, asset_type) → снимок asset.
+        # Версия сбрасывается при перезагрузке индекса (переиндексация меняет ID)
+        self._keyword_cache: LRUCache[AssetSnapshot] = LRUCache(
+            maxsize=settings.media_cache_size,
+            ttl=settings.media_cache_ttl
+        )
+
+        # Снимки ресурсов, у которых есть ключевые слова (грузятся вместе с индексом)
+        self._assets: Dict[int, AssetSnapshot] = {}
+        self._index_loaded = False
+        self._index_lock = asyncio.Lock()
+        self._listener_task: Optional[asyncio.Task] = None
+        self._reload_event = asyncio.Event()
+
+        # Testimonials в памяти для выбора без ORDER BY random()
+        self._testimonials: Dict[int, AssetSnapshot] = {}
+        self._testimonial_sampler = TestimonialSampler()
+        self._testimonials_loaded_at = float("-inf")
+
     @staticmethod
     def normalize_keyword(keyword: str) -> str:
         """
@@ -75,7 +147,7 @@ class MediaLibrary:
         keyword: str,
         asset_type: str = "product",
         use_cache: bool = True
-    ) -> Optional[MediaAsset]:
+    ) -> Optional[AssetSnapshot]:
         """
         O(1) поиск медиа-ресурса по ключевому слову
 
@@ -85,41 +157,24 @@ class MediaLibrary:
             use_cache: Использовать L1 кэш
 
         Returns:
-            MediaAsset или None
+            AssetSnapshot или None
 
-        Производительность: < 20ms (кэш: < 5ms)
+        Производительность: < 20ms (кэш: без обращения к БД)
         """
-        import time
-        start = time.time()
-
-        self._stats["total_searches"] += 1
-
+        start = time.perf_counter()
         normalized = self.normalize_keyword(keyword)
+        cache_key = (normalized, asset_type)
 
-        # Проверка L1 кэша
-        if use_cache and normalized in self._keyword_cache:
-            self._stats["cache_hits"] += 1
-            asset_id = self._keyword_cache[normalized]
-
-            async with AsyncSessionLocal() as session:
-                result = await session.execute(
-                    select(MediaAsset).where(MediaAsset.id == asset_id)
-                )
-                asset = result.scalar_one_or_none()
-
-                # Обновляем статистику использования
-                if asset:
-                    asset.usage_count += 1
-                    asset.last_used_at = datetime.utcnow()
-                    await session.commit()
+        # Проверка L1 кэша: снимок ресурса в памяти, без обращения к БД
+        asset = self._keyword_cache.get(cache_key) if use_cache else None
+        if asset:
+            get_asset_usage_buffer().record(asset.id)
 
-                elapsed = (time.time() - start) * 1000
-                logger.debug(f"find_by_keyword('{keyword}') -> cache hit, {elapsed:.1f}ms")
-                return asset
+            elapsed = (time.perf_counter() - start) * 1000
+            logger.debug(f"find_by_keyword('{keyword}') -> cache hit, {elapsed:.1f}ms")
+            return asset
 
         # Cache miss -> БД lookup
-        self._stats["cache_misses"] += 1
-
         async with AsyncSessionLocal() as session:
             # Поиск через индексную таблицу
             result = await session.execute(
@@ -135,28 +190,28 @@ class MediaLibrary:
                 .limit(1)
             )
 
-            asset = result.scalar_one_or_none()
+            model = result.scalar_one_or_none()
 
-            # Обновляем кэш и статистику
-            if asset:
-                self._keyword_cache[normalized] = asset.id
-                asset.usage_count += 1
-                asset.last_used_at = datetime.utcnow()
-                await session.commit()
+        asset = AssetSnapshot.from_model(model) if model else None
 
-            elapsed = (time.time() - start) * 1000
-            logger.debug(f"find_by_keyword('{keyword}') -> DB lookup, {elapsed:.1f}ms")
+        # Обновляем кэш и статистику
+        if asset:
+            self._keyword_cache.set(cache_key, asset)
+            get_asset_usage_buffer().record(asset.id)
 
-            # Обновляем среднее время поиска
-            self._update_avg_search_time(elapsed)
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.debug(f"find_by_keyword('{keyword}') -> DB lookup, {elapsed:.1f}ms")
 
-            return asset
+        # Обновляем среднее время поиска в БД
+        self._keyword_cache.stats.record_latency(elapsed)
+
+        return asset
 
     async def find_in_text(
         self,
         content: str,
         asset_type: str = "product"
-    ) -> Optional[MediaAsset]:
+    ) -> Optional[AssetSnapshot]:
         """
         Извлекает продукт из текста поста
 
@@ -164,91 +219,176 @@ class MediaLibrary:
         "Попробуй лимф гьян для детокса!" -> asset для greenflash/lymph_gyan
 
         Алгоритм:
-        1. Ищем все совпадения keywords в тексте
-        2. Выбираем самое длинное (специфичное)
-        3. Возвращаем соответствующий asset
+        1. Один проход автомата ProductIndex по тексту (keywords из media_keyword_index)
+        2. Выбираем самое длинное (специфичное), при равенстве — по приоритету
+        3. Возвращаем снимок asset из памяти (без чтения из БД)
+
+        Производительность: < 20ms при 10k keywords
+        (scripts/benchmark_media_library.py)
         """
-        content_lower = content.lower()
-        matches = []
+        await self.ensure_index()
 
-        async with AsyncSessionLocal() as session:
-            # Получаем все keywords для данного типа
-            result = await session.execute(
-                select(MediaKeywordIndex)
-                .join(MediaAsset, MediaAsset.id == MediaKeywordIndex.asset_id)
-                .where(MediaAsset.asset_type == asset_type)
-            )
+        match = get_product_index().find(content, asset_type=asset_type)
+        if not match:
+            return None
 
-            all_keywords = result.scalars().all()
+        for asset_id in match.entry.asset_ids(asset_type):
+            asset = self._assets.get(asset_id)
+            if asset:
+                get_asset_usage_buffer().record(asset.id)
+                logger.info(f"find_in_text: Найден продукт {list(asset.nl_products)} в тексте")
+                return asset
 
-            # Ищем совпадения в тексте
-            for kw_index in all_keywords:
-                if kw_index.normalized_keyword in content_lower:
-                    matches.append((
-                        len(kw_index.normalized_keyword),  # Длина для приоритета
-                        kw_index.priority,
-                        kw_index.asset_id
-                    ))
+        return None
 
-            if not matches:
-                return None
+    # ------------------------------------------------------------------
+    # Индекс ключевых слов в памяти процесса
+    # ------------------------------------------------------------------
 
-            # Сортируем: сначала по длине, потом по приоритету
-            matches.sort(reverse=True)
-            _, _, asset_id = matches[0]
+    async def ensure_index(self):
+        """Загружает индекс ключевых слов при первом обращении"""
+        if not self._index_loaded:
+            async with self._index_lock:
+                if not self._index_loaded:
+                    await self.reload_product_index()
 
-            # Получаем asset
+    async def reload_product_index(self):
+        """Перестраивает индекс продуктов (маппинг + media_keyword_index) без перезапуска"""
+        async with AsyncSessionLocal() as session:
             result = await session.execute(
-                select(MediaAsset).where(MediaAsset.id == asset_id)
+                select(
+                    MediaKeywordIndex.keyword,
+                    MediaKeywordIndex.priority,
+                    MediaKeywordIndex.asset_id,
+                    MediaAsset.asset_type
+                )
+                .join(MediaAsset, MediaAsset.id == MediaKeywordIndex.asset_id)
             )
-            asset = result.scalar_one_or_none()
-
-            if asset:
-                asset.usage_count += 1
-                asset.last_used_at = datetime.utcnow()
-                await session.commit()
-                logger.info(f"find_in_text: Найден продукт {asset.nl_products} в тексте")
+            keyword_rows = result.all()
 
-            return asset
+            result = await session.execute(
+                select(MediaAsset).where(
+                    MediaAsset.id.in_(select(MediaKeywordIndex.asset_id).distinct())
+                )
+            )
+            assets = {asset.id: AssetSnapshot.from_model(asset) for asset in result.scalars()}
+
+        index = get_product_index()
+        await index.reload(
+            (row.keyword, row.priority, row.asset_id, row.asset_type) for row in keyword_rows
+        )
+        self._assets = assets
+        self._index_loaded = True
+        # Переиндексация могла сменить ID ресурсов — записи L1 кэша больше не верны
+        self._keyword_cache.bump_version()
+        logger.info(f"Product index reloaded: {len(index)} keywords, {len(assets)} assets")
+
+    async def start_index_listener(self, debounce: float = 1.0):
+        """Подписывается на NOTIFY media_index_changed и перезагружает индекс"""
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen_loop(debounce))
+
+    async def stop_index_listener(self):
+        """Останавливает подписку на изменения индекса"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Колбэк asyncpg: только отмечаем, что индекс нужно перезагрузить"""
+        logger.info(f"NOTIFY {channel} ({payload or 'без payload'}): индекс медиа будет перезагружен")
+        self._reload_event.set()
+
+    async def _listen_loop(self, debounce: float):
+        """Держит выделенное соединение для LISTEN и переподключается при обрыве"""
+        import asyncpg
+
+        dsn = make_url(settings.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        reconnect = False
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(MEDIA_INDEX_CHANNEL, self._on_notify)
+                logger.info(f"LISTEN {MEDIA_INDEX_CHANNEL}")
+
+                # Изменения, пропущенные пока соединения не было
+                if reconnect:
+                    self._reload_event.set()
+                reconnect = True
+
+                while True:
+                    await self._reload_event.wait()
+                    # Индексатор коммитит пачками — ждём, пока поток уведомлений стихнет
+                    await asyncio.sleep(debounce)
+                    self._reload_event.clear()
+                    await self.reload_product_index()
+                    await self.reload_testimonials()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Media index listener error: {e}, reconnecting in 5s")
+                await asyncio.sleep(5)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
 
     async def get_testimonial(
         self,
         category: Optional[str] = None,
         tags: Optional[List[str]] = None
-    ) -> Optional[MediaAsset]:
+    ) -> Optional[AssetSnapshot]:
         """
         Получить случайный чек/историю партнёра
 
+        Выбор идёт в памяти (TestimonialSampler): O(1), реже показанные
+        выпадают чаще, последние показанные не повторяются подряд.
+
         Args:
             category: Категория (checks, before_after, stories)
             tags: Теги для фильтрации (["семья", "успех"])
 
         Returns:
-            MediaAsset типа testimonial
+            AssetSnapshot типа testimonial
         """
-        async with AsyncSessionLocal() as session:
-            query = select(MediaAsset).where(MediaAsset.asset_type == "testimonial")
+        await self.ensure_testimonials()
 
-            if category:
-                query = query.where(MediaAsset.category == category)
+        asset_id = self._testimonial_sampler.sample(category=category, tags=tags)
+        testimonial = self._testimonials.get(asset_id) if asset_id is not None else None
 
-            if tags:
-                # Поиск по тегам в JSONB
-                for tag in tags:
-                    query = query.where(MediaAsset.tags.contains([tag]))
+        if testimonial:
+            self._testimonial_sampler.record_use(testimonial.id)
+            get_asset_usage_buffer().record(testimonial.id)
 
-            # Случайный выбор
-            query = query.order_by(func.random()).limit(1)
+        return testimonial
 
-            result = await session.execute(query)
-            testimonial = result.scalar_one_or_none()
+    async def ensure_testimonials(self):
+        """Загружает testimonials при первом обращении и раз в TESTIMONIALS_REFRESH_INTERVAL"""
+        if time.monotonic() - self._testimonials_loaded_at < self.TESTIMONIALS_REFRESH_INTERVAL:
+            return
+        async with self._index_lock:
+            if time.monotonic() - self._testimonials_loaded_at >= self.TESTIMONIALS_REFRESH_INTERVAL:
+                await self.reload_testimonials()
 
-            if testimonial:
-                testimonial.usage_count += 1
-                testimonial.last_used_at = datetime.utcnow()
-                await session.commit()
+    async def reload_testimonials(self):
+        """Перечитывает testimonials из БД (веса берутся из актуального usage_count)"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(MediaAsset).where(MediaAsset.asset_type == "testimonial")
+            )
+            models = result.scalars().all()
 
-            return testimonial
+        self._testimonials = {asset.id: AssetSnapshot.from_model(asset) for asset in models}
+        self._testimonial_sampler.load(
+            (asset.id, asset.category, asset.tags, asset.usage_count) for asset in models
+        )
+        self._testimonials_loaded_at = time.monotonic()
 
     async def upload_testimonial(
         self,
@@ -273,13 +413,16 @@ class MediaLibrary:
         """
         # Вычисляем file_hash для дедупликации
         full_path = self.testimonials_path / file_path
-        if full_path.exists():
-            with open(full_path, "rb") as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+        if await path_exists(full_path):
+            # Хеширование многомегабайтного файла — вне event loop
+            file_hash = await sha256_file(full_path)
         else:
             file_hash = None
             logger.warning(f"Файл не найден: {full_path}")
 
+        # Варианты для Telegram строятся один раз при загрузке, а не при каждой отправке
+        variants = await run_cpu(self._build_variants, full_path) if file_hash else {}
+
         async with AsyncSessionLocal() as session:
             # Проверка на дубликат
             if file_hash:
@@ -300,18 +443,37 @@ class MediaLibrary:
                 description=description,
                 nl_products=nl_products,
                 tags=tags or [],
-                file_type="image"  # По умолчанию
+                file_type="image",  # По умолчанию
+                variants=variants
             )
 
             session.add(asset)
             await session.commit()
             await session.refresh(asset)
 
+            # Новый чек сразу доступен для выбора
+            if self._testimonial_sampler.loaded:
+                self._testimonials[asset.id] = AssetSnapshot.from_model(asset)
+                self._testimonial_sampler.add(asset.id, category, asset.tags or [])
+
             logger.info(f"Создан testimonial: {asset.id} - {description}")
             return asset
 
+    def _build_variants(self, full_path: Path) -> Dict[str, str]:
+        """Строит варианты testimonial (1280px JPEG/WebP, водяной знак) рядом с файлом"""
+        store = get_variant_store(self.testimonials_path)
+        try:
+            variants = store.build_file(full_path)
+            store.save()
+            return variants
+        except Exception as e:
+            logger.warning(f"Варианты изображения не построены ({full_path}): {e}")
+            return {}
+
     async def get_stats(self) -> Dict:
         """Получить статистику библиотеки"""
+        cache_stats = self._keyword_cache.stats
+
         async with AsyncSessionLocal() as session:
             # Подсчёт по типам
             result = await session.execute(
@@ -338,11 +500,9 @@ class MediaLibrary:
                 "assets": counts,
                 "total_keywords": total_keywords,
                 "cache_size": len(self._keyword_cache),
-                "cache_hit_rate": (
-                    self._stats["cache_hits"] / self._stats["total_searches"] * 100
-                    if self._stats["total_searches"] > 0 else 0
-                ),
-                "avg_search_time_ms": self._stats["avg_search_time_ms"]
+                "cache_hit_rate": cache_stats.hit_rate,
+                "avg_search_time_ms": cache_stats.avg_lookup_ms,
+                "cache": cache_stats.as_dict()
             }
 
     async def clear_cache(self):
@@ -350,16 +510,6 @@ class MediaLibrary:
         self._keyword_cache.clear()
         logger.info("L1 cache cleared")
 
-    def _update_avg_search_time(self, elapsed_ms: float):
-        """Обновляет скользящее среднее времени поиска"""
-        alpha = 0.1  # Коэффициент сглаживания
-        if self._stats["avg_search_time_ms"] == 0:
-            self._stats["avg_search_time_ms"] = elapsed_ms
-        else:
-            self._stats["avg_search_time_ms"] = (
-                alpha * elapsed_ms + (1 - alpha) * self._stats["avg_search_time_ms"]
-            )
-
     @staticmethod
     def calculate_file_hash(file_path: Path) -> str:
         """Вычисляет SHA256 хеш файла"""
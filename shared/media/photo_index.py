@@ -0,0 +1,208 @@
+"""
+Индекс фотографий продуктов в content/unified_products
+
+Структура каталога: unified_products/{brand}/{product}/photos/*.jpg
+(встречаются и папки без бренда: unified_products/calcium/photos/*.jpg).
+
+Каталог сканируется один раз при старте; дальше любой поиск фото — это
+обращение к dict и random.choice без системных вызовов. Индекс обновляется
+сам, если изменилось mtime одной из просканированных директорий
+(проверка не чаще refresh_interval секунд).
+"""
+
+import os
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+DEFAULT_BASE_PATH = Path(__file__).parent.parent.parent / "content" / "unified_products"
+
+# Порядок предпочтения форматов (раньше код брал сначала jpg, потом png, потом jpeg)
+PHOTO_EXTENSIONS = {".jpg": 0, ".png": 1, ".jpeg": 2}
+
+
+class PhotoIndex:
+    """Индекс: папка продукта → отсортированный список фото"""
+
+    def __init__(self, base_path: Path = DEFAULT_BASE_PATH, refresh_interval: float = 60.0):
+        self.base_path = Path(base_path)
+        self.refresh_interval = refresh_interval
+
+        self._folders: Dict[str, List[Path]] = {}         # "occuba/biome_serum" → фото
+        self._products: Dict[str, List[str]] = {}         # "biome_serum" → папки
+        self._categories: Dict[str, List[Path]] = {}      # "occuba" → все фото бренда
+        self._all: List[Path] = []
+        self._dir_mtimes: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._built = False
+
+    # ------------------------------------------------------------------
+    # Построение
+    # ------------------------------------------------------------------
+
+    def build(self):
+        """Сканирует каталог и атомарно подменяет индекс"""
+        folders: Dict[str, List[Tuple[int, str, Path]]] = {}
+        dir_mtimes: Dict[str, float] = {}
+
+        if self.base_path.exists():
+            for root, dirs, files in os.walk(self.base_path):
+                # Служебные каталоги (.variants — подготовленные для Telegram копии) не индексируем
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                try:
+                    dir_mtimes[root] = os.stat(root).st_mtime
+                except OSError:
+                    continue
+
+                photos = [
+                    (PHOTO_EXTENSIONS[os.path.splitext(name)[1].lower()], name, Path(root) / name)
+                    for name in files
+                    if os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS
+                ]
+                if not photos:
+                    continue
+
+                rel = Path(root).relative_to(self.base_path)
+                # Фото из {folder}/photos принадлежат {folder}
+                if rel.name == "photos":
+                    rel = rel.parent
+                folders.setdefault(rel.as_posix(), []).extend(photos)
+        else:
+            logger.warning(f"Product photos path not found: {self.base_path}")
+
+        folder_photos = {folder: [p for _, _, p in sorted(items)] for folder, items in folders.items()}
+
+        products: Dict[str, List[str]] = {}
+        categories: Dict[str, List[Path]] = {}
+        all_photos: List[Path] = []
+        for folder in sorted(folder_photos):
+            parts = folder.split("/")
+            products.setdefault(parts[-1].lower(), []).append(folder)
+            categories.setdefault(parts[0].lower(), []).extend(folder_photos[folder])
+            all_photos.extend(folder_photos[folder])
+
+        self._folders = folder_photos
+        self._products = products
+        self._categories = categories
+        self._all = all_photos
+        self._dir_mtimes = dir_mtimes
+        self._last_check = time.monotonic()
+        self._built = True
+        logger.info(f"Photo index built: {len(all_photos)} photos in {len(folder_photos)} folders")
+
+    def refresh_if_stale(self) -> bool:
+        """
+        Перестраивает индекс, если изменилась какая-либо директория
+
+        Returns:
+            True если индекс перестроен
+        """
+        if not self._built:
+            self.build()
+            return True
+
+        now = time.monotonic()
+        if now - self._last_check < self.refresh_interval:
+            return False
+        self._last_check = now
+
+        for path, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    break
+            except OSError:
+                break
+        else:
+            if self._dir_mtimes or not self.base_path.exists():
+                return False
+
+        logger.info(f"Product photos changed, rebuilding index: {self.base_path}")
+        self.build()
+        return True
+
+    # ------------------------------------------------------------------
+    # Поиск
+    # ------------------------------------------------------------------
+
+    def photos_in_folder(self, folder: str) -> List[Path]:
+        """Фото папки продукта ("omega/omega" или "calcium")"""
+        self.refresh_if_stale()
+        return self._folders.get(folder.strip("/"), [])
+
+    def first_photo(self, folder: str) -> Optional[Path]:
+        """Первое фото папки (jpg раньше png)"""
+        photos = self.photos_in_folder(folder)
+        return photos[0] if photos else None
+
+    def random_photo_in_folder(self, folder: str) -> Optional[Path]:
+        """Случайное фото папки"""
+        photos = self.photos_in_folder(folder)
+        return random.choice(photos) if photos else None
+
+    def find_product_folder(self, product_key: str, category: Optional[str] = None) -> Optional[str]:
+        """
+        Папка продукта по ключу
+
+        Порядок: {category}/{product_key} → любая папка с именем product_key
+        (сначала в той же категории) → папка, имя которой содержит product_key.
+        """
+        self.refresh_if_stale()
+        key = product_key.lower()
+
+        if category:
+            for candidate in (f"{category}/{product_key}", f"{category.lower()}/{key}"):
+                if candidate in self._folders:
+                    return candidate
+
+        exact = self._products.get(key, [])
+        if exact:
+            if category:
+                prefix = category.lower() + "/"
+                for folder in exact:
+                    if folder.lower().startswith(prefix):
+                        return folder
+            return exact[0]
+
+        for name, folders in self._products.items():
+            if key in name:
+                return folders[0]
+        return None
+
+    def category_photos(self, category: str) -> List[Path]:
+        """Все фото бренда/категории верхнего уровня"""
+        self.refresh_if_stale()
+        return self._categories.get(category.lower(), [])
+
+    def random_photo(self, category: Optional[str] = None, extensions: Tuple[str, ...] = (".jpg",)) -> Optional[Path]:
+        """Случайное фото (по умолчанию только jpg, как раньше rglob("*.jpg"))"""
+        self.refresh_if_stale()
+        photos = self._categories.get(category.lower(), []) if category else self._all
+        if extensions:
+            photos = [p for p in photos if p.suffix.lower() in extensions]
+        return random.choice(photos) if photos else None
+
+    def count(self, extension: Optional[str] = None) -> int:
+        """Количество фото в индексе"""
+        self.refresh_if_stale()
+        if extension is None:
+            return len(self._all)
+        return sum(1 for p in self._all if p.suffix.lower() == extension)
+
+
+# Экземпляры по базовому пути
+_photo_indexes: Dict[str, PhotoIndex] = {}
+
+
+def get_photo_index(base_path: Optional[Path] = None) -> PhotoIndex:
+    """Получить индекс фото для каталога (по умолчанию content/unified_products)"""
+    path = Path(base_path or DEFAULT_BASE_PATH).resolve()
+    key = str(path)
+    if key not in _photo_indexes:
+        index = PhotoIndex(path)
+        index.build()
+        _photo_indexes[key] = index
+    return _photo_indexes[key]
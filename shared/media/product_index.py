@@ -0,0 +1,329 @@
+"""
+Единый индекс упоминаний продуктов NL
+
+Все поиски «какой продукт упомянут в тексте» (фото в ответах куратора,
+MediaLibrary.find_in_text, референсы изображений, product_photos) идут через
+один автомат Ахо-Корасик по нормализованным ключевым словам.
+
+Источники:
+- content/unified_products/full_products_mapping.json (keyword → папка продукта)
+- таблица media_keyword_index (keyword → asset_id с приоритетом)
+
+Семантика совпадения: побеждает самое длинное ключевое слово, при равной
+длине — с большим приоритетом, затем — встретившееся раньше.
+
+Индекс строится при старте и перезагружается без остановки бота:
+- reload_if_changed() — при изменении mtime файла маппинга
+- reload() — MediaLibrary после NOTIFY от scripts/index_media_library.py
+  (маппинг и медиа-ключевые слова, автомат строится один раз вне event loop)
+"""
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from shared.utils.aho_corasick import AhoCorasick
+from shared.utils.offload import run_cpu
+
+
+DEFAULT_MAPPING_FILE = (
+    Path(__file__).parent.parent.parent / "content" / "unified_products" / "full_products_mapping.json"
+)
+
+_NON_WORD_RE = re.compile(r"[^а-яёa-z0-9 ]")
+_SPACES_RE = re.compile(r" {2,}")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст или ключевое слово для поиска
+
+    Спецсимволы заменяются пробелами (а не удаляются), поэтому
+    "3D-Slim" и "3d slim" нормализуются одинаково: "3d slim".
+    """
+    normalized = _NON_WORD_RE.sub(" ", text.lower().replace("_", " "))
+    return _SPACES_RE.sub(" ", normalized).strip()
+
+
+@dataclass
+class ProductEntry:
+    """Ключевое слово индекса"""
+    keyword: str                  # нормализованное ключевое слово
+    priority: int
+    folder: Optional[str] = None  # папка в unified_products (из маппинга)
+    # (priority, asset_id, asset_type) из media_keyword_index, по убыванию приоритета
+    assets: List[Tuple[int, int, str]] = field(default_factory=list)
+
+    def asset_ids(self, asset_type: Optional[str] = None) -> List[int]:
+        """ID медиа-ресурсов по убыванию приоритета"""
+        return [asset_id for _, asset_id, kind in self.assets if asset_type is None or kind == asset_type]
+
+
+@dataclass(frozen=True)
+class ProductMatch:
+    """Найденное в тексте упоминание продукта"""
+    entry: ProductEntry
+    start: int
+    end: int
+
+    @property
+    def keyword(self) -> str:
+        return self.entry.keyword
+
+    @property
+    def folder(self) -> Optional[str]:
+        return self.entry.folder
+
+
+class ProductIndex:
+    """Индекс упоминаний продуктов (автомат + таблица записей)"""
+
+    def __init__(self, mapping_file: Path = DEFAULT_MAPPING_FILE, reload_check_interval: float = 30.0):
+        self.mapping_file = Path(mapping_file)
+        self.reload_check_interval = reload_check_interval
+
+        self._mapping_keywords: Dict[str, str] = {}            # keyword → folder
+        self._mapping_categories: Dict[str, List[str]] = {}    # категория → папки
+        self._media_keywords: Dict[str, List[Tuple[int, int, str]]] = {}
+
+        # Автомат и записи подменяются одним присваиванием при перестройке
+        self._state: Tuple[AhoCorasick, Dict[str, ProductEntry]] = (AhoCorasick().build(), {})
+        self._mapping_mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._loaded = False
+        self.media_loaded = False
+
+    # ------------------------------------------------------------------
+    # Загрузка и перестройка
+    # ------------------------------------------------------------------
+
+    def load_mapping(self):
+        """Читает full_products_mapping.json и перестраивает индекс"""
+        mapping = self._read_mapping()
+        if mapping is None:
+            return
+        keywords, categories, mtime = mapping
+        self._install(keywords, categories, mtime, self._media_keywords,
+                      self._build_state(keywords, self._media_keywords))
+        self._loaded = True
+
+    def set_media_keywords(self, rows):
+        """
+        Заменяет ключевые слова медиа-библиотеки
+
+        Args:
+            rows: Итерируемое (keyword, priority, asset_id, asset_type)
+        """
+        media = self._parse_media_rows(rows)
+        self._install(self._mapping_keywords, self._mapping_categories, self._mapping_mtime, media,
+                      self._build_state(self._mapping_keywords, media))
+        self.media_loaded = True
+
+    async def reload(self, rows):
+        """
+        Перечитывает маппинг и заменяет ключевые слова медиа-библиотеки
+
+        Автомат строится один раз и вне event loop (run_cpu), затем
+        оба источника и автомат подменяются вместе.
+
+        Args:
+            rows: Итерируемое (keyword, priority, asset_id, asset_type)
+        """
+        prepared = await run_cpu(self._prepare, list(rows))
+        self._install(*prepared)
+        self._loaded = True
+        self.media_loaded = True
+
+    def _prepare(self, rows):
+        """Читает маппинг, разбирает медиа-ключевые слова и строит автомат (в пуле потоков)"""
+        mapping = self._read_mapping()
+        if mapping is None:
+            # Файл повреждён — оставляем прежний маппинг
+            mapping = (self._mapping_keywords, self._mapping_categories, self._mapping_mtime)
+        keywords, categories, mtime = mapping
+        media = self._parse_media_rows(rows)
+        return keywords, categories, mtime, media, self._build_state(keywords, media)
+
+    def _read_mapping(self) -> Optional[Tuple[Dict[str, str], Dict[str, List[str]], Optional[float]]]:
+        """Содержимое файла маппинга: (keywords, categories, mtime) или None при ошибке"""
+        try:
+            mtime = self.mapping_file.stat().st_mtime
+            with open(self.mapping_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data.get("keywords", {}), data.get("categories", {}), mtime
+        except FileNotFoundError:
+            logger.warning(f"Product mapping file not found: {self.mapping_file}")
+            return {}, {}, None
+        except Exception as e:
+            logger.error(f"Error loading product mapping: {e}")
+            return None
+
+    @staticmethod
+    def _parse_media_rows(rows) -> Dict[str, List[Tuple[int, int, str]]]:
+        media: Dict[str, List[Tuple[int, int, str]]] = {}
+        for keyword, priority, asset_id, asset_type in rows:
+            normalized = normalize_text(keyword)
+            if normalized:
+                media.setdefault(normalized, []).append((priority or 1, asset_id, asset_type))
+        return media
+
+    @staticmethod
+    def _build_state(
+        mapping_keywords: Dict[str, str],
+        media_keywords: Dict[str, List[Tuple[int, int, str]]]
+    ) -> Tuple[AhoCorasick, Dict[str, ProductEntry]]:
+        """Собирает новый автомат из обоих источников (не трогает текущий)"""
+        entries: Dict[str, ProductEntry] = {}
+
+        for keyword, folder in mapping_keywords.items():
+            normalized = normalize_text(keyword)
+            if not normalized:
+                continue
+            # Приоритет = длина ключевого слова (как в scripts/index_media_library.py)
+            entry = entries.setdefault(normalized, ProductEntry(keyword=normalized, priority=len(keyword)))
+            if entry.folder is None:
+                entry.folder = folder
+
+        for normalized, assets in media_keywords.items():
+            entry = entries.setdefault(normalized, ProductEntry(keyword=normalized, priority=0))
+            entry.assets = sorted(assets, key=lambda a: (-a[0], a[1]))
+            entry.priority = max(entry.priority, entry.assets[0][0])
+
+        automaton = AhoCorasick()
+        for keyword in entries:
+            automaton.add(keyword)
+        automaton.build()
+        return automaton, entries
+
+    def _install(self, keywords, categories, mtime, media, state):
+        """Подменяет источники и готовый автомат (без await между присваиваниями)"""
+        self._mapping_keywords = keywords
+        self._mapping_categories = categories
+        self._mapping_mtime = mtime
+        self._media_keywords = media
+        self._state = state
+        logger.info(f"Product index built: {len(state[1])} keywords")
+
+    def ensure_loaded(self):
+        """Загружает маппинг при первом обращении"""
+        if not self._loaded:
+            self.load_mapping()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Перезагружает маппинг, если файл изменился (не чаще reload_check_interval)
+
+        Returns:
+            True если индекс перестроен
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.reload_check_interval:
+            return False
+        self._last_check = now
+
+        try:
+            mtime = self.mapping_file.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._mapping_mtime:
+            return False
+
+        logger.info(f"Product mapping changed, reloading: {self.mapping_file}")
+        self.load_mapping()
+        return True
+
+    # ------------------------------------------------------------------
+    # Поиск
+    # ------------------------------------------------------------------
+
+    def find_all(self, text: str, asset_type: Optional[str] = None) -> List[ProductMatch]:
+        """
+        Все упомянутые продукты в порядке предпочтения
+
+        Args:
+            text: Произвольный текст
+            asset_type: Оставить только ключевые слова с медиа-ресурсами этого типа
+
+        Returns:
+            Список ProductMatch: длиннее → приоритетнее → раньше в тексте
+        """
+        self.ensure_loaded()
+        self.reload_if_changed()
+        automaton, entries = self._state
+
+        seen: Dict[str, ProductMatch] = {}
+        for start, end, keyword in automaton.iter_matches(normalize_text(text)):
+            if keyword in seen:
+                continue
+            entry = entries[keyword]
+            if asset_type is not None and not entry.asset_ids(asset_type):
+                continue
+            seen[keyword] = ProductMatch(entry=entry, start=start, end=end)
+
+        return sorted(
+            seen.values(),
+            key=lambda m: (-len(m.entry.keyword), -m.entry.priority, m.start)
+        )
+
+    def find(self, text: str, asset_type: Optional[str] = None) -> Optional[ProductMatch]:
+        """Лучшее совпадение в тексте (или None)"""
+        matches = self.find_all(text, asset_type=asset_type)
+        return matches[0] if matches else None
+
+    def lookup(self, keyword: str) -> Optional[ProductEntry]:
+        """Точное совпадение ключевого слова"""
+        self.ensure_loaded()
+        return self._state[1].get(normalize_text(keyword))
+
+    def resolve_folder(self, name: str) -> Optional[str]:
+        """
+        Папка продукта по названию/подсказке
+
+        Сначала точное совпадение ключевого слова, затем самое длинное
+        ключевое слово внутри названия, затем самое короткое ключевое слово,
+        содержащее название (неполный запрос: "коллаг" → "коллаген").
+        """
+        entry = self.lookup(name)
+        if entry and entry.folder:
+            return entry.folder
+
+        for match in self.find_all(name):
+            if match.folder:
+                return match.folder
+
+        normalized = normalize_text(name)
+        if not normalized:
+            return None
+        containing = [
+            entry for keyword, entry in self._state[1].items()
+            if entry.folder and normalized in keyword
+        ]
+        if containing:
+            return min(containing, key=lambda e: len(e.keyword)).folder
+        return None
+
+    def category_folders(self, category: str) -> List[str]:
+        """Папки продуктов категории из маппинга"""
+        self.ensure_loaded()
+        return self._mapping_categories.get(category.lower(), [])
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+
+# Глобальный экземпляр
+_product_index: Optional[ProductIndex] = None
+
+
+def get_product_index() -> ProductIndex:
+    """Получить глобальный экземпляр ProductIndex"""
+    global _product_index
+    if _product_index is None:
+        _product_index = ProductIndex()
+        _product_index.load_mapping()
+    return _product_index
@@ -0,0 +1,176 @@
+"""
+Случайный выбор чеков/историй партнёров без ORDER BY random().
+
+Все testimonials загружаются в память одним запросом, для каждой пары
+(category, tag) заранее строится список ID и таблица Alias (метод Уолкера),
+поэтому выбор с весами — O(1). Вес ресурса обратно пропорционален его
+usage_count: редко показанные чеки выпадают чаще, а последние показанные
+не повторяются подряд.
+
+Таблицы перестраиваются при загрузке нового testimonial (add) и при
+перезагрузке из БД (load).
+"""
+import random
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+# (category, tag); None — «любая»
+BucketKey = Tuple[Optional[str], Optional[str]]
+
+
+class AliasTable:
+    """Таблица Alias для выбора элемента с весами за O(1)"""
+
+    def __init__(self, items: Sequence[int], weights: Sequence[float]):
+        self.items = list(items)
+        count = len(self.items)
+        self._prob: List[float] = [0.0] * count
+        self._alias: List[int] = [0] * count
+        if not count:
+            return
+
+        total = sum(weights)
+        scaled = [w * count / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        for index in small + large:
+            self._prob[index] = 1.0
+
+    def sample(self, rng: random.Random) -> Optional[int]:
+        if not self.items:
+            return None
+        index = rng.randrange(len(self.items))
+        if rng.random() >= self._prob[index]:
+            index = self._alias[index]
+        return self.items[index]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class TestimonialSampler:
+    """Взвешенный выбор testimonial по категории и тегам"""
+
+    def __init__(self, recent_size: int = 5, rng: Optional[random.Random] = None):
+        """
+        Args:
+            recent_size: Сколько последних выданных ID не повторять
+            rng: Генератор случайных чисел (для тестов)
+        """
+        self._rng = rng or random.Random()
+        self._usage: Dict[int, int] = {}                # asset_id → usage_count
+        self._category: Dict[int, Optional[str]] = {}
+        self._tags: Dict[int, frozenset] = {}
+        self._buckets: Dict[BucketKey, AliasTable] = {}
+        self._recent: Deque[int] = deque(maxlen=recent_size)
+        self.loaded = False
+
+    @staticmethod
+    def weight(usage_count: int) -> float:
+        """Вес ресурса: чем чаще показывали, тем реже выбираем"""
+        return 1.0 / (1 + max(usage_count, 0))
+
+    def load(self, rows: Iterable[Tuple[int, Optional[str], Iterable[str], int]]):
+        """
+        Заменяет все данные сэмплера
+
+        Args:
+            rows: (asset_id, category, tags, usage_count)
+        """
+        self._usage, self._category, self._tags, self._buckets = {}, {}, {}, {}
+        for asset_id, category, tags, usage_count in rows:
+            self._usage[asset_id] = usage_count or 0
+            self._category[asset_id] = category
+            self._tags[asset_id] = frozenset(tags or ())
+        self._rebuild(self._usage.keys())
+        self.loaded = True
+        logger.info(f"Testimonial sampler loaded: {len(self._usage)} testimonials, {len(self._buckets)} buckets")
+
+    def add(self, asset_id: int, category: Optional[str], tags: Iterable[str], usage_count: int = 0):
+        """Добавляет testimonial и перестраивает только затронутые списки"""
+        self._usage[asset_id] = usage_count
+        self._category[asset_id] = category
+        self._tags[asset_id] = frozenset(tags or ())
+        self._rebuild([asset_id])
+
+    def record_use(self, asset_id: int):
+        """Отмечает выдачу (для защиты от повторов подряд)"""
+        self._recent.append(asset_id)
+        if asset_id in self._usage:
+            self._usage[asset_id] += 1
+
+    def _keys_for(self, asset_id: int) -> List[BucketKey]:
+        category = self._category[asset_id]
+        keys: List[BucketKey] = [(None, None), (category, None)]
+        for tag in self._tags[asset_id]:
+            keys.append((None, tag))
+            keys.append((category, tag))
+        return keys
+
+    def _rebuild(self, asset_ids: Iterable[int]):
+        """Перестраивает списки и Alias-таблицы для ключей указанных ресурсов"""
+        affected = {key for asset_id in asset_ids for key in self._keys_for(asset_id)}
+        members: Dict[BucketKey, List[int]] = {key: [] for key in affected}
+
+        for asset_id in sorted(self._usage):
+            for key in self._keys_for(asset_id):
+                if key in members:
+                    members[key].append(asset_id)
+
+        for key, ids in members.items():
+            self._buckets[key] = AliasTable(ids, [self.weight(self._usage[i]) for i in ids])
+
+    def sample(self, category: Optional[str] = None, tags: Optional[List[str]] = None) -> Optional[int]:
+        """
+        Случайный testimonial (ID) с учётом весов
+
+        Args:
+            category: Категория (checks, before_after, stories)
+            tags: Все эти теги должны быть у ресурса
+
+        Returns:
+            asset_id или None, если подходящих нет
+        """
+        tags = list(dict.fromkeys(tags or []))
+        if len(tags) > 1:
+            return self._sample_filtered(category, tags)
+
+        table = self._buckets.get((category, tags[0] if tags else None))
+        if not table:
+            return None
+
+        # Несколько попыток, чтобы не отдать только что показанный ресурс
+        asset_id = table.sample(self._rng)
+        if len(table) > len(self._recent):
+            for _ in range(3):
+                if asset_id not in self._recent:
+                    break
+                asset_id = table.sample(self._rng)
+        return asset_id
+
+    def _sample_filtered(self, category: Optional[str], tags: List[str]) -> Optional[int]:
+        """Несколько тегов: фильтруем самый короткий список (редкий путь, O(len))"""
+        tables = [self._buckets.get((category, tag)) for tag in tags]
+        if not all(tables):
+            return None
+
+        required = frozenset(tags)
+        smallest = min(tables, key=len)
+        candidates = [i for i in smallest.items if required <= self._tags[i]]
+        fresh = [i for i in candidates if i not in self._recent] or candidates
+        if not fresh:
+            return None
+        return self._rng.choices(fresh, weights=[self.weight(self._usage[i]) for i in fresh])[0]
+
+    def __len__(self) -> int:
+        return len(self._usage)
@@ -159,10 +159,14 @@ class PersonaManager:
             mood=mood_state
         )
 
-    def get_prompt_enhancement(self, context: PersonaContext) -> str:
+    @staticmethod
+    def get_prompt_enhancement(context: PersonaContext) -> str:
         """
         Возвращает дополнение к промпту на основе контекста персоны.
 
+        Не зависит от состояния менеджера (куратор строит дополнения
+        заранее — curator_bot/ai/persona_selection.py).
+
         Args:
             context: Контекст персоны
 
@@ -10,9 +10,13 @@ from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 
 from shared.utils.logger import get_logger
+from shared.utils.single_flight import SingleFlight
 
 logger = get_logger(__name__)
 
+# Одинаковые тексты, запрошенные одновременно, считаются один раз
+_embedding_flight = SingleFlight("embeddings")
+
 
 class EmbeddingService:
     """
@@ -83,9 +87,12 @@ class EmbeddingService:
         return [emb.tolist() for emb in embeddings]
 
     async def aget_embedding(self, text: str) -> List[float]:
-        """Асинхронная версия get_embedding."""
+        """Асинхронная версия get_embedding (одинаковые одновременные запросы объединяются)."""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.get_embedding, text)
+        return await _embedding_flight.do(
+            (self.model_name, text),
+            lambda: loop.run_in_executor(None, self.get_embedding, text)
+        )
 
     async def aget_embeddings(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """Асинхронная версия get_embeddings."""
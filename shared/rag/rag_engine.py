@@ -6,10 +6,14 @@ from typing import List, Optional, Callable, Awaitable
 from dataclasses import dataclass
 
 from shared.utils.logger import get_logger
+from shared.utils.single_flight import SingleFlight
 from .vector_store import VectorStore, SearchResult, get_vector_store
 
 logger = get_logger(__name__)
 
+# Одинаковые поисковые запросы, пришедшие одновременно, выполняются один раз
+_retrieve_flight = SingleFlight("rag_retrieve")
+
 
 @dataclass
 class RAGContext:
@@ -79,14 +83,20 @@ class RAGEngine:
             min_similarity: Минимальный порог схожести
 
         Returns:
-            Список найденных документов
+            Список найденных документов (общий для одновременных одинаковых запросов)
         """
         store = await self._get_vector_store()
-        results = await store.search(
-            query=query,
-            top_k=top_k or self.top_k,
-            category=category,
-            min_similarity=min_similarity or self.min_similarity
+        top_k = top_k or self.top_k
+        min_similarity = min_similarity or self.min_similarity
+
+        results = await _retrieve_flight.do(
+            (id(store), query, category, top_k, min_similarity),
+            lambda: store.search(
+                query=query,
+                top_k=top_k,
+                category=category,
+                min_similarity=min_similarity
+            )
         )
         logger.debug(f"Найдено {len(results)} релевантных документов для запроса: {query[:50]}...")
         return results
@@ -0,0 +1,152 @@
+"""
+Автомат Ахо-Корасик для поиска множества подстрок за один проход.
+
+Строится один раз из словаря (шаблон → значение), затем каждый текст
+сканируется за O(len(text) + число совпадений) независимо от размера словаря.
+При build() failure-ссылки сворачиваются в полную таблицу переходов (DFA),
+поэтому на каждый символ текста приходится ровно один поиск в dict.
+Для больших словарей (тысячи ключевых слов медиа-библиотеки) полная таблица
+занимает сотни мегабайт — выше max_dfa_transitions автомат остаётся на
+goto/fail-переходах.
+
+Пример:
+    automaton = AhoCorasick()
+    automaton.add("energy diet", "product")
+    automaton.add("бизнес", "business")
+    automaton.build()
+    automaton.values_in("хочу energy diet")  # {"product"}
+"""
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик со значениями у шаблонов"""
+
+    def __init__(self, max_dfa_transitions: int = 200_000):
+        self.max_dfa_transitions = max_dfa_transitions
+        # Переходы по символу: для каждого состояния dict символ → состояние
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Выходы: для каждого состояния список (длина шаблона, значение)
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        # После build(): полные переходы (или None) и уникальные значения выходов состояния
+        self._delta: Optional[List[Dict[str, int]]] = None
+        self._values: List[Tuple[Any, ...]] = []
+        self._built = False
+        self.patterns_count = 0
+
+    def add(self, pattern: str, value: Any = None):
+        """
+        Добавляет шаблон (до вызова build)
+
+        Args:
+            pattern: Подстрока для поиска (регистр не меняется — нормализуйте заранее)
+            value: Значение, которое вернётся при совпадении (по умолчанию сам шаблон)
+        """
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(pattern), pattern if value is None else value))
+        self.patterns_count += 1
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        """Строит failure-ссылки (BFS) и объединяет выходы"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Выходы суффиксных шаблонов наследуются, чтобы не ходить по fail при поиске
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+        # Полная таблица переходов: символ, которого нет в goto, берём у fail-состояния
+        # (BFS-порядок гарантирует, что таблица fail-состояния уже готова).
+        # Сворачиваем, только пока таблица укладывается в max_dfa_transitions.
+        self._delta = None
+        delta_table: List[Optional[Dict[str, int]]] = [None] * len(self._goto)
+        delta_table[0] = dict(self._goto[0])
+        total = len(delta_table[0])
+        for state in queue:
+            delta = dict(delta_table[self._fail[state]])
+            delta.update(self._goto[state])
+            delta_table[state] = delta
+            total += len(delta)
+            if total > self.max_dfa_transitions:
+                break
+        else:
+            self._delta = delta_table
+
+        self._values = [tuple(dict.fromkeys(value for _, value in out)) for out in self._out]
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        Все вхождения шаблонов (включая перекрывающиеся)
+
+        Yields:
+            (start, end, value) — позиции в тексте, end не включительно
+        """
+        if not self._built:
+            self.build()
+        delta, out = self._delta, self._out
+        state = 0
+        for index, ch in enumerate(text):
+            state = delta[state].get(ch, 0) if delta is not None else self._next(state, ch)
+            if out[state]:
+                end = index + 1
+                for length, value in out[state]:
+                    yield end - length, end, value
+
+    def values_in(self, text: str) -> Set[Any]:
+        """Множество значений всех шаблонов, встречающихся в тексте"""
+        if not self._built:
+            self.build()
+        values = self._values
+        found: Set[Any] = set()
+        state = 0
+        delta = self._delta
+        if delta is not None:
+            for ch in text:
+                state = delta[state].get(ch, 0)
+                if values[state]:
+                    found.update(values[state])
+            return found
+
+        for ch in text:
+            state = self._next(state, ch)
+            if values[state]:
+                found.update(values[state])
+        return found
+
+    def _next(self, state: int, ch: str) -> int:
+        """Переход по символу: через DFA-таблицу или по failure-ссылкам"""
+        if self._delta is not None:
+            return self._delta[state].get(ch, 0)
+        goto, fail = self._goto, self._fail
+        while state and ch not in goto[state]:
+            state = fail[state]
+        return goto[state].get(ch, 0)
+
+    def __len__(self) -> int:
+        return self.patterns_count
@@ -0,0 +1,218 @@
+"""
+Базовый буфер отложенной (write-behind) записи в БД.
+
+Общая часть ConversationWriter, UsageRecorder и AssetUsageBuffer:
+- фоновый цикл: сброс через flush_interval после первой записи в пустой буфер;
+- немедленный сброс, когда накопилось batch_size записей;
+- flush() под локом: буфер подменяется пустым, пакет пишется без блокировки
+  новых записей;
+- при ошибке пакет возвращается в буфер (не больше max_pending), а цикл
+  повторяет сброс с растущей паузой (retry backoff) — без новых записей;
+- close() останавливает цикл и сбрасывает остаток с повторами.
+
+Наследник реализует _write() и, если буфер не список, _take/_merge_back/_has_pending.
+
+Пример:
+    class EventRecorder(BatchBuffer):
+        log_prefix = "EVENTS"
+
+        async def _write(self, rows) -> int:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(Event), rows)
+                await session.commit()
+            return len(rows)
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+class BatchBuffer:
+    """Буфер записей с пакетным сбросом в БД"""
+
+    log_prefix = "BATCH"   # префикс логов
+    item_name = "rows"     # что считаем в логах
+
+    def __init__(
+        self,
+        flush_interval: float,
+        batch_size: int = 0,
+        max_pending: int = 10000,
+        close_retries: int = 3,
+        max_retry_delay: float = 60.0
+    ):
+        """
+        Args:
+            flush_interval: Задержка сброса после первой записи (сек)
+            batch_size: Сколько записей накопить до немедленного сброса (0 — только по таймеру)
+            max_pending: Сколько записей держать при недоступной БД
+            close_retries: Попыток сброса при остановке бота
+            max_retry_delay: Максимальная пауза между повторами после ошибки (сек)
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.close_retries = close_retries
+        self.max_retry_delay = max_retry_delay
+
+        self._buffer: List[Any] = []
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._retry_delay = 0.0   # > 0 — последний сброс не удался
+        self._closing = False
+
+        self.flushes = 0
+        self.failures = 0
+        self.rows_written = 0
+
+    # ------------------------------------------------------------------
+    # Для наследников
+    # ------------------------------------------------------------------
+
+    async def _write(self, batch: Any) -> int:
+        """Записывает пакет в БД; исключение — пакет вернётся в буфер"""
+        raise NotImplementedError
+
+    def _take(self) -> Any:
+        """Забирает содержимое буфера, оставляя пустой"""
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    def _merge_back(self, batch: Any):
+        """Возвращает несохранённый пакет в буфер (старые — вперёд, с ограничением)"""
+        self._buffer = (batch + self._buffer)[-self.max_pending:]
+
+    def _has_pending(self) -> bool:
+        return bool(self._buffer)
+
+    def _count(self, batch: Any) -> int:
+        """Размер пакета для логов"""
+        return len(batch)
+
+    def _after_flush(self, batch: Any):
+        """Вызывается после успешного сброса вне лока (колбэки и т.п.)"""
+
+    @property
+    def pending(self) -> int:
+        """Сколько записей ждут сброса"""
+        return len(self._buffer)
+
+    # ------------------------------------------------------------------
+    # Фоновый цикл
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self) -> bool:
+        """
+        Запускает фоновый цикл (если не запущен) и будит его
+
+        Returns:
+            False если нет event loop (скрипты/тесты) — сбросим при close()
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._flush_loop())
+        self._wakeup.set()
+        return True
+
+    def _schedule(self):
+        """Новая запись: будит цикл; при заполненном пакете — сброс немедленно"""
+        if not self._ensure_started():
+            return
+        # После ошибки не долбим БД на каждой записи — повторит цикл
+        if not self.batch_size or self._retry_delay or self.pending < self.batch_size:
+            return
+        if not (self._flush_task and not self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def _flush_loop(self):
+        """Сброс через flush_interval после первой записи (после ошибки — через паузу повтора)"""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self._retry_delay or self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    def _retry_later(self):
+        """Сброс не удался: удваиваем паузу и будим цикл для повтора"""
+        self.failures += 1
+        self._retry_delay = min(self.max_retry_delay, max(self.flush_interval, self._retry_delay * 2 or 1.0))
+        if not self._closing:
+            self._ensure_started()
+
+    # ------------------------------------------------------------------
+    # Сброс
+    # ------------------------------------------------------------------
+
+    async def flush(self) -> int:
+        """
+        Записывает буфер одним пакетом
+
+        Returns:
+            int: Количество записанных строк (0 — буфер пуст или ошибка)
+        """
+        async with self._lock:
+            if not self._has_pending():
+                return 0
+            batch = self._take()
+
+            try:
+                written = await self._write(batch)
+            except asyncio.CancelledError:
+                # Остановка посреди записи — пакет не теряем, его сбросит close()
+                self._merge_back(batch)
+                raise
+            except Exception as e:
+                logger.error(f"[{self.log_prefix}] Failed to flush {self._count(batch)} {self.item_name}: {e}")
+                self._merge_back(batch)
+                self._retry_later()
+                return 0
+
+            self._retry_delay = 0.0
+            self.flushes += 1
+            self.rows_written += written
+
+        self._after_flush(batch)
+        logger.debug(f"[{self.log_prefix}] Flushed {written} {self.item_name}")
+        return written
+
+    async def close(self):
+        """Останавливает фоновый цикл и сбрасывает остаток (с повторами)"""
+        self._closing = True
+        try:
+            for task in (self._task, self._flush_task):
+                if task and not task.done():
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+            self._task = None
+            self._flush_task = None
+
+            for attempt in range(self.close_retries):
+                await self.flush()
+                if not self._has_pending():
+                    return
+                await asyncio.sleep(0.5 * (attempt + 1))
+
+            logger.error(f"[{self.log_prefix}] {self.pending} {self.item_name} were not saved on shutdown")
+        finally:
+            self._closing = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для мониторинга"""
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "rows_written": self.rows_written,
+            "retry_delay": self._retry_delay,
+        }
@@ -0,0 +1,131 @@
+"""
+Ограниченный LRU-кэш с TTL и инвалидацией по версии.
+
+Записи хранят версию кэша на момент записи: bump_version() делает все
+текущие записи устаревшими за O(1) (например, после переиндексации, когда
+ID ресурсов могли смениться), а старые записи удаляются при обращении
+или вытесняются по LRU.
+
+Пример:
+    cache = LRUCache(maxsize=1024, ttl=3600)
+    cache.set("коллаген", snapshot)
+    cache.get("коллаген")       # snapshot (hit)
+    cache.bump_version()
+    cache.get("коллаген")       # None (miss)
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    """Статистика кэша одного экземпляра"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    avg_lookup_ms: float = 0.0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля попаданий, %"""
+        return self.hits / self.lookups * 100 if self.lookups else 0.0
+
+    def record_latency(self, elapsed_ms: float, alpha: float = 0.1):
+        """Обновляет скользящее среднее времени поиска"""
+        if self.avg_lookup_ms == 0:
+            self.avg_lookup_ms = elapsed_ms
+        else:
+            self.avg_lookup_ms = alpha * elapsed_ms + (1 - alpha) * self.avg_lookup_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hit_rate, 1),
+            "avg_lookup_ms": round(self.avg_lookup_ms, 2),
+        }
+
+
+class LRUCache(Generic[V]):
+    """LRU-кэш фиксированного размера"""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            maxsize: Максимум записей (старые вытесняются)
+            ttl: Время жизни записи в секундах (None — без ограничения)
+            clock: Источник времени (для тестов)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.stats = CacheStats()
+        self._clock = clock
+        # key → (value, expires_at, version)
+        self._data: "OrderedDict[Hashable, Tuple[V, Optional[float], int]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Значение по ключу или None (устаревшие записи удаляются)"""
+        item = self._data.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+
+        value, expires_at, version = item
+        if version != self.version or (expires_at is not None and self._clock() >= expires_at):
+            del self._data[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V):
+        """Записывает значение, вытесняя самую давно использованную запись"""
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at, self.version)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Удаляет одну запись"""
+        self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удаляет записи, ключи которых подходят под условие; возвращает их число"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def bump_version(self) -> int:
+        """Делает устаревшими все текущие записи"""
+        self.version += 1
+        return self.version
+
+    def clear(self):
+        """Удаляет все записи (статистика сохраняется)"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,117 @@
+"""
+Вынос блокирующей работы из event loop.
+
+Оба бота работают в одном процессе и одном event loop (run_bots.py):
+синхронное чтение многомегабайтного фото или обработка PIL в хендлере
+останавливает все диалоги. Такие операции выполняются в выделенных пулах
+потоков:
+
+- run_io   — файловый ввод-вывод (чтение фото, хеширование файлов)
+- run_cpu  — обработка изображений (PIL), base64 больших файлов
+
+Pillow и hashlib отпускают GIL на тяжёлых участках (декодирование,
+ресайз, кодирование, SHA256), поэтому потоков достаточно и не нужно
+сериализовать мегабайты между процессами. Пулы раздельные, чтобы долгая
+обработка картинок не задерживала чтение файлов.
+
+Пример:
+    image_base64 = await read_file_base64(photo_path)
+    file_hash = await sha256_file(path)
+    result = await run_cpu(add_watermark, image_base64, "NL International")
+"""
+import asyncio
+import base64
+import functools
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+IO_WORKERS = 8
+CPU_WORKERS = max(2, min(4, os.cpu_count() or 2))
+
+_executors: Dict[str, Optional[ThreadPoolExecutor]] = {"io": None, "cpu": None}
+
+
+def _get_executor(kind: str) -> ThreadPoolExecutor:
+    """Пул создаётся при первом обращении (и заново после shutdown_executors)"""
+    executor = _executors[kind]
+    if executor is None:
+        workers = IO_WORKERS if kind == "io" else CPU_WORKERS
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"offload-{kind}")
+        _executors[kind] = executor
+    return executor
+
+
+async def _run(kind: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs) if kwargs else functools.partial(func, *args)
+    return await loop.run_in_executor(_get_executor(kind), call)
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполняет блокирующий ввод-вывод в пуле потоков"""
+    return await _run("io", func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполняет обработку изображений и другую тяжёлую работу в отдельном пуле"""
+    return await _run("cpu", func, *args, **kwargs)
+
+
+def shutdown_executors(wait: bool = False):
+    """
+    Останавливает пулы при остановке бота
+
+    Уже запущенные задачи дорабатывают (второй бот в run_bots.py может ещё
+    ждать результат), следующий вызов run_io/run_cpu создаст пул заново.
+    """
+    for kind, executor in _executors.items():
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            _executors[kind] = None
+
+
+# ----------------------------------------------------------------------
+# Готовые асинхронные обёртки
+# ----------------------------------------------------------------------
+
+def _read_base64(path: Union[str, Path]) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def _sha256_file(path: Union[str, Path]) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def read_file_bytes(path: Union[str, Path]) -> bytes:
+    """Читает файл целиком вне event loop"""
+    return await run_io(Path(path).read_bytes)
+
+
+async def read_file_base64(path: Union[str, Path]) -> str:
+    """Читает файл и кодирует в base64 вне event loop"""
+    return await run_cpu(_read_base64, path)
+
+
+async def decode_base64(data: str) -> bytes:
+    """Декодирует base64 (картинка поста — мегабайты) вне event loop"""
+    return await run_cpu(base64.b64decode, data)
+
+
+async def sha256_file(path: Union[str, Path]) -> str:
+    """SHA256 файла вне event loop"""
+    return await run_io(_sha256_file, path)
+
+
+async def path_exists(path: Union[str, Path]) -> bool:
+    """Проверка существования файла вне event loop (сетевые/медленные диски)"""
+    return await run_io(os.path.exists, path)
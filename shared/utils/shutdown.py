@@ -0,0 +1,23 @@
+"""
+Остановка общих ресурсов процесса.
+
+В run_bots.py оба бота работают в одном процессе, и часть синглтонов у них
+общая: буфер usage LLM, менеджеры токенов, пулы offload. Если их закрывает
+main бота, который остановился первым, второй бот ещё дорабатывает апдейты
+без них. Поэтому main каждого бота закрывает их только при самостоятельном
+запуске (close_shared=True), а run_bots.py — один раз, после остановки обоих.
+"""
+from loguru import logger
+
+
+async def close_shared_resources():
+    """Сбрасывает usage LLM и останавливает токены и пулы потоков"""
+    # Импорт здесь: shared.utils не должен тянуть AI клиентов при импорте
+    from shared.ai_clients.token_manager import close_token_managers
+    from shared.ai_clients.usage_recorder import get_usage_recorder
+    from shared.utils.offload import shutdown_executors
+
+    await get_usage_recorder().close()
+    await close_token_managers()
+    shutdown_executors()
+    logger.info("Shared resources closed")
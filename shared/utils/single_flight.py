@@ -0,0 +1,107 @@
+"""
+Single-flight: объединение одинаковых одновременных вызовов.
+
+Если несколько корутин одновременно запрашивают одно и то же (одинаковый ключ),
+реальный вызов выполняется один раз, остальные ждут его результат.
+Типичный случай — после публикации поста много пользователей почти
+одновременно задают один и тот же вопрос.
+
+Пример:
+    _flight = SingleFlight("embeddings")
+    vector = await _flight.do(text, lambda: compute(text))
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def make_key(*parts: Any) -> str:
+    """Стабильный ключ из произвольных JSON-совместимых частей (промпты, контекст, параметры)"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Группа single-flight вызовов с общей статистикой"""
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Имя группы (для статистики)
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}  # Сколько корутин ждут каждый вызов
+        self.calls = 0
+        self.saved = 0
+        _registry[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет fn или присоединяется к уже идущему вызову с тем же ключом
+
+        Вызов выполняется в отдельной задаче: отмена одного из ожидающих
+        не отменяет результат для остальных. Когда отменяется последний
+        ожидающий, вызов отменяется тоже — например, проигравший hedge
+        маршрутизатора прерывает запрос к провайдеру, а не оставляет его
+        работать вхолостую.
+
+        Args:
+            key: Ключ идентичности запроса
+            fn: Фабрика корутины (вызывается только для первого запроса)
+
+        Returns:
+            Результат fn (общий для всех ожидающих — не изменяйте его)
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.saved += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._release(key, task)
+
+    def _release(self, key: Hashable, task: asyncio.Future):
+        """Ожидающий ушёл; если он был последним — отменяем незавершённый вызов"""
+        left = self._waiters[task] - 1
+        if left:
+            self._waiters[task] = left
+            return
+        del self._waiters[task]
+        if not task.done():
+            task.cancel()
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        """Убирает завершённый вызов из таблицы"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Помечаем исключение как прочитанное, если все ожидающие отменились
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "saved": self.saved, "inflight": self.inflight}
+
+
+_registry: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Статистика всех single-flight групп: сколько дублирующих вызовов сэкономлено"""
+    return {name: flight.get_stats() for name, flight in _registry.items()}
@@ -0,0 +1,15 @@
+"""
+Приём апдейтов Telegram: long polling, webhook или шарды
+
+Экспорт:
+- WebhookServer / get_webhook_server: Один aiohttp-сервер на оба бота
+- run_dispatcher: Запуск диспетчера в режиме BOT_MODE
+- HashRing: Консистентное хеширование telegram_id по воркерам
+- ShardRouter: Фронтовой роутер webhook → воркер-владелец пользователя
+"""
+
+from .server import WebhookServer, get_webhook_server, run_dispatcher
+from .hash_ring import HashRing
+from .shard_router import ShardRouter
+
+__all__ = ["WebhookServer", "get_webhook_server", "run_dispatcher", "HashRing", "ShardRouter"]
@@ -0,0 +1,64 @@
+"""
+Консистентное хеширование ключей (telegram_id) по узлам (воркерам).
+
+При добавлении или удалении узла переезжает только ~1/N ключей, поэтому
+горячее состояние остальных пользователей (контексты воронки, кэш истории)
+остаётся у своих воркеров. Виртуальные узлы (replicas) выравнивают нагрузку.
+
+Кольцо детерминировано: у роутера и у воркеров, построенных по одному
+списку узлов, node_for() совпадает.
+"""
+import bisect
+import hashlib
+from typing import Dict, Hashable, Iterable, List, Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Кольцо узлов с виртуальными точками"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 128):
+        """
+        Args:
+            nodes: Начальные узлы
+            replicas: Виртуальных точек на узел
+        """
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: self._owners[p] for p in self._points}
+
+    def node_for(self, key: Hashable) -> Optional[str]:
+        """Узел, которому принадлежит ключ (None — кольцо пустое)"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[self._points[index]]
+
+    def __len__(self) -> int:
+        return len(self._nodes)
@@ -0,0 +1,318 @@
+"""
+Приём апдейтов Telegram через webhook.
+
+Long polling добавляет задержку (запрос getUpdates → ответ → следующий
+запрос) и ограничивает пропускную способность одним потоком getUpdates
+на процесс. В режиме webhook Telegram сам присылает апдейты POST-запросами,
+до max_connections параллельно.
+
+WebhookServer — один aiohttp-сервер на оба бота (run_bots.py):
+- путь на бота: {WEBHOOK_PATH}/curator, {WEBHOOK_PATH}/content;
+- проверка заголовка X-Telegram-Bot-Api-Secret-Token (свой секрет на бота);
+- ответ 200 сразу, апдейт передаётся диспетчеру в фоновой задаче
+  (Telegram не ждёт обработчик и не шлёт апдейт повторно);
+- при остановке каждый бот дожидается обработки своих принятых апдейтов
+  (serve() возвращается только после этого, до finally в main бота).
+
+Режим выбирается настройкой BOT_MODE (polling, webhook, shard_worker);
+run_dispatcher() вызывается из main каждого бота вместо dp.start_polling.
+"""
+import asyncio
+import hashlib
+import hmac
+import secrets
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from loguru import logger
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def derive_secret(secret: str, name: str) -> str:
+    """Секрет для имени (бот, служебный канал) из общего секрета: hex, годится для Telegram"""
+    return hmac.new(secret.encode(), name.encode(), hashlib.sha256).hexdigest()
+
+
+@dataclass
+class _BotEntry:
+    """Зарегистрированный бот: куда передавать апдейты и чем их проверять"""
+
+    name: str
+    bot: Bot
+    dispatcher: Dispatcher
+    secret: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    # Апдейты бота в обработке
+    tasks: Set[asyncio.Task] = field(default_factory=set)
+
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий апдейты нескольких ботов на одном порту"""
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        base_url: str = "",
+        path: str = "/webhook",
+        secret: str = "",
+        max_connections: int = 40,
+        drain_timeout: float = 30.0
+    ):
+        """
+        Args:
+            host: Адрес для прослушивания
+            port: Порт (один на все боты)
+            base_url: Публичный адрес, который регистрируется в Telegram
+            path: Префикс пути, к нему добавляется имя бота
+            secret: Общий секрет, из которого выводятся секреты ботов
+            max_connections: Сколько параллельных соединений разрешить Telegram
+            drain_timeout: Сколько ждать обработку принятых апдейтов при остановке (сек)
+        """
+        self.host = host
+        self.port = port
+        self.base_url = base_url.rstrip("/")
+        self.path = "/" + path.strip("/")
+        self.max_connections = max_connections
+        self.drain_timeout = drain_timeout
+        self._secret = secret or secrets.token_hex(32)
+
+        self._bots: Dict[str, _BotEntry] = {}
+        self._serving = 0  # serve() ещё не вернулись (включая дорабатывающих апдейты)
+        self._routes: List[Tuple[str, str, Callable]] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self._start_lock = asyncio.Lock()
+        self._stopped: Optional[asyncio.Event] = None
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected_secret = 0
+        self.bad_requests = 0
+        self._handle_time_total = 0.0
+
+    # === Регистрация ботов ===
+
+    def bot_secret(self, name: str) -> str:
+        """Секрет бота для заголовка X-Telegram-Bot-Api-Secret-Token ([A-Za-z0-9_-])"""
+        return derive_secret(self._secret, name)
+
+    def url_for(self, name: str) -> str:
+        return f"{self.base_url}{self.path}/{name}"
+
+    def register(self, name: str, bot: Bot, dispatcher: Dispatcher, **kwargs: Any):
+        """Подключает бота к серверу (kwargs передаются в feed_update)"""
+        self._bots[name] = _BotEntry(name, bot, dispatcher, self.bot_secret(name), kwargs)
+
+    def unregister(self, name: str):
+        self._bots.pop(name, None)
+
+    def add_route(self, method: str, path: str, handler: Callable):
+        """Дополнительный служебный маршрут (до start())"""
+        self._routes.append((method, path, handler))
+
+    def create_app(self) -> web.Application:
+        """aiohttp-приложение: POST {path}/{bot}, GET /health и служебные маршруты"""
+        app = web.Application()
+        app.router.add_post(self.path + "/{bot}", self.handle_update)
+        app.router.add_get("/health", self.handle_health)
+        for method, path, handler in self._routes:
+            app.router.add_route(method, path, handler)
+        return app
+
+    # === Обработка запросов ===
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        entry = self._bots.get(request.match_info["bot"])
+        if entry is None:
+            return web.Response(status=404)
+
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, entry.secret):
+            self.rejected_secret += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": entry.bot})
+        except Exception as e:
+            self.bad_requests += 1
+            logger.warning(f"[WEBHOOK] Bad update for {entry.name}: {e}")
+            return web.Response(status=400)
+
+        # Отвечаем сразу: обработчик (LLM, БД) не держит соединение Telegram
+        self.received += 1
+        task = asyncio.create_task(self._process(entry, update))
+        for tasks in (self._tasks, entry.tasks):
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    async def _process(self, entry: _BotEntry, update: Update):
+        started = time.perf_counter()
+        try:
+            await entry.dispatcher.feed_update(entry.bot, update, **entry.kwargs)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"[WEBHOOK] {entry.name} update {update.update_id} failed: {e}")
+        finally:
+            self._handle_time_total += time.perf_counter() - started
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"bots": sorted(self._bots), **self.get_stats()})
+
+    # === Жизненный цикл ===
+
+    async def start(self):
+        """Запускает сервер (повторные вызовы ничего не делают)"""
+        async with self._start_lock:
+            if self._runner is not None:
+                return
+            self._stopped = asyncio.Event()
+            runner = web.AppRunner(self.create_app(), handle_signals=False)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, self.port).start()
+            self._runner = runner
+            self._install_signal_handlers()
+            logger.info(f"[WEBHOOK] Listening on {self.host}:{self.port}{self.path}/*")
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows или не главный поток — остаётся KeyboardInterrupt
+
+    def request_stop(self):
+        """Просит все serve() завершиться (сигнал SIGTERM/SIGINT)"""
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def serve(
+        self,
+        name: str,
+        bot: Bot,
+        dispatcher: Dispatcher,
+        set_webhook: bool = True,
+        **kwargs: Any
+    ):
+        """
+        Подключает бота, регистрирует webhook в Telegram и ждёт остановки.
+
+        Аналог dp.start_polling: возвращается по SIGTERM/SIGINT, после чего
+        main бота выполняет свой finally.
+
+        Args:
+            set_webhook: False — апдейты приходят не от Telegram, а от
+                шард-роутера (он сам регистрирует webhook)
+        """
+        if set_webhook and not self.base_url:
+            raise RuntimeError("WEBHOOK_BASE_URL is required for BOT_MODE=webhook")
+
+        self.register(name, bot, dispatcher, **kwargs)
+        self._serving += 1
+        try:
+            await self.start()
+            if set_webhook:
+                await bot.set_webhook(
+                    url=self.url_for(name),
+                    secret_token=self.bot_secret(name),
+                    allowed_updates=dispatcher.resolve_used_update_types(),
+                    max_connections=self.max_connections
+                )
+                logger.info(f"[WEBHOOK] {name} webhook set to {self.url_for(name)}")
+            await self._stopped.wait()
+        finally:
+            # Webhook в Telegram не удаляем: апдейты копятся там, пока бот перезапускается
+            entry = self._bots.get(name)
+            self.unregister(name)
+            # Свои апдейты дорабатываем до возврата: после него main бота
+            # закрывает свои ресурсы, а второй бот может ещё работать
+            try:
+                if entry is not None:
+                    await self.drain(entry.tasks)
+            finally:
+                self._serving -= 1
+            # Сервер останавливает последний вернувшийся бот
+            if not self._serving:
+                await self.stop()
+
+    async def drain(self, tasks: Optional[Set[asyncio.Task]] = None):
+        """
+        Дожидается фоновой обработки уже принятых апдейтов (не дольше drain_timeout)
+
+        Args:
+            tasks: Апдейты одного бота (по умолчанию — все)
+        """
+        tasks = set(self._tasks if tasks is None else tasks)
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"[WEBHOOK] {len(pending)} updates cancelled on shutdown")
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        runner, self._runner = self._runner, None
+        await runner.cleanup()  # Сначала перестаём принимать новые апдейты
+        await self.drain()
+        logger.info(f"[WEBHOOK] Stopped: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        finished = self.processed + self.failed
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "in_flight": len(self._tasks),
+            "rejected_secret": self.rejected_secret,
+            "bad_requests": self.bad_requests,
+            "avg_handle_ms": round(self._handle_time_total / finished * 1000, 1) if finished else 0.0,
+        }
+
+
+# Глобальный экземпляр (общий для обоих ботов в run_bots.py)
+_webhook_server: Optional[WebhookServer] = None
+
+
+def get_webhook_server() -> WebhookServer:
+    """Получить глобальный экземпляр WebhookServer"""
+    global _webhook_server
+    if _webhook_server is None:
+        from shared.config.settings import settings
+        _webhook_server = WebhookServer(
+            host=settings.webhook_host,
+            port=settings.webhook_port,
+            base_url=settings.webhook_base_url,
+            path=settings.webhook_path,
+            secret=settings.webhook_secret
+        )
+    return _webhook_server
+
+
+async def run_dispatcher(name: str, bot: Bot, dispatcher: Dispatcher, **kwargs: Any):
+    """Принимает апдейты бота в режиме BOT_MODE (polling или webhook) до остановки"""
+    from shared.config.settings import settings
+
+    if settings.bot_mode == "webhook":
+        await get_webhook_server().serve(name, bot, dispatcher, **kwargs)
+        return
+    if settings.bot_mode == "shard_worker":
+        # Апдейты пересылает шард-роутер (curator_bot/sharding.py)
+        await get_webhook_server().serve(name, bot, dispatcher, set_webhook=False, **kwargs)
+        return
+
+    # После работы в режиме webhook getUpdates отвечает 409, пока webhook не снят
+    await bot.delete_webhook(drop_pending_updates=False)
+    await dispatcher.start_polling(bot, allowed_updates=dispatcher.resolve_used_update_types(), **kwargs)
@@ -0,0 +1,255 @@
+"""
+Фронтовой шард-роутер: webhook Telegram → воркер, владеющий пользователем.
+
+Несколько воркеров куратора (процессы на разных ядрах или машинах) держат
+горячее состояние только своих пользователей. Роутер принимает webhook
+Telegram, достаёт из апдейта telegram_id и пересылает апдейт как есть
+воркеру по консистентному хешу (HashRing). Апдейты одного пользователя
+всегда приходят в один процесс.
+
+Членство:
+- воркер раз в heartbeat_interval шлёт POST /shards/heartbeat {worker, url};
+- воркер без heartbeat дольше heartbeat_ttl, недоступный при пересылке
+  или приславший POST /shards/leave исключается;
+- при изменении состава роутер сначала рассылает воркерам новый список
+  (POST /shards/ring — воркер сохраняет изменения и выгружает чужих
+  пользователей), потом переключает кольцо.
+
+Служебные запросы подписываются секретом derive_secret(WEBHOOK_SECRET, "shards"),
+пересылаемые апдейты — секретом бота, который проверяет WebhookServer воркера.
+
+Запуск роутера и воркеров на одной машине: scripts/run_curator_shards.py
+"""
+import asyncio
+import hmac
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+from loguru import logger
+
+from shared.webhook.hash_ring import HashRing
+from shared.webhook.server import SECRET_HEADER, derive_secret
+
+SHARDS_CHANNEL = "shards"
+
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """telegram_id автора апдейта (message.from, callback_query.from, ...)"""
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        for field in ("from", "user"):
+            user = payload.get(field)
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+        chat = payload.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+class ShardRouter:
+    """Принимает webhook одного бота и раскладывает апдейты по воркерам"""
+
+    def __init__(
+        self,
+        secret: str,
+        bot_name: str = "curator",
+        path: str = "/webhook",
+        heartbeat_ttl: float = 6.0,
+        forward_timeout: float = 10.0,
+        replicas: int = 128
+    ):
+        """
+        Args:
+            secret: Общий WEBHOOK_SECRET (тот же у всех воркеров)
+            bot_name: Имя бота в пути webhook ({path}/{bot_name})
+            path: Префикс пути webhook
+            heartbeat_ttl: Через сколько секунд без heartbeat воркер исключается
+            forward_timeout: Таймаут пересылки апдейта воркеру (сек)
+            replicas: Виртуальных точек кольца на воркер
+        """
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET is required for sharding")
+        self.bot_name = bot_name
+        self.path = "/" + path.strip("/")
+        self.heartbeat_ttl = heartbeat_ttl
+        self.forward_timeout = forward_timeout
+        self.replicas = replicas
+
+        self.bot_secret = derive_secret(secret, bot_name)
+        self.shards_secret = derive_secret(secret, SHARDS_CHANNEL)
+
+        self.ring = HashRing(replicas=replicas)
+        self._workers: Dict[str, str] = {}        # worker_id → url
+        self._last_seen: Dict[str, float] = {}
+        self._membership_lock = asyncio.Lock()
+        self._http: Optional[ClientSession] = None
+        self._expiry_task: Optional[asyncio.Task] = None
+
+        self.forwarded: Dict[str, int] = {}
+        self.forward_errors = 0
+        self.rejected_secret = 0
+        self.unavailable = 0
+        self.rebalances = 0
+
+    # === Приложение ===
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"{self.path}/{self.bot_name}", self.handle_update)
+        app.router.add_post("/shards/heartbeat", self.handle_heartbeat)
+        app.router.add_post("/shards/leave", self.handle_leave)
+        app.router.add_get("/shards", self.handle_status)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application):
+        self._http = ClientSession(timeout=ClientTimeout(total=self.forward_timeout))
+        self._expiry_task = asyncio.create_task(self._expiry_loop())
+
+    async def _on_cleanup(self, app: web.Application):
+        if self._expiry_task:
+            self._expiry_task.cancel()
+        if self._http:
+            await self._http.close()
+
+    # === Апдейты ===
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.bot_secret):
+            self.rejected_secret += 1
+            return web.Response(status=401)
+
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        user_id = extract_user_id(update)
+        key = user_id if user_id is not None else update.get("update_id", 0)
+
+        # Недоступный воркер исключаем и пробуем нового владельца
+        for _ in range(2):
+            worker = self.ring.node_for(key)
+            if worker is None:
+                break
+            if await self._forward(worker, body):
+                return web.Response()
+            await self._remove_worker(worker, reason="forward failed")
+
+        # Воркеров нет — Telegram повторит доставку позже
+        self.unavailable += 1
+        return web.Response(status=503)
+
+    async def _forward(self, worker: str, body: bytes) -> bool:
+        url = self._workers.get(worker)
+        if url is None:
+            return False
+        try:
+            async with self._http.post(
+                f"{url}{self.path}/{self.bot_name}",
+                data=body,
+                headers={SECRET_HEADER: self.bot_secret, "Content-Type": "application/json"}
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+            self.forwarded[worker] = self.forwarded.get(worker, 0) + 1
+            return True
+        except Exception as e:
+            self.forward_errors += 1
+            logger.warning(f"[SHARDS] Forward to {worker} failed: {e}")
+            return False
+
+    # === Членство ===
+
+    def _check_shards_secret(self, request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.shards_secret)
+
+    async def handle_heartbeat(self, request: web.Request) -> web.Response:
+        if not self._check_shards_secret(request):
+            return web.Response(status=401)
+        data = await request.json()
+        worker, url = data["worker"], data["url"].rstrip("/")
+
+        self._last_seen[worker] = time.monotonic()
+        if self._workers.get(worker) != url:
+            self._workers[worker] = url
+            await self._rebalance(reason=f"{worker} joined")
+        return web.json_response({"workers": self.ring.nodes})
+
+    async def handle_leave(self, request: web.Request) -> web.Response:
+        if not self._check_shards_secret(request):
+            return web.Response(status=401)
+        data = await request.json()
+        await self._remove_worker(data["worker"], reason="left")
+        return web.json_response({"workers": self.ring.nodes})
+
+    async def _remove_worker(self, worker: str, reason: str):
+        if self._workers.pop(worker, None) is None:
+            return
+        self._last_seen.pop(worker, None)
+        await self._rebalance(reason=f"{worker} {reason}")
+
+    async def _expiry_loop(self):
+        """Исключает воркеры, переставшие слать heartbeat"""
+        while True:
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+            now = time.monotonic()
+            for worker, seen in list(self._last_seen.items()):
+                if now - seen > self.heartbeat_ttl:
+                    await self._remove_worker(worker, reason="missed heartbeats")
+
+    async def _rebalance(self, reason: str):
+        """Рассылает новый состав воркерам и переключает кольцо"""
+        async with self._membership_lock:
+            members = sorted(self._workers)
+            if members == self.ring.nodes:
+                return
+
+            # Воркеры сохраняют изменения уходящих пользователей до переключения кольца
+            await asyncio.gather(
+                *(self._send_ring(worker, url, members) for worker, url in list(self._workers.items()))
+            )
+            self.ring = HashRing(members, replicas=self.replicas)
+            self.rebalances += 1
+            logger.info(f"[SHARDS] Rebalanced ({reason}): {members}")
+
+    async def _send_ring(self, worker: str, url: str, members: List[str]):
+        try:
+            async with self._http.post(
+                f"{url}/shards/ring",
+                json={"workers": members, "replicas": self.replicas},
+                headers={SECRET_HEADER: self.shards_secret}
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+        except Exception as e:
+            logger.warning(f"[SHARDS] Failed to send ring to {worker}: {e}")
+
+    # === Статус ===
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "workers": {
+                worker: {
+                    "url": url,
+                    "last_seen_sec": round(now - self._last_seen.get(worker, now), 1),
+                    "forwarded": self.forwarded.get(worker, 0),
+                }
+                for worker, url in sorted(self._workers.items())
+            },
+            "ring": self.ring.nodes,
+            "rebalances": self.rebalances,
+            "forward_errors": self.forward_errors,
+            "rejected_secret": self.rejected_secret,
+            "unavailable": self.unavailable,
+        }
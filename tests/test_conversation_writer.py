@@ -0,0 +1,193 @@
+"""
+Тесты отложенной записи диалогов куратора
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.dialects import postgresql
+
+import curator_bot.database.conversation_writer as writer_module
+from curator_bot.database.conversation_writer import ConversationWriter
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self._ids = ids
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._ids
+
+
+class FakeSession:
+    """Сессия, которая запоминает запросы и выдаёт ID вставленным строкам"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.db.statements.append((sql, params))
+        if params is not None:
+            ids = list(range(self.db.next_id, self.db.next_id + len(params)))
+            self.db.next_id += len(params)
+            self.db.rows.extend(params)
+            return FakeResult(ids)
+        return FakeResult([])
+
+    async def commit(self):
+        self.db.commits += 1
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.statements = []
+        self.rows = []
+        self.commits = 0
+        self.next_id = 100
+        self.fail = False
+
+    def session(self):
+        if self.fail:
+            raise ConnectionError("db is down")
+        return FakeSession(self)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(writer_module, "AsyncSessionLocal", db.session)
+    return db
+
+
+@pytest_asyncio.fixture
+async def writer(db):
+    writer = ConversationWriter(flush_interval=0.05, batch_size=10)
+    yield writer
+    await writer.close()
+
+
+class TestConversationWriter:
+    """Пакетная запись сообщений и активности"""
+
+    @pytest.mark.asyncio
+    async def test_turn_is_one_transaction(self, writer, db):
+        saved = []
+        writer.touch_user(1)
+        writer.add_message(1, "user", "Привет")
+        writer.add_message(1, "bot", "Здравствуй!", ai_model="claude", tokens_used=42, on_saved=saved.append)
+
+        assert db.commits == 0
+        assert await writer.flush() == 2
+
+        assert db.commits == 1
+        insert_sql, rows = db.statements[0]
+        assert insert_sql.startswith("INSERT INTO conversation_messages")
+        assert "RETURNING" in insert_sql
+        assert [r["sender"] for r in rows] == ["user", "bot"]
+        assert rows[1]["tokens_used"] == 42
+        assert saved == [101]
+
+    @pytest.mark.asyncio
+    async def test_activity_updates_use_values(self, writer, db):
+        writer.touch_user(1, datetime(2024, 1, 1))
+        writer.touch_user(2, datetime(2024, 1, 2), onboarding=False)
+        writer.touch_user(1, datetime(2024, 1, 3))
+        await writer.flush()
+
+        sqls = [sql for sql, _ in db.statements]
+        assert len(sqls) == 2
+        assert sqls[0].startswith("UPDATE users SET last_activity=activity.at")
+        assert "FROM (VALUES" in sqls[0]
+        assert "UPDATE user_onboarding_progress" in sqls[1]
+        assert "is_completed IS false" in sqls[1]
+        assert "last_reminder_hours" in sqls[1]
+
+    @pytest.mark.asyncio
+    async def test_timer_flush(self, writer, db):
+        writer.add_message(1, "user", "Привет")
+        await asyncio.sleep(0.15)
+        assert writer.pending == 0
+        assert db.commits == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_size_triggers_flush(self, db):
+        writer = ConversationWriter(flush_interval=60, batch_size=5)
+        try:
+            for i in range(5):
+                writer.add_message(1, "user", f"msg {i}")
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert len(db.rows) == 5
+        finally:
+            await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_order(self, writer, db):
+        writer.add_message(1, "user", "first")
+        writer.touch_user(1, datetime(2024, 1, 1))
+        db.fail = True
+        assert await writer.flush() == 0
+
+        writer.add_message(1, "user", "second")
+        assert [m.message_text for m in writer._messages] == ["first", "second"]
+        assert writer._user_activity[1] == datetime(2024, 1, 1)
+
+        db.fail = False
+        assert await writer.flush() == 2
+        assert [r["message_text"] for r in db.rows] == ["first", "second"]
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_is_retried_with_backoff(self, writer, db):
+        writer.max_retry_delay = 0.1
+        db.fail = True
+        writer.add_message(1, "user", "Привет")
+        await asyncio.sleep(0.1)
+
+        assert writer.failures >= 1
+        assert writer.get_stats()["retry_delay"] > 0
+        assert writer.pending == 1
+
+        # Новых записей нет — цикл сам повторяет сброс
+        db.fail = False
+        await asyncio.sleep(0.3)
+        assert writer.pending == 0
+        assert [r["message_text"] for r in db.rows] == ["Привет"]
+        assert writer.get_stats()["retry_delay"] == 0
+
+    @pytest.mark.asyncio
+    async def test_has_pending(self, writer):
+        writer.add_message(1, "user", "Привет")
+        assert writer.has_pending(1)
+        assert not writer.has_pending(2)
+        await writer.flush()
+        assert not writer.has_pending(1)
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_remaining(self, db):
+        writer = ConversationWriter(flush_interval=60)
+        writer.add_message(1, "user", "Пока")
+        await writer.close()
+        assert len(db.rows) == 1
+        assert writer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_callback_errors_do_not_break_flush(self, writer, db):
+        def broken(message_id):
+            raise RuntimeError("boom")
+
+        saved = []
+        writer.add_message(1, "bot", "a", on_saved=broken)
+        writer.add_message(1, "bot", "b", on_saved=saved.append)
+        assert await writer.flush() == 2
+        assert saved == [101]
@@ -0,0 +1,148 @@
+"""
+Тесты параллельных этапов handle_message куратора
+"""
+import asyncio
+import importlib
+import sys
+import time
+from types import ModuleType, SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from curator_bot.database.conversation_writer import ConversationWriter
+
+
+def _import_messages_module():
+    """
+    Импорт обработчика без sentence_transformers: RAG в этих тестах
+    подменяется целиком, модель эмбеддингов не нужна
+    """
+    try:
+        importlib.import_module("sentence_transformers")
+    except ImportError:
+        stub = ModuleType("sentence_transformers")
+        stub.SentenceTransformer = None
+        sys.modules["sentence_transformers"] = stub
+        try:
+            return importlib.import_module("curator_bot.handlers.messages")
+        finally:
+            del sys.modules["sentence_transformers"]
+    return importlib.import_module("curator_bot.handlers.messages")
+
+
+messages_module = _import_messages_module()
+
+
+STAGE_DELAY = 0.2
+
+
+class FakeSession:
+    """Сессия из DbSessionMiddleware: пользователь уже загружен"""
+
+    async def commit(self):
+        pass
+
+
+class SlowHistoryCache:
+    async def get_history(self, session, user_id):
+        await asyncio.sleep(STAGE_DELAY)
+        return []
+
+    async def append(self, user_id, sender, message_text, timestamp):
+        return SimpleNamespace(sender=sender, message_text=message_text, timestamp=timestamp)
+
+
+class FakeMessage:
+    def __init__(self, text):
+        self.text = text
+        self.from_user = SimpleNamespace(id=10)
+        self.chat = SimpleNamespace(id=10)
+        self.bot = SimpleNamespace(send_chat_action=self._noop)
+        self.answers = []
+
+    async def _noop(self, *args, **kwargs):
+        pass
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+@pytest_asyncio.fixture
+async def pipeline(monkeypatch):
+    user = SimpleNamespace(id=1, telegram_id=10, lead_status=None, first_name="Анна")
+    writer = ConversationWriter(flush_interval=60)
+    calls = {"user": user, "rag_started": 0}
+
+    async def slow_rag(text, intent):
+        calls["rag_started"] += 1
+        await asyncio.sleep(STAGE_DELAY)
+        return ["[faq]: доставка 3 дня"]
+
+    async def generate_response(**kwargs):
+        calls["dispatched_at"] = time.perf_counter()
+        calls["knowledge_fragments"] = kwargs["knowledge_fragments"]
+        return "Ответ"
+
+    monkeypatch.setattr(messages_module, "get_history_cache", SlowHistoryCache)
+    monkeypatch.setattr(messages_module, "get_conversation_writer", lambda: writer)
+    monkeypatch.setattr(messages_module, "retrieve_knowledge", slow_rag)
+    monkeypatch.setattr(messages_module.chat_engine, "should_use_rag", lambda intent: True)
+    monkeypatch.setattr(messages_module.chat_engine, "generate_response", generate_response)
+    monkeypatch.setattr(messages_module.product_manager, "extract_product_from_content", lambda text: None)
+    monkeypatch.setattr(messages_module.business_presenter, "should_send_business_media", lambda *a: None)
+    yield calls
+
+    # Записи в БД в этих тестах не проверяются — только останавливаем цикл сброса
+    writer._messages.clear()
+    writer._user_activity.clear()
+    writer._onboarding_activity.clear()
+    await writer.close()
+
+
+class TestHandleMessagePipeline:
+    """История и RAG перекрываются во времени"""
+
+    @pytest.mark.asyncio
+    async def test_history_and_rag_overlap(self, pipeline):
+        message = FakeMessage("Сколько идёт доставка?")
+        start = time.perf_counter()
+        await messages_module.handle_message(message, FakeSession(), pipeline["user"])
+
+        to_llm = pipeline["dispatched_at"] - start
+        # Последовательно было бы 2 × STAGE_DELAY
+        assert to_llm < STAGE_DELAY * 1.5
+        assert pipeline["knowledge_fragments"] == ["[faq]: доставка 3 дня"]
+        assert message.answers == ["Ответ"]
+
+    @pytest.mark.asyncio
+    async def test_no_rag_for_unknown_user(self, pipeline):
+        tasks_before = asyncio.all_tasks()
+
+        message = FakeMessage("Сколько идёт доставка?")
+        await messages_module.handle_message(message, FakeSession(), None)
+        await asyncio.sleep(0)
+
+        leftover = [t for t in asyncio.all_tasks() - tasks_before if not t.done()]
+        assert leftover == []
+        assert pipeline["rag_started"] == 0
+        assert "/start" in message.answers[0]
+
+    @pytest.mark.asyncio
+    async def test_no_rag_for_contact_reply(self, pipeline, monkeypatch):
+        flushed = []
+
+        async def flush():
+            flushed.append(True)
+
+        user = pipeline["user"]
+        user.lead_status = "contact_requested"
+        monkeypatch.setattr(messages_module.get_conversation_writer(), "flush", flush)
+
+        message = FakeMessage("+7 900 123-45-67")
+        await messages_module.handle_message(message, FakeSession(), user)
+
+        assert user.phone == "+79001234567"
+        assert user.lead_status == "hot"
+        assert flushed == [True]
+        assert pipeline["rag_started"] == 0
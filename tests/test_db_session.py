@@ -0,0 +1,151 @@
+"""
+Тесты DbSessionMiddleware: одна сессия и один запрос пользователя на апдейт
+"""
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from curator_bot.database.models import User
+from curator_bot.middlewares.db_session import DbSessionMiddleware
+
+# ARRAY в прогрессе онбординга не создаётся в SQLite — таблица вручную
+ONBOARDING_DDL = """
+CREATE TABLE user_onboarding_progress (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER UNIQUE REFERENCES users(id),
+    current_day INTEGER,
+    completed_tasks TEXT,
+    started_at DATETIME,
+    last_activity DATETIME,
+    last_reminder_hours INTEGER,
+    is_completed BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+@pytest_asyncio.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(User.__table__.create)
+        await conn.execute(text(ONBOARDING_DDL))
+
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add(User(telegram_id=10, first_name="Анна", funnel_step=1))
+        await session.commit()
+        await session.execute(text(
+            "INSERT INTO user_onboarding_progress (user_id, current_day, is_completed) VALUES (1, 3, 0)"
+        ))
+        await session.commit()
+
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    )
+    yield factory, statements
+    await engine.dispose()
+
+
+def update_from(telegram_id: int) -> dict:
+    return {"event_from_user": SimpleNamespace(id=telegram_id)}
+
+
+async def next_step(event, data):
+    user = data["user"]
+    user.funnel_step += 1
+    await data["session"].commit()
+    return user.funnel_step
+
+
+async def db_step(factory) -> int:
+    async with factory() as session:
+        return (await session.execute(select(User.funnel_step).where(User.telegram_id == 10))).scalar_one()
+
+
+class TestDbSessionMiddleware:
+    """Горячий пользователь — без запросов, изменения не теряются"""
+
+    @pytest.mark.asyncio
+    async def test_user_and_progress_in_one_query(self, db):
+        factory, statements = db
+        middleware = DbSessionMiddleware(session_factory=factory)
+        seen = {}
+
+        async def handler(event, data):
+            seen["session"] = data["session"]
+            seen["day"] = data["user"].onboarding_progress.current_day
+
+        await middleware(handler, None, update_from(10))
+
+        assert statements == ["SELECT"]
+        assert seen["day"] == 3
+        assert isinstance(seen["session"], AsyncSession)
+
+    @pytest.mark.asyncio
+    async def test_hot_user_needs_no_select(self, db):
+        factory, statements = db
+        middleware = DbSessionMiddleware(session_factory=factory)
+
+        assert await middleware(next_step, None, update_from(10)) == 2
+        statements.clear()
+        assert await middleware(next_step, None, update_from(10)) == 3
+        assert await middleware(next_step, None, update_from(10)) == 4
+
+        assert "SELECT" not in statements
+        assert await db_step(factory) == 4
+        assert middleware.get_stats()["user_queries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_update_is_not_cached(self, db):
+        factory, statements = db
+        middleware = DbSessionMiddleware(session_factory=factory)
+        await middleware(next_step, None, update_from(10))
+
+        async def broken(event, data):
+            data["user"].funnel_step = 100
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await middleware(broken, None, update_from(10))
+
+        async def uncommitted(event, data):
+            data["user"].funnel_step = 200
+
+        await middleware(uncommitted, None, update_from(10))
+
+        statements.clear()
+        assert await middleware(next_step, None, update_from(10)) == 3
+        assert statements[0] == "SELECT"
+
+    @pytest.mark.asyncio
+    async def test_unknown_user_and_ttl(self, db):
+        factory, statements = db
+        middleware = DbSessionMiddleware(session_factory=factory, cache_ttl=0)
+        seen = {}
+
+        async def handler(event, data):
+            seen["user"] = data["user"]
+
+        await middleware(handler, None, update_from(999))
+        assert seen["user"] is None
+
+        await middleware(handler, None, update_from(10))
+        await middleware(handler, None, update_from(10))
+        assert middleware.get_stats()["user_queries"] == 3
+
+    @pytest.mark.asyncio
+    async def test_discard_moved_users(self, db):
+        factory, _ = db
+        middleware = DbSessionMiddleware(session_factory=factory)
+        await middleware(next_step, None, update_from(10))
+
+        assert middleware.discard_where(lambda telegram_id: telegram_id != 10) == 0
+        assert middleware.discard_where(lambda telegram_id: telegram_id == 10) == 1
+        assert middleware.get_stats()["cached_users"] == 0
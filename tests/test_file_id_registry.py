@@ -0,0 +1,133 @@
+"""
+Тесты реестра Telegram file_id
+"""
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile
+
+from shared.media.file_id_registry import FileIdRegistry
+
+
+class FakeBot:
+    """Бот, который «загружает» файлы и проверяет file_id"""
+
+    def __init__(self, bot_id: int = 1):
+        self.id = bot_id
+        self.sent = []
+        self.valid_ids = set()
+        self.error = None
+        self.file_id_error = "Bad Request: wrong file identifier/HTTP URL specified"
+        self._counter = 0
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent.append(photo)
+        if self.error:
+            raise TelegramBadRequest(method=None, message=self.error)
+        if isinstance(photo, str):
+            if photo not in self.valid_ids:
+                raise TelegramBadRequest(method=None, message=self.file_id_error)
+            file_id = photo
+        else:
+            self._counter += 1
+            file_id = f"bot{self.id}-file{self._counter}"
+            self.valid_ids.add(file_id)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="thumb"), SimpleNamespace(file_id=file_id)])
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = FileIdRegistry()
+    saved = []
+
+    async def save(bot_id, file_hash, file_id, file_size):
+        saved.append((bot_id, file_id))
+
+    async def ensure_loaded(bot_id):
+        pass
+
+    monkeypatch.setattr(registry, "_save", save)
+    monkeypatch.setattr(registry, "_ensure_loaded", ensure_loaded)
+    registry.saved = saved
+    return registry
+
+
+class TestFileIdRegistry:
+    """Загрузка один раз, дальше file_id"""
+
+    @pytest.mark.asyncio
+    async def test_second_send_reuses_file_id(self, registry, tmp_path):
+        photo = tmp_path / "omega.jpg"
+        photo.write_bytes(b"x" * 1000)
+        bot = FakeBot()
+
+        await registry.send_photo(bot, 100, path=photo, caption="1")
+        await registry.send_photo(bot, 200, path=photo, caption="2")
+
+        assert isinstance(bot.sent[0], FSInputFile)
+        assert bot.sent[1] == "bot1-file1"
+        assert registry.saved == [(1, "bot1-file1")]
+        stats = registry.get_stats()
+        assert (stats["uploads"], stats["reuses"], stats["bytes_saved"]) == (1, 1, 1000)
+
+    @pytest.mark.asyncio
+    async def test_file_ids_are_per_bot(self, registry):
+        data = b"post image"
+        curator, manager = FakeBot(1), FakeBot(2)
+
+        await registry.send_photo(curator, 1, data=data)
+        await registry.send_photo(manager, 1, data=data)
+
+        assert isinstance(manager.sent[0], BufferedInputFile)
+        assert registry.get_stats()["uploads"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rejected_file_id_falls_back_to_upload(self, registry):
+        data = b"post image"
+        bot = FakeBot()
+        await registry.send_photo(bot, 1, data=data)
+        bot.valid_ids.clear()
+
+        message = await registry.send_photo(bot, 1, data=data)
+
+        assert message.photo[-1].file_id == "bot1-file2"
+        assert registry.rejected == 1
+        assert registry.get(bot.id, registry.hash_bytes(data)) == "bot1-file2"
+
+    @pytest.mark.asyncio
+    async def test_expired_file_reference_falls_back_to_upload(self, registry):
+        data = b"post image"
+        bot = FakeBot()
+        await registry.send_photo(bot, 1, data=data)
+        bot.valid_ids.clear()
+        bot.file_id_error = "Bad Request: FILE_REFERENCE_EXPIRED"
+
+        message = await registry.send_photo(bot, 1, data=data)
+
+        assert message.photo[-1].file_id == "bot1-file2"
+        assert registry.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_other_bad_request_is_raised(self, registry):
+        data = b"post image"
+        bot = FakeBot()
+        await registry.send_photo(bot, 1, data=data)
+        bot.error = "Bad Request: message caption is too long"
+
+        with pytest.raises(TelegramBadRequest):
+            await registry.send_photo(bot, 1, data=data)
+
+        # file_id не забыт и повторной загрузки не было
+        assert registry.rejected == 0
+        assert registry.get(bot.id, registry.hash_bytes(data)) == "bot1-file1"
+        assert registry.get_stats()["uploads"] == 1
+
+    def test_path_hash_cached_until_file_changes(self, registry, tmp_path):
+        photo = tmp_path / "a.jpg"
+        photo.write_bytes(b"one")
+        first, _ = registry.hash_path(photo)
+        assert registry.hash_path(photo)[0] == first
+
+        photo.write_bytes(b"two!")
+        assert registry.hash_path(photo)[0] != first
@@ -0,0 +1,212 @@
+"""
+Тесты хранилища контекстов диалоговой воронки
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from curator_bot.funnels.context_store import FunnelContextStore
+from curator_bot.funnels.conversational_funnel import (
+    ConversationalFunnel,
+    ConversationContext,
+    ConversationStage,
+    UserIntent,
+)
+
+
+class FakeBackend:
+    """Бэкенд в памяти со счётчиками обращений"""
+
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.data = {}
+        self.delay = delay
+        self.loads = 0
+        self.saves = []
+        self.deletes = []
+        self.fail = False
+
+    async def load(self, user_id):
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        return self.data.get(user_id)
+
+    async def save_many(self, records):
+        if self.fail:
+            raise ConnectionError("backend is down")
+        self.saves.append(dict(records))
+        self.data.update(records)
+
+    async def delete_many(self, user_ids):
+        user_ids = list(user_ids)
+        self.deletes.append(user_ids)
+        for user_id in user_ids:
+            self.data.pop(user_id, None)
+
+    async def close(self):
+        pass
+
+
+def make_store(backend=None, **kwargs):
+    return FunnelContextStore(
+        ConversationContext.new, ConversationContext.from_dict, backend=backend, flush_interval=60, **kwargs
+    )
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest_asyncio.fixture
+async def store(backend):
+    store = make_store(backend)
+    yield store
+    await store.close()
+
+
+class TestConversationContext:
+    """Компактная запись контекста"""
+
+    def test_slots(self):
+        ctx = ConversationContext.new(1)
+        assert not hasattr(ctx, "__dict__")
+
+    def test_round_trip(self):
+        ctx = ConversationContext(
+            user_id=42,
+            stage=ConversationStage.SOLUTION,
+            intent=UserIntent.BUSINESS,
+            pains=["money"],
+            objections=["price"],
+            trust_score=3,
+            messages_count=7,
+            link_provided=True,
+            last_message_at=datetime(2024, 5, 1, 10, 30),
+        )
+        restored = ConversationContext.from_dict(ctx.to_dict())
+        assert restored == ctx
+
+    def test_from_partial_dict(self):
+        ctx = ConversationContext.from_dict({"user_id": 5, "stage": "discovery"})
+        assert ctx.stage == ConversationStage.DISCOVERY
+        assert ctx.pains == []
+
+
+class TestFunnelContextStore:
+    """LRU в памяти + ленивая загрузка + отложенная запись"""
+
+    @pytest.mark.asyncio
+    async def test_lazy_load_from_backend(self, store, backend):
+        backend.data[7] = ConversationContext(user_id=7, stage=ConversationStage.DEEPENING).to_dict()
+
+        ctx = await store.load(7)
+        assert ctx.stage == ConversationStage.DEEPENING
+        assert await store.load(7) is ctx
+        assert backend.loads == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_loads_are_merged(self):
+        backend = FakeBackend(delay=0.05)
+        store = make_store(backend)
+        first, second = await asyncio.gather(store.load(1), store.load(1))
+        assert first is second
+        assert backend.loads == 1
+
+    @pytest.mark.asyncio
+    async def test_writes_are_coalesced(self, store, backend):
+        ctx = await store.load(1)
+        for _ in range(5):
+            ctx.messages_count += 1
+            store.mark_dirty(1, ctx)
+        other = await store.load(2)
+        store.mark_dirty(2, other)
+
+        assert await store.flush() == 2
+        assert len(backend.saves) == 1
+        assert backend.saves[0][1]["messages_count"] == 5
+        assert await store.flush() == 0
+
+    @pytest.mark.asyncio
+    async def test_dirty_context_survives_eviction(self, backend):
+        store = make_store(backend, maxsize=1)
+        ctx = await store.load(1)
+        ctx.trust_score = 4
+        store.mark_dirty(1, ctx)
+        await store.load(2)  # вытесняет 1 из LRU
+
+        await store.flush()
+        assert backend.data[1]["trust_score"] == 4
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_is_retried(self, store, backend):
+        ctx = await store.load(1)
+        store.mark_dirty(1, ctx)
+        backend.fail = True
+        assert await store.flush() == 0
+        assert store.get_stats()["dirty"] == 1
+
+        backend.fail = False
+        assert await store.flush() == 1
+        assert 1 in backend.data
+
+    @pytest.mark.asyncio
+    async def test_delete(self, store, backend):
+        backend.data[3] = ConversationContext(user_id=3, messages_count=9).to_dict()
+        await store.load(3)
+        store.delete(3)
+        await store.flush()
+
+        assert backend.deletes == [[3]]
+        assert (await store.load(3)).messages_count == 0
+
+    @pytest.mark.asyncio
+    async def test_close_flushes(self, backend):
+        store = make_store(backend)
+        store.mark_dirty(1, await store.load(1))
+        await store.close()
+        assert 1 in backend.data
+
+    def test_memory_is_bounded(self):
+        store = make_store(maxsize=100)
+        for user_id in range(1000):
+            store.get_or_create(user_id)
+
+        stats = store.get_stats()
+        assert stats["contexts"] == 100
+        assert stats["approx_memory_kb"] > 0
+        assert stats["cache"]["evictions"] == 900
+
+    def test_memory_only_store(self):
+        store = make_store()
+        ctx = store.get_or_create(1)
+        store.mark_dirty(1, ctx)
+        assert store.peek(1) is ctx
+        assert store.get_stats()["backend"] == "memory"
+
+
+class TestFunnelWithStore:
+    """ConversationalFunnel поверх хранилища"""
+
+    @pytest.mark.asyncio
+    async def test_state_survives_restart(self, backend):
+        funnel = ConversationalFunnel(store=make_store(backend))
+        await funnel.load_context(100)
+        funnel.analyze_message(100, "Хочу похудеть, ничего не помогает")
+        funnel.mark_link_provided(100)
+        await funnel.close()
+
+        restarted = ConversationalFunnel(store=make_store(backend))
+        assert not restarted.has_link_been_provided(100)  # ещё не загружен
+        ctx = await restarted.load_context(100)
+        assert ctx.messages_count == 1
+        assert restarted.has_link_been_provided(100)
+
+    def test_reset_context(self):
+        funnel = ConversationalFunnel(store=make_store())
+        funnel.analyze_message(1, "Привет")
+        funnel.reset_context(1)
+        assert funnel.get_context(1).messages_count == 0
@@ -0,0 +1,224 @@
+"""
+Тесты кэша истории диалогов куратора
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from curator_bot.ai.history_cache import ConversationHistoryCache, HistoryTurn
+
+
+BASE_TIME = datetime(2024, 1, 1, 12, 0)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class FakeSession:
+    """Сессия, которая отдаёт историю «из БД» (новые сверху, как ORDER BY DESC)"""
+
+    def __init__(self, rows_by_user=None):
+        self.rows_by_user = rows_by_user or {}
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        user_id = statement.whereclause.right.value
+        limit = statement._limit_clause.value
+        rows = sorted(self.rows_by_user.get(user_id, []), key=lambda r: r[2], reverse=True)
+        return FakeResult(rows[:limit])
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def op(*args):
+            self.ops.append((name, args))
+        return op
+
+    async def execute(self):
+        for name, args in self.ops:
+            getattr(self.redis, "_" + name)(*args)
+
+
+class FakeRedis:
+    """Минимальная замена redis.asyncio для списков"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def _delete(self, key):
+        self.lists.pop(key, None)
+
+    def _rpush(self, key, *items):
+        self.lists.setdefault(key, []).extend(items)
+
+    def _rpushx(self, key, *items):
+        if key in self.lists:
+            self.lists[key].extend(items)
+
+    def _ltrim(self, key, start, end):
+        if key in self.lists:
+            self.lists[key] = self.lists[key][start:] if end == -1 else self.lists[key][start:end + 1]
+
+    def _expire(self, key, seconds):
+        pass
+
+
+def make_rows(count, user_id=1):
+    return {
+        user_id: [
+            ("user" if i % 2 == 0 else "bot", f"msg {i}", BASE_TIME + timedelta(minutes=i))
+            for i in range(count)
+        ]
+    }
+
+
+class TestHistoryCache:
+    """Кольцевой буфер реплик"""
+
+    @pytest.mark.asyncio
+    async def test_cold_start_loads_from_db_in_order(self):
+        cache = ConversationHistoryCache(turns=5)
+        session = FakeSession(make_rows(8))
+
+        history = await cache.get_history(session, 1)
+
+        assert [t.message_text for t in history] == ["msg 3", "msg 4", "msg 5", "msg 6", "msg 7"]
+        assert session.queries == 1
+
+    @pytest.mark.asyncio
+    async def test_warm_conversation_needs_no_queries(self):
+        cache = ConversationHistoryCache(turns=4)
+        session = FakeSession(make_rows(2))
+        await cache.get_history(session, 1)
+
+        for i in range(10):
+            await cache.append(1, "user", f"new {i}", BASE_TIME + timedelta(hours=1, minutes=i))
+            await cache.get_history(session, 1)
+
+        history = await cache.get_history(session, 1)
+        assert session.queries == 1
+        assert [t.message_text for t in history] == ["new 6", "new 7", "new 8", "new 9"]
+
+    @pytest.mark.asyncio
+    async def test_returned_list_is_a_copy(self):
+        cache = ConversationHistoryCache()
+        session = FakeSession()
+        history = await cache.get_history(session, 1)
+        history.append(HistoryTurn("user", "local", BASE_TIME))
+
+        assert await cache.get_history(session, 1) == []
+
+    @pytest.mark.asyncio
+    async def test_append_for_cold_user_does_not_create_partial_buffer(self):
+        cache = ConversationHistoryCache()
+        session = FakeSession(make_rows(3))
+
+        # Реплика уже в БД, но пользователь ещё не загружен
+        session.rows_by_user[1].append(("user", "msg 3", BASE_TIME + timedelta(minutes=3)))
+        await cache.append(1, "user", "msg 3", BASE_TIME + timedelta(minutes=3))
+
+        history = await cache.get_history(session, 1)
+        assert [t.message_text for t in history] == ["msg 0", "msg 1", "msg 2", "msg 3"]
+
+    @pytest.mark.asyncio
+    async def test_lru_evicts_inactive_users(self):
+        cache = ConversationHistoryCache(max_users=2)
+        session = FakeSession()
+        for user_id in (1, 2, 3):
+            await cache.get_history(session, user_id)
+
+        assert session.queries == 3
+        await cache.get_history(session, 1)
+        assert session.queries == 4
+
+    @pytest.mark.asyncio
+    async def test_ttl_expires_idle_buffer(self):
+        now = [0.0]
+        cache = ConversationHistoryCache(ttl=60)
+        cache._memory._clock = lambda: now[0]
+        session = FakeSession()
+
+        await cache.get_history(session, 1)
+        now[0] = 30
+        await cache.append(1, "user", "hi", BASE_TIME)  # продлевает TTL
+        now[0] = 80
+        await cache.get_history(session, 1)
+        assert session.queries == 1
+
+        now[0] = 200
+        await cache.get_history(session, 1)
+        assert session.queries == 2
+
+
+class TestHistoryCacheRedis:
+    """Второй уровень в Redis"""
+
+    @pytest.fixture
+    def redis(self):
+        return FakeRedis()
+
+    def make_cache(self, redis, **kwargs):
+        cache = ConversationHistoryCache(redis_url="redis://test", **kwargs)
+        cache._redis = redis
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_restart_reads_redis_instead_of_db(self, redis):
+        session = FakeSession(make_rows(3))
+        first = self.make_cache(redis, turns=5)
+        await first.get_history(session, 1)
+        await first.append(1, "bot", "reply", BASE_TIME + timedelta(hours=1))
+
+        # Новый процесс: память пустая, Redis заполнен
+        second = self.make_cache(redis, turns=5)
+        history = await second.get_history(session, 1)
+
+        assert session.queries == 1
+        assert second.redis_loads == 1
+        assert [t.message_text for t in history] == ["msg 0", "msg 1", "msg 2", "reply"]
+        assert history[-1].timestamp == BASE_TIME + timedelta(hours=1)
+
+    @pytest.mark.asyncio
+    async def test_redis_list_is_trimmed(self, redis):
+        cache = self.make_cache(redis, turns=3)
+        session = FakeSession(make_rows(3))
+        await cache.get_history(session, 1)
+        for i in range(5):
+            await cache.append(1, "user", f"new {i}", BASE_TIME + timedelta(hours=1, minutes=i))
+
+        assert len(redis.lists["curator:history:1"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_fall_back_to_db(self):
+        class BrokenRedis(FakeRedis):
+            async def lrange(self, key, start, end):
+                raise ConnectionError("redis down")
+
+        cache = self.make_cache(BrokenRedis())
+        session = FakeSession(make_rows(2))
+
+        history = await cache.get_history(session, 1)
+        assert len(history) == 2
+        assert session.queries == 1
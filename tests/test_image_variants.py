@@ -0,0 +1,121 @@
+"""
+Тесты вариантов изображений для Telegram
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from shared.media.image_variants import ImageVariantStore, VariantSpec
+from shared.media.photo_index import PhotoIndex
+
+
+SPECS = (
+    VariantSpec("tg"),
+    VariantSpec("webp", format="WEBP", quality=80),
+    VariantSpec("tg_wm", watermark="NL International"),
+    VariantSpec("tg_logo", logo_path="/nonexistent/logo.png"),
+)
+
+
+def _photo(path, size=(2400, 1800), color=(200, 30, 30)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path, format="JPEG", quality=100)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / "unified_products"
+    _photo(root / "omega" / "photos" / "1.jpg")
+    return ImageVariantStore(root, specs=SPECS)
+
+
+class TestImageVariantStore:
+    """Построение и поиск вариантов"""
+
+    def test_build_and_resolve(self, store):
+        source = store.root / "omega" / "photos" / "1.jpg"
+        report = store.build()
+
+        assert report.built == 1
+        variant = store.resolve(source, "tg")
+        assert variant.parent.name == ".variants"
+        with Image.open(variant) as image:
+            assert max(image.size) == 1280
+        assert set(store.variants_for(source)) == {"tg", "webp", "tg_wm"}  # логотипа нет
+        assert store.manifest_path.exists()
+
+    def test_unchanged_files_are_skipped(self, store):
+        store.build()
+        report = store.build()
+        assert (report.built, report.skipped) == (0, 1)
+
+    def test_changed_source_falls_back_until_rebuilt(self, store):
+        source = store.root / "omega" / "photos" / "1.jpg"
+        store.build()
+        old_variant = store.resolve(source, "tg")
+
+        _photo(source, color=(0, 0, 255))
+        stat = source.stat()
+        os.utime(source, (stat.st_atime, stat.st_mtime + 5))
+        assert store.resolve(source, "tg") == source
+
+        store.build()
+        assert store.resolve(source, "tg") != old_variant
+        assert not old_variant.exists()
+
+    def test_deleted_source_removes_variants(self, store):
+        source = store.root / "omega" / "photos" / "1.jpg"
+        store.build()
+        variant = store.resolve(source, "tg")
+
+        source.unlink()
+        store.build()
+        assert not variant.exists()
+        assert store.variants_for(source) == {}
+
+    def test_manifest_reloaded_when_changed_by_another_process(self, store):
+        source = store.root / "omega" / "photos" / "1.jpg"
+        reader = ImageVariantStore(store.root, specs=SPECS, reload_check_interval=0)
+        assert reader.resolve(source, "tg") == source
+
+        # scripts/build_image_variants.py в другом процессе
+        store.build()
+
+        assert reader.resolve(source, "tg").parent.name == ".variants"
+        assert reader.reload_if_changed() is False
+
+    def test_unsaved_changes_survive_reload_check(self, store):
+        source = store.root / "omega" / "photos" / "1.jpg"
+        writer = ImageVariantStore(store.root, specs=SPECS, reload_check_interval=0)
+        writer.build_file(source)
+
+        assert writer.reload_if_changed() is False
+        writer.save()
+        assert writer.resolve(source, "tg").parent.name == ".variants"
+
+    def test_concurrent_builds_keep_every_entry(self, store):
+        # Загрузки testimonial строят варианты в нескольких потоках run_cpu
+        sources = [_photo(store.root / "checks" / f"{i}.jpg", size=(1600, 1200)) for i in range(8)]
+
+        def upload(source):
+            variants = store.build_file(source)
+            store.save()
+            return variants
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(upload, sources))
+
+        assert all(set(variants) == {"tg", "webp", "tg_wm"} for variants in results)
+        manifest = json.loads(store.manifest_path.read_text(encoding="utf-8"))
+        assert {f"checks/{i}.jpg" for i in range(8)} <= set(manifest)
+
+    def test_photo_index_ignores_variants(self, store):
+        store.build()
+        index = PhotoIndex(store.root, refresh_interval=0)
+        index.build()
+        assert [p.name for p in index.photos_in_folder("omega")] == ["1.jpg"]
+        assert index.count() == 1
@@ -0,0 +1,186 @@
+"""
+Тесты выбора лидера планировщиков через advisory-блокировки
+"""
+import pytest
+
+from shared.database.leader_election import (
+    HEARTBEAT_SQL,
+    TRY_LOCK_SQL,
+    UNLOCK_SQL,
+    LeaderElection,
+    lock_key,
+)
+
+
+class FakeResult:
+    def __init__(self, value):
+        self._value = value
+
+    def scalar(self):
+        return self._value
+
+
+class FakePostgres:
+    """Advisory-блокировки уровня сессии: держатся, пока живо соединение"""
+
+    def __init__(self):
+        self.locks = {}
+        self.leases = []
+        self.fail_leases = False
+
+    def connect(self):
+        async def factory():
+            return FakeConnection(self)
+        return factory
+
+    def release_all(self, conn):
+        self.locks = {key: owner for key, owner in self.locks.items() if owner is not conn}
+
+
+class FakeConnection:
+    def __init__(self, db: FakePostgres):
+        self.db = db
+        self.alive = True
+
+    async def execute(self, statement, params=None):
+        if not self.alive:
+            raise ConnectionError("connection lost")
+        if statement is HEARTBEAT_SQL:
+            return FakeResult(1)
+        if statement is TRY_LOCK_SQL:
+            owner = self.db.locks.setdefault(params["key"], self)
+            return FakeResult(owner is self)
+        if statement is UNLOCK_SQL:
+            if self.db.locks.get(params["key"]) is self:
+                del self.db.locks[params["key"]]
+            return FakeResult(True)
+        if self.db.fail_leases:
+            raise RuntimeError('relation "scheduler_leases" does not exist')
+        self.db.leases.append(statement.compile().params)
+        return FakeResult(None)
+
+    def kill(self):
+        """Соединение оборвалось: Postgres снимает блокировки сессии"""
+        self.alive = False
+        self.db.release_all(self)
+
+    async def invalidate(self):
+        self.db.release_all(self)
+
+    async def close(self):
+        self.db.release_all(self)
+
+
+class Job:
+    def __init__(self, fail_start=False):
+        self.running = False
+        self.starts = 0
+        self.fail_start = fail_start
+
+    async def start(self):
+        if self.fail_start:
+            raise RuntimeError("boom")
+        self.running = True
+        self.starts += 1
+
+    async def stop(self):
+        self.running = False
+
+
+def make_instance(db, name):
+    election = LeaderElection(instance_id=name, heartbeat_interval=60, connect=db.connect())
+    jobs = {"reminders": Job(), "onboarding": Job()}
+    for job_name, job in jobs.items():
+        election.add_job(job_name, job.start, job.stop)
+    return election, jobs
+
+
+class TestLeaderElection:
+    """Одна задача — один исполнитель, быстрый перехват при падении"""
+
+    @pytest.mark.asyncio
+    async def test_only_one_instance_runs_each_job(self):
+        db = FakePostgres()
+        first, first_jobs = make_instance(db, "a")
+        second, second_jobs = make_instance(db, "b")
+
+        await first.tick()
+        await second.tick()
+        await second.tick()
+
+        assert all(job.running for job in first_jobs.values())
+        assert not any(job.running for job in second_jobs.values())
+        assert first.get_stats()["leading"] == ["onboarding", "reminders"]
+        assert second.get_stats()["following"] == ["onboarding", "reminders"]
+        assert first_jobs["reminders"].starts == 1
+
+    @pytest.mark.asyncio
+    async def test_graceful_stop_hands_over(self):
+        db = FakePostgres()
+        first, first_jobs = make_instance(db, "a")
+        second, second_jobs = make_instance(db, "b")
+        await first.tick()
+        await second.tick()
+
+        await first.stop()
+        assert not any(job.running for job in first_jobs.values())
+
+        await second.tick()
+        assert all(job.running for job in second_jobs.values())
+
+    @pytest.mark.asyncio
+    async def test_connection_loss_steps_down_and_fails_over(self):
+        db = FakePostgres()
+        first, first_jobs = make_instance(db, "a")
+        second, second_jobs = make_instance(db, "b")
+        await first.tick()
+        await second.tick()
+
+        first._conn.kill()
+        await first.tick()  # heartbeat не прошёл
+        assert not any(job.running for job in first_jobs.values())
+        assert first.get_stats()["connection_losses"] == 1
+
+        await second.tick()
+        assert all(job.running for job in second_jobs.values())
+
+        # Вернувшийся экземпляр остаётся ведомым
+        await first.tick()
+        assert not any(job.running for job in first_jobs.values())
+
+    @pytest.mark.asyncio
+    async def test_failed_start_releases_lock(self):
+        db = FakePostgres()
+        election = LeaderElection(instance_id="a", heartbeat_interval=60, connect=db.connect())
+        broken = Job(fail_start=True)
+        election.add_job("reminders", broken.start, broken.stop)
+
+        await election.tick()
+        assert not election.is_leader("reminders")
+        assert lock_key("reminders") not in db.locks
+
+    @pytest.mark.asyncio
+    async def test_leases_are_written(self):
+        db = FakePostgres()
+        election, _ = make_instance(db, "a")
+        await election.tick()
+
+        assert {lease["job"] for lease in db.leases} == {"reminders", "onboarding"}
+        assert all(lease["holder"] == "a" for lease in db.leases)
+
+    @pytest.mark.asyncio
+    async def test_lease_errors_keep_leadership(self):
+        db = FakePostgres()
+        db.fail_leases = True
+        election, jobs = make_instance(db, "a")
+
+        await election.tick()
+        await election.tick()
+        assert all(job.running for job in jobs.values())
+        assert election.get_stats()["connection_losses"] == 0
+
+    def test_lock_keys_are_stable_bigints(self):
+        key = lock_key("curator_reminders")
+        assert key == lock_key("curator_reminders")
+        assert key != lock_key("curator_onboarding")
+        assert -2 ** 63 <= key < 2 ** 63
@@ -0,0 +1,84 @@
+"""
+Тесты для учёта использования LLM
+"""
+import asyncio
+import pytest
+
+from shared.ai_clients.usage import (
+    LLMUsage,
+    UsageTimer,
+    collect_usage,
+    record_usage,
+    summarize_usage,
+)
+from shared.ai_clients.router_client import RoutingAIClient
+
+
+class UsageClient:
+    """Фейковый клиент, который пишет usage как настоящие"""
+
+    def __init__(self, provider: str, delay: float = 0.0):
+        self.provider = provider
+        self.delay = delay
+
+    async def generate_response(self, system_prompt, user_message, context=None, temperature=0.7, **kwargs):
+        timer = UsageTimer()
+        await asyncio.sleep(self.delay)
+        record_usage(LLMUsage(
+            provider=self.provider,
+            model=f"{self.provider}-model",
+            input_tokens=100,
+            output_tokens=20,
+            wall_ms=timer.wall_ms
+        ))
+        return f"answer from {self.provider}"
+
+
+class TestUsageCollection:
+    """Тесты сборщика usage"""
+
+    def test_record_outside_collector_is_noop(self):
+        record_usage(LLMUsage(provider="x", model="y", input_tokens=1))
+
+    def test_collect_and_summarize(self):
+        with collect_usage() as usages:
+            record_usage(LLMUsage(provider="claude", model="m1", input_tokens=10, output_tokens=5, wall_ms=100))
+            record_usage(LLMUsage(provider="yandexgpt", model="m2", input_tokens=3, cached_tokens=2, wall_ms=50))
+
+        summary = summarize_usage(usages)
+        assert summary["calls"] == 2
+        assert summary["input_tokens"] == 13
+        assert summary["output_tokens"] == 5
+        assert summary["cached_tokens"] == 2
+        assert summary["wall_ms"] == 150
+        assert summary["providers"] == ["claude/m1", "yandexgpt/m2"]
+        assert usages[0].total_tokens == 15
+
+    def test_nested_collectors_are_isolated(self):
+        with collect_usage() as outer:
+            record_usage(LLMUsage(provider="a", model="a"))
+            with collect_usage() as inner:
+                record_usage(LLMUsage(provider="b", model="b"))
+
+        assert [u.provider for u in outer] == ["a"]
+        assert [u.provider for u in inner] == ["b"]
+
+    def test_timer_ttft(self):
+        timer = UsageTimer()
+        assert timer.ttft_ms is None
+        timer.mark_first_token()
+        first = timer.ttft_ms
+        timer.mark_first_token()
+        assert timer.ttft_ms == first
+
+    @pytest.mark.asyncio
+    async def test_usage_collected_through_router_tasks(self):
+        router = RoutingAIClient([("a", UsageClient("a")), ("b", UsageClient("b"))])
+
+        with collect_usage() as usages:
+            answer = await router.generate_response("sys", "hi")
+
+        assert answer == "answer from a"
+        assert len(usages) == 1
+        assert usages[0].provider == "a"
+        assert usages[0].total_tokens == 120
@@ -0,0 +1,65 @@
+"""
+Тесты LRU-кэша с TTL и версиями
+"""
+from shared.utils.lru_cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestLRUCache:
+    """Вытеснение, TTL и инвалидация"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "a" становится свежей
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats.evictions == 1
+
+    def test_ttl_expiration(self):
+        clock = FakeClock()
+        cache = LRUCache(maxsize=10, ttl=60, clock=clock)
+        cache.set("a", 1)
+
+        clock.now = 59
+        assert cache.get("a") == 1
+        clock.now = 60
+        assert cache.get("a") is None
+        assert cache.stats.expirations == 1
+        assert len(cache) == 0
+
+    def test_bump_version_invalidates_all(self):
+        cache = LRUCache(maxsize=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.bump_version()
+
+        assert cache.get("a") is None
+        cache.set("a", 10)
+        assert cache.get("a") == 10
+        assert cache.get("b") is None
+
+    def test_stats(self):
+        cache = LRUCache(maxsize=10)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.get("missing")
+        cache.stats.record_latency(10.0)
+        cache.stats.record_latency(20.0)
+
+        assert cache.stats.hits == 2
+        assert cache.stats.misses == 1
+        assert round(cache.stats.hit_rate, 1) == 66.7
+        assert cache.stats.avg_lookup_ms == 11.0
@@ -0,0 +1,147 @@
+"""
+Тесты поиска медиа-ресурсов по тексту (индекс в памяти процесса)
+"""
+import asyncio
+import contextlib
+import importlib
+import json
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from shared.media.asset_usage import AssetUsageBuffer
+from shared.media.media_library import AssetSnapshot, MediaLibrary
+from shared.media.product_index import ProductIndex
+from shared.utils.aho_corasick import AhoCorasick
+
+# shared.media экспортирует экземпляр media_library — берём сам модуль
+media_module = importlib.import_module("shared.media.media_library")
+asset_usage_module = importlib.import_module("shared.media.asset_usage")
+
+
+def _snapshot(asset_id: int, product: str) -> AssetSnapshot:
+    return AssetSnapshot(
+        id=asset_id, asset_type="product", file_path=f"/photos/{asset_id}.jpg",
+        file_id=None, file_type="photo", category=None, description=None,
+        nl_products=(product,), tags=(),
+    )
+
+
+@pytest_asyncio.fixture
+async def library(tmp_path, monkeypatch):
+    mapping_file = tmp_path / "full_products_mapping.json"
+    mapping_file.write_text(json.dumps({"keywords": {}, "categories": {}}), encoding="utf-8")
+    index = ProductIndex(mapping_file=mapping_file, reload_check_interval=3600)
+    index.load_mapping()
+    index.set_media_keywords([
+        ("коллаген", 5, 1, "product"),
+        ("collagen peptides", 5, 2, "product"),
+    ])
+    monkeypatch.setattr(media_module, "get_product_index", lambda: index)
+
+    media = MediaLibrary()
+    media._assets = {1: _snapshot(1, "collagen"), 2: _snapshot(2, "collagen_peptides")}
+    media._index_loaded = True
+
+    usage = AssetUsageBuffer()
+    monkeypatch.setattr(media_module, "get_asset_usage_buffer", lambda: usage)
+    media.usage = usage
+    yield media
+    if usage._task:
+        usage._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await usage._task
+
+
+class TestFindInText:
+    """find_in_text без обращений к БД за ключевыми словами"""
+
+    @pytest.mark.asyncio
+    async def test_longest_keyword_wins(self, library):
+        asset = await library.find_in_text("Пью Collagen-Peptides и просто коллаген")
+        assert asset.id == 2
+        assert library.usage._pending[2][0] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_match(self, library):
+        assert await library.find_in_text("Доброе утро!") is None
+        assert library.usage.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_keyword_cache_hit_without_db(self, library):
+        library._keyword_cache.set(("коллаген", "product"), library._assets[1])
+
+        asset = await library.find_by_keyword("Коллаген!")
+        assert asset.id == 1
+        assert library.usage._pending[1][0] == 1
+        assert library._keyword_cache.stats.hits == 1
+
+    def test_cache_instances_are_independent(self, library):
+        other = MediaLibrary()
+        library._keyword_cache.set(("коллаген", "product"), library._assets[1])
+        assert len(other._keyword_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_testimonial_from_memory(self, library):
+        snapshot = AssetSnapshot(
+            id=7, asset_type="testimonial", file_path="/t/7.jpg", file_id=None, file_type="image",
+            category="checks", description="Первый чек", nl_products=(), tags=("успех",),
+        )
+        library._testimonials = {7: snapshot}
+        library._testimonial_sampler.load([(7, "checks", ["успех"], 0)])
+        library._testimonials_loaded_at = float("inf")
+
+        assert await library.get_testimonial(category="checks", tags=["успех"]) is snapshot
+        assert await library.get_testimonial(category="stories") is None
+        assert library.usage._pending[7][0] == 1
+
+    @pytest.mark.asyncio
+    async def test_notify_sets_reload_event(self, library):
+        library._on_notify(None, 1, media_module.MEDIA_INDEX_CHANNEL, "")
+        assert library._reload_event.is_set()
+
+
+class TestAssetUsageBuffer:
+    """Счётчики использования копятся в памяти"""
+
+    def test_record_aggregates_hits(self):
+        usage = AssetUsageBuffer()
+        usage.record(1, datetime(2024, 1, 1))
+        usage.record(1, datetime(2024, 1, 2))
+        usage.record(2)
+        assert usage.pending == 2
+        assert usage._pending[1] == (2, datetime(2024, 1, 2))
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_counts(self, monkeypatch):
+        def broken_session():
+            raise ConnectionError("db is down")
+
+        monkeypatch.setattr(asset_usage_module, "AsyncSessionLocal", broken_session)
+        usage = AssetUsageBuffer(max_pending=2)
+        usage._pending = {1: (3, datetime(2024, 1, 1)), 2: (1, datetime(2024, 1, 1))}
+
+        assert await usage.flush() == 0
+        usage._merge_back({1: (2, datetime(2024, 1, 3)), 5: (1, datetime(2024, 1, 3))})
+        assert usage._pending[1] == (5, datetime(2024, 1, 3))
+        assert 5 not in usage._pending
+
+
+class TestAutomatonWithoutDfa:
+    """Большие словари остаются на goto/fail-переходах"""
+
+    def test_same_matches_as_dfa(self):
+        patterns = ["he", "she", "his", "hers", "коллаген", "лаген"]
+        text = "ushers и коллагенчик"
+
+        dense, sparse = AhoCorasick(), AhoCorasick(max_dfa_transitions=0)
+        for pattern in patterns:
+            dense.add(pattern)
+            sparse.add(pattern)
+        dense.build()
+        sparse.build()
+
+        assert sparse._delta is None
+        assert list(sparse.iter_matches(text)) == list(dense.iter_matches(text))
+        assert sparse.values_in(text) == dense.values_in(text) == {"he", "she", "hers", "коллаген", "лаген"}
@@ -0,0 +1,115 @@
+"""
+Тесты единого классификатора сообщений куратора (Ахо-Корасик)
+"""
+import pytest
+
+from shared.utils.aho_corasick import AhoCorasick
+from curator_bot.ai.message_features import (
+    INTENT_CATEGORY_KEYWORDS,
+    PERSONA_MOOD_KEYWORDS,
+    FUNNEL_INTENT_MARKERS,
+    PAIN_MARKERS,
+    LINK_CATEGORY_KEYWORDS,
+    classify_message,
+)
+from curator_bot.funnels.referral_links import (
+    get_instant_link_for_query,
+    CATEGORY_LINKS,
+    PARTNER_REGISTRATION_LINK,
+    SHOP_MAIN_LINK,
+)
+
+
+def _naive_first(groups, text):
+    for name, words in groups.items():
+        if any(word in text for word in words):
+            return name
+    return None
+
+
+MESSAGES = [
+    "Привет!",
+    "Что такое MetaBoost и как его принимать?",
+    "Устала постоянно, нет сил к вечеру",
+    "Это же пирамида, не верю я в ваш сетевой маркетинг",
+    "Сколько можно заработать удалённо из дома?",
+    "Дорого, подумаю потом",
+    "Спасибо, интересно, расскажи про Energy Diet",
+    "Как оформить заказ и сколько стоит доставка?",
+    "Ребёнок часто болеет, есть что-то для детей?",
+    "Кожа сухая, появились морщины, какой крем лучше?",
+    "Хочу в команду, кто будет наставником?",
+]
+
+
+class TestAhoCorasick:
+    """Тесты автомата"""
+
+    def test_overlapping_matches(self):
+        automaton = AhoCorasick()
+        for word in ["he", "she", "his", "hers"]:
+            automaton.add(word)
+        automaton.build()
+
+        matches = {(start, end, value) for start, end, value in automaton.iter_matches("ushers")}
+        assert matches == {(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")}
+        assert automaton.values_in("ushers") == {"she", "he", "hers"}
+
+    def test_values_and_empty(self):
+        automaton = AhoCorasick()
+        automaton.add("сетевой", "a")
+        automaton.add("сетевой маркетинг", "b")
+        automaton.add("", "ignored")
+
+        assert len(automaton) == 2
+        assert automaton.values_in("сетевой маркетинг") == {"a", "b"}
+        assert automaton.values_in("ничего") == set()
+
+
+class TestMessageFeatures:
+    """Паритет с прежними any()-проверками"""
+
+    @pytest.mark.parametrize("message", MESSAGES)
+    def test_parity_with_naive_scan(self, message):
+        text = message.lower()
+        features = classify_message(message)
+
+        assert features.intent_category == (_naive_first(INTENT_CATEGORY_KEYWORDS, text) or "other")
+        assert features.persona_mood == (_naive_first(PERSONA_MOOD_KEYWORDS, text) or "default")
+        assert features.funnel_intent == (_naive_first(FUNNEL_INTENT_MARKERS, text) or "curious")
+        assert features.link_category == (_naive_first(LINK_CATEGORY_KEYWORDS, text) or "general")
+        assert features.pains == tuple(
+            pain for pain, words in PAIN_MARKERS.items() if any(word in text for word in words)
+        )
+
+    def test_priorities(self):
+        # "пирамида" — и скептик воронки, и sales; "заработать" — бизнес
+        features = classify_message("Это пирамида? Как тут заработать?")
+        assert features.funnel_intent == "skeptic"
+        assert features.intent_category == "business"
+
+    def test_objection_and_trust(self):
+        features = classify_message("Дорого, не верю")
+        assert features.is_objection
+        assert features.objection_type == "price"
+        assert features.trust_delta == -1
+
+        features = classify_message("Спасибо, расскажи ещё")
+        assert not features.is_objection
+        assert features.objection_type is None
+        assert features.trust_delta == 1
+
+    def test_urgency(self):
+        assert classify_message("Срочно помоги!").urgency == "high"
+        assert classify_message("Привет").urgency == "normal"
+
+
+class TestInstantLink:
+    """referral_links.get_instant_link_for_query"""
+
+    def test_categories(self):
+        assert get_instant_link_for_query("Что такое MetaBoost?") == ("cocktails", CATEGORY_LINKS["cocktails"])
+        assert get_instant_link_for_query("Как заработать в NL?") == ("business", PARTNER_REGISTRATION_LINK)
+
+    def test_general_fallback(self):
+        assert get_instant_link_for_query("Привет") == ("general", SHOP_MAIN_LINK)
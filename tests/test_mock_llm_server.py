@@ -0,0 +1,114 @@
+"""
+Тесты для локальной заглушки AI провайдеров: настоящие клиенты против mock-сервера
+"""
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestServer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from shared.config.settings import settings
+from shared.ai_clients.mock_server import MockLLMServer, MockLLMConfig, parse_latency
+from shared.ai_clients.usage import collect_usage
+
+
+@pytest_asyncio.fixture
+async def mock_server():
+    """Запущенная заглушка с мгновенными ответами"""
+    server = MockLLMServer(MockLLMConfig(latency="fixed:5", tokens_per_second=0, responses=["Тестовый ответ"]))
+    test_server = TestServer(server.create_app())
+    await test_server.start_server()
+    yield server, str(test_server.make_url("")).rstrip("/")
+    await test_server.close()
+
+
+def make_private_key() -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode()
+
+
+class TestMockLLMServer:
+    """Клиенты работают с заглушкой через настройки base URL"""
+
+    @pytest.mark.asyncio
+    async def test_yandexgpt_client(self, mock_server, monkeypatch):
+        from shared.ai_clients.yandexgpt_client import YandexGPTClient
+
+        server, base = mock_server
+        monkeypatch.setattr(settings, "yandex_llm_base_url", f"{base}/foundationModels/v1")
+        monkeypatch.setattr(settings, "yandex_iam_url", f"{base}/iam/v1/tokens")
+
+        client = YandexGPTClient(
+            service_account_id="mock-sa-test",
+            key_id="mock-key",
+            private_key=make_private_key(),
+            folder_id="folder",
+            model="yandexgpt-lite"
+        )
+        with collect_usage() as usages:
+            answer = await client.generate_response("Ты куратор", "Привет")
+
+        assert answer == "Тестовый ответ"
+        assert usages[0].provider == "yandexgpt"
+        assert usages[0].output_tokens > 0
+        assert server.stats["tokens_issued"] == 1
+        await client.token_manager.close()
+
+    @pytest.mark.asyncio
+    async def test_gigachat_client(self, mock_server, monkeypatch):
+        from shared.ai_clients.gigachat_client import GigaChatClient
+
+        server, base = mock_server
+        monkeypatch.setattr(settings, "gigachat_base_url", f"{base}/api/v1")
+        monkeypatch.setattr(settings, "gigachat_oauth_url", f"{base}/api/v2/oauth")
+
+        client = GigaChatClient(auth_token="bW9jay10ZXN0")
+        answer = await client.generate_response("Ты куратор", "Привет")
+
+        assert answer == "Тестовый ответ"
+        await client.token_manager.close()
+
+    @pytest.mark.asyncio
+    async def test_anthropic_streaming_client(self, mock_server, monkeypatch):
+        from shared.ai_clients.anthropic_client import AnthropicClient
+
+        server, base = mock_server
+        monkeypatch.setattr(settings, "anthropic_base_url", base)
+
+        client = AnthropicClient(api_key="mock-key", model="claude-mock")
+        with collect_usage() as usages:
+            answer = await client.generate_response("Ты куратор", "Привет")
+
+        assert answer == "Тестовый ответ"
+        assert usages[0].provider == "claude"
+        assert usages[0].ttft_ms is not None
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_injection(self, monkeypatch):
+        from shared.ai_clients.gigachat_client import GigaChatClient
+        import httpx
+
+        server = MockLLMServer(MockLLMConfig(latency="fixed:0", rate_limit_rate=1.0))
+        test_server = TestServer(server.create_app())
+        await test_server.start_server()
+        base = str(test_server.make_url("")).rstrip("/")
+        monkeypatch.setattr(settings, "gigachat_base_url", f"{base}/api/v1")
+        monkeypatch.setattr(settings, "gigachat_oauth_url", f"{base}/api/v2/oauth")
+
+        client = GigaChatClient(auth_token="bW9jay0yOTk=")
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.generate_response("sys", "hi")
+
+        assert server.stats["rate_limited"] == 1
+        await client.token_manager.close()
+        await test_server.close()
+
+    def test_parse_latency(self):
+        assert parse_latency("fixed:300") == ("fixed", [300.0])
+        assert parse_latency("lognormal:6.0,0.5") == ("lognormal", [6.0, 0.5])
+        with pytest.raises(ValueError):
+            parse_latency("gamma:1")
@@ -0,0 +1,130 @@
+"""
+Тесты выноса блокирующей работы из event loop
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from content_manager_bot.utils.image_helpers import resize_image
+from shared.utils import offload
+
+
+@pytest.fixture(scope="module")
+def large_image_base64():
+    """Фото ~24 Мп (~4 МБ JPEG, как с телефона): обработка занимает сотни миллисекунд"""
+    size = (6000, 4000)
+    image = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.effect_noise(size, 6),
+        Image.radial_gradient("L").resize(size),
+    ))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+async def max_loop_lag(work, interval: float = 0.005) -> float:
+    """Выполняет work() и возвращает максимальную задержку тиков event loop (сек)"""
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(lag, time.perf_counter() - start - interval)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(interval * 2)
+    try:
+        await work()
+    finally:
+        done.set()
+        await task
+    return lag
+
+
+class TestOffload:
+    """Пулы run_io / run_cpu"""
+
+    @pytest.mark.asyncio
+    async def test_runs_in_named_pools(self):
+        io_thread = await offload.run_io(lambda: threading.current_thread().name)
+        cpu_thread = await offload.run_cpu(lambda: threading.current_thread().name)
+        assert io_thread.startswith("offload-io")
+        assert cpu_thread.startswith("offload-cpu")
+
+    @pytest.mark.asyncio
+    async def test_kwargs_and_exceptions(self):
+        assert await offload.run_cpu(int, "ff", base=16) == 255
+        with pytest.raises(ValueError):
+            await offload.run_io(int, "not a number")
+
+    @pytest.mark.asyncio
+    async def test_file_helpers(self, tmp_path):
+        path = tmp_path / "photo.jpg"
+        path.write_bytes(b"\xff\xd8\xff" + b"x" * 3_000_000)
+
+        assert await offload.path_exists(path)
+        assert not await offload.path_exists(tmp_path / "missing.jpg")
+        assert await offload.read_file_bytes(path) == path.read_bytes()
+        assert base64.b64decode(await offload.read_file_base64(path)) == path.read_bytes()
+        assert await offload.decode_base64(await offload.read_file_base64(path)) == path.read_bytes()
+
+        assert await offload.sha256_file(path) == hashlib.sha256(path.read_bytes()).hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_shutdown_recreates_pool(self):
+        await offload.run_io(lambda: None)
+        offload.shutdown_executors(wait=True)
+        assert await offload.run_io(lambda: 42) == 42
+
+
+class TestLoopResponsiveness:
+    """Event loop продолжает обслуживать другие корутины во время обработки фото"""
+
+    @pytest.mark.asyncio
+    async def test_resize_does_not_block_loop(self, large_image_base64):
+        async def blocking():
+            resize_image(large_image_base64, max_width=1280, max_height=1280)
+
+        async def offloaded():
+            result = await offload.run_cpu(resize_image, large_image_base64, max_width=1280, max_height=1280)
+            assert result
+
+        blocked_lag = await max_loop_lag(blocking)
+        offloaded_lag = await max_loop_lag(offloaded)
+
+        # Синхронная версия держит loop всё время обработки
+        assert blocked_lag > 0.1
+        assert offloaded_lag < 0.1
+        assert offloaded_lag < blocked_lag / 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_coroutines_progress(self, large_image_base64):
+        """Пока идут несколько обработок, другие корутины делают тики"""
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            offload.run_cpu(resize_image, large_image_base64, max_width=800, max_height=800) for _ in range(3)
+        ))
+        elapsed = time.perf_counter() - start
+        task.cancel()
+
+        # Хотя бы половина ожидаемых тиков за время обработки
+        assert ticks >= int(elapsed / 0.01 * 0.5)
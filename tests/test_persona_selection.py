@@ -0,0 +1,105 @@
+"""
+Тесты выбора персоны куратора (чистая функция, без общего состояния)
+"""
+import asyncio
+import dataclasses
+from types import SimpleNamespace
+
+import pytest
+
+from curator_bot.ai.chat_engine import CuratorChatEngine
+from curator_bot.ai.message_features import classify_message
+from curator_bot.ai.persona_selection import (
+    MOOD_RULES,
+    get_curator_persona,
+    message_seed,
+    select_persona,
+)
+from shared.persona import PERSONA_CHARACTERISTICS, MoodState, PersonaManager
+
+MESSAGES = {
+    "sad": "Устал, ничего не получается",
+    "product": "Какой состав у коллагена?",
+    "skeptic": "Это же пирамида, не верю",
+    "happy": "Ура, получилось!",
+    "business": "Как заработать в бизнесе?",
+    "default": "Привет",
+}
+
+
+class TestSelectPersona:
+    """Выбор зависит только от сообщения и возвращает готовый объект"""
+
+    def test_mood_rules(self):
+        for mood, text in MESSAGES.items():
+            features = classify_message(text)
+            assert features.persona_mood == mood
+            persona = select_persona(features, seed=message_seed(text))
+
+            category, intensity, _ = MOOD_RULES[mood]
+            assert (persona.mood_category, persona.intensity) == (category, intensity)
+            assert persona.temperature == PERSONA_CHARACTERISTICS[persona.persona_version]["temperature"]
+            assert persona.persona_name in persona.prompt_enhancement
+
+    def test_same_message_same_object(self):
+        text = MESSAGES["product"]
+        first = select_persona(classify_message(text), seed=message_seed(text))
+        second = select_persona(classify_message(text), seed=message_seed(text))
+        assert first is second
+
+    def test_seed_picks_between_variants(self):
+        features = classify_message(MESSAGES["skeptic"])
+        versions = {select_persona(features, seed=seed).persona_version for seed in range(4)}
+        assert versions == {"rebel", "expert"}
+
+    def test_prompt_matches_persona_manager(self):
+        # Дополнение к промпту то же, что давал общий PersonaManager
+        manager = PersonaManager()
+        for persona in ("friend", "expert", "rebel"):
+            manager.set_mood(MoodState(persona_version=persona))
+            expected = manager.get_prompt_enhancement(manager.get_persona_context())
+            for category, intensity, _ in MOOD_RULES.values():
+                assert get_curator_persona(persona, category, intensity).prompt_enhancement == expected
+
+    def test_immutable_and_cached(self):
+        persona = get_curator_persona("expert", "interest", "medium")
+        assert get_curator_persona("expert", "interest", "medium") is persona
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            persona.temperature = 1.0
+
+
+class RecordingClient:
+    """AI-клиент: запоминает промпт и температуру каждого запроса"""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def generate_response(self, system_prompt, user_message, context, temperature):
+        await asyncio.sleep(0)
+        self.calls[user_message] = (system_prompt, temperature)
+        return "Ответ"
+
+
+class TestConcurrentDialogs:
+
+    @pytest.mark.asyncio
+    async def test_moods_do_not_leak_between_users(self):
+        client = RecordingClient()
+        engine = CuratorChatEngine(client)
+        engine.use_conversational_mode = False
+
+        async def reply(telegram_id: int, text: str):
+            user = SimpleNamespace(
+                telegram_id=telegram_id, first_name="Анна", qualification="consultant",
+                lessons_completed=0, current_goal=None
+            )
+            await engine.generate_response(user, text, conversation_history=[])
+
+        texts = list(MESSAGES.values()) * 5
+        await asyncio.gather(*(reply(i, text) for i, text in enumerate(texts)))
+
+        for text in MESSAGES.values():
+            expected = select_persona(classify_message(text), seed=message_seed(text))
+            system_prompt, temperature = client.calls[text]
+            assert temperature == expected.temperature
+            assert system_prompt.endswith(expected.prompt_enhancement)
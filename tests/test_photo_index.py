@@ -0,0 +1,74 @@
+"""
+Тесты индекса фото продуктов
+"""
+import os
+
+import pytest
+
+from shared.media.photo_index import PhotoIndex
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"img")
+
+
+@pytest.fixture
+def products_dir(tmp_path):
+    base = tmp_path / "unified_products"
+    _touch(base / "occuba" / "biome_serum" / "photos" / "b.jpg")
+    _touch(base / "occuba" / "biome_serum" / "photos" / "a.png")
+    _touch(base / "occuba" / "biome_serum" / "photos" / "c.jpg")
+    _touch(base / "omega" / "omega" / "photos" / "1.jpg")
+    _touch(base / "omega" / "magnesium_marine" / "photos" / "1.jpeg")
+    _touch(base / "calcium" / "photos" / "x.jpg")
+    (base / "full_products_mapping.json").write_text("{}")
+    return base
+
+
+@pytest.fixture
+def index(products_dir):
+    photo_index = PhotoIndex(products_dir, refresh_interval=0)
+    photo_index.build()
+    return photo_index
+
+
+class TestPhotoIndex:
+    """Поиск по индексу"""
+
+    def test_folder_photos_sorted_jpg_first(self, index, products_dir):
+        photos = index.photos_in_folder("occuba/biome_serum")
+        assert [p.name for p in photos] == ["b.jpg", "c.jpg", "a.png"]
+        assert index.first_photo("occuba/biome_serum") == products_dir / "occuba/biome_serum/photos/b.jpg"
+
+    def test_folder_without_brand(self, index):
+        assert index.first_photo("calcium").name == "x.jpg"
+        assert index.first_photo("unknown/folder") is None
+
+    def test_find_product_folder(self, index):
+        assert index.find_product_folder("omega", "omega") == "omega/omega"
+        assert index.find_product_folder("biome_serum") == "occuba/biome_serum"
+        assert index.find_product_folder("magnesium") == "omega/magnesium_marine"
+        assert index.find_product_folder("nothing") is None
+
+    def test_random_photo(self, index):
+        assert index.random_photo("omega").name == "1.jpg"
+        assert index.random_photo().suffix == ".jpg"
+        assert index.count() == 6
+        assert index.count(".jpg") == 4
+
+    def test_refresh_on_directory_change(self, index, products_dir):
+        folder = products_dir / "omega" / "omega" / "photos"
+        _touch(folder / "2.jpg")
+        # mtime директории может не измениться в пределах разрешения ФС
+        stat = folder.stat()
+        os.utime(folder, (stat.st_atime, stat.st_mtime + 5))
+
+        assert [p.name for p in index.photos_in_folder("omega/omega")] == ["1.jpg", "2.jpg"]
+
+    def test_no_refresh_within_interval(self, products_dir):
+        photo_index = PhotoIndex(products_dir, refresh_interval=3600)
+        photo_index.build()
+        _touch(products_dir / "calcium" / "photos" / "y.jpg")
+
+        assert len(photo_index.photos_in_folder("calcium")) == 1
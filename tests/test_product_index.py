@@ -0,0 +1,156 @@
+"""
+Тесты единого индекса упоминаний продуктов
+"""
+import json
+import os
+import threading
+
+import pytest
+
+from shared.ai_clients.image_reference_service import ImageReferenceService
+from shared.media.product_index import ProductIndex, normalize_text
+
+
+MAPPING = {
+    "keywords": {
+        "коллаген": "collagen/collagen_peptides",
+        "collagen peptides": "collagen/collagen_peptides",
+        "energy diet": "energy_diet/_collection",
+        "ed smart": "energy_diet/ed_smart",
+        "3d slim": "3d_slim/3d_slim",
+        "чай": "enerwood/_collection",
+        "белый чай": "beloved/white_tea",
+    },
+    "categories": {
+        "enerwood": ["enerwood/_collection", "enerwood/green_tea"],
+    },
+}
+
+
+# Ключевые слова референсов до перехода на единый индекс — все должны находиться
+LEGACY_REFERENCE_KEYWORDS = [
+    ("energy_diet", ["energy diet", "энерджи дайет", "энерджи диет", "ed "]),
+    ("energy_diet_smart", ["ed smart", "smart", "смарт"]),
+    ("energy_diet_hd", ["ed hd", "hd", "хд"]),
+    ("greenflash", ["greenflash", "green flash", "грин флеш", "гринфлеш"]),
+    ("collagen", ["collagen", "коллаген"]),
+    ("draineffect", ["draineffect", "drain effect", "драйн", "дрейн"]),
+    ("3d_slim", ["3d slim", "3д слим", "слим"]),
+    ("omega", ["omega", "омега"]),
+    ("biodrone", ["biodrone", "биодрон"]),
+    ("enerwood", ["enerwood", "энервуд", "чай"]),
+    ("occuba", ["occuba", "оккуба", "косметика"]),
+    ("beloved", ["be loved", "белавед", "би лавед"]),
+    ("baby_food", ["детское", "baby", "малыш", "ребёнок", "для детей"]),
+    ("sport", ["протеин", "protein", "спорт", "sport", "гейнер", "bcaa"]),
+]
+
+
+@pytest.fixture
+def mapping_file(tmp_path):
+    path = tmp_path / "full_products_mapping.json"
+    path.write_text(json.dumps(MAPPING, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def index(mapping_file):
+    product_index = ProductIndex(mapping_file=mapping_file, reload_check_interval=0)
+    product_index.load_mapping()
+    return product_index
+
+
+class TestNormalize:
+    """Нормализация текста"""
+
+    def test_special_chars_become_spaces(self):
+        assert normalize_text("3D-Slim!") == "3d slim"
+        assert normalize_text("ED_Smart") == "ed smart"
+        assert normalize_text("  Коллаген,  да ") == "коллаген да"
+
+
+class TestProductIndex:
+    """Поиск упоминаний"""
+
+    def test_longest_match_wins(self, index):
+        match = index.find("Утром пью белый чай и коктейль")
+        assert match.keyword == "белый чай"
+        assert match.folder == "beloved/white_tea"
+
+    def test_find_all_order(self, index):
+        matches = index.find_all("Коллаген или 3D-Slim? А может Energy Diet")
+        assert [m.keyword for m in matches] == ["energy diet", "коллаген", "3d slim"]
+
+    def test_no_match(self, index):
+        assert index.find("Привет, как дела?") is None
+
+    def test_resolve_folder(self, index):
+        assert index.resolve_folder("ed_smart") == "energy_diet/ed_smart"
+        assert index.resolve_folder("хочу коллаген") == "collagen/collagen_peptides"
+        assert index.resolve_folder("неизвестно") is None
+
+    def test_resolve_folder_partial_name(self, index):
+        # Название короче ключевого слова — ищем ключевое слово, которое его содержит
+        assert index.resolve_folder("коллаг") == "collagen/collagen_peptides"
+        assert index.resolve_folder("smart") == "energy_diet/ed_smart"
+        assert index.resolve_folder("3d") == "3d_slim/3d_slim"
+        assert index.resolve_folder("") is None
+
+    def test_category_folders(self, index):
+        assert index.category_folders("Enerwood") == ["enerwood/_collection", "enerwood/green_tea"]
+
+    def test_media_keywords_priority(self, index):
+        index.set_media_keywords([
+            ("Коллаген", 3, 10, "product"),
+            ("коллаген", 8, 11, "product"),
+            ("коллаген", 9, 12, "testimonial"),
+        ])
+        match = index.find("Купила коллаген", asset_type="product")
+        assert match.entry.asset_ids("product") == [11, 10]
+        assert match.folder == "collagen/collagen_peptides"
+        # Ключевые слова без ресурсов нужного типа не возвращаются
+        assert index.find("белый чай", asset_type="product") is None
+
+    def test_hot_reload_on_mtime_change(self, index, mapping_file):
+        assert index.find("биодрон") is None
+
+        data = dict(MAPPING, keywords=dict(MAPPING["keywords"], биодрон="biodrone/biodrone"))
+        mapping_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        stat = mapping_file.stat()
+        os.utime(mapping_file, (stat.st_atime, stat.st_mtime + 10))
+
+        assert index.find("биодрон").folder == "biodrone/biodrone"
+
+    @pytest.mark.asyncio
+    async def test_reload_builds_once_off_loop(self, index, mapping_file, monkeypatch):
+        builds = []
+        build_state = ProductIndex._build_state
+
+        def counting_build(*args):
+            builds.append(threading.get_ident())
+            return build_state(*args)
+
+        monkeypatch.setattr(ProductIndex, "_build_state", staticmethod(counting_build))
+        data = dict(MAPPING, keywords=dict(MAPPING["keywords"], биодрон="biodrone/biodrone"))
+        mapping_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+        await index.reload([("омега", 5, 20, "product")])
+
+        assert len(builds) == 1
+        assert builds[0] != threading.get_ident()
+        assert index.find("биодрон").folder == "biodrone/biodrone"
+        assert index.find("омега-3").entry.asset_ids() == [20]
+        assert index.media_loaded
+
+
+class TestReferenceDetection:
+    """ImageReferenceService.detect_product_from_text не теряет старые ключевые слова"""
+
+    @pytest.mark.parametrize("product_id,keyword", [
+        (product_id, keyword)
+        for product_id, keywords in LEGACY_REFERENCE_KEYWORDS
+        for keyword in keywords
+    ])
+    def test_legacy_keyword(self, tmp_path, product_id, keyword):
+        service = ImageReferenceService(references_path=tmp_path / "image_references.json")
+        assert service.detect_product_from_text(f"Сегодня расскажу про {keyword} подробнее") == product_id
@@ -0,0 +1,140 @@
+"""
+Тесты для маршрутизатора AI провайдеров
+"""
+import asyncio
+import pytest
+
+from shared.ai_clients.router_client import (
+    RoutingAIClient,
+    CircuitBreaker,
+    ProviderStats,
+    AllProvidersFailedError,
+)
+
+
+class FakeClient:
+    """Фейковый AI клиент с настраиваемой задержкой и ошибками"""
+
+    def __init__(self, answer: str, delay: float = 0.0, fail: bool = False):
+        self.answer = answer
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_response(self, system_prompt, user_message, context=None, temperature=0.7, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("provider down")
+        return self.answer
+
+    async def generate_with_rag(self, system_prompt, user_message, knowledge_fragments, context=None,
+                                temperature=0.7, **kwargs):
+        return await self.generate_response(system_prompt, user_message, context, temperature)
+
+
+class TestProviderStats:
+    """Тесты скользящей статистики"""
+
+    def test_percentiles_and_error_rate(self):
+        stats = ProviderStats(window_size=10)
+        for latency in [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]:
+            stats.record_success(latency)
+
+        assert stats.percentile(0.5) == 0.6
+        assert stats.percentile(0.95) == 1.0
+        assert stats.error_rate == 0.0
+
+        stats.record_failure()
+        assert stats.error_rate == pytest.approx(0.1)
+
+    def test_empty_stats(self):
+        assert ProviderStats().percentile(0.95) is None
+
+
+class TestCircuitBreaker:
+    """Тесты circuit breaker"""
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        stats = ProviderStats()
+        for _ in range(3):
+            breaker.record_failure(stats)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow_request() is False
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+        breaker.record_failure(ProviderStats())
+
+        assert breaker.allow_request() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request() is False
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestRoutingAIClient:
+    """Тесты маршрутизации"""
+
+    @pytest.mark.asyncio
+    async def test_primary_answers(self):
+        primary = FakeClient("primary")
+        backup = FakeClient("backup")
+        router = RoutingAIClient([("a", primary), ("b", backup)], min_hedge_delay=0.05)
+
+        assert await router.generate_response("sys", "hi") == "primary"
+        assert backup.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_loser_cancelled(self):
+        primary = FakeClient("slow", delay=1.0)
+        backup = FakeClient("fast", delay=0.01)
+        router = RoutingAIClient(
+            [("a", primary), ("b", backup)],
+            default_hedge_delay=0.05,
+            min_hedge_delay=0.05
+        )
+
+        assert await router.generate_response("sys", "hi") == "fast"
+        await asyncio.sleep(0)
+        assert primary.cancelled == 1
+        assert router.get_stats()["b"]["hedges_won"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failover_on_error(self):
+        primary = FakeClient("broken", fail=True)
+        backup = FakeClient("backup")
+        router = RoutingAIClient([("a", primary), ("b", backup)], default_hedge_delay=5.0)
+
+        assert await router.generate_with_rag("sys", "hi", ["fragment"]) == "backup"
+        assert router.get_stats()["a"]["total_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_provider(self):
+        primary = FakeClient("broken", fail=True)
+        backup = FakeClient("backup")
+        router = RoutingAIClient([("a", primary), ("b", backup)], circuit_cooldown=60)
+        router.providers[0].breaker.failure_threshold = 2
+
+        for _ in range(2):
+            await router.generate_response("sys", "hi")
+        assert router.get_stats()["a"]["circuit"] == CircuitBreaker.OPEN
+
+        calls_before = primary.calls
+        assert await router.generate_response("sys", "hi") == "backup"
+        assert primary.calls == calls_before
+
+    @pytest.mark.asyncio
+    async def test_all_providers_failed(self):
+        router = RoutingAIClient([("a", FakeClient("x", fail=True)), ("b", FakeClient("y", fail=True))])
+
+        with pytest.raises(AllProvidersFailedError):
+            await router.generate_response("sys", "hi")
@@ -0,0 +1,223 @@
+"""
+Тесты шардирования куратора по telegram_id
+"""
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, web
+
+from curator_bot.funnels.context_store import FunnelContextStore
+from curator_bot.funnels.conversational_funnel import ConversationalFunnel, ConversationContext
+from shared.webhook.hash_ring import HashRing
+from shared.webhook.server import SECRET_HEADER, derive_secret
+from shared.webhook.shard_router import ShardRouter, extract_user_id
+
+SECRET = "s3cret"
+
+
+def make_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+            "text": "Привет",
+        },
+    }
+
+
+class TestHashRing:
+    """Консистентное хеширование"""
+
+    def test_deterministic(self):
+        first = HashRing(["a", "b", "c"])
+        second = HashRing(["c", "a", "b"])
+        assert all(first.node_for(key) == second.node_for(key) for key in range(1000))
+
+    def test_balanced(self):
+        ring = HashRing([f"w{i}" for i in range(4)])
+        counts = Counter(ring.node_for(key) for key in range(20000))
+        assert set(counts) == {"w0", "w1", "w2", "w3"}
+        assert min(counts.values()) > 20000 / 4 * 0.7
+
+    def test_adding_node_moves_only_its_share(self):
+        ring = HashRing([f"w{i}" for i in range(4)])
+        before = {key: ring.node_for(key) for key in range(20000)}
+        ring.add("w4")
+        moved = [key for key in before if ring.node_for(key) != before[key]]
+
+        assert all(ring.node_for(key) == "w4" for key in moved)
+        assert 0.1 < len(moved) / len(before) < 0.3
+
+    def test_removing_node_keeps_others(self):
+        ring = HashRing([f"w{i}" for i in range(4)])
+        before = {key: ring.node_for(key) for key in range(5000)}
+        ring.remove("w2")
+        for key, node in before.items():
+            if node != "w2":
+                assert ring.node_for(key) == node
+        assert ring.nodes == ["w0", "w1", "w3"]
+
+    def test_empty(self):
+        assert HashRing().node_for(1) is None
+
+
+class TestExtractUserId:
+
+    def test_message_and_callback(self):
+        assert extract_user_id(make_update(1, 42)) == 42
+        callback = {"update_id": 2, "callback_query": {"id": "x", "from": {"id": 7}, "chat_instance": "c"}}
+        assert extract_user_id(callback) == 7
+
+    def test_chat_only_and_unknown(self):
+        assert extract_user_id({"update_id": 3, "channel_post": {"chat": {"id": -100}}}) == -100
+        assert extract_user_id({"update_id": 4, "poll": {"id": "p"}}) is None
+
+
+class FakeWorker:
+    """Воркер-заглушка: принимает апдейты и новые составы кольца"""
+
+    def __init__(self, name: str, port: int):
+        self.name = name
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.updates = []
+        self.rings = []
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/webhook/curator", self.handle_update)
+        app.router.add_post("/shards/ring", self.handle_ring)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle_update(self, request):
+        assert request.headers[SECRET_HEADER] == derive_secret(SECRET, "curator")
+        self.updates.append(await request.json())
+        return web.Response()
+
+    async def handle_ring(self, request):
+        assert request.headers[SECRET_HEADER] == derive_secret(SECRET, "shards")
+        self.rings.append((await request.json())["workers"])
+        return web.json_response({"ok": True})
+
+
+@pytest_asyncio.fixture
+async def cluster(unused_tcp_port_factory):
+    router = ShardRouter(secret=SECRET)
+    runner = web.AppRunner(router.create_app())
+    await runner.setup()
+    port = unused_tcp_port_factory()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    workers = [FakeWorker(f"w{i}", unused_tcp_port_factory()) for i in range(3)]
+    for worker in workers:
+        await worker.start()
+
+    async with ClientSession() as http:
+        base = f"http://127.0.0.1:{port}"
+
+        async def call(path, payload, secret_name="shards"):
+            headers = {SECRET_HEADER: derive_secret(SECRET, secret_name)}
+            async with http.post(base + path, json=payload, headers=headers) as response:
+                return response.status
+
+        async def join(worker):
+            return await call("/shards/heartbeat", {"worker": worker.name, "url": worker.url})
+
+        async def send(update):
+            return await call("/webhook/curator", update, secret_name="curator")
+
+        yield router, workers, join, send, call
+
+    for worker in workers:
+        if worker.runner is not None:
+            await worker.stop()
+    await runner.cleanup()
+
+
+class TestShardRouter:
+    """Маршрутизация и членство"""
+
+    @pytest.mark.asyncio
+    async def test_same_user_goes_to_same_worker(self, cluster):
+        router, workers, join, send, _ = cluster
+        for worker in workers:
+            assert await join(worker) == 200
+        assert router.ring.nodes == ["w0", "w1", "w2"]
+        assert workers[0].rings[-1] == ["w0", "w1", "w2"]
+
+        for i in range(60):
+            assert await send(make_update(i, user_id=i % 20)) == 200
+
+        owners = {}
+        for worker in workers:
+            for update in worker.updates:
+                owners.setdefault(update["message"]["from"]["id"], set()).add(worker.name)
+        assert all(len(names) == 1 for names in owners.values())
+        assert sum(len(worker.updates) for worker in workers) == 60
+        assert sum(1 for worker in workers if worker.updates) > 1
+
+    @pytest.mark.asyncio
+    async def test_dead_worker_is_replaced(self, cluster):
+        router, workers, join, send, _ = cluster
+        for worker in workers:
+            await join(worker)
+        user_id = next(uid for uid in range(100) if router.ring.node_for(uid) == "w1")
+
+        await workers[1].stop()
+        workers[1].runner = None
+        assert await send(make_update(1, user_id)) == 200
+
+        assert router.ring.nodes == ["w0", "w2"]
+        assert any(u["message"]["from"]["id"] == user_id for w in (workers[0], workers[2]) for u in w.updates)
+
+    @pytest.mark.asyncio
+    async def test_leave_rebalances(self, cluster):
+        router, workers, join, send, call = cluster
+        for worker in workers:
+            await join(worker)
+        assert await call("/shards/leave", {"worker": "w2"}) == 200
+        assert router.ring.nodes == ["w0", "w1"]
+        assert workers[0].rings[-1] == ["w0", "w1"]
+        assert router.get_stats()["rebalances"] == 4
+
+    @pytest.mark.asyncio
+    async def test_secrets_and_no_workers(self, cluster):
+        router, workers, join, send, call = cluster
+        assert await call("/webhook/curator", make_update(1, 1), secret_name="shards") == 401
+        assert await call("/shards/heartbeat", {"worker": "x", "url": "http://x"}, secret_name="curator") == 401
+        assert await send(make_update(1, 1)) == 503
+
+
+class TestStateRelease:
+    """Выгрузка контекстов пользователей, переехавших на другой воркер"""
+
+    @pytest.mark.asyncio
+    async def test_release_keeps_owned_users(self):
+        funnel = ConversationalFunnel(store=FunnelContextStore(ConversationContext.new, ConversationContext.from_dict))
+        for user_id in range(10):
+            funnel.analyze_message(user_id, "Привет")
+
+        released = await funnel.release_contexts(keep=lambda user_id: user_id % 2 == 0)
+
+        assert released == 5
+        assert funnel.get_stats()["contexts"] == 5
+        assert funnel.get_context(4).messages_count == 1
+        assert funnel.get_context(5).messages_count == 0
+
+    def test_dirty_contexts_are_not_evicted(self):
+        store = FunnelContextStore(ConversationContext.new, ConversationContext.from_dict, backend=object())
+        store.mark_dirty(1, ConversationContext.new(1))
+        store.get_or_create(2)
+
+        assert store.evict(lambda user_id: True) == 1
+        assert store.peek(1) is not None
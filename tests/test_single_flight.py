@@ -0,0 +1,146 @@
+"""
+Тесты для single-flight объединения вызовов
+"""
+import asyncio
+import pytest
+
+from shared.ai_clients.router_client import RoutingAIClient
+from shared.utils.single_flight import SingleFlight, make_key, get_single_flight_stats
+
+
+class TestSingleFlight:
+    """Тесты SingleFlight"""
+
+    @pytest.mark.asyncio
+    async def test_identical_calls_share_one_execution(self):
+        flight = SingleFlight("test_identical")
+        executions = 0
+
+        async def work():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.02)
+            return "result"
+
+        results = await asyncio.gather(*[flight.do("same", work) for _ in range(10)])
+
+        assert results == ["result"] * 10
+        assert executions == 1
+        assert flight.get_stats() == {"calls": 10, "saved": 9, "inflight": 0}
+        assert get_single_flight_stats()["test_identical"]["saved"] == 9
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        flight = SingleFlight("test_keys")
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2)))
+
+        assert results == [1, 2]
+        assert flight.saved == 0
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_are_not_cached(self):
+        flight = SingleFlight("test_sequential")
+        executions = 0
+
+        async def work():
+            nonlocal executions
+            executions += 1
+            return executions
+
+        assert await flight.do("k", work) == 1
+        assert await flight.do("k", work) == 2
+
+    @pytest.mark.asyncio
+    async def test_error_shared_by_all_waiters(self):
+        flight = SingleFlight("test_error")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(3)], return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        flight = SingleFlight("test_cancel")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == "done"
+
+    @pytest.mark.asyncio
+    async def test_last_waiter_cancel_cancels_call(self):
+        flight = SingleFlight("test_cancel_last")
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set()
+
+        waiters[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=0.5)
+        assert flight.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_router_hedge_loser_cancels_provider_call(self):
+        class CoalescedClient:
+            """Клиент, как настоящие: вызовы объединены через SingleFlight"""
+
+            def __init__(self, name: str, delay: float):
+                self.flight = SingleFlight(f"test_hedge_{name}")
+                self.delay = delay
+                self.cancelled = 0
+
+            async def generate_response(self, system_prompt, user_message, context=None, temperature=0.7):
+                key = make_key(system_prompt, user_message, context, temperature)
+                return await self.flight.do(key, self._request)
+
+            async def _request(self):
+                try:
+                    await asyncio.sleep(self.delay)
+                except asyncio.CancelledError:
+                    self.cancelled += 1
+                    raise
+                return f"answer after {self.delay}"
+
+        primary = CoalescedClient("primary", delay=1.0)
+        backup = CoalescedClient("backup", delay=0.01)
+        router = RoutingAIClient(
+            [("a", primary), ("b", backup)],
+            default_hedge_delay=0.05,
+            min_hedge_delay=0.05
+        )
+
+        assert await router.generate_response("sys", "hi") == "answer after 0.01"
+        await asyncio.sleep(0.01)
+        assert primary.cancelled == 1
+        assert primary.flight.inflight == 0
+
+    def test_make_key_is_stable(self):
+        context = [{"role": "user", "content": "привет"}]
+        assert make_key("m", "sys", context, 0.7) == make_key("m", "sys", list(context), 0.7)
+        assert make_key("m", "sys", context, 0.7) != make_key("m", "sys", context, 0.8)
@@ -0,0 +1,71 @@
+"""
+Тесты выбора testimonials в памяти
+"""
+import random
+from collections import Counter
+
+from shared.media import testimonial_sampler as sampler_module
+from shared.media.testimonial_sampler import AliasTable
+
+
+def _sampler(rows, recent_size=0):
+    sampler = sampler_module.TestimonialSampler(recent_size=recent_size, rng=random.Random(7))
+    sampler.load(rows)
+    return sampler
+
+
+ROWS = [
+    (1, "checks", ["семья", "успех"], 0),
+    (2, "checks", ["успех"], 0),
+    (3, "stories", ["семья"], 0),
+    (4, "checks", [], 9),
+]
+
+
+class TestAliasTable:
+    """Выбор с весами"""
+
+    def test_distribution_follows_weights(self):
+        table = AliasTable([1, 2], [3.0, 1.0])
+        rng = random.Random(1)
+        counts = Counter(table.sample(rng) for _ in range(20000))
+        assert 0.72 < counts[1] / 20000 < 0.78
+
+    def test_empty(self):
+        assert AliasTable([], []).sample(random.Random()) is None
+
+
+class TestTestimonialSampler:
+    """Фильтры, веса и повторы"""
+
+    def test_filters(self):
+        sampler = _sampler(ROWS)
+        assert {sampler.sample(category="stories") for _ in range(20)} == {3}
+        assert {sampler.sample(tags=["семья"]) for _ in range(50)} == {1, 3}
+        assert {sampler.sample(category="checks", tags=["семья", "успех"]) for _ in range(20)} == {1}
+        assert sampler.sample(category="unknown") is None
+        assert sampler.sample(tags=["семья", "нет_такого"]) is None
+
+    def test_low_usage_preferred(self):
+        sampler = _sampler(ROWS)
+        counts = Counter(sampler.sample(category="checks") for _ in range(3000))
+        # Вес 1/(1+9) против 1 у остальных
+        assert counts[4] < counts[1] / 5
+
+    def test_no_immediate_repeat(self):
+        sampler = _sampler([(1, "checks", [], 0), (2, "checks", [], 0), (3, "checks", [], 0)], recent_size=1)
+        previous = None
+        repeats = 0
+        for _ in range(200):
+            asset_id = sampler.sample(category="checks")
+            repeats += asset_id == previous
+            sampler.record_use(asset_id)
+            previous = asset_id
+        assert repeats < 5
+
+    def test_add_updates_buckets(self):
+        sampler = _sampler(ROWS)
+        sampler.add(5, "before_after", ["семья"])
+        assert sampler.sample(category="before_after") == 5
+        assert 5 in {sampler.sample(tags=["семья"]) for _ in range(100)}
+        assert len(sampler) == 5
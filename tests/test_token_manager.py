@@ -0,0 +1,105 @@
+"""
+Тесты для менеджера токенов AI провайдеров
+"""
+import asyncio
+import time
+import pytest
+
+from shared.ai_clients.token_manager import TokenManager, AuthToken
+
+
+class FakeTokenEndpoint:
+    """Фейковый эндпоинт авторизации"""
+
+    def __init__(self, lifetime: float = 3600, delay: float = 0.0):
+        self.lifetime = lifetime
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch(self) -> AuthToken:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return AuthToken(value=f"token-{self.calls}", expires_at=time.time() + self.lifetime)
+
+
+class TestTokenManager:
+    """Тесты TokenManager"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_single_flight(self):
+        endpoint = FakeTokenEndpoint(delay=0.05)
+        manager = TokenManager("test", endpoint.fetch)
+
+        tokens = await asyncio.gather(*[manager.get_token() for _ in range(20)])
+
+        assert set(tokens) == {"token-1"}
+        assert endpoint.calls == 1
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_background_refresh_before_expiry(self):
+        endpoint = FakeTokenEndpoint(lifetime=0.5)
+        manager = TokenManager("test", endpoint.fetch, refresh_ratio=0.2, min_validity=0.0)
+
+        assert await manager.get_token() == "token-1"
+        await asyncio.sleep(0.2)
+
+        # Фоновая задача уже обновила токен — запрос получает его без ожидания
+        assert endpoint.calls >= 2
+        assert await manager.get_token() != "token-1"
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_ignores_already_replaced_token(self):
+        endpoint = FakeTokenEndpoint()
+        manager = TokenManager("test", endpoint.fetch)
+
+        assert await manager.get_token() == "token-1"
+        manager.invalidate("some-old-token")
+        assert await manager.get_token() == "token-1"
+
+        manager.invalidate("token-1")
+        assert await manager.get_token() == "token-2"
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_disk_cache_survives_restart(self, tmp_path):
+        cache = tmp_path / "tokens.json"
+        endpoint = FakeTokenEndpoint()
+
+        first = TokenManager("yandex:sa", endpoint.fetch, cache_path=str(cache))
+        assert await first.get_token() == "token-1"
+        await first.close()
+
+        second = TokenManager("yandex:sa", endpoint.fetch, cache_path=str(cache))
+        assert await second.get_token() == "token-1"
+        assert endpoint.calls == 1
+        await second.close()
+
+    @pytest.mark.asyncio
+    async def test_fetch_error_propagates_to_all_waiters(self):
+        async def failing_fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("auth down")
+
+        manager = TokenManager("test", failing_fetch, retry_delay=10)
+        results = await asyncio.gather(*[manager.get_token() for _ in range(3)], return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        endpoint = FakeTokenEndpoint(delay=0.05)
+        manager = TokenManager("test", endpoint.fetch)
+
+        first = asyncio.create_task(manager.get_token())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(manager.get_token())
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == "token-1"
+        assert first.cancelled()
+        assert endpoint.calls == 1
+        await manager.close()
@@ -0,0 +1,207 @@
+"""
+Тесты очереди обработки апдейтов куратора
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import CallbackQuery
+
+from curator_bot.middlewares.user_ordering import (
+    BUSY_USER_TEXT,
+    OVERLOAD_TEXT,
+    TIMEOUT_TEXT,
+    UserOrderingMiddleware,
+)
+
+
+class FakeMessage:
+    def __init__(self, user_id, text=""):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+class FakeCallback(CallbackQuery):
+    """CallbackQuery без бота: всплывашки запоминаются, сообщение — FakeMessage"""
+
+    async def answer(self, text=None, **kwargs):
+        self.popups.append(text)
+
+
+def fake_callback(user_id):
+    return FakeCallback.model_construct(
+        id=str(user_id), from_user=SimpleNamespace(id=user_id), chat_instance="chat",
+        message=FakeMessage(user_id), data="next", text="next", popups=[]
+    )
+
+
+class Recorder:
+    """Обработчик, который запоминает порядок и пиковую конкуренцию"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.events = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, event, data):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.events.append(("start", event.from_user.id, event.text))
+        await asyncio.sleep(self.delay)
+        self.events.append(("end", event.from_user.id, event.text))
+        self.active -= 1
+        return event.text
+
+
+class TestUserOrdering:
+    """Порядок по пользователю и общий лимит воркеров"""
+
+    @pytest.mark.asyncio
+    async def test_same_user_is_serialized(self):
+        middleware = UserOrderingMiddleware(max_workers=10)
+        handler = Recorder()
+
+        results = await asyncio.gather(
+            middleware(handler, FakeMessage(1, "first"), {}),
+            middleware(handler, FakeMessage(1, "second"), {}),
+        )
+
+        assert results == ["first", "second"]
+        assert handler.events == [
+            ("start", 1, "first"), ("end", 1, "first"),
+            ("start", 1, "second"), ("end", 1, "second"),
+        ]
+        assert middleware.get_stats()["users_pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_different_users_run_in_parallel(self):
+        middleware = UserOrderingMiddleware(max_workers=10)
+        handler = Recorder()
+
+        await asyncio.gather(*(middleware(handler, FakeMessage(i), {}) for i in range(5)))
+        assert handler.peak == 5
+
+    @pytest.mark.asyncio
+    async def test_global_concurrency_is_capped(self):
+        middleware = UserOrderingMiddleware(max_workers=3)
+        handler = Recorder(delay=0.02)
+
+        await asyncio.gather(*(middleware(handler, FakeMessage(i), {}) for i in range(12)))
+        assert handler.peak == 3
+        stats = middleware.get_stats()
+        assert stats["processed"] == 12
+        assert stats["max_queue_depth"] > 0
+        assert stats["wait_p95_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_events_without_user_pass_through(self):
+        middleware = UserOrderingMiddleware()
+
+        async def handler(event, data):
+            return "ok"
+
+        assert await middleware(handler, SimpleNamespace(), {}) == "ok"
+
+
+class TestBackpressure:
+    """Быстрые ответы вместо таймаутов"""
+
+    @pytest.mark.asyncio
+    async def test_too_many_messages_from_one_user(self):
+        middleware = UserOrderingMiddleware(max_per_user=2)
+        handler = Recorder()
+        messages = [FakeMessage(1, str(i)) for i in range(3)]
+
+        results = await asyncio.gather(*(middleware(handler, m, {}) for m in messages))
+
+        assert results == ["0", "1", None]
+        assert messages[2].answers == [BUSY_USER_TEXT]
+        assert middleware.get_stats()["rejected_user"] == 1
+
+    @pytest.mark.asyncio
+    async def test_global_queue_overflow(self):
+        middleware = UserOrderingMiddleware(max_workers=1, max_queue=2)
+        handler = Recorder()
+        messages = [FakeMessage(i) for i in range(5)]
+
+        results = await asyncio.gather(*(middleware(handler, m, {}) for m in messages))
+
+        # 1 в работе + 2 в очереди, остальным — сразу ответ о перегрузке
+        assert results.count(None) == 2
+        assert messages[3].answers == [OVERLOAD_TEXT]
+        assert messages[4].answers == [OVERLOAD_TEXT]
+        assert middleware.get_stats()["rejected_overload"] == 2
+
+    @pytest.mark.asyncio
+    async def test_queue_position_notice(self):
+        middleware = UserOrderingMiddleware(max_workers=1, notice_after=0.02)
+        handler = Recorder(delay=0.1)
+        first, second, third = FakeMessage(1), FakeMessage(2), FakeMessage(3)
+
+        await asyncio.gather(*(middleware(handler, m, {}) for m in (first, second, third)))
+
+        assert first.answers == []
+        assert "1-й в очереди" in second.answers[0]
+        assert "2-й в очереди" in third.answers[0]
+        assert middleware.get_stats()["queue_notices"] == 2
+        assert middleware.get_stats()["processed"] == 3
+
+    @pytest.mark.asyncio
+    async def test_callback_queue_notice_goes_to_chat(self):
+        middleware = UserOrderingMiddleware(max_workers=1, notice_after=0.02)
+
+        async def handler(event, data):
+            await asyncio.sleep(0.1)
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+
+        first, queued = FakeMessage(1), fake_callback(2)
+        await asyncio.gather(middleware(handler, first, {}), middleware(handler, queued, {}))
+
+        # Запрос закрывает только обработчик, уведомление — сообщением в чат
+        assert queued.popups == [None]
+        assert "1-й в очереди" in queued.message.answers[0]
+
+    @pytest.mark.asyncio
+    async def test_callback_rejection_is_popup(self):
+        middleware = UserOrderingMiddleware(max_workers=1, max_queue=1)
+        handler = Recorder(delay=0.05)
+        first, second, rejected = FakeMessage(1), FakeMessage(2), fake_callback(3)
+
+        results = await asyncio.gather(*(middleware(handler, e, {}) for e in (first, second, rejected)))
+
+        assert results == ["", "", None]
+        assert rejected.popups == [OVERLOAD_TEXT]
+        assert rejected.message.answers == []
+
+    @pytest.mark.asyncio
+    async def test_wait_timeout(self):
+        middleware = UserOrderingMiddleware(max_workers=1, notice_after=0.01, max_wait=0.05)
+        handler = Recorder(delay=0.2)
+        slow, late = FakeMessage(1), FakeMessage(2)
+
+        results = await asyncio.gather(middleware(handler, slow, {}), middleware(handler, late, {}))
+
+        assert results[1] is None
+        assert late.answers[-1] == TIMEOUT_TEXT
+        stats = middleware.get_stats()
+        assert stats["timed_out"] == 1
+        assert stats["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_handler_error_releases_worker(self):
+        middleware = UserOrderingMiddleware(max_workers=1)
+
+        async def broken(event, data):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await middleware(broken, FakeMessage(1), {})
+
+        assert await middleware(Recorder(delay=0), FakeMessage(1, "ok"), {}) == "ok"
+        assert middleware.get_stats()["active"] == 0
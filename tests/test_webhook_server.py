@@ -0,0 +1,167 @@
+"""
+Тесты приёма апдейтов через webhook
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import ClientSession
+
+from shared.webhook.server import SECRET_HEADER, WebhookServer
+
+
+def make_update(update_id: int, text: str = "Привет", user_id: int = 10) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+            "text": text,
+        },
+    }
+
+
+def make_dispatcher(received: list, gate: asyncio.Event = None) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        if gate is not None:
+            await gate.wait()
+        received.append(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+@pytest_asyncio.fixture
+async def server(unused_tcp_port):
+    server = WebhookServer(host="127.0.0.1", port=unused_tcp_port, base_url="https://bots.example.com", secret="s3cret")
+    await server.start()
+    async with ClientSession() as http:
+        server.http = http
+        yield server
+        await server.stop()
+
+
+def post(server: WebhookServer, name: str, payload, secret: str = None):
+    headers = {SECRET_HEADER: server.bot_secret(name) if secret is None else secret}
+    url = f"http://127.0.0.1:{server.port}{server.path}/{name}"
+    if isinstance(payload, dict):
+        return server.http.post(url, json=payload, headers=headers)
+    return server.http.post(url, data=payload, headers=headers)
+
+
+class TestWebhookServer:
+    """Проверка секрета, немедленный ответ, передача диспетчеру"""
+
+    @pytest.mark.asyncio
+    async def test_acknowledges_before_handler_finishes(self, server):
+        received, gate = [], asyncio.Event()
+        server.register("curator", Bot("42:TEST"), make_dispatcher(received, gate))
+
+        async with post(server, "curator", make_update(1)) as response:
+            assert response.status == 200
+        assert received == []
+        assert server.get_stats()["in_flight"] == 1
+
+        gate.set()
+        await server.drain()
+        assert received == ["Привет"]
+        assert server.get_stats()["processed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_wrong_secret_is_rejected(self, server):
+        received = []
+        server.register("curator", Bot("42:TEST"), make_dispatcher(received))
+
+        async with post(server, "curator", make_update(1), secret="guess") as response:
+            assert response.status == 401
+        async with post(server, "curator", make_update(2), secret=server.bot_secret("content")) as response:
+            assert response.status == 401
+
+        await server.drain()
+        assert received == []
+        assert server.get_stats()["rejected_secret"] == 2
+
+    @pytest.mark.asyncio
+    async def test_unknown_bot_and_bad_payload(self, server):
+        server.register("curator", Bot("42:TEST"), make_dispatcher([]))
+
+        async with post(server, "other", make_update(1)) as response:
+            assert response.status == 404
+        async with post(server, "curator", b"not json") as response:
+            assert response.status == 400
+        assert server.get_stats()["bad_requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_two_bots_share_one_port(self, server):
+        curator, content = [], []
+        server.register("curator", Bot("42:CURATOR"), make_dispatcher(curator))
+        server.register("content", Bot("43:CONTENT"), make_dispatcher(content))
+
+        async with post(server, "curator", make_update(1, "куратору")) as response:
+            assert response.status == 200
+        async with post(server, "content", make_update(2, "контент-менеджеру")) as response:
+            assert response.status == 200
+
+        await server.drain()
+        assert curator == ["куратору"]
+        assert content == ["контент-менеджеру"]
+
+    @pytest.mark.asyncio
+    async def test_handler_error_is_counted(self, server):
+        router = Router()
+
+        @router.message()
+        async def broken(message: Message):
+            raise RuntimeError("boom")
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        server.register("curator", Bot("42:TEST"), dp)
+
+        async with post(server, "curator", make_update(1)) as response:
+            assert response.status == 200
+        await server.drain()
+        assert server.get_stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_serve_returns_after_own_updates(self, server):
+        curator, gate = [], asyncio.Event()
+        curator_serve = asyncio.create_task(
+            server.serve("curator", Bot("42:CURATOR"), make_dispatcher(curator, gate), set_webhook=False)
+        )
+        content_serve = asyncio.create_task(
+            server.serve("content", Bot("43:CONTENT"), make_dispatcher([]), set_webhook=False)
+        )
+        await asyncio.sleep(0.05)
+
+        async with post(server, "curator", make_update(1)) as response:
+            assert response.status == 200
+        server.request_stop()
+
+        # Контент-менеджеру дожидаться нечего, куратор ждёт свой апдейт
+        await asyncio.wait_for(content_serve, timeout=1)
+        await asyncio.sleep(0.05)
+        assert not curator_serve.done()
+        assert curator == []
+        assert server._runner is not None  # сервер останавливает последний бот
+
+        gate.set()
+        await asyncio.wait_for(curator_serve, timeout=1)
+        assert curator == ["Привет"]
+        assert server.get_stats()["in_flight"] == 0
+        assert server._runner is None
+
+    def test_bot_secrets_are_valid_and_distinct(self):
+        server = WebhookServer(secret="s3cret")
+        curator, content = server.bot_secret("curator"), server.bot_secret("content")
+        assert curator != content
+        assert curator.isalnum() and len(curator) <= 256
+        assert WebhookServer(secret="s3cret").bot_secret("curator") == curator